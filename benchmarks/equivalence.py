@@ -0,0 +1,337 @@
+"""Equivalence harness: legacy row-by-row code versus the accelerated engines.
+
+Every case builds one input, runs the legacy implementation (engine="rows")
+and the accelerated one (engine="array") on separate copies, and compares
+the output columns:
+
+- power_flow          BatteryCharge, GridFlow, BatteryFlow, EVCharge, EVFlow
+- dual_tariff         DualTariff
+- dynamic_tariff      DynamicTariff
+- direct_irradiance   DirectIrradiance, DNI
+
+Inputs are randomised (seeded) plus edge cases: DST transitions (a
+Europe/Brussels index), NaN and missing Belpex prices, NaN/zero grid flow,
+zero PV, a battery that runs full or empty, no battery, and every EV_type.
+
+    python -m benchmarks.equivalence                      # all cases
+    python -m benchmarks.equivalence --only power_flow --days 60 --output eq.json
+
+A column passes when NaNs sit at the same rows and every other value
+satisfies |accelerated - legacy| <= atol + rtol * |legacy|. The command
+exits with status 1 on any breach; `assert_equivalent` raises
+`EquivalenceError` for use in tests. Every case also reports the speedup of
+the accelerated engine.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import synthetic
+from financialmodel.models import ElectricityContract
+from gridcost.gridcost import GridCost
+
+DEFAULT_ATOL = 1e-9
+DEFAULT_RTOL = 1e-9
+
+POWER_FLOW_COLUMNS = ("BatteryCharge", "GridFlow", "BatteryFlow", "EVCharge", "EVFlow")
+EV_TYPES = ("no_EV", "B2G", "with_SC", "no_SC", "smart")
+
+
+class EquivalenceError(AssertionError):
+    """The accelerated engine drifted from the legacy one beyond the tolerance."""
+
+
+@dataclass(frozen=True)
+class Case:
+    """`build()` returns a fresh input; `run(input, engine)` returns the output columns."""
+
+    name: str
+    target: str
+    build: Callable[[], Any]
+    run: Callable[[Any, str], pd.DataFrame]
+
+
+# ----------------------------------------------------------------------
+# inputs
+# ----------------------------------------------------------------------
+
+def _index(days: int, freq: str) -> pd.DatetimeIndex:
+    return pd.date_range("2018-06-04", periods=int(pd.Timedelta(days=days) / pd.Timedelta(freq)),
+                         freq=freq, name="DateTime")
+
+
+def _dst_index(start: str, freq: str = "15min") -> pd.DatetimeIndex:
+    """One week of local Brussels time around a DST transition (the index keeps its freq)."""
+    return pd.date_range(start, periods=int(pd.Timedelta(days=7) / pd.Timedelta(freq)), freq=freq,
+                         tz="Europe/Brussels", name="DateTime")
+
+
+def _weather(index: pd.DatetimeIndex, seed: int) -> pd.DataFrame:
+    """Synthetic weather/load on an arbitrary index (also tz-aware)."""
+    naive = index.tz_localize(None) if index.tz is not None else index
+    frame = synthetic.weather_and_load(years=1.0, freq="1h", seed=seed, start=str(naive[0].normalize().date()))
+    hourly = frame.reindex(naive.floor("h"))
+    rng = np.random.default_rng(seed)
+    hourly["Load_kW"] = hourly["Load_kW"].to_numpy() * rng.uniform(0.7, 1.3, len(index))
+    hourly.index = index
+    return hourly
+
+
+def _power_flow_input(index: pd.DatetimeIndex, seed: int, *, pv_scale: float = 1.0, load_scale: float = 1.0):
+    frame = _weather(index, seed)
+    obj = synthetic.powercalculations(frame)
+    obj.pd["PV_generated_power"] = pv_scale * 6.0 * frame["GlobRad"].to_numpy() / 1000.0
+    obj.pd["Load_kW"] = load_scale * frame["Load_kW"].to_numpy()
+    rng = np.random.default_rng(seed + 7)
+    # profiles as written by add_EV_load_type: mostly idle, 3.7 kW or 7.4 kW while charging
+    obj.pd["Load_EV_kW_with_SC"] = rng.choice([0.0, 0.0, 0.0, 3.7], len(index))
+    obj.pd["Load_EV_kW_no_SC"] = rng.choice([0.0, 0.0, 0.0, 7.4], len(index))
+    # as written by smart_EV_load: full power in the cheapest steps, a partial step per session
+    obj.pd["Load_EV_kW_smart"] = rng.choice([0.0, 0.0, 0.0, 11.0], len(index)) * rng.uniform(0.5, 1.0, len(index))
+    return obj
+
+
+def _gridcost(index: pd.DatetimeIndex, seed: int, contract: ElectricityContract, *,
+              nan_flow: float = 0.0, zero_flow: float = 0.0, nan_price: float = 0.0,
+              missing_day: bool = False, no_prices: bool = False) -> GridCost:
+    rng = np.random.default_rng(seed)
+    n = len(index)
+    flow = rng.normal(-0.4, 1.5, n)
+    flow[rng.random(n) < zero_flow] = 0.0
+    flow[rng.random(n) < nan_flow] = np.nan
+    price = 90 + 50 * rng.standard_normal(n)      # negative prices included
+    price[rng.random(n) < nan_price] = np.nan
+    if missing_day:
+        price[: int(pd.Timedelta(days=1) / (index[1] - index[0]))] = np.nan
+
+    gc = GridCost.__new__(GridCost)
+    gc.electricity_contract = contract
+    gc.resample_freq = "1h"
+    gc.pd = pd.DataFrame({"GridFlow": flow, "BelpexFilter": price}, index=index)
+    if no_prices:
+        # no Belpex file: GridCost stores None prices in an object column
+        gc.pd["BelpexFilter"] = None
+    return gc
+
+
+# ----------------------------------------------------------------------
+# runners
+# ----------------------------------------------------------------------
+
+def _run_power_flow(**kwargs):
+    def run(obj, engine: str) -> pd.DataFrame:
+        obj.power_flow(engine=engine, **kwargs)
+        return obj.pd[list(POWER_FLOW_COLUMNS)]
+    return run
+
+
+def _run_tariff(name: str):
+    def run(gc, engine: str) -> pd.DataFrame:
+        getattr(gc, name.lower().replace("tariff", "_tariff"))(engine=engine)
+        return gc.pd[[name]]
+    return run
+
+
+def _run_irradiance(tilt_angle: float, orientation: str):
+    def run(obj, engine: str) -> pd.DataFrame:
+        obj.calculate_direct_irradiance(tilt_angle=tilt_angle, orientation=orientation, engine=engine)
+        return obj.pd[["DirectIrradiance", "DNI"]]
+    return run
+
+
+def _irradiance_input(index: pd.DatetimeIndex, seed: int, *, dark: bool = False):
+    frame = _weather(index, seed)
+    if dark:
+        frame[["GlobRad", "DiffRad"]] = 0.0
+    obj = synthetic.powercalculations(frame)
+    synthetic.add_solar_angles(obj)
+    return obj
+
+
+DUAL = ElectricityContract(contract_type="DualTariff", dual_cons_peak=35.0, dual_cons_offpeak=25.0,
+                           dual_inj_peak=-4.0, dual_inj_offpeak=-2.0)
+DYNAMIC = ElectricityContract(contract_type="DynamicTariff", dynamic_cons_var_peak=0.11, dynamic_cons_var_offpeak=0.1,
+                              dynamic_cons_fix_peak=2.0, dynamic_cons_fix_offpeak=1.5, dynamic_inj_var_peak=0.08,
+                              dynamic_inj_var_offpeak=0.07, dynamic_inj_fix_peak=-1.0, dynamic_inj_fix_offpeak=-0.5)
+
+
+def default_cases(days: int = 14, seed: int = 0) -> List[Case]:
+    """Randomised and edge-case inputs for every accelerated code path."""
+    cases: List[Case] = []
+    hourly = _index(days, "1h")
+    quarter = _index(days, "15min")
+    spring = _dst_index("2018-03-22")   # 25 March: 23 h day
+    autumn = _dst_index("2018-10-25")   # 28 October: 25 h day
+
+    # power_flow: every EV type, battery sizes from none to effectively unbounded
+    for i, ev in enumerate(EV_TYPES):
+        for max_charge in (0, 8, 1000):
+            cases.append(Case(f"power_flow/random/{ev}/battery={max_charge}", "power_flow",
+                              lambda i=i: _power_flow_input(quarter, seed + i),
+                              _run_power_flow(EV_type=ev, max_charge=max_charge)))
+    cases += [
+        Case("power_flow/hourly", "power_flow", lambda: _power_flow_input(hourly, seed), _run_power_flow()),
+        Case("power_flow/zero_pv", "power_flow", lambda: _power_flow_input(quarter, seed, pv_scale=0.0),
+             _run_power_flow(EV_type="B2G")),
+        Case("power_flow/full_battery", "power_flow", lambda: _power_flow_input(quarter, seed, pv_scale=5.0),
+             _run_power_flow(max_charge=2, max_AC_power_output=3)),
+        Case("power_flow/empty_battery", "power_flow",
+             lambda: _power_flow_input(quarter, seed, pv_scale=0.0, load_scale=4.0), _run_power_flow(max_charge=2)),
+        Case("power_flow/peak_power_limit", "power_flow", lambda: _power_flow_input(quarter, seed, pv_scale=3.0),
+             _run_power_flow(max_DC_batterypower=8, battery_PeakPower=2.5, max_PV_input=4)),
+        Case("power_flow/dst_spring", "power_flow", lambda: _power_flow_input(spring, seed), _run_power_flow(EV_type="B2G")),
+        Case("power_flow/dst_autumn", "power_flow", lambda: _power_flow_input(autumn, seed), _run_power_flow(EV_type="B2G")),
+    ]
+
+    # tariffs
+    for name, contract in (("DualTariff", DUAL), ("DynamicTariff", DYNAMIC)):
+        target = name.lower().replace("tariff", "_tariff")
+        cases += [
+            Case(f"{target}/random", target, lambda c=contract: _gridcost(quarter, seed, c), _run_tariff(name)),
+            Case(f"{target}/nan_and_zero_flow", target,
+                 lambda c=contract: _gridcost(quarter, seed + 1, c, nan_flow=0.05, zero_flow=0.1), _run_tariff(name)),
+            Case(f"{target}/dst_spring", target, lambda c=contract: _gridcost(spring, seed + 2, c), _run_tariff(name)),
+            Case(f"{target}/dst_autumn", target, lambda c=contract: _gridcost(autumn, seed + 3, c), _run_tariff(name)),
+        ]
+    cases += [
+        Case("dynamic_tariff/nan_belpex", "dynamic_tariff",
+             lambda: _gridcost(quarter, seed + 4, DYNAMIC, nan_price=0.1, missing_day=True), _run_tariff("DynamicTariff")),
+        Case("dynamic_tariff/no_belpex", "dynamic_tariff",
+             lambda: _gridcost(quarter, seed + 5, DYNAMIC, no_prices=True), _run_tariff("DynamicTariff")),
+    ]
+
+    # direct irradiance: every orientation, flat to vertical
+    for orientation in ("S", "E", "W", "N", "EW"):
+        for tilt in (0, 35, 90):
+            cases.append(Case(f"direct_irradiance/{orientation}/tilt={tilt}", "direct_irradiance",
+                              lambda: _irradiance_input(hourly, seed), _run_irradiance(tilt, orientation)))
+    cases += [
+        Case("direct_irradiance/dark", "direct_irradiance", lambda: _irradiance_input(hourly, seed, dark=True),
+             _run_irradiance(35, "S")),
+        Case("direct_irradiance/dst_autumn", "direct_irradiance", lambda: _irradiance_input(autumn, seed),
+             _run_irradiance(35, "S")),
+    ]
+    return cases
+
+
+# ----------------------------------------------------------------------
+# comparison
+# ----------------------------------------------------------------------
+
+def compare_columns(legacy: pd.DataFrame, accelerated: pd.DataFrame, *, atol: float = DEFAULT_ATOL,
+                    rtol: float = DEFAULT_RTOL) -> Dict[str, Dict[str, Any]]:
+    """Max absolute/relative difference and pass/fail per column."""
+    report = {}
+    for column in legacy.columns:
+        a = pd.to_numeric(legacy[column], errors="coerce").to_numpy(dtype=float)
+        b = pd.to_numeric(accelerated[column], errors="coerce").to_numpy(dtype=float)
+        nan_a, nan_b = np.isnan(a), np.isnan(b)
+        both = ~(nan_a | nan_b)
+        diff = np.abs(a[both] - b[both])
+        scale = np.abs(a[both])
+        rel = np.divide(diff, scale, out=np.where(diff > 0, np.inf, 0.0), where=scale > 0)
+        nan_mismatch = int((nan_a != nan_b).sum())
+        report[column] = {
+            "max_abs": float(diff.max()) if diff.size else 0.0,
+            "max_rel": float(rel.max()) if rel.size else 0.0,
+            "nan_mismatch": nan_mismatch,
+            "ok": bool(nan_mismatch == 0 and np.all(diff <= atol + rtol * scale)),
+        }
+    return report
+
+
+def run_case(case: Case, *, atol: float = DEFAULT_ATOL, rtol: float = DEFAULT_RTOL) -> Dict[str, Any]:
+    outputs, times = {}, {}
+    for engine in ("rows", "array"):
+        state = case.build()
+        start = time.perf_counter()
+        outputs[engine] = case.run(state, engine)
+        times[engine] = time.perf_counter() - start
+
+    columns = compare_columns(outputs["rows"], outputs["array"], atol=atol, rtol=rtol)
+    return {
+        "case": case.name,
+        "target": case.target,
+        "rows": len(outputs["rows"]),
+        "legacy_s": times["rows"],
+        "accelerated_s": times["array"],
+        "speedup": times["rows"] / times["array"] if times["array"] > 0 else None,
+        "columns": columns,
+        "ok": all(c["ok"] for c in columns.values()),
+    }
+
+
+def run_equivalence(cases: Optional[Iterable[Case]] = None, *, only: Optional[Sequence[str]] = None,
+                    atol: float = DEFAULT_ATOL, rtol: float = DEFAULT_RTOL,
+                    report: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Run `cases` (default: `default_cases()`), optionally only those whose
+    name contains one of the `only` substrings. Returns the report document.
+    """
+    cases = list(default_cases() if cases is None else cases)
+    if only:
+        cases = [c for c in cases if any(s in c.name for s in only)]
+    results = []
+    for case in cases:
+        result = run_case(case, atol=atol, rtol=rtol)
+        results.append(result)
+        if report is not None:
+            report(result)
+    return {"atol": atol, "rtol": rtol, "ok": all(r["ok"] for r in results), "results": results}
+
+
+def assert_equivalent(document: Dict[str, Any]) -> None:
+    """Raise `EquivalenceError` listing every column over the tolerance."""
+    breaches = [
+        f"{r['case']}.{column}: max_abs={c['max_abs']:.3g} max_rel={c['max_rel']:.3g} nan_mismatch={c['nan_mismatch']}"
+        for r in document["results"]
+        for column, c in r["columns"].items()
+        if not c["ok"]
+    ]
+    if breaches:
+        raise EquivalenceError(
+            f"{len(breaches)} column(s) over tolerance (atol={document['atol']}, rtol={document['rtol']}):\n"
+            + "\n".join(breaches)
+        )
+
+
+def _print_result(result: Dict[str, Any]) -> None:
+    worst = max(result["columns"].values(), key=lambda c: c["max_abs"])
+    speedup = f"{result['speedup']:>8.1f}x" if result["speedup"] else "       -"
+    print(f"{'ok  ' if result['ok'] else 'FAIL'} {result['case']:<44} {result['rows']:>7} rows "
+          f"max_abs={worst['max_abs']:.2e} max_rel={worst['max_rel']:.2e} {speedup}", flush=True)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.equivalence", description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", help="run the cases whose name contains one of these")
+    parser.add_argument("--days", type=int, default=14, help="length of the randomised inputs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--atol", type=float, default=DEFAULT_ATOL)
+    parser.add_argument("--rtol", type=float, default=DEFAULT_RTOL)
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    document = run_equivalence(default_cases(args.days, args.seed), only=args.only, atol=args.atol,
+                               rtol=args.rtol, report=_print_result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+    try:
+        assert_equivalent(document)
+    except EquivalenceError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
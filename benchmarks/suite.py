@@ -0,0 +1,456 @@
+"""Benchmark suite for the hot paths, on synthetic data.
+
+Every benchmark is timed on every dataset (resolution x number of years):
+
+    python -m benchmarks                                  # 1h/15min/1min, 1 and 10 years
+    python -m benchmarks --freq 1h --years 1 --only power_flow dual_tariff
+    python -m benchmarks --compare old.json new.json      # flag regressions
+
+Results are written as JSON (default `benchmarks/results/<commit>-<time>.json`)
+with the commit, library versions and machine next to the timings, so runs
+on different commits can be compared with `--compare`.
+
+The row-by-row implementations (solar angles, direct irradiance,
+power_flow, the tariffs) would take hours on ten years of minute data, so
+each benchmark has a row limit and is timed on the first `row_limit` rows of
+the dataset; `rows` and `truncated` in the output say what was timed and
+`rows_per_s` makes the numbers comparable. `--max-rows` overrides the
+limits (0 = no limit). Setup (building inputs) is never part of a timing.
+Benchmarks named `<name>[array]` time the accelerated engine of `<name>`.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import synthetic
+from financialmodel.financialmodel import FinancialModel
+from financialmodel.models import BatterySpec, ElectricityContract, InverterSpec, SolarSpec
+from gridcost.gridcost import GridCost
+from powercalculations._fleet import EVSpec
+
+SCHEMA_VERSION = 1
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+DEFAULT_FREQS = ("1h", "15min", "1min")
+DEFAULT_YEARS = (1.0, 10.0)
+
+
+@dataclass(frozen=True)
+class Dataset:
+    freq: str
+    years: float
+
+    @property
+    def name(self) -> str:
+        return f"{self.freq}-{self.years:g}y"
+
+
+class Inputs:
+    """Synthetic inputs of one dataset, generated on first use and reused by all benchmarks."""
+
+    def __init__(self, dataset: Dataset, workdir: str, seed: int = 0) -> None:
+        self.dataset = dataset
+        self.workdir = workdir
+        self.seed = seed
+        self._frame: Optional[pd.DataFrame] = None
+        self._belpex_path: Optional[str] = None
+        self._pickles: Dict[int, str] = {}
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        if self._frame is None:
+            self._frame = synthetic.weather_and_load(self.dataset.years, self.dataset.freq, seed=self.seed)
+        return self._frame
+
+    @property
+    def rows(self) -> int:
+        return len(self.frame)
+
+    def head(self, rows: Optional[int]) -> pd.DataFrame:
+        return self.frame if rows is None else self.frame.iloc[:rows]
+
+    @property
+    def belpex_path(self) -> str:
+        if self._belpex_path is None:
+            path = os.path.join(self.workdir, f"belpex-{self.dataset.years:g}y.csv")
+            synthetic.belpex_prices(self.dataset.years, seed=self.seed).to_csv(path, index=False)
+            self._belpex_path = path
+        return self._belpex_path
+
+    def consumption(self, rows: Optional[int]) -> pd.DataFrame:
+        """DateTime + GridFlow frame, as GridCost takes it."""
+        return synthetic.grid_flow(self.head(rows)).reset_index()
+
+    def irradiance_pickle(self, rows: Optional[int]) -> str:
+        if rows not in self._pickles:
+            path = os.path.join(self.workdir, f"pd_{self.dataset.name}_{rows}")
+            self._pickles[rows] = synthetic.write_financialmodel_pickle(self.head(rows), path)
+        return self._pickles[rows]
+
+
+# ----------------------------------------------------------------------
+# benchmarks: setup(inputs, rows) -> state, run(state); only run is timed
+# ----------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Benchmark:
+    name: str
+    setup: Callable[[Inputs, Optional[int]], Any]
+    run: Callable[[Any], Any]
+    row_limit: Optional[int] = None
+
+
+DUAL_CONTRACT = ElectricityContract(contract_type="DualTariff", dual_cons_peak=35.0, dual_cons_offpeak=25.0,
+                                    dual_inj_peak=-4.0, dual_inj_offpeak=-2.0)
+DYNAMIC_CONTRACT = ElectricityContract(contract_type="DynamicTariff", dynamic_cons_var_peak=0.1,
+                                       dynamic_cons_var_offpeak=0.1, dynamic_cons_fix_peak=2.0,
+                                       dynamic_inj_var_peak=0.08, dynamic_inj_var_offpeak=0.08)
+
+
+# a depot of 50 vehicles: 11 and 22 kW chargers, half of them V2G, four priority classes
+DEPOT_FLEET = [EVSpec(name=f"EV{j}", capacity=60.0 + j, charger_power=22.0 if j % 3 == 0 else 11.0,
+                      V2G=bool(j % 2), priority=j % 4) for j in range(50)]
+
+
+def _setup_powercalculations(inputs: Inputs, rows: Optional[int]):
+    return synthetic.powercalculations(inputs.head(rows))
+
+
+def _setup_direct_irradiance(inputs: Inputs, rows: Optional[int]):
+    obj = synthetic.powercalculations(inputs.head(rows))
+    synthetic.add_solar_angles(obj)
+    return obj
+
+
+def _setup_power_flow(inputs: Inputs, rows: Optional[int]):
+    obj = synthetic.powercalculations(inputs.head(rows))
+    obj.pd["PV_generated_power"] = 4.0 * obj.pd["GlobRad"] / 1000.0
+    return obj
+
+
+def _gridcost_kwargs(inputs: Inputs, contract: ElectricityContract) -> Dict[str, Any]:
+    return {
+        "file_path_BelpexFilter": inputs.belpex_path,
+        "resample_freq": inputs.dataset.freq,
+        "electricity_contract": contract,
+    }
+
+
+def _setup_dispatch(inputs: Inputs, rows: Optional[int]):
+    obj = _setup_power_flow(inputs, rows)
+    prices = synthetic.belpex_prices(inputs.dataset.years, seed=inputs.seed).set_index("DateTime")["BelpexFilter"]
+    obj.pd["BelpexFilter"] = prices.resample(obj.pd.index.freq).mean().reindex(obj.pd.index).to_numpy()
+    return obj
+
+
+def _setup_smart_EV_load(inputs: Inputs, rows: Optional[int]):
+    obj = _setup_dispatch(inputs, rows)
+    return obj, synthetic.EV_sessions(obj.pd.index, seed=inputs.seed)
+
+
+def _setup_gridcost_init(inputs: Inputs, rows: Optional[int]):
+    return inputs.consumption(rows), _gridcost_kwargs(inputs, DUAL_CONTRACT)
+
+
+def _setup_gridcost_export(inputs: Inputs, rows: Optional[int]):
+    export = synthetic.supplier_export(synthetic.grid_flow(inputs.head(rows)))
+    return export, _gridcost_kwargs(inputs, DUAL_CONTRACT)
+
+
+def _run_gridcost_init(state):
+    consumption, kwargs = state
+    return GridCost(consumption_data_df=consumption, **kwargs)
+
+
+def _gridcost_setup(contract: ElectricityContract):
+    def setup(inputs: Inputs, rows: Optional[int]) -> GridCost:
+        return GridCost(consumption_data_df=inputs.consumption(rows), **_gridcost_kwargs(inputs, contract))
+    return setup
+
+
+def _component_grid():
+    solar = [
+        SolarSpec(solar_panel_cost=150 + 10 * n, solar_panel_count=n, solar_panel_lifetime=25, panel_surface=1.7,
+                  annual_degredation=0.5, panel_efficiency=0.21, temperature_coefficient=-0.003)
+        for n in (4, 8, 12)
+    ]
+    battery = [BatterySpec(battery_cost=2500, battery_count=n, battery_lifetime=10, battery_capacity=5.0) for n in (0, 1)]
+    inverter = [InverterSpec(inverter_cost=1200, inverter_lifetime=10, inverter_efficiency=0.97,
+                             DC_battery=5, DC_solar_panels=6, AC_output=5)]
+    return solar, battery, inverter, [DUAL_CONTRACT, DYNAMIC_CONTRACT]
+
+
+def _setup_optimise_components(inputs: Inputs, rows: Optional[int]):
+    # a fresh model per repeat: FinancialModel caches grid series per component set
+    model = FinancialModel(pkl_path=inputs.irradiance_pickle(rows), belpex_filter_path=inputs.belpex_path)
+    return model, _component_grid()
+
+
+def _run_optimise_components(state):
+    model, (solar, battery, inverter, contracts) = state
+    results = model.optimise_components(solar_options=solar, battery_options=battery,
+                                        inverter_options=inverter, contract_options=contracts)
+    # failing combinations are skipped silently; an empty ranking means nothing was timed
+    if not results:
+        raise RuntimeError("optimise_components evaluated no combination")
+    return results
+
+
+BENCHMARKS: Dict[str, Benchmark] = {
+    b.name: b
+    for b in (
+        Benchmark("calculate_solar_angles", _setup_powercalculations,
+                  lambda obj: obj.calculate_solar_angles(latitude=synthetic.LATITUDE, longitude=synthetic.LONGITUDE),
+                  row_limit=2_000),
+        Benchmark("calculate_direct_irradiance", _setup_direct_irradiance,
+                  lambda obj: obj.calculate_direct_irradiance(tilt_angle=30, orientation="S"),
+                  row_limit=50_000),
+        Benchmark("power_flow", _setup_power_flow, lambda obj: obj.power_flow(), row_limit=100_000),
+        Benchmark("gridcost_init", _setup_gridcost_init, _run_gridcost_init),
+        Benchmark("gridcost_init_supplier_export", _setup_gridcost_export, _run_gridcost_init, row_limit=100_000),
+        Benchmark("dual_tariff", _gridcost_setup(DUAL_CONTRACT), lambda gc: gc.dual_tariff(), row_limit=100_000),
+        Benchmark("dynamic_tariff", _gridcost_setup(DYNAMIC_CONTRACT), lambda gc: gc.dynamic_tariff(),
+                  row_limit=100_000),
+        Benchmark("capacity_tariff", _gridcost_setup(DUAL_CONTRACT), lambda gc: gc.capacity_tariff()),
+        Benchmark("optimise_components", _setup_optimise_components, _run_optimise_components, row_limit=8_760),
+        Benchmark("optimal_power_flow", _setup_dispatch, lambda obj: obj.optimal_power_flow(DYNAMIC_CONTRACT),
+                  row_limit=8_760),
+        Benchmark("mpc_power_flow", _setup_dispatch, lambda obj: obj.mpc_power_flow(DYNAMIC_CONTRACT),
+                  row_limit=100_000),
+        Benchmark("dp_power_flow", _setup_dispatch, lambda obj: obj.dp_power_flow(DYNAMIC_CONTRACT),
+                  row_limit=100_000),
+        Benchmark("peak_shaving_sweep", _setup_power_flow,
+                  lambda obj: obj.peak_shaving_sweep([2.0 * n for n in range(11)]), row_limit=100_000),
+        Benchmark("smart_EV_load", _setup_smart_EV_load,
+                  lambda state: state[0].smart_EV_load(state[1], DYNAMIC_CONTRACT, max_EV_power=11)),
+        Benchmark("steady_state_charge", _setup_power_flow, lambda obj: obj.steady_state_charge(max_charge=20),
+                  row_limit=1_000_000),
+        Benchmark("fleet_power_flow", _setup_power_flow,
+                  lambda obj: obj.fleet_power_flow(DEPOT_FLEET, site_EV_power=150), row_limit=100_000),
+        # accelerated engines (checked against the ones above by benchmarks.equivalence)
+        Benchmark("calculate_direct_irradiance[array]", _setup_direct_irradiance,
+                  lambda obj: obj.calculate_direct_irradiance(tilt_angle=30, orientation="S", engine="array")),
+        Benchmark("power_flow[array]", _setup_power_flow, lambda obj: obj.power_flow(engine="array"),
+                  row_limit=1_000_000),
+        Benchmark("dual_tariff[array]", _gridcost_setup(DUAL_CONTRACT), lambda gc: gc.dual_tariff(engine="array")),
+        Benchmark("dynamic_tariff[array]", _gridcost_setup(DYNAMIC_CONTRACT),
+                  lambda gc: gc.dynamic_tariff(engine="array")),
+    )
+}
+
+
+# ----------------------------------------------------------------------
+# running
+# ----------------------------------------------------------------------
+
+def _row_limit(benchmark: Benchmark, max_rows: Optional[int]) -> Optional[int]:
+    if max_rows is None:
+        return benchmark.row_limit
+    return None if max_rows == 0 else max_rows
+
+
+def time_benchmark(benchmark: Benchmark, inputs: Inputs, *, repeat: int = 3,
+                   max_rows: Optional[int] = None) -> Dict[str, Any]:
+    """Time `benchmark` on `inputs` `repeat` times (fresh setup for every repetition)."""
+    limit = _row_limit(benchmark, max_rows)
+    rows = inputs.rows if limit is None else min(limit, inputs.rows)
+    result: Dict[str, Any] = {
+        "benchmark": benchmark.name,
+        "dataset": inputs.dataset.name,
+        "freq": inputs.dataset.freq,
+        "years": inputs.dataset.years,
+        "rows": rows,
+        "truncated": rows < inputs.rows,
+        "times_s": [],
+        "error": None,
+    }
+    for _ in range(repeat):
+        state = benchmark.setup(inputs, None if rows == inputs.rows else rows)
+        start = time.perf_counter()
+        try:
+            benchmark.run(state)
+        except Exception as exc:  # noqa: BLE001
+            # record the failure (and how long it took to fail) instead of aborting the suite
+            result["times_s"].append(time.perf_counter() - start)
+            result["error"] = f"{type(exc).__name__}: {exc}"
+            break
+        result["times_s"].append(time.perf_counter() - start)
+
+    times = result["times_s"]
+    result["min_s"] = min(times)
+    result["median_s"] = statistics.median(times)
+    result["rows_per_s"] = rows / result["min_s"] if result["min_s"] > 0 else None
+    return result
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        out = subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def environment() -> Dict[str, Any]:
+    """Commit, library versions and machine of this run."""
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_benchmarks(
+    *,
+    freqs: Sequence[str] = DEFAULT_FREQS,
+    years: Sequence[float] = DEFAULT_YEARS,
+    only: Optional[Iterable[str]] = None,
+    repeat: int = 3,
+    max_rows: Optional[int] = None,
+    seed: int = 0,
+    output: Optional[str] = None,
+    report: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Run the selected benchmarks (default: all) on every (freq, years)
+    dataset. Returns the JSON document; with `output` it is also written to
+    that path. `report` is called with every result as soon as it is known.
+    """
+    names = list(only) if only else list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {unknown}. Available: {list(BENCHMARKS)}")
+
+    document: Dict[str, Any] = {
+        "schema": SCHEMA_VERSION,
+        "environment": environment(),
+        "settings": {"freqs": list(freqs), "years": list(years), "repeat": repeat,
+                     "max_rows": max_rows, "seed": seed},
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="benchmarks-") as workdir:
+        for y in years:
+            for freq in freqs:
+                inputs = Inputs(Dataset(freq, float(y)), workdir, seed=seed)
+                for name in names:
+                    result = time_benchmark(BENCHMARKS[name], inputs, repeat=repeat, max_rows=max_rows)
+                    document["results"].append(result)
+                    if report is not None:
+                        report(result)
+
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+    return document
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], *, tolerance: float = 0.25) -> List[Dict[str, Any]]:
+    """
+    Match the results of two runs on (benchmark, dataset, rows) and compare
+    their best times. `status` is 'regression' when the current run is more
+    than `tolerance` (fraction) slower, 'improvement' when it is that much
+    faster, and 'new'/'missing'/'error' for unmatched or failed entries.
+    """
+    def key(r):
+        return r["benchmark"], r["dataset"], r["rows"]
+
+    old = {key(r): r for r in baseline["results"]}
+    new = {key(r): r for r in current["results"]}
+    rows = []
+    for k in list(old) + [k for k in new if k not in old]:
+        before, after = old.get(k), new.get(k)
+        entry = {"benchmark": k[0], "dataset": k[1], "rows": k[2],
+                 "baseline_s": before and before["min_s"], "current_s": after and after["min_s"], "ratio": None}
+        if before is None:
+            entry["status"] = "new"
+        elif after is None:
+            entry["status"] = "missing"
+        elif after["error"] or before["error"]:
+            entry["status"] = "error"
+        else:
+            entry["ratio"] = after["min_s"] / before["min_s"] if before["min_s"] > 0 else None
+            if entry["ratio"] is not None and entry["ratio"] > 1 + tolerance:
+                entry["status"] = "regression"
+            elif entry["ratio"] is not None and entry["ratio"] < 1 / (1 + tolerance):
+                entry["status"] = "improvement"
+            else:
+                entry["status"] = "ok"
+        rows.append(entry)
+    return rows
+
+
+# ----------------------------------------------------------------------
+# command line
+# ----------------------------------------------------------------------
+
+def _print_result(result: Dict[str, Any]) -> None:
+    rate = f"{result['rows_per_s']:>12,.0f} rows/s" if result["rows_per_s"] else ""
+    note = f"  [{result['error']}]" if result["error"] else ""
+    print(f"{result['benchmark']:<36} {result['dataset']:<12} {result['rows']:>10,} rows "
+          f"{result['min_s']:>10.4f} s {rate}{note}", flush=True)
+
+
+def _default_output() -> str:
+    commit = (_git("rev-parse", "--short", "HEAD") or "nogit")
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return os.path.join(DEFAULT_RESULTS_DIR, f"{commit}-{stamp}.json")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.splitlines()[0])
+    parser.add_argument("--freq", nargs="+", default=list(DEFAULT_FREQS), help="dataset resolutions")
+    parser.add_argument("--years", nargs="+", type=float, default=list(DEFAULT_YEARS), help="dataset lengths")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-rows", type=int, default=None,
+                        help="override the per-benchmark row limits (0 = no limit)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON output path")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="slowdown fraction reported as regression")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.compare[1], encoding="utf-8") as f:
+            current = json.load(f)
+        rows = compare(baseline, current, tolerance=args.tolerance)
+        for r in rows:
+            ratio = f"{r['ratio']:.2f}x" if r["ratio"] is not None else "-"
+            print(f"{r['benchmark']:<36} {r['dataset']:<12} {ratio:>8}  {r['status']}")
+        return 1 if any(r["status"] == "regression" for r in rows) else 0
+
+    output = args.output or _default_output()
+    run_benchmarks(freqs=args.freq, years=args.years, only=args.only, repeat=args.repeat,
+                   max_rows=args.max_rows, seed=args.seed, output=output, report=_print_result)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""Synthetic input data for the benchmarks.
+
+Everything is generated from a seed, so a benchmark run does not need the
+Excel/CSV files in `data/` and two runs on different commits time exactly
+the same inputs:
+
+- `weather_and_load`: the columns PowerCalculations reads from the
+  irradiance and load files (GlobRad, DiffRad, temperatures, Load_kW)
+- `belpex_prices`: quarter-hourly Belpex prices (€/MWh), as in the Belpex CSV
+- `supplier_export`: a supplier interval table (Start/End Date/Time,
+  Register, Volume, Unit), the format GridCost parses from smart meter exports
+- `EV_sessions`: overnight charging sessions of a fleet, as `smart_EV_load` takes them
+"""
+from __future__ import annotations
+
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from powercalculations.powercalculations import PowerCalculations
+
+START = "2018-01-01"
+LATITUDE = 50.88    # Leuven
+LONGITUDE = 4.70
+
+
+def index_for(years: float, freq: str, start: str = START) -> pd.DatetimeIndex:
+    """Regular DatetimeIndex covering `years` (365-day years) at `freq`."""
+    periods = int(pd.Timedelta(days=365 * years) / pd.Timedelta(freq))
+    return pd.date_range(start, periods=max(periods, 1), freq=freq, name="DateTime")
+
+
+def _sun(idx: pd.DatetimeIndex) -> tuple:
+    """(daylight shape in [0, 1], seasonal factor in [0, 1]) per timestamp."""
+    hour = idx.hour.to_numpy() + idx.minute.to_numpy() / 60.0
+    doy = idx.dayofyear.to_numpy()
+    season = 0.5 - 0.5 * np.cos((doy - 10) / 365.0 * 2 * np.pi)   # 0 in winter, 1 in summer
+    half_day = 4.0 + 4.0 * season                                 # 8 h (winter) .. 16 h (summer) of daylight
+    daylight = np.clip(np.cos((hour - 13.0) / half_day * np.pi / 2), 0, None)
+    return daylight, season
+
+
+def weather_and_load(years: float = 1.0, freq: str = "1h", *, seed: int = 0, start: str = START) -> pd.DataFrame:
+    """
+    Irradiance [W/m²], temperatures [°C] and household load [kW] with a
+    DateTime index. Cloud cover changes per day, the load has a morning and
+    an evening peak plus noise.
+    """
+    idx = index_for(years, freq, start)
+    rng = np.random.default_rng(seed)
+    daylight, season = _sun(idx)
+
+    days = (idx.normalize() - idx[0].normalize()).days.to_numpy()
+    clearness = rng.uniform(0.2, 1.0, days.max() + 1)[days]
+    glob = (350 + 650 * season) * daylight * clearness
+    diff = glob * (0.15 + 0.6 * (1 - clearness))
+    t_air = 3 + 15 * season + 6 * daylight + rng.normal(0, 1.0, len(idx))
+
+    hour = idx.hour.to_numpy() + idx.minute.to_numpy() / 60.0
+    load = (
+        0.25
+        + 0.6 * np.exp(-((hour - 7.5) ** 2) / 2)
+        + 1.0 * np.exp(-((hour - 19.0) ** 2) / 4)
+        + 0.3 * (1 - season)
+        + rng.gamma(2.0, 0.08, len(idx))
+    )
+    return pd.DataFrame(
+        {
+            "Load_kW": load,
+            "GlobRad": glob,
+            "DiffRad": diff,
+            "T_RV_degC": t_air,
+            "T_CommRoof_degC": t_air + 12 * daylight * clearness,
+        },
+        index=idx,
+    )
+
+
+def belpex_prices(years: float = 1.0, *, seed: int = 0, start: str = START) -> pd.DataFrame:
+    """Quarter-hourly Belpex prices [€/MWh] as DateTime, BelpexFilter columns."""
+    idx = index_for(years, "15min", start)
+    rng = np.random.default_rng(seed + 1)
+    daylight, season = _sun(idx)
+    hour = idx.hour.to_numpy() + idx.minute.to_numpy() / 60.0
+    price = (
+        95
+        + 35 * np.sin((hour - 12) / 24 * 2 * np.pi) ** 2
+        - 60 * season * daylight                       # solar dip around noon in summer
+        + rng.normal(0, 12, len(idx))
+    )
+    return pd.DataFrame({"DateTime": idx, "BelpexFilter": price})
+
+
+def EV_sessions(index: pd.DatetimeIndex, vehicles: int = 50, *, seed: int = 0) -> pd.DataFrame:
+    """
+    One overnight session per vehicle and day of `index`: plugged in between 16:00 and 20:00, out between
+    06:00 and 09:00 the next morning, needing 5-40 kWh.
+    """
+    rng = np.random.default_rng(seed + 2)
+    days = pd.date_range(index[0].normalize(), index[-1].normalize(), freq="D")
+    n = len(days) * vehicles
+    day = np.tile(days.to_numpy(), vehicles)
+    return pd.DataFrame(
+        {
+            "vehicle": np.repeat([f"EV{v}" for v in range(vehicles)], len(days)),
+            "plug_in": day + pd.to_timedelta(rng.uniform(16, 20, n), "h").to_numpy(),
+            "plug_out": day + pd.to_timedelta(rng.uniform(30, 33, n), "h").to_numpy(),
+            "energy": rng.uniform(5, 40, n),
+        }
+    )
+
+
+def grid_flow(frame: pd.DataFrame, pv_peak_kw: float = 4.0) -> pd.Series:
+    """Net grid flow [kW] of a simple PV installation (>0 injection, <0 offtake)."""
+    pv = pv_peak_kw * frame["GlobRad"] / 1000.0
+    return (pv - frame["Load_kW"]).rename("GridFlow")
+
+
+def supplier_export(flow: pd.Series) -> pd.DataFrame:
+    """
+    Supplier interval table for a GridFlow series: one offtake and one
+    injection row per interval, energy in kWh with a decimal comma.
+    """
+    idx = flow.index
+    step = pd.Timedelta(idx.freq or (idx[1] - idx[0]))
+    hours = step.total_seconds() / 3600.0
+    end = idx + step
+
+    values = flow.to_numpy(dtype=float)
+    offtake = np.clip(-values, 0, None) * hours
+    injection = np.clip(values, 0, None) * hours
+
+    start_date = idx.strftime("%d-%m-%Y")
+    start_time = idx.strftime("%H:%M:%S")
+    end_date = end.strftime("%d-%m-%Y")
+    end_time = end.strftime("%H:%M:%S")
+    n = len(idx)
+    table = pd.DataFrame(
+        {
+            "Start Date": np.concatenate([start_date, start_date]),
+            "Start Time": np.concatenate([start_time, start_time]),
+            "End Date": np.concatenate([end_date, end_date]),
+            "End Time": np.concatenate([end_time, end_time]),
+            "Register": ["Offtake Day"] * n + ["Injection Day"] * n,
+            "Volume": np.char.replace(np.concatenate([offtake, injection]).round(4).astype(str), ".", ","),
+            "Unit": "kWh",
+        }
+    )
+    # interleave the two registers per interval, as in a real export
+    order = np.arange(2 * n).reshape(2, n).T.ravel()
+    return table.iloc[order].reset_index(drop=True)
+
+
+def powercalculations(frame: pd.DataFrame) -> PowerCalculations:
+    """
+    PowerCalculations object with the columns its constructor creates; the
+    result columns start at 0.0 instead of None so every column is float,
+    as in the initialized dataframes in `data/`.
+    """
+    obj = PowerCalculations.__new__(PowerCalculations)
+    obj.pd = frame[["Load_kW", "GlobRad", "DiffRad", "T_RV_degC", "T_CommRoof_degC"]].copy()
+    for column in ("DirectIrradiance", "PV_generated_power", "GridFlow", "BatteryCharge",
+                   "NettoProduction", "EVLoad", "PowerLoss", "BatteryFlow"):
+        obj.pd[column] = 0.0
+    return obj
+
+
+def add_solar_angles(obj: PowerCalculations, latitude: float = LATITUDE, longitude: float = LONGITUDE) -> None:
+    """Fill SolarZenithAngle/SolarAzimuthAngle with one vectorised pvlib call."""
+    import pvlib  # imported on first use, see powercalculations._directirradiance
+
+    angles = pvlib.solarposition.get_solarposition(
+        obj.pd.index, latitude, longitude, temperature=obj.pd["T_RV_degC"].to_numpy()
+    )
+    obj.pd["SolarZenithAngle"] = angles["zenith"].to_numpy()
+    obj.pd["SolarAzimuthAngle"] = angles["azimuth"].to_numpy()
+
+
+def write_financialmodel_pickle(frame: pd.DataFrame, path: str, *, tilt_angle: int = 30, orientation: str = "S") -> str:
+    """
+    Pickle a PowerCalculations object with DirectIrradiance filled in, as
+    FinancialModel expects in `pkl_path`.
+    """
+    obj = powercalculations(frame)
+    add_solar_angles(obj)
+    obj.calculate_direct_irradiance(tilt_angle=tilt_angle, orientation=orientation)
+    with open(path, "wb") as f:
+        pickle.dump(obj, f)
+    return path
@@ -0,0 +1,85 @@
+"""Cheap lower bounds on the yearly grid cost, used to prune component searches.
+
+`power_flow` keeps the grid flow of every timestep inside a known envelope:
+
+    -Load_kW  <=  GridFlow  <=  min(PV clipped to DC_solar_panels, AC_output)
+
+(the battery only shifts PV surplus to later deficits and the EV is not used
+by `FinancialModel`). GridCost's resample-mean and linear interpolation are
+order preserving, and every tariff is piecewise linear in GridFlow with its
+kink at zero, so the per-interval cost of *any* flow inside the envelope is
+at least min(0, cost(lower), cost(upper)). Summing those minima, plus the
+sign-aware minima of the kWh-proportional fees, gives a lower bound on
+`GridCost.calculate_total_cost()` without running `power_flow`.
+"""
+from __future__ import annotations
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from gridcost.gridcost import GridCost
+
+
+def _tariff_column(gc: GridCost) -> np.ndarray:
+    """Fill and return the tariff column for the contract of `gc`."""
+    c = gc.electricity_contract
+    if c.contract_type == "DualTariff":
+        gc.dual_tariff()
+    elif c.contract_type == "DynamicTariff":
+        gc.dynamic_tariff()
+    else:
+        raise ValueError(f"Unknown tariff type: {c.contract_type}")
+    return gc.pd[c.contract_type].to_numpy(dtype=float)
+
+
+def _interval_hours(gc: GridCost) -> float:
+    idx = gc.pd.index
+    try:
+        return pd.Timedelta(idx.freq).total_seconds() / 3600.0
+    except Exception:
+        diffs = pd.Series(idx).diff().dropna()
+        return pd.to_timedelta(diffs.median()).total_seconds() / 3600.0
+
+
+def _linear_fee_bound(rate: float, max_kwh: float) -> float:
+    """Minimum of rate * x for x in [0, max_kwh]."""
+    return min(0.0, rate * max_kwh)
+
+
+def grid_cost_lower_bound(offtake_envelope: GridCost, injection_envelope: GridCost) -> float:
+    """
+    Lower bound on `calculate_total_cost()` for any GridFlow between the two envelopes.
+
+    Both GridCost objects must use the same contract, Belpex file and
+    resample frequency; `offtake_envelope` carries the most negative possible
+    GridFlow per timestep and `injection_envelope` the most positive one.
+    """
+    c = offtake_envelope.electricity_contract
+
+    cost_low = _tariff_column(offtake_envelope)
+    cost_high = _tariff_column(injection_envelope)
+    # fmin skips the NaN rows that GridCost leaves where no data was resampled
+    energy_lb = float(np.fmin(0.0, np.fmin(cost_low, cost_high)).sum())
+
+    dt = _interval_hours(offtake_envelope)
+    max_offtake_kwh = float(np.nansum(np.clip(-offtake_envelope.pd["GridFlow"].to_numpy(dtype=float), 0, None))) * dt
+    max_injection_kwh = float(np.nansum(np.clip(injection_envelope.pd["GridFlow"].to_numpy(dtype=float), 0, None))) * dt
+
+    fixed_component = c.dual_fix if c.contract_type == "DualTariff" else c.dynamic_fix
+    per_kwh_offtake = (
+        c.purchase_rate_consumption + c.excise_duty + c.energy_contribution + c.green_power_fee
+    ) / 100
+    # calculate_total_cost bills at least 2.5 kW of capacity, or 0 when the
+    # capacity tariff cannot be computed; a negative rate has no lower bound.
+    capacity_lb = 0.0 if c.capacity_tariff_rate >= 0 else -math.inf
+
+    return (
+        energy_lb
+        + c.data_management_cost
+        + fixed_component
+        + _linear_fee_bound(c.purchase_rate_injection / 100, max_injection_kwh)
+        + _linear_fee_bound(per_kwh_offtake, max_offtake_kwh)
+        + capacity_lb
+    )
@@ -0,0 +1,129 @@
+"""Checkpointing of completed evaluations for long optimisation sweeps.
+
+`ResultCheckpoint` appends (key, result) records to a local pickle stream,
+so a sweep that is killed can be restarted with `resume=True`: completed
+keys are read back, their results are merged into the new run and only the
+remaining combinations are evaluated.
+
+The file starts with a header holding a signature of the sweep (option
+lists, discount rate, ...). Resuming against a different sweep raises a
+ValueError instead of silently mixing results. A record that was only
+partially written when the process died is dropped on resume.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+_FORMAT_VERSION = 1
+
+
+def sweep_signature(*parts: Any) -> str:
+    """Stable fingerprint of the inputs that define a sweep."""
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+
+class ResultCheckpoint:
+    """
+    Append-only store of completed evaluations.
+
+    - `completed` maps key -> result (None for combinations that failed)
+    - `record(key, result)` buffers a completed evaluation; the buffer is
+      written (and fsync'ed) every `every` records and on `close()`
+    """
+
+    def __init__(self, path: str, signature: str, *, resume: bool = False, every: int = 50) -> None:
+        self.path = path
+        self.signature = signature
+        self.every = max(1, int(every))
+        self.completed: Dict[Hashable, Optional[Dict[str, Any]]] = {}
+        self._buffer: List[Tuple[Hashable, Optional[Dict[str, Any]]]] = []
+
+        if resume and os.path.isfile(path):
+            self._load()
+        else:
+            with open(path, "wb") as f:
+                pickle.dump({"version": _FORMAT_VERSION, "signature": signature}, f)
+
+    def _load(self) -> None:
+        with open(self.path, "rb") as f:
+            try:
+                header = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError) as exc:
+                raise ValueError(f"Checkpoint file is not readable: {self.path}") from exc
+            if not isinstance(header, dict) or header.get("signature") != self.signature:
+                raise ValueError(
+                    f"Checkpoint {self.path} was written by a different sweep; "
+                    "remove it or run without resume"
+                )
+
+            good_offset = f.tell()
+            while True:
+                try:
+                    key, result = pickle.load(f)
+                except EOFError:
+                    break
+                except Exception:  # noqa: BLE001
+                    # partial record from an interrupted write
+                    break
+                self.completed[key] = result
+                good_offset = f.tell()
+
+        # drop a partial tail so new records append to a valid stream
+        with open(self.path, "r+b") as f:
+            f.truncate(good_offset)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.completed
+
+    def record(self, key: Hashable, result: Optional[Dict[str, Any]]) -> None:
+        self.completed[key] = result
+        self._buffer.append((key, result))
+        if len(self._buffer) >= self.every:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        with open(self.path, "ab") as f:
+            for entry in self._buffer:
+                pickle.dump(entry, f)
+            f.flush()
+            os.fsync(f.fileno())
+        self._buffer.clear()
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "ResultCheckpoint":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        # also flush on errors/KeyboardInterrupt: the point is not losing work
+        self.close()
+
+
+def open_checkpoint(
+    path: Optional[str],
+    signature: str,
+    *,
+    resume: bool = False,
+    every: int = 50,
+    results_path: Optional[str] = None,
+) -> Optional[ResultCheckpoint]:
+    """
+    Checkpoint for a sweep, or None when `path` is not set.
+
+    When resuming, checkpointed results are fed through the result sink
+    again, so an existing `results_path` CSV is removed first to avoid
+    duplicate rows. Call this before creating the sink.
+    """
+    if not path:
+        if resume:
+            raise ValueError("resume=True requires a checkpoint_path")
+        return None
+    if resume and results_path and os.path.isfile(path) and os.path.isfile(results_path):
+        os.remove(results_path)
+    return ResultCheckpoint(path, signature, resume=resume, every=every)
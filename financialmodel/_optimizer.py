@@ -19,15 +19,21 @@ Notes / assumptions implemented here:
 
 Return value: a sorted list of results (lowest NPV first). Each result is a
 dict with keys: 'solar','battery','inverter','contract','npv','capex','annual_cost'.
+Results are streamed through a `TopKResultSink`, so `top_k` bounds memory and
+`results_path` optionally keeps a compact CSV row of every evaluation.
 """
 
 from math import gcd
 import pickle
 import os
-from typing import Iterable, List
+from typing import Any, Iterable, List, Optional, Tuple
 
 import powercalculations.powercalculations as pc
 import gridcost.gridcost as gc
+from financialmodel._results import TopKResultSink
+from financialmodel._checkpoint import open_checkpoint, sweep_signature
+from financialmodel._shards import shard_bounds
+from powercalculations.progress import as_reporter
 
 
 def _lcm(a: int, b: int) -> int:
@@ -44,6 +50,8 @@ def optimizer(
     tilt_angle: int = 30,
     discount_rate: float = 0.05,
     tariff: str = "DynamicTariff",
+    top_k: Optional[int] = None,
+    results_path: Optional[str] = None,
 ):
     """Evaluate combinations and return sorted results by NPV (ascending).
 
@@ -51,9 +59,11 @@ def optimizer(
     defined in `components`.
     contracts: iterable of either `gc.GridCost` instances or dict-like objects
     that contain the GridCost init parameters (e.g. 'peak_tariff', 'offpeak_tariff', ...)
+    top_k: keep only the first `top_k` results (None keeps all).
+    results_path: optional CSV file that receives a compact row per result.
     """
 
-    results: List[dict] = []
+    sink = TopKResultSink(top_k, metric="npv", columnar_path=results_path)
 
     # Map orientation/tilt to existing pickle files (same as electricity_cost)
     pickles = {
@@ -188,7 +198,7 @@ def optimizer(
                         cashflow = -operating_cost - repl
                         npv += cashflow / ((1 + discount_rate) ** year)
 
-                    results.append(
+                    sink.add(
                         {
                             "solar": solar,
                             "battery": battery,
@@ -201,11 +211,22 @@ def optimizer(
                     )
 
     # sort by NPV (lowest is best)
-    results.sort(key=lambda x: x["npv"]) 
-    return results
+    sink.close()
+    return sink.results()
 
 
-def grid_search(param_grid: dict, cost_fn, *, top_k: int = 10, progress: bool = False):
+def grid_search(
+    param_grid: dict,
+    cost_fn,
+    *,
+    top_k: int = 10,
+    progress: Any = False,
+    results_path: Optional[str] = None,
+    checkpoint_path: Optional[str] = None,
+    resume: bool = False,
+    checkpoint_every: int = 50,
+    shard: Optional[Tuple[int, int]] = None,
+):
     """Perform a grid search over the provided parameter grid using cost_fn.
 
     Args:
@@ -213,7 +234,18 @@ def grid_search(param_grid: dict, cost_fn, *, top_k: int = 10, progress: bool =
         cost_fn: callable that accepts a dict of parameters and returns a scalar cost
                 (lower is better). It should raise on invalid parameter sets.
         top_k: number of best results to return (default 10).
-        progress: if True, prints progress to stdout (simple counter).
+        progress: progress reporting (True for a status line on stderr, a
+                callback, a logger or a ProgressReporter; see
+                `powercalculations.progress`). Silent by default.
+        results_path: optional CSV file that receives a compact row
+                (params + cost) for every evaluated combination.
+        checkpoint_path: optional file that records every completed
+                combination (see `financialmodel._checkpoint`), flushed every
+                `checkpoint_every` evaluations.
+        resume: if True, combinations already in `checkpoint_path` are not
+                evaluated again; their results are merged into this run.
+        shard: optional (i, n); only the i-th of n contiguous blocks of the
+                combinations is evaluated (see `financialmodel._shards`).
 
     Returns:
         list of dicts sorted by cost ascending. Each dict contains 'params' and 'cost'.
@@ -227,30 +259,51 @@ def grid_search(param_grid: dict, cost_fn, *, top_k: int = 10, progress: bool =
         best = grid_search(grid, my_cost, top_k=5)
 """
 
-    from itertools import product
+    from itertools import islice, product
 
     keys = list(param_grid.keys())
     pools = [list(param_grid[k]) for k in keys]
 
-    results = []
+    checkpoint = open_checkpoint(
+        checkpoint_path,
+        sweep_signature("grid_search", keys, pools, shard),
+        resume=resume,
+        every=checkpoint_every,
+        results_path=results_path,
+    )
+    sink = TopKResultSink(top_k, metric="cost", columnar_path=results_path)
     total = 1
     for p in pools:
         total *= max(1, len(p))
+    start, stop = shard_bounds(total, shard)
 
-    i = 0
-    for combo in product(*pools):
-        i += 1
-        params = dict(zip(keys, combo))
+    with as_reporter(progress).stage("grid_search", total=stop - start) as stage:
         try:
-            cost = float(cost_fn(params))
-        except Exception:
-            # skip invalid parameter combinations
-            continue
+            for i, combo in enumerate(islice(product(*pools), start, stop), start=start + 1):
+                stage.advance()
+                if checkpoint is not None and i in checkpoint:
+                    entry = checkpoint.completed[i]
+                    if entry is not None:
+                        sink.add(entry)
+                    continue
+
+                params = dict(zip(keys, combo))
+                try:
+                    cost = float(cost_fn(params))
+                except Exception:
+                    # skip invalid parameter combinations
+                    if checkpoint is not None:
+                        checkpoint.record(i, None)
+                    continue
 
-        results.append({"params": params, "cost": cost})
-        if progress and i % 50 == 0:
-            print(f"Evaluated {i}/{total} combinations")
+                entry = {"params": params, "cost": cost}
+                sink.add(entry)
+                if checkpoint is not None:
+                    checkpoint.record(i, entry)
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
 
-    results.sort(key=lambda x: x["cost"]) 
-    return results[:top_k]
+    sink.close()
+    return sink.results()
     
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""Representative-day reduction of a yearly time series.
+
+Clusters the days of a year (Load_kW, PV/irradiance, Belpex price profiles)
+into k typical days with k-medoids. Each medoid is a real day of the year and
+carries the number of days it stands for as its weight.
+
+A power flow simulated on only the medoid days can be expanded back to a
+full-year series (every day takes the profile of its medoid), so GridCost
+and its calendar-dependent tariffs are applied unchanged.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class RepresentativeDays:
+    """Result of `select_representative_days`."""
+
+    medoids: pd.DatetimeIndex  # representative days (midnight timestamps), chronological
+    weights: np.ndarray  # number of days each medoid stands for
+    assignment: pd.Series  # day (midnight timestamp) -> medoid day
+    rows_per_day: int
+    freq: pd.Timedelta
+
+    @property
+    def k(self) -> int:
+        return len(self.medoids)
+
+    def reduce(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Rows of the medoid days, restamped onto a continuous index.
+
+        The index starts at midnight of the first day with the original
+        frequency, which `power_flow` needs to derive its timestep; every row
+        keeps its hour of day for the hour-dependent rules of `power_flow`.
+        """
+        days = frame.index.normalize()
+        reduced = frame[days.isin(self.medoids)].copy()
+        reduced.index = pd.date_range(
+            days[0], periods=len(reduced), freq=self.freq, name=frame.index.name
+        )
+        return reduced
+
+    def expand(self, reduced: pd.Series, index: pd.DatetimeIndex) -> pd.Series:
+        """Map a series over `reduce(...)` rows back onto the full-year `index`."""
+        values = np.asarray(reduced, dtype=float).reshape(self.k, self.rows_per_day)
+
+        days = index.normalize()
+        medoid_pos = self.medoids.get_indexer(self.assignment.reindex(days).to_numpy())
+        slot = ((index - days) // self.freq).to_numpy().astype(int)
+
+        return pd.Series(values[medoid_pos, slot], index=index, name=reduced.name)
+
+
+def _day_matrix(frame: pd.DataFrame, columns: Sequence[str], rows_per_day: int) -> tuple:
+    """(full days, day x feature matrix) with every column standardised."""
+    data = frame[list(columns)].astype(float)
+    std = data.std().replace(0, 1).fillna(1)
+    data = ((data - data.mean()) / std).fillna(0.0)
+
+    days = frame.index.normalize()
+    counts = pd.Series(days).value_counts()
+    full_days = pd.DatetimeIndex(sorted(counts.index[counts == rows_per_day]))
+
+    mask = days.isin(full_days)
+    matrix = data.to_numpy()[mask].reshape(len(full_days), rows_per_day * len(columns))
+    return full_days, matrix
+
+
+def _k_medoids(dist: np.ndarray, k: int, max_iter: int) -> np.ndarray:
+    """Greedy BUILD initialisation followed by alternating medoid updates."""
+    n = len(dist)
+    medoids = [int(np.argmin(dist.sum(axis=1)))]
+    nearest = dist[medoids[0]].copy()
+    while len(medoids) < k:
+        gain = np.clip(nearest[None, :] - dist, 0, None).sum(axis=1)
+        gain[medoids] = -1
+        m = int(np.argmax(gain))
+        medoids.append(m)
+        nearest = np.minimum(nearest, dist[m])
+
+    medoids = np.array(medoids)
+    for _ in range(max_iter):
+        labels = np.argmin(dist[:, medoids], axis=1)
+        updated = medoids.copy()
+        for j in range(k):
+            members = np.flatnonzero(labels == j)
+            if len(members):
+                updated[j] = members[np.argmin(dist[np.ix_(members, members)].sum(axis=1))]
+        if np.array_equal(updated, medoids):
+            break
+        medoids = updated
+    return medoids
+
+
+def select_representative_days(
+    frame: pd.DataFrame,
+    k: int,
+    *,
+    columns: Optional[Sequence[str]] = None,
+    max_iter: int = 100,
+) -> RepresentativeDays:
+    """
+    Cluster the days of `frame` into `k` representative days (k-medoids).
+
+    `frame` needs a regular DatetimeIndex; `columns` defaults to every
+    numeric column. Each column is standardised before the daily profiles
+    are compared (Euclidean distance), so kW and EUR/MWh weigh equally.
+    Incomplete days (e.g. a partial first day) are not used as medoids and
+    are assigned to the medoid of the nearest full day in time.
+    """
+    if columns is None:
+        columns = list(frame.select_dtypes("number").columns)
+    if not columns:
+        raise ValueError("No columns to cluster on")
+
+    freq = pd.Timedelta(frame.index.freq or pd.infer_freq(frame.index[:10]))
+    rows_per_day = int(pd.Timedelta(days=1) / freq)
+
+    full_days, matrix = _day_matrix(frame, columns, rows_per_day)
+    if len(full_days) == 0:
+        raise ValueError("frame contains no complete days")
+    k = int(min(max(1, k), len(full_days)))
+
+    sq = (matrix ** 2).sum(axis=1)
+    dist = np.sqrt(np.clip(sq[:, None] + sq[None, :] - 2 * matrix @ matrix.T, 0, None))
+    medoid_pos = np.sort(_k_medoids(dist, k, max_iter))
+    labels = np.argmin(dist[:, medoid_pos], axis=1)
+
+    medoids = full_days[medoid_pos]
+    assignment = pd.Series(medoids[labels], index=full_days)
+
+    all_days = pd.DatetimeIndex(frame.index.normalize().unique())
+    partial = all_days.difference(full_days)
+    if len(partial):
+        nearest = full_days.get_indexer(partial, method="nearest")
+        assignment = pd.concat([assignment, pd.Series(assignment.to_numpy()[nearest], index=partial)]).sort_index()
+
+    weights = assignment.value_counts().reindex(medoids).to_numpy()
+    return RepresentativeDays(
+        medoids=medoids,
+        weights=weights,
+        assignment=assignment,
+        rows_per_day=rows_per_day,
+        freq=freq,
+    )
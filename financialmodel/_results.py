@@ -0,0 +1,217 @@
+"""Streaming result collection for the optimisers.
+
+Collecting every result dict of a sweep in a list and sorting it at the end
+keeps thousands of SolarSpec/BatterySpec/InverterSpec objects (and, for
+`make_cost_fn` metrics, full grid series) alive until the sweep finishes.
+
+`TopKResultSink` keeps only the best `top_k` results in a bounded heap and can
+optionally append every result as a compact row (scalars only) to a CSV file,
+so memory stays constant regardless of the number of combinations evaluated.
+"""
+from __future__ import annotations
+
+import csv
+import heapq
+import itertools
+import os
+from dataclasses import fields, is_dataclass
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+import pandas as pd
+
+_SCALAR_TYPES = (int, float, str, bool)
+
+
+def _metric_value(result: Mapping[str, Any], metric: str) -> float:
+    """Look up `metric` in a result dict (top level first, then 'metrics')."""
+    value = result.get(metric)
+    if value is None and isinstance(result.get("metrics"), Mapping):
+        value = result["metrics"].get(metric)
+    if value is None:
+        raise KeyError(f"Result has no metric '{metric}'")
+    return float(value)
+
+
+def _flatten_scalars(prefix: str, obj: Any, out: Dict[str, Any]) -> None:
+    """Add the scalar fields of a dataclass or mapping to `out` as 'prefix.field'."""
+    if is_dataclass(obj):
+        items = ((f.name, getattr(obj, f.name)) for f in fields(obj))
+    elif isinstance(obj, Mapping):
+        items = obj.items()
+    else:
+        return
+    for k, v in items:
+        if v is None or isinstance(v, _SCALAR_TYPES):
+            out[f"{prefix}.{k}"] = v
+
+
+def compact_row(result: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Turn a result dict into a flat row of scalars.
+
+    - scalar values are kept as-is
+    - dataclasses (SolarSpec, ElectricityContract, ...) and nested dicts
+      ('params', 'metrics', 'contract_params') are flattened one level deep
+      as 'key.field'
+    - everything else (Series/DataFrames, lists, ...) is dropped
+    """
+    row: Dict[str, Any] = {}
+    for k, v in result.items():
+        if v is None or isinstance(v, _SCALAR_TYPES):
+            row[k] = v
+        elif is_dataclass(v):
+            _flatten_scalars(k, v, row)
+        elif isinstance(v, Mapping):
+            for kk, vv in v.items():
+                if vv is None or isinstance(vv, _SCALAR_TYPES):
+                    row[f"{k}.{kk}"] = vv
+                else:
+                    _flatten_scalars(f"{k}.{kk}", vv, row)
+    return row
+
+
+class TopKResultSink:
+    """
+    Bounded collector for optimisation results.
+
+    Keeps the best `top_k` results by `metric` (lower is better unless
+    `minimise=False`) in a heap. With `top_k=None` every result is kept, which
+    matches the old append-and-sort behaviour.
+
+    Ties are resolved like a stable sort: among equal metric values the
+    result that was added first ranks first.
+
+    If `columnar_path` is given, every added result is also written as a
+    compact row (see `compact_row`) to that CSV file. Rows are buffered and
+    appended every `flush_every` results; the header is taken from the first
+    flushed batch and later rows are aligned to it. A column that first
+    appears in a later batch is added to the header, empty in earlier rows.
+    """
+
+    def __init__(
+        self,
+        top_k: Optional[int] = None,
+        *,
+        metric: str = "npv_cost",
+        minimise: bool = True,
+        columnar_path: Optional[str] = None,
+        row_fn: Optional[Callable[[Mapping[str, Any]], Dict[str, Any]]] = None,
+        flush_every: int = 1000,
+    ) -> None:
+        if top_k is not None and top_k < 0:
+            raise ValueError("top_k must be None or >= 0")
+
+        self.top_k = top_k
+        self.metric = metric
+        self.minimise = minimise
+        self.columnar_path = columnar_path
+        self.row_fn = row_fn or compact_row
+        self.flush_every = max(1, int(flush_every))
+
+        self.n_seen = 0
+        # heap entries: (-score, -seq, result); the root is the current worst
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._buffer: List[Dict[str, Any]] = []
+        self._columns: Optional[List[str]] = None
+
+        if columnar_path and os.path.isfile(columnar_path):
+            self._columns = list(pd.read_csv(columnar_path, nrows=0).columns)
+
+    # ------------------------------------------------------------------
+    # collection
+    # ------------------------------------------------------------------
+
+    def _score(self, result: Mapping[str, Any]) -> float:
+        value = _metric_value(result, self.metric)
+        return value if self.minimise else -value
+
+    def add(self, result: Dict[str, Any], *, order: Optional[int] = None) -> None:
+        """
+        Offer a result to the sink.
+
+        `order` overrides the insertion counter used to break ties, so a search
+        that visits combinations out of order can still rank ties exactly like
+        the exhaustive enumeration would.
+        """
+        score = self._score(result)
+        seq = next(self._seq) if order is None else order
+        self.n_seen += 1
+
+        if self.columnar_path:
+            self._buffer.append(self.row_fn(result))
+            if len(self._buffer) >= self.flush_every:
+                self.flush()
+
+        entry = (-score, -seq, result)
+        if self.top_k is None or len(self._heap) < self.top_k:
+            heapq.heappush(self._heap, entry)
+        elif self.top_k > 0 and entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def extend(self, results) -> None:
+        for r in results:
+            self.add(r)
+
+    def would_accept(self, value: float, order: int) -> bool:
+        """True if a result with metric `value` and tie-break `order` would enter the top-k."""
+        if self.top_k is None or len(self._heap) < self.top_k:
+            return True
+        if self.top_k == 0:
+            return False
+        score = value if self.minimise else -value
+        worst_score, worst_seq = -self._heap[0][0], -self._heap[0][1]
+        return (score, order) < (worst_score, worst_seq)
+
+    def results(self) -> List[Dict[str, Any]]:
+        """Kept results, best first."""
+        ordered = sorted(self._heap, key=lambda e: (-e[0], -e[1]))
+        return [e[2] for e in ordered]
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    # ------------------------------------------------------------------
+    # columnar output
+    # ------------------------------------------------------------------
+
+    def flush(self) -> None:
+        """Append buffered rows to `columnar_path`."""
+        if not self.columnar_path or not self._buffer:
+            return
+
+        df = pd.DataFrame.from_records(self._buffer)
+        write_header = self._columns is None
+        if self._columns is None:
+            self._columns = list(df.columns)
+        else:
+            added = [c for c in df.columns if c not in self._columns]
+            if added:
+                self._add_columns(added)
+            df = df.reindex(columns=self._columns)
+
+        df.to_csv(self.columnar_path, mode="a", header=write_header, index=False)
+        self._buffer.clear()
+
+    def _add_columns(self, added: List[str]) -> None:
+        """Extend the header with `added`; rows already written get empty cells for them."""
+        self._columns = self._columns + added
+        if not os.path.isfile(self.columnar_path):
+            return
+        tmp = self.columnar_path + ".tmp"
+        with open(self.columnar_path, newline="") as src, open(tmp, "w", newline="") as dst:
+            reader, writer = csv.reader(src), csv.writer(dst, lineterminator="\n")
+            next(reader, None)
+            writer.writerow(self._columns)
+            for row in reader:
+                writer.writerow(row + [""] * len(added))
+        os.replace(tmp, self.columnar_path)
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "TopKResultSink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,406 @@
+"""Budgeted search strategies over a parameter grid.
+
+`grid_search` in `financialmodel._optimizer` evaluates the full Cartesian
+product of the grid. The strategies here explore the same grid with a fixed
+evaluation budget instead:
+
+- `coordinate_descent`: compass search on the index lattice of ordered axes
+  (e.g. panel count, battery count), with full scans of categorical axes.
+- `successive_halving`: screens many random configurations at low fidelity
+  and promotes the best 1/eta to the next, higher fidelity.
+- `bayesian_search`: Gaussian-process surrogate with expected improvement.
+
+All strategies take the same `cost_fn(params) -> float` as `grid_search`
+(lower is better, raising for invalid params) and return a `SearchResult`
+with the top-k results and the best-found trajectory. `progress` takes the
+same values as elsewhere (see `powercalculations.progress`).
+"""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from itertools import product
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from financialmodel._results import TopKResultSink
+from powercalculations.progress import as_reporter
+
+Index = Tuple[int, ...]
+
+
+@dataclass
+class SearchResult:
+    """Outcome of a budgeted search."""
+
+    results: List[Dict[str, Any]]  # best first, each {'params', 'cost'}
+    trajectory: List[Dict[str, Any]] = field(default_factory=list)
+    evaluations: int = 0
+    grid_size: int = 0
+
+
+class _GridSpace:
+    """Index lattice over a dict of parameter pools."""
+
+    def __init__(self, param_grid: Dict[str, Sequence[Any]]) -> None:
+        self.keys = list(param_grid.keys())
+        self.pools = [list(param_grid[k]) for k in self.keys]
+        if any(len(p) == 0 for p in self.pools):
+            raise ValueError("Every axis of param_grid needs at least one value")
+        self.shape = tuple(len(p) for p in self.pools)
+        self.size = int(np.prod(self.shape))
+
+    def params(self, idx: Index) -> Dict[str, Any]:
+        return {k: pool[i] for k, pool, i in zip(self.keys, self.pools, idx)}
+
+    def all_indices(self) -> List[Index]:
+        return list(product(*(range(n) for n in self.shape)))
+
+    def random_indices(self, n: int, rng: np.random.Generator) -> List[Index]:
+        """Up to `n` distinct random lattice points."""
+        n = min(n, self.size)
+        flat = rng.choice(self.size, size=n, replace=False)
+        return [tuple(int(v) for v in np.unravel_index(f, self.shape)) for f in flat]
+
+    def center(self) -> Index:
+        return tuple((n - 1) // 2 for n in self.shape)
+
+
+class _Evaluator:
+    """Budgeted, memoised wrapper around cost_fn that records the trajectory."""
+
+    def __init__(
+        self,
+        space: _GridSpace,
+        cost_fn: Callable[[Dict[str, Any]], float],
+        *,
+        budget: int,
+        top_k: int,
+        results_path: Optional[str],
+        progress: Any,
+    ) -> None:
+        self.space = space
+        self.cost_fn = cost_fn
+        self.budget = int(budget)
+        self.stage = as_reporter(progress).stage("search", total=self.budget)
+        self.stage.__enter__()
+        self.sink = TopKResultSink(top_k, metric="cost", columnar_path=results_path)
+        self.costs: Dict[Tuple[Index, float], Optional[float]] = {}
+        self.trajectory: List[Dict[str, Any]] = []
+        self.evaluations = 0
+        self.best_cost = math.inf
+        self.best_params: Optional[Dict[str, Any]] = None
+
+    @property
+    def exhausted(self) -> bool:
+        return self.evaluations >= self.budget
+
+    def seen(self, idx: Index, fidelity: float = 1.0) -> bool:
+        return (idx, fidelity) in self.costs
+
+    def __call__(self, idx: Index, fidelity: float = 1.0) -> Optional[float]:
+        """Cost of lattice point `idx` (None if invalid or out of budget)."""
+        key = (idx, fidelity)
+        if key in self.costs:
+            return self.costs[key]
+        if self.exhausted:
+            return None
+
+        params = self.space.params(idx)
+        call_params = params if fidelity >= 1.0 else {**params, "fidelity": fidelity}
+        self.evaluations += 1
+        try:
+            cost: Optional[float] = float(self.cost_fn(call_params))
+        except Exception:
+            # invalid parameter combination: counts against the budget
+            cost = None
+        self.costs[key] = cost
+
+        if cost is not None and fidelity >= 1.0:
+            self.sink.add({"params": params, "cost": cost})
+            if cost < self.best_cost:
+                self.best_cost, self.best_params = cost, params
+
+        self.trajectory.append(
+            {
+                "evaluation": self.evaluations,
+                "params": params,
+                "fidelity": fidelity,
+                "cost": cost,
+                "best_cost": self.best_cost if self.best_params is not None else None,
+                "best_params": self.best_params,
+            }
+        )
+        self.stage.advance()
+        return cost
+
+    def finish(self) -> SearchResult:
+        self.stage.__exit__(None, None, None)
+        self.sink.close()
+        return SearchResult(
+            results=self.sink.results(),
+            trajectory=self.trajectory,
+            evaluations=self.evaluations,
+            grid_size=self.space.size,
+        )
+
+
+def _default_budget(space: _GridSpace, budget: Optional[int]) -> int:
+    # 10% of the grid, but at least a handful of evaluations
+    return int(budget) if budget is not None else max(5, int(math.ceil(0.1 * space.size)))
+
+
+# ----------------------------------------------------------------------
+# Coordinate descent
+# ----------------------------------------------------------------------
+
+def coordinate_descent(
+    param_grid: dict,
+    cost_fn,
+    *,
+    budget: Optional[int] = None,
+    top_k: int = 10,
+    categorical_axes: Sequence[str] = (),
+    start: Optional[Dict[str, int]] = None,
+    seed: int = 0,
+    progress: Any = False,
+    results_path: Optional[str] = None,
+) -> SearchResult:
+    """Compass search over the ordered axes of `param_grid`.
+
+    Every axis is treated as ordered by its list position (list panel counts
+    or battery counts in increasing order) except those named in
+    `categorical_axes`, which are scanned completely. From `start` (axis name
+    -> list index, default the middle of each axis) the search tries steps of
+    +/- `step` on each ordered axis, moves to any improvement and halves the
+    steps when none is found. Once converged, remaining budget is spent on
+    restarts from random lattice points.
+    """
+    space = _GridSpace(param_grid)
+    ev = _Evaluator(space, cost_fn, budget=_default_budget(space, budget), top_k=top_k,
+                    results_path=results_path, progress=progress)
+    rng = np.random.default_rng(seed)
+    categorical = [space.keys.index(a) for a in categorical_axes if a in space.keys]
+    ordered = [d for d in range(len(space.keys)) if d not in categorical]
+
+    def value(idx: Index) -> float:
+        cost = ev(idx)
+        return math.inf if cost is None else cost
+
+    current = space.center()
+    if start:
+        current = tuple(int(start.get(k, c)) for k, c in zip(space.keys, current))
+
+    while not ev.exhausted:
+        best_val = value(current)
+        steps = {d: max(1, space.shape[d] // 4) for d in ordered}
+
+        while not ev.exhausted:
+            improved = False
+
+            for d in categorical:
+                for j in range(space.shape[d]):
+                    cand = current[:d] + (j,) + current[d + 1:]
+                    v = value(cand)
+                    if v < best_val:
+                        current, best_val, improved = cand, v, True
+
+            for d in ordered:
+                for direction in (-1, 1):
+                    j = current[d] + direction * steps[d]
+                    if not 0 <= j < space.shape[d]:
+                        continue
+                    cand = current[:d] + (j,) + current[d + 1:]
+                    v = value(cand)
+                    if v < best_val:
+                        current, best_val, improved = cand, v, True
+                        break
+
+            if not improved:
+                if all(s == 1 for s in steps.values()):
+                    break
+                steps = {d: max(1, s // 2) for d, s in steps.items()}
+
+        # converged: restart from an unseen random point
+        unseen = [i for i in space.random_indices(min(space.size, 64), rng) if not ev.seen(i)]
+        if not unseen:
+            break
+        current = unseen[0]
+
+    return ev.finish()
+
+
+# ----------------------------------------------------------------------
+# Successive halving
+# ----------------------------------------------------------------------
+
+def successive_halving(
+    param_grid: dict,
+    cost_fn,
+    *,
+    budget: Optional[int] = None,
+    top_k: int = 10,
+    eta: int = 3,
+    min_fidelity: float = 1 / 9,
+    seed: int = 0,
+    progress: Any = False,
+    results_path: Optional[str] = None,
+) -> SearchResult:
+    """Successive halving over random configurations of `param_grid`.
+
+    Rung r evaluates its configurations at fidelity
+    min_fidelity * eta**r (capped at 1.0); only the best 1/eta of each rung
+    are promoted. Fidelity is passed to cost_fn as params['fidelity'] for
+    rungs below 1.0 (see `make_cost_fn`, which then simulates a subsample
+    of weeks); cost functions that ignore it still work, just without the
+    saving. The number of starting configurations is chosen so the total
+    number of cost_fn calls stays within `budget`. Only full-fidelity
+    evaluations are ranked in the results.
+    """
+    space = _GridSpace(param_grid)
+    total_budget = _default_budget(space, budget)
+    ev = _Evaluator(space, cost_fn, budget=total_budget, top_k=top_k,
+                    results_path=results_path, progress=progress)
+    rng = np.random.default_rng(seed)
+
+    n_rungs = max(1, int(round(math.log(1 / min_fidelity, eta))) + 1)
+    fidelities = [min(1.0, min_fidelity * eta ** r) for r in range(n_rungs)]
+    fidelities[-1] = 1.0
+
+    # n0 * (1 + 1/eta + 1/eta^2 + ...) <= budget
+    calls_per_start = sum(eta ** -r for r in range(n_rungs))
+    n0 = max(1, min(space.size, int(total_budget // calls_per_start)))
+    rung = space.random_indices(n0, rng)
+
+    for r, fidelity in enumerate(fidelities):
+        scored = []
+        for idx in rung:
+            cost = ev(idx, fidelity)
+            if cost is not None:
+                scored.append((cost, idx))
+        scored.sort()
+        if r < len(fidelities) - 1:
+            keep = max(1, len(rung) // eta)
+            rung = [idx for _, idx in scored[:keep]]
+        if ev.exhausted:
+            break
+
+    return ev.finish()
+
+
+# ----------------------------------------------------------------------
+# Bayesian optimisation (GP surrogate + expected improvement)
+# ----------------------------------------------------------------------
+
+def _features(space: _GridSpace, indices: Sequence[Index], categorical: Sequence[int]) -> np.ndarray:
+    """Ordered axes scaled to [0, 1], categorical axes one-hot encoded."""
+    idx = np.asarray(indices, dtype=float).reshape(len(indices), len(space.shape))
+    cols = []
+    for d, n in enumerate(space.shape):
+        if d in categorical:
+            cols.append(np.eye(n)[idx[:, d].astype(int)])
+        else:
+            cols.append((idx[:, d] / max(1, n - 1))[:, None])
+    return np.hstack(cols)
+
+
+def _gp_posterior(
+    x_train: np.ndarray,
+    y_train: np.ndarray,
+    x_test: np.ndarray,
+    length_scale: float,
+    noise: float = 1e-6,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Posterior mean/std of a zero-mean GP with an RBF kernel (standardised y)."""
+
+    def kernel(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        d2 = ((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=-1)
+        return np.exp(-0.5 * d2 / length_scale ** 2)
+
+    k_tt = kernel(x_train, x_train) + noise * np.eye(len(x_train))
+    chol = np.linalg.cholesky(k_tt)
+    alpha = np.linalg.solve(chol.T, np.linalg.solve(chol, y_train))
+    k_ts = kernel(x_train, x_test)
+    mean = k_ts.T @ alpha
+    v = np.linalg.solve(chol, k_ts)
+    var = np.clip(1.0 - (v ** 2).sum(axis=0), 1e-12, None)
+    return mean, np.sqrt(var)
+
+
+def _expected_improvement(mean: np.ndarray, std: np.ndarray, best: float) -> np.ndarray:
+    """EI for minimisation."""
+    from scipy.stats import norm  # scipy.stats is slow to import; only needed here
+
+    z = (best - mean) / std
+    return (best - mean) * norm.cdf(z) + std * norm.pdf(z)
+
+
+def bayesian_search(
+    param_grid: dict,
+    cost_fn,
+    *,
+    budget: Optional[int] = None,
+    top_k: int = 10,
+    n_initial: Optional[int] = None,
+    categorical_axes: Sequence[str] = (),
+    length_scale: float = 0.3,
+    candidate_pool: int = 5000,
+    seed: int = 0,
+    progress: Any = False,
+    results_path: Optional[str] = None,
+) -> SearchResult:
+    """Surrogate-model search with a Gaussian process and expected improvement.
+
+    Starts with `n_initial` random points (default a quarter of the budget,
+    at least 3), then repeatedly fits a GP to the evaluated costs and
+    evaluates the unseen lattice point with the highest expected
+    improvement. Grids larger than `candidate_pool` are subsampled each
+    iteration to keep the acquisition step cheap.
+    """
+    space = _GridSpace(param_grid)
+    total_budget = _default_budget(space, budget)
+    ev = _Evaluator(space, cost_fn, budget=total_budget, top_k=top_k,
+                    results_path=results_path, progress=progress)
+    rng = np.random.default_rng(seed)
+    categorical = [space.keys.index(a) for a in categorical_axes if a in space.keys]
+
+    if n_initial is None:
+        n_initial = max(3, total_budget // 4)
+    for idx in space.random_indices(min(n_initial, total_budget), rng):
+        ev(idx)
+
+    all_indices = space.all_indices() if space.size <= candidate_pool else None
+
+    while not ev.exhausted:
+        observed = [(idx, c) for (idx, _), c in ev.costs.items() if c is not None]
+        if all_indices is not None:
+            candidates = [i for i in all_indices if not ev.seen(i)]
+        else:
+            candidates = [i for i in space.random_indices(candidate_pool, rng) if not ev.seen(i)]
+        if not candidates:
+            break
+        if len(observed) < 2:
+            ev(candidates[int(rng.integers(len(candidates)))])
+            continue
+
+        y = np.array([c for _, c in observed], dtype=float)
+        y_std = y.std() or 1.0
+        y_norm = (y - y.mean()) / y_std
+        mean, std = _gp_posterior(
+            _features(space, [i for i, _ in observed], categorical),
+            y_norm,
+            _features(space, candidates, categorical),
+            length_scale,
+        )
+        ei = _expected_improvement(mean, std, float(y_norm.min()))
+        ev(candidates[int(np.argmax(ei))])
+
+    return ev.finish()
+
+
+STRATEGIES = {
+    "coordinate": coordinate_descent,
+    "halving": successive_halving,
+    "bayesian": bayesian_search,
+}
@@ -0,0 +1,207 @@
+"""Sensitivity of optimisation rankings to the financial assumptions.
+
+Discount rate, energy-price escalation, degradation and component lifetimes
+only enter the NPV, not the simulated grid series or the year-1 grid cost.
+Given a finished `optimise_components` result set, the NPV of every result
+is recomputed here for a grid of those parameters as array operations,
+without any power-flow or GridCost run.
+
+Parameters that can be swept (all optional; missing ones keep the value of
+the original run):
+
+- discount_rate       fraction per year
+- escalation          yearly energy-price escalation (fraction, default 0)
+- degradation         panel degradation in % per year (overrides SolarSpec)
+- solar_lifetime, battery_lifetime, inverter_lifetime   years
+- horizon             years (default: LCM of the lifetimes, as in the model)
+
+Note that a result set limited with `top_k` can only be re-ranked among the
+results it contains.
+"""
+from __future__ import annotations
+
+from itertools import product
+from math import gcd
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+PARAMETERS = (
+    "discount_rate",
+    "escalation",
+    "degradation",
+    "solar_lifetime",
+    "battery_lifetime",
+    "inverter_lifetime",
+    "horizon",
+)
+
+
+def _lcm(a: int, b: int) -> int:
+    return a * b // gcd(a, b) if a and b else max(a, b)
+
+
+def config_label(result: Mapping[str, Any]) -> str:
+    """Short readable id of a component/contract combination."""
+    solar, battery, inverter, contract = (result.get(k) for k in ("solar", "battery", "inverter", "contract"))
+    parts = []
+    if solar is not None:
+        parts.append(f"{solar.solar_panel_count} panels")
+    if battery is not None:
+        parts.append(f"{battery.battery_count} batt")
+    if inverter is not None:
+        parts.append(f"{inverter.AC_output:g} kW inv")
+    if contract is not None:
+        parts.append(getattr(contract, "product_name", "") or contract.contract_type)
+    return " / ".join(parts)
+
+
+class _ResultArrays:
+    """The per-result inputs of the NPV as arrays."""
+
+    def __init__(self, results: Sequence[Mapping[str, Any]]) -> None:
+        self.annual_cost = np.array([r["annual_cost_year1"] for r in results], dtype=float)
+        self.solar_cost = np.array([r["solar"].total_solar_panel_cost for r in results], dtype=float)
+        self.battery_cost = np.array([r["battery"].total_battery_cost for r in results], dtype=float)
+        self.inverter_cost = np.array([r["inverter"].inverter_cost for r in results], dtype=float)
+        self.degradation = np.array([r["solar"].annual_degredation for r in results], dtype=float)
+        self.solar_lifetime = np.array([int(r["solar"].solar_panel_lifetime) for r in results])
+        self.battery_lifetime = np.array([int(r["battery"].battery_lifetime) for r in results])
+        self.inverter_lifetime = np.array([int(r["inverter"].inverter_lifetime) for r in results])
+
+    def npv_cost(self, params: Mapping[str, float], base_discount_rate: float) -> np.ndarray:
+        """NPV of costs of every result under `params` (same model as FinancialModel._npv_cost)."""
+        n = len(self.annual_cost)
+        discount_rate = float(params.get("discount_rate", base_discount_rate))
+        escalation = float(params.get("escalation", 0.0))
+        deg = np.full(n, params["degradation"], dtype=float) if "degradation" in params else self.degradation
+        lives = [
+            np.full(n, int(params[name]), dtype=int) if name in params else own
+            for name, own in (
+                ("solar_lifetime", self.solar_lifetime),
+                ("battery_lifetime", self.battery_lifetime),
+                ("inverter_lifetime", self.inverter_lifetime),
+            )
+        ]
+        if "horizon" in params:
+            horizon = np.full(n, int(params["horizon"]))
+        else:
+            horizon = np.array([_lcm(_lcm(s, b), i) for s, b, i in zip(*lives)])
+
+        years = np.arange(1, int(horizon.max()) + 1)
+        active = years[None, :] <= horizon[:, None]
+        discount = (1 + discount_rate) ** years
+
+        growth = ((1 + deg[:, None] / 100.0) * (1 + escalation)) ** (years[None, :] - 1)
+        yearly = self.annual_cost[:, None] * growth
+        for life, cost in zip(lives, (self.solar_cost, self.battery_cost, self.inverter_cost)):
+            yearly = yearly + np.where(years[None, :] % life[:, None] == 0, cost[:, None], 0.0)
+
+        capex = self.solar_cost + self.battery_cost + self.inverter_cost
+        return capex + (np.where(active, yearly, 0.0) / discount).sum(axis=1)
+
+
+def sensitivity_sweep(
+    results: Sequence[Mapping[str, Any]],
+    param_grid: Mapping[str, Sequence[float]],
+    *,
+    discount_rate: float,
+) -> pd.DataFrame:
+    """
+    NPV and rank of every result for every combination of `param_grid`.
+
+    `discount_rate` is the rate of the original run (used when it is not
+    swept). Returns a long table with one row per (scenario, result):
+    the swept parameters, 'scenario', 'config' (index into `results`),
+    'label', 'npv_cost' and 'rank' (1 = best within the scenario).
+    """
+    unknown = set(param_grid) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown sensitivity parameters: {sorted(unknown)}")
+
+    arrays = _ResultArrays(results)
+    labels = [config_label(r) for r in results]
+    names = list(param_grid)
+    n = len(results)
+
+    frames = []
+    for s, values in enumerate(product(*(param_grid[k] for k in names))):
+        params = dict(zip(names, values))
+        npv = arrays.npv_cost(params, discount_rate)
+        frame = pd.DataFrame({
+            "scenario": s,
+            **params,
+            "config": np.arange(n),
+            "label": labels,
+            "npv_cost": npv,
+            # stable ranks: ties keep the original result order
+            "rank": np.argsort(np.argsort(npv, kind="stable"), kind="stable") + 1,
+        })
+        frames.append(frame)
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def rank_stability_table(sweep: pd.DataFrame, *, top_n: int = 3) -> pd.DataFrame:
+    """
+    How stable each configuration's rank is across the sweep's scenarios.
+
+    One row per config with its best/worst/mean rank, the share of
+    scenarios in which it ranks first and in the top `top_n`, and its
+    mean NPV; sorted by mean rank.
+    """
+    grouped = sweep.groupby(["config", "label"])
+    table = pd.DataFrame({
+        "best_rank": grouped["rank"].min(),
+        "worst_rank": grouped["rank"].max(),
+        "mean_rank": grouped["rank"].mean(),
+        "share_first": grouped["rank"].apply(lambda r: float((r == 1).mean())),
+        f"share_top_{top_n}": grouped["rank"].apply(lambda r: float((r <= top_n).mean())),
+        "mean_npv_cost": grouped["npv_cost"].mean(),
+    })
+    return table.sort_values(["mean_rank", "mean_npv_cost"]).reset_index()
+
+
+def tornado_table(
+    results: Sequence[Mapping[str, Any]],
+    ranges: Mapping[str, Tuple[float, float]],
+    *,
+    discount_rate: float,
+    config: int = 0,
+) -> pd.DataFrame:
+    """
+    One-at-a-time sensitivity of one configuration (default: results[0]).
+
+    For every parameter in `ranges` (name -> (low, high)) the NPV of
+    `results[config]` is recomputed at both ends with everything else at
+    the original values. Rows are sorted by swing (|high - low|), largest
+    first, and also list which configuration ranks first at each end.
+    """
+    unknown = set(ranges) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown sensitivity parameters: {sorted(unknown)}")
+
+    arrays = _ResultArrays(results)
+    labels = [config_label(r) for r in results]
+    base = arrays.npv_cost({}, discount_rate)[config]
+
+    rows: List[Dict[str, Any]] = []
+    for name, (low, high) in ranges.items():
+        npv_low = arrays.npv_cost({name: low}, discount_rate)
+        npv_high = arrays.npv_cost({name: high}, discount_rate)
+        rows.append({
+            "parameter": name,
+            "low": low,
+            "high": high,
+            "npv_cost_low": float(npv_low[config]),
+            "npv_cost_high": float(npv_high[config]),
+            "swing": float(abs(npv_high[config] - npv_low[config])),
+            "best_at_low": labels[int(np.argmin(npv_low))],
+            "best_at_high": labels[int(np.argmin(npv_high))],
+        })
+
+    table = pd.DataFrame(rows).sort_values("swing", ascending=False, kind="stable").reset_index(drop=True)
+    table.attrs["base_npv_cost"] = float(base)
+    table.attrs["config"] = labels[config]
+    return table
@@ -0,0 +1,98 @@
+"""Deterministic sharding of optimisation sweeps across machines.
+
+A sweep started with `shard=(i, n)` only evaluates the i-th of n contiguous
+blocks of the combination space (in enumeration order), so n machines can
+split a sweep without any coordination. Because the blocks are contiguous,
+feeding the per-shard results back in shard order reproduces the single-node
+ranking exactly, including the order of ties.
+
+    results = model.optimise_components(..., top_k=20, shard=(i, n))
+    save_shard("shard_i.pkl", results, shard=(i, n))
+    ...
+    best = merge_shards(["shard_0.pkl", ..., "shard_{n-1}.pkl"], top_k=20)
+"""
+from __future__ import annotations
+
+import os
+import pickle
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+
+from financialmodel._results import TopKResultSink
+
+Shard = Tuple[int, int]
+
+
+def validate_shard(shard: Optional[Shard]) -> Optional[Shard]:
+    if shard is None:
+        return None
+    i, n = (int(v) for v in shard)
+    if n < 1 or not 0 <= i < n:
+        raise ValueError(f"shard must be (i, n) with 0 <= i < n, got {shard}")
+    return i, n
+
+
+def shard_bounds(total: int, shard: Optional[Shard]) -> Tuple[int, int]:
+    """[start, stop) of the enumeration indices that belong to `shard`."""
+    if shard is None:
+        return 0, total
+    i, n = validate_shard(shard)
+    return i * total // n, (i + 1) * total // n
+
+
+def save_shard(path: str, results: List[Dict[str, Any]], *, shard: Shard) -> None:
+    """Write the (top-k) results of one shard for `merge_shards`."""
+    with open(path, "wb") as f:
+        pickle.dump({"shard": validate_shard(shard), "results": results}, f)
+
+
+def _load_shard(path: str) -> Tuple[Shard, List[Dict[str, Any]]]:
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Shard file not found: {path}")
+    with open(path, "rb") as f:
+        payload = pickle.load(f)
+    return tuple(payload["shard"]), payload["results"]
+
+
+def merge_shards(
+    shards: Sequence[Union[str, List[Dict[str, Any]]]],
+    *,
+    top_k: Optional[int] = None,
+    metric: str = "npv_cost",
+    minimise: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    Combine per-shard results into the global ranking.
+
+    `shards` are files written by `save_shard` (any order; every shard of the
+    sweep must be present exactly once) or result lists already in shard
+    order. Use metric="cost" for `grid_search` results. Every shard must
+    have kept at least `top_k` results for the merge to equal the single-node
+    top-k.
+    """
+    if shards and all(isinstance(s, str) for s in shards):
+        loaded = sorted((_load_shard(p) for p in shards), key=lambda item: item[0][0])
+        found = [s for s, _ in loaded]
+        n = found[0][1]
+        if found != [(i, n) for i in range(n)]:
+            raise ValueError(f"Expected shards 0..{n - 1} of {n} exactly once, got {found}")
+        result_lists = [results for _, results in loaded]
+    else:
+        result_lists = list(shards)
+
+    sink = TopKResultSink(top_k, metric=metric, minimise=minimise)
+    for results in result_lists:
+        sink.extend(results)
+    return sink.results()
+
+
+def merge_results_files(paths: Sequence[str], out_path: str) -> pd.DataFrame:
+    """
+    Concatenate per-shard `results_path` CSV files (given in shard order)
+    into `out_path`; the result equals the single-node results file.
+    """
+    frames = [pd.read_csv(p) for p in paths if os.path.isfile(p) and os.path.getsize(p) > 0]
+    merged = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    merged.to_csv(out_path, index=False)
+    return merged
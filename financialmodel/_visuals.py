@@ -11,8 +11,6 @@ from typing import Any, Callable, Mapping, Optional, Sequence, Tuple
 
 import pandas as pd
 import itertools
-import matplotlib.pyplot as plt
-from matplotlib.gridspec import GridSpec
 
 from financialmodel._getters import (
     get_contract_comparison_data,
@@ -46,7 +44,8 @@ def plot_contract_comparison_cost_and_consumption(
       - Cost vs solar panels per contract (right y-axis)
       - Summary table under the plot (contracts as columns)
     """
-
+    import matplotlib.pyplot as plt
+    from matplotlib.gridspec import GridSpec
 
     if data is None:
         if results is None:
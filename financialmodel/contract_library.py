@@ -0,0 +1,174 @@
+"""Cached, parallel loading of a directory of contract PDFs.
+
+Parsing a tariff card means opening it with pdfplumber and extracting the
+text of every page, which dominates the time of `electricity_contract_from_pdf`.
+`load_contract_pdfs` keeps two on-disk caches, both keyed by the sha256 of
+the PDF:
+
+- text/<sha>.txt                              extracted text
+- contracts/<sha>-v<PARSER_VERSION>-<opts>.pkl parsed ElectricityContract
+
+plus an index of (size, mtime) per path, so unchanged files are not even
+re-hashed. A re-scan of an unchanged directory only stats the files and
+unpickles the contracts. Files that do need parsing are handled in a process
+pool. Bumping `models.PARSER_VERSION` invalidates the parsed contracts but
+keeps the extracted text.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import financialmodel.models as models
+from financialmodel.models import ElectricityContract
+
+DEFAULT_CACHE_DIRNAME = ".contract_cache"
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _parse_pdf(path: str, text: Optional[str], parse_kwargs: Dict[str, Any]) -> Tuple[str, ElectricityContract]:
+    """Worker: (extracted text, parsed contract) for one PDF."""
+    if text is None:
+        text = models._read_pdf_text(path)
+    contract = models.electricity_contract_from_pdf(ElectricityContract, path, text_override=text, **parse_kwargs)
+    return text, contract
+
+
+class ContractPdfCache:
+    """
+    On-disk cache of extracted PDF text and parsed contracts.
+
+    `stats` counts, since construction, the contracts served from the cache
+    ('cached'), parsed from cached text ('text_cached') and parsed from the
+    PDF ('parsed').
+    """
+
+    def __init__(self, cache_dir: str) -> None:
+        self.root = Path(cache_dir)
+        (self.root / "text").mkdir(parents=True, exist_ok=True)
+        (self.root / "contracts").mkdir(parents=True, exist_ok=True)
+        self._index_path = self.root / "index.json"
+        try:
+            self._index: Dict[str, List[Any]] = json.loads(self._index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self._index = {}
+        self.stats = {"cached": 0, "text_cached": 0, "parsed": 0}
+
+    def sha256(self, path: Path) -> str:
+        """sha256 of a file, re-hashed only when its size or mtime changed."""
+        st = path.stat()
+        key = str(path.resolve())
+        entry = self._index.get(key)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        sha = models._sha256_file(path)
+        self._index[key] = [st.st_size, st.st_mtime_ns, sha]
+        return sha
+
+    def save_index(self) -> None:
+        _atomic_write(self._index_path, json.dumps(self._index).encode("utf-8"))
+
+    # ------------------------------------------------------------------
+
+    def _text_path(self, sha: str) -> Path:
+        return self.root / "text" / f"{sha}.txt"
+
+    def _contract_path(self, sha: str, parse_kwargs: Dict[str, Any]) -> Path:
+        opts = hashlib.sha256(repr(sorted(parse_kwargs.items())).encode("utf-8")).hexdigest()[:12]
+        return self.root / "contracts" / f"{sha}-v{models.PARSER_VERSION}-{opts}.pkl"
+
+    def load_text(self, sha: str) -> Optional[str]:
+        path = self._text_path(sha)
+        return path.read_text(encoding="utf-8") if path.is_file() else None
+
+    def store_text(self, sha: str, text: str) -> None:
+        _atomic_write(self._text_path(sha), text.encode("utf-8"))
+
+    def load_contract(self, sha: str, parse_kwargs: Dict[str, Any]) -> Optional[ElectricityContract]:
+        path = self._contract_path(sha, parse_kwargs)
+        if not path.is_file():
+            return None
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception:  # noqa: BLE001
+            # unreadable entry (e.g. interrupted write): parse again
+            return None
+
+    def store_contract(self, sha: str, parse_kwargs: Dict[str, Any], contract: ElectricityContract) -> None:
+        _atomic_write(self._contract_path(sha, parse_kwargs), pickle.dumps(contract))
+
+
+def load_contract_pdfs(
+    directory: str,
+    *,
+    pattern: str = "*.pdf",
+    cache_dir: Optional[str] = None,
+    use_cache: bool = True,
+    workers: Optional[int] = None,
+    cache: Optional[ContractPdfCache] = None,
+    **parse_kwargs: Any,
+) -> List[ElectricityContract]:
+    """
+    Parse every PDF in `directory` (sorted by name) into an ElectricityContract.
+
+    - cache_dir: cache location, default `<directory>/.contract_cache`;
+      `use_cache=False` always parses. Pass a `ContractPdfCache` as `cache`
+      to reuse one (and read its `stats`).
+    - workers: processes for the PDFs that need parsing (default: CPU
+      count); 1 parses in this process.
+    - parse_kwargs are passed to `electricity_contract_from_pdf` (region,
+      meter_type) and are part of the cache key.
+
+    Contracts served from the cache keep their original `parsed_at`;
+    `source_pdf_path` is set to the current location of the file.
+    """
+    paths = sorted(Path(directory).glob(pattern))
+    if not paths:
+        raise FileNotFoundError(f"No contract PDFs matching {pattern!r} in {directory}")
+
+    if not use_cache:
+        return [_parse_pdf(str(p), None, parse_kwargs)[1] for p in paths]
+
+    if cache is None:
+        cache = ContractPdfCache(cache_dir or os.path.join(directory, DEFAULT_CACHE_DIRNAME))
+
+    contracts: List[Optional[ElectricityContract]] = [None] * len(paths)
+    todo: List[Tuple[int, str, Optional[str]]] = []
+    shas = [cache.sha256(p) for p in paths]
+    for i, (path, sha) in enumerate(zip(paths, shas)):
+        contract = cache.load_contract(sha, parse_kwargs)
+        if contract is not None:
+            contract.source_pdf_path = str(path)
+            contracts[i] = contract
+            cache.stats["cached"] += 1
+            continue
+        text = cache.load_text(sha)
+        cache.stats["text_cached" if text is not None else "parsed"] += 1
+        todo.append((i, str(path), text))
+
+    if todo:
+        n_workers = min(workers or os.cpu_count() or 1, len(todo))
+        if n_workers > 1:
+            with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                parsed = list(pool.map(_parse_pdf, *zip(*[(p, t, parse_kwargs) for _, p, t in todo])))
+        else:
+            parsed = [_parse_pdf(p, t, parse_kwargs) for _, p, t in todo]
+
+        for (i, _, _), (text, contract) in zip(todo, parsed):
+            cache.store_text(shas[i], text)
+            cache.store_contract(shas[i], parse_kwargs, contract)
+            contracts[i] = contract
+
+    cache.save_index()
+    return contracts
@@ -9,8 +9,12 @@ from math import gcd
 import pickle
 import os
 
+import pandas as pd
+
 import powercalculations.powercalculations as pc
 import gridcost.gridcost as gc
+from financialmodel.models import ElectricityContract
+from powercalculations.profiling import profiled
 
 # Simple in-memory cache for generated grid_series keyed by a tuple
 _DEFAULT_GRID_CACHE = {}
@@ -20,6 +24,7 @@ def _lcm(a: int, b: int) -> int:
     return a * b // gcd(a, b) if a and b else max(a, b)
 
 
+@profiled("costs.load_irradiance")
 def _ensure_pickled_irradiance(pkl_path: str):
     if not os.path.exists(pkl_path):
         raise FileNotFoundError(f"Pickle path not found: {pkl_path}")
@@ -28,6 +33,36 @@ def _ensure_pickled_irradiance(pkl_path: str):
     return irradiance
 
 
+def _subsample_weeks(irradiance, fidelity: float) -> float:
+    """Keep every k-th week of `irradiance.pd` (k ~ 1/fidelity), in place.
+
+    The kept weeks are stitched onto a continuous index starting at the
+    original start, so weekday/hour structure (and the index frequency) is
+    preserved for the tariffs. Returns the fraction of rows kept, used to
+    scale annual energy costs back up.
+    """
+    step = max(1, int(round(1.0 / fidelity)))
+    if step == 1:
+        return 1.0
+
+    df = irradiance.pd
+    week = (df.index - df.index[0]) // pd.Timedelta(days=7)
+    kept = df[week % step == 0]
+    freq = df.index.freq or pd.infer_freq(df.index[:10])
+    kept.index = pd.date_range(df.index[0], periods=len(kept), freq=freq, name=df.index.name)
+    irradiance.pd = kept
+    return len(kept) / len(df)
+
+
+def _as_contract(contract, tariff: str) -> ElectricityContract:
+    """ElectricityContract from a contract, a dict of its fields or None."""
+    if isinstance(contract, ElectricityContract):
+        return contract
+    fields = dict(contract or {})
+    fields.setdefault("contract_type", tariff)
+    return ElectricityContract(**fields)
+
+
 def make_cost_fn(
     orientation: str = "S",
     tilt_angle: int = 30,
@@ -35,14 +70,23 @@ def make_cost_fn(
     discount_rate: float = 0.05,
     pkl_path: str = None,
     cache: Dict = None,
+    belpex_filter_path: str = "",
 ) -> Tuple[Callable[[Dict[str, Any]], float], Callable[[Dict[str, Any]], Dict[str, Any]]]:
     """Return (cost_fn, compute_metrics_fn).
 
-    cost_fn(params) -> float (NPV). Params may be a dict containing keys
-    'solar','battery','inverter','contract' where each value is either a
-    dataclass-like object with attributes or a dict with the expected keys.
+    cost_fn(params) -> float (NPV of the costs, lower is better). Params may
+    be a dict containing keys 'solar','battery','inverter','contract' where
+    each value is either a dataclass-like object with attributes or a dict
+    with the expected keys. The contract is an ElectricityContract or a dict
+    of its fields (contract_type defaults to `tariff`) and is priced by
+    GridCost; a DynamicTariff needs the Belpex prices of `belpex_filter_path`.
 
     compute_metrics_fn(params) -> dict with detailed outputs.
+
+    An optional params['fidelity'] in (0, 1] simulates only every
+    round(1/fidelity)-th week of the year and scales the energy cost back to
+    a full year; the budgeted search strategies use this to screen
+    candidates cheaply.
     """
 
     if cache is None:
@@ -75,7 +119,7 @@ def make_cost_fn(
             return d
         return v
 
-    def _build_cache_key(solar, battery, inverter):
+    def _build_cache_key(solar, battery, inverter, fidelity=1.0):
         return (
             int(getattr(solar, "solar_panel_count", 0)),
             float(getattr(solar, "panel_surface", 0.0)),
@@ -84,10 +128,12 @@ def make_cost_fn(
             float(getattr(battery, "battery_capacity", 0.0)),
             float(getattr(inverter, "AC_output", 0.0)),
             float(getattr(inverter, "DC_solar_panels", 0.0)),
+            float(fidelity),
         )
 
-    def compute_grid_series(solar, battery, inverter):
-        key = _build_cache_key(solar, battery, inverter)
+    def compute_grid_series(solar, battery, inverter, fidelity=1.0):
+        """Return (grid_series, fraction of the year simulated)."""
+        key = _build_cache_key(solar, battery, inverter, fidelity)
         if key in cache:
             return cache[key]
 
@@ -97,6 +143,7 @@ def make_cost_fn(
         # many PowerCalculations objects are mutable; load fresh each call
         # (we re-open the pickle to get a fresh instance)
         irradiance = _ensure_pickled_irradiance(pkl_path)
+        fraction = _subsample_weeks(irradiance, fidelity) if fidelity < 1.0 else 1.0
 
         # PV generation
         irradiance.PV_generated_power(
@@ -119,61 +166,35 @@ def make_cost_fn(
         )
 
         grid_series = irradiance.get_grid_power()[0]
-        cache[key] = grid_series
-        return grid_series
+        cache[key] = (grid_series, fraction)
+        return grid_series, fraction
 
     def compute_metrics(params: Dict[str, Any]) -> Dict[str, Any]:
         # Normalize inputs
         solar = _as_obj(params.get("solar"))
         battery = _as_obj(params.get("battery"))
         inverter = _as_obj(params.get("inverter"))
-        contract = params.get("contract")
-        if contract is None:
-            contract = {}
-        if not isinstance(contract, dict):
-            # try dataclass-like
-            try:
-                contract = contract.as_dict()
-            except Exception:
-                # fallback: build from attributes
-                contract = {
-                    "resample_freq": getattr(contract, "resample_freq", "1h"),
-                    "belpex_scale": getattr(contract, "belpex_scale", 1.1261),
-                    "dual_peak_tariff": getattr(contract, "dual_peak_tariff", getattr(contract, "peak_tariff", 0.1701)),
-                    "dual_offpeak_tariff": getattr(contract, "dual_offpeak_tariff", getattr(contract, "offpeak_tariff", 0.1463)),
-                    "dual_fixed_tariff": getattr(contract, "dual_fixed_tariff", getattr(contract, "fixed_tariff", 0.01554)),
-                    "dual_injection_tariff": getattr(contract, "dual_injection_tariff", getattr(contract, "injection_tariff", 0.03)),
-                    "capacity_tariff_rate": getattr(contract, "capacity_tariff_rate", 41.3087),
-                }
-
-        # Build grid series (cached)
-        grid_series = compute_grid_series(solar, battery, inverter)
-
-        # Create GridCost with contract params
-        financials = gc.GridCost(grid_series, file_path_BelpexFilter="", **contract)
-
-        # calculate tariffs
-        try:
-            financials.dual_tariff()
-        except Exception:
-            pass
-        try:
-            financials.dynamic_tariff()
-        except Exception:
-            pass
-
-        # compute annual energy cost and fixed component
         tariff_type = params.get("tariff", tariff)
-        try:
-            annual_energy_cost = financials.get_grid_cost_total(calculationtype=tariff_type)
-        except Exception:
-            # fallback sum
-            annual_energy_cost = float(financials.get_grid_cost_perhour(calculationtype=tariff_type).sum())
+        contract = _as_contract(params.get("contract"), tariff_type)
+        if contract.contract_type == "DynamicTariff" and not belpex_filter_path:
+            raise ValueError("A DynamicTariff contract needs belpex_filter_path")
 
-        fixed_component_dual = 111.3
-        fixed_component_dynamic = 100.7
-        fixed_component = fixed_component_dual if tariff_type == "DualTariff" else fixed_component_dynamic
+        # Build grid series (cached)
+        fidelity = float(params.get("fidelity", 1.0))
+        if not 0.0 < fidelity <= 1.0:
+            raise ValueError(f"fidelity must be in (0, 1], got {fidelity}")
+        grid_series, fraction = compute_grid_series(solar, battery, inverter, fidelity)
+
+        financials = gc.GridCost(
+            consumption_data_df=grid_series,
+            file_path_BelpexFilter=belpex_filter_path,
+            electricity_contract=contract,
+        )
+        breakdown = financials.calculate_total_cost(return_breakdown=True)
 
+        # yearly charges do not scale with the simulated fraction of the year
+        fixed_component = breakdown["fixed_component"] + breakdown["data_management_cost"]
+        annual_energy_cost = (breakdown["total_cost"] - fixed_component) / fraction
         annual_cost_year1 = annual_energy_cost + fixed_component
 
         # capex
@@ -213,10 +234,12 @@ def make_cost_fn(
             "annual_cost_year1": annual_cost_year1,
             "grid_series": grid_series,
             "horizon": horizon,
+            "fidelity": fidelity,
         }
 
     def cost_fn(params: Dict[str, Any]) -> float:
         metrics = compute_metrics(params)
-        return float(metrics["npv"])
+        # the searches minimise; npv is negative for costs
+        return -float(metrics["npv"])
 
     return cost_fn, compute_metrics
@@ -4,16 +4,30 @@ from __future__ import annotations
 
 from dataclasses import is_dataclass, asdict
 from math import gcd
-from typing import Iterable, List, Dict, Any, Optional, Union, Tuple
+from typing import Callable, Iterable, List, Dict, Any, Optional, Union, Tuple
 
+import logging
 import os
 import pickle
 
+import numpy as np
 import pandas as pd
 from powercalculations.powercalculations import PowerCalculations as pc  # type: ignore
 
 from financialmodel.models import SolarSpec, BatterySpec, InverterSpec, ElectricityContract
+from financialmodel._results import TopKResultSink
+from financialmodel._bounds import grid_cost_lower_bound
+from financialmodel._checkpoint import ResultCheckpoint, open_checkpoint, sweep_signature
+from financialmodel._shards import shard_bounds
+from financialmodel._sensitivity import rank_stability_table, sensitivity_sweep, tornado_table
+from financialmodel._representative import RepresentativeDays, select_representative_days
+from powercalculations.profiling import profile_option, profiled, rows_of_result
+from powercalculations.progress import SILENT, ProgressReporter, as_reporter
 from gridcost.gridcost import GridCost
+from gridcost._contracttable import ContractTable
+from gridcost._scenarios import PriceScenarios, summarise_costs
+
+logger = logging.getLogger(__name__)
 
 
 def _lcm(a: int, b: int) -> int:
@@ -51,17 +65,43 @@ class FinancialModel:
         default_tariff: str = "DynamicTariff",
         pkl_path: Optional[str] = None,
         belpex_filter_path: str = r"C:\Users\67583\OneDrive - Bain\Documents\Personal projects\MA1SEM2_EnergyProject\data\belpex_quarter_hourly.csv",
+        dispatch: str = "greedy",
+        dispatch_contract: Optional[ElectricityContract] = None,
+        dispatch_options: Optional[Dict[str, Any]] = None,
     ) -> None:
+        """
+        dispatch selects the battery controller behind every GridFlow series:
+            - "greedy": `PowerCalculations.power_flow` (default).
+            - "optimal": `optimal_power_flow`, cost-optimal with perfect foresight.
+            - "mpc": `mpc_power_flow`, daily re-planning on day-ahead prices and
+              a load/PV forecast.
+        The "optimal" and "mpc" controllers minimise the bill of
+        `dispatch_contract` (default: an ElectricityContract of
+        `default_tariff`), with Belpex prices from `belpex_filter_path`. The
+        resulting GridFlow is then priced with every contract of a sweep.
+        `dispatch_options` are passed on to the controller (e.g. horizon_hours).
+        """
+        if dispatch not in ("greedy", "optimal", "mpc"):
+            raise ValueError("dispatch must be 'greedy', 'optimal' or 'mpc'")
         self.orientation = orientation
         self.tilt_angle = tilt_angle
         self.discount_rate = discount_rate
         self.default_tariff = default_tariff
         self.pkl_path = pkl_path
         self.belpex_filter_path = belpex_filter_path
+        self.dispatch = dispatch
+        self.dispatch_contract = dispatch_contract
+        self.dispatch_options = dict(dispatch_options or {})
 
         # cache for grid series keyed by component configuration
         self._grid_cache: Dict[Tuple, pd.Series | pd.DataFrame] = {}
 
+        # representative-day reductions keyed by (pickle path, k, belpex path)
+        self._representative_cache: Dict[Tuple, RepresentativeDays] = {}
+
+        # counters of the last optimise_components run
+        self.last_search_stats: Dict[str, Any] = {}
+
     # ------------------------------------------------------------------
     # internal helpers
     # ------------------------------------------------------------------
@@ -83,7 +123,8 @@ class FinancialModel:
 
         return pickles.get((self.orientation, self.tilt_angle), "data/initialized_dataframes/pd_S_30")
 
-    def _load_irradiance(self) -> pc.PowerCalculations:
+    @profiled("FinancialModel.load_irradiance")
+    def _load_irradiance(self) -> pc:
         """Load the PowerCalculations object from pickle."""
         path = self._pickled_path()
         if not os.path.exists(path):
@@ -92,7 +133,7 @@ class FinancialModel:
         with open(path, "rb") as f:
             irradiance = pickle.load(f)
 
-        if not isinstance(irradiance, pc.PowerCalculations):
+        if not isinstance(irradiance, pc):
             raise TypeError("Pickled object is not a powercalculations.PowerCalculations instance")
 
         return irradiance
@@ -116,23 +157,36 @@ class FinancialModel:
             float(inverter.DC_battery),
         )
 
+    @profiled("FinancialModel.compute_grid_series", rows=rows_of_result)
     def _compute_grid_series(
         self,
         solar: SolarSpec,
         battery: BatterySpec,
         inverter: InverterSpec,
+        days: Optional[RepresentativeDays] = None,
     ) -> pd.Series | pd.DataFrame:
         """
         Run PV + battery power flow and return the resulting GridFlow time series.
 
         The result is whatever `PowerCalculations.get_grid_power()[0]` returns:
         typically a pandas Series/DataFrame indexed by DateTime with GridFlow power.
+
+        With `days`, the power flow only runs on the representative days and
+        the result is expanded back to a full year (see `_representative`).
         """
         key = self._build_grid_cache_key(solar, battery, inverter)
+        if days is not None:
+            key += ("representative", days.assignment.to_numpy().tobytes())
         if key in self._grid_cache:
             return self._grid_cache[key]
 
         irradiance = self._load_irradiance()
+        full_index = irradiance.pd.index
+        contract = self._dispatch_contract()
+        if contract is not None and contract.contract_type == "DynamicTariff":
+            irradiance.pd["BelpexFilter"] = self._belpex_prices(full_index)
+        if days is not None:
+            irradiance.pd = days.reduce(irradiance.pd)
 
         # PV generation
         irradiance.PV_generated_power(
@@ -145,7 +199,7 @@ class FinancialModel:
 
         # Battery + inverter power flow
         max_charge = battery.battery_capacity * battery.battery_count
-        irradiance.power_flow(
+        flow_options = dict(
             max_charge=max_charge,
             max_AC_power_output=inverter.AC_output,
             max_PV_input=inverter.DC_solar_panels,
@@ -153,11 +207,58 @@ class FinancialModel:
             battery_roundtrip_efficiency=97.5,
             battery_PeakPower=battery.battery_capacity,
         )
+        if contract is None:
+            irradiance.power_flow(**flow_options)
+        elif self.dispatch == "optimal":
+            irradiance.optimal_power_flow(contract, **flow_options, **self.dispatch_options)
+        else:
+            irradiance.mpc_power_flow(contract, **flow_options, **self.dispatch_options)
 
         grid_series = irradiance.get_grid_power()[0]
+        if days is not None:
+            grid_series = days.expand(grid_series, full_index)
         self._grid_cache[key] = grid_series
         return grid_series
 
+    def _dispatch_contract(self) -> Optional[ElectricityContract]:
+        """Contract the battery controller minimises; None for the greedy power flow."""
+        if self.dispatch == "greedy":
+            return None
+        if self.dispatch_contract is not None:
+            return self.dispatch_contract
+        return ElectricityContract(contract_type=self.default_tariff)
+
+    def _belpex_prices(self, index: pd.DatetimeIndex) -> pd.Series:
+        """Belpex prices [€/MWh] from `belpex_filter_path`, averaged onto `index`."""
+        if not self.belpex_filter_path or not os.path.isfile(self.belpex_filter_path):
+            raise FileNotFoundError(f"BelpexFilter file not found: {self.belpex_filter_path}")
+        belpex = pd.read_csv(self.belpex_filter_path, parse_dates=["DateTime"]).set_index("DateTime")["BelpexFilter"]
+        return belpex.resample(index.freq).mean().reindex(index)
+
+    def representative_days(self, k: int, belpex_filter_path: Optional[str] = None) -> RepresentativeDays:
+        """
+        Reduce the irradiance pickle's year to `k` weighted representative days.
+
+        Days are clustered on Load_kW and DirectIrradiance, plus the Belpex
+        price when `belpex_filter_path` covers the pickle's dates.
+        """
+        if belpex_filter_path is None:
+            belpex_filter_path = self.belpex_filter_path
+        key = (self._pickled_path(), int(k), belpex_filter_path)
+        if key in self._representative_cache:
+            return self._representative_cache[key]
+
+        frame = self._load_irradiance().pd[["Load_kW", "DirectIrradiance"]].astype(float)
+        if belpex_filter_path and os.path.isfile(belpex_filter_path):
+            belpex = pd.read_csv(belpex_filter_path, parse_dates=["DateTime"]).set_index("DateTime")["BelpexFilter"]
+            price = belpex.resample(frame.index.freq).mean().reindex(frame.index)
+            if price.notna().mean() > 0.5:
+                frame["BelpexFilter"] = price.interpolate(limit_direction="both")
+
+        days = select_representative_days(frame, k)
+        self._representative_cache[key] = days
+        return days
+
     @staticmethod
     def _capex(solar: SolarSpec, battery: BatterySpec, inverter: InverterSpec) -> float:
         """Total upfront investment for this component set."""
@@ -177,6 +278,90 @@ class FinancialModel:
         lcm_sb = _lcm(int(solar.solar_panel_lifetime), int(battery.battery_lifetime))
         return _lcm(lcm_sb, int(inverter.inverter_lifetime))
 
+    @staticmethod
+    @profiled("FinancialModel.npv_cost")
+    def _npv_cost(
+        annual_cost_year1: float,
+        capex: float,
+        solar: SolarSpec,
+        battery: BatterySpec,
+        inverter: InverterSpec,
+        horizon: int,
+        discount_rate: float,
+    ) -> float:
+        """NPV of costs: capex + yearly OPEX (scaled by degradation) + replacements."""
+        npv_cost = capex  # year 0 capex (undiscounted)
+        deg = solar.annual_degredation / 100.0
+
+        for year in range(1, horizon + 1):
+            # scale OPEX with degradation approx.
+            operating_cost = annual_cost_year1 * ((1 + deg) ** (year - 1))
+
+            # replacement costs at end-of-life years
+            replacement = 0.0
+            if year % int(solar.solar_panel_lifetime) == 0:
+                replacement += solar.total_solar_panel_cost
+            if year % int(battery.battery_lifetime) == 0:
+                replacement += battery.total_battery_cost
+            if year % int(inverter.inverter_lifetime) == 0:
+                replacement += inverter.inverter_cost
+
+            yearly_cost = operating_cost + replacement
+            npv_cost += yearly_cost / ((1 + discount_rate) ** year)
+
+        return npv_cost
+
+    @profiled("FinancialModel.evaluate_combination")
+    def _evaluate_combination(
+        self,
+        solar: SolarSpec,
+        battery: BatterySpec,
+        inverter: InverterSpec,
+        contract_obj: ElectricityContract,
+        grid_series: pd.Series | pd.DataFrame,
+        *,
+        discount_rate: float,
+        belpex_filter_path: str,
+    ) -> Dict[str, Any]:
+        """Annual grid cost and NPV for one simulated component set and contract."""
+        gc = GridCost(
+            consumption_data_df=grid_series,
+            file_path_BelpexFilter=belpex_filter_path,
+            electricity_contract=contract_obj,
+        )
+        annual_cost_year1 = gc.calculate_total_cost()
+        return self._result_from_annual_cost(
+            solar, battery, inverter, contract_obj, annual_cost_year1, discount_rate=discount_rate
+        )
+
+    def _result_from_annual_cost(
+        self,
+        solar: SolarSpec,
+        battery: BatterySpec,
+        inverter: InverterSpec,
+        contract_obj: ElectricityContract,
+        annual_cost_year1: float,
+        *,
+        discount_rate: float,
+    ) -> Dict[str, Any]:
+        """Result dict (capex, NPV, ...) for a known year-1 grid cost."""
+        capex = self._capex(solar, battery, inverter)
+        horizon = self._lifetime_horizon(solar, battery, inverter)
+        npv_cost = self._npv_cost(
+            annual_cost_year1, capex, solar, battery, inverter, horizon, discount_rate
+        )
+
+        return {
+            "solar": solar,
+            "battery": battery,
+            "inverter": inverter,
+            "contract": contract_obj,
+            "annual_cost_year1": float(annual_cost_year1),
+            "capex": float(capex),
+            "npv_cost": float(npv_cost),
+            "horizon_years": int(horizon),
+        }
+
     # ------------------------------------------------------------------
     # 1) Full component optimisation (components + contracts)
     # ------------------------------------------------------------------
@@ -187,15 +372,84 @@ class FinancialModel:
         solar_options: Iterable[SolarSpec],
         battery_options: Iterable[BatterySpec],
         inverter_options: Iterable[InverterSpec],
-        contract_options: Iterable[Union[ElectricityContract, Dict[str, Any]]],
+        contract_options: Union[ContractTable, Iterable[Union[ElectricityContract, Dict[str, Any]]]],
         top_k: Optional[int] = None,
         discount_rate: Optional[float] = None,
         belpex_filter_path: Optional[str] = None,
+        results_path: Optional[str] = None,
+        sink: Optional[TopKResultSink] = None,
+        search: str = "exhaustive",
+        representative_days: int = 12,
+        shortlist_fraction: float = 0.1,
+        checkpoint_path: Optional[str] = None,
+        resume: bool = False,
+        checkpoint_every: int = 50,
+        shard: Optional[Tuple[int, int]] = None,
+        progress: Any = None,
+        profile: Union[bool, str] = False,
     ) -> List[Dict[str, Any]]:
         """
         Evaluate every combination of (solar, battery, inverter, contract)
         and return results sorted by NPV of total cost (ascending).
 
+        `contract_options` may be a `ContractTable`; search="exhaustive"
+        then prices all contracts of a component set with one GridCost.
+
+        Results are collected in a `TopKResultSink`, so only the best `top_k`
+        are held in memory. Pass `results_path` to also append every result as
+        a compact CSV row, or pass a preconfigured `sink` (e.g. to rank on
+        another metric); `top_k` and `results_path` are ignored in that case.
+
+        search:
+            - "exhaustive": simulate every component set (default).
+            - "prune": branch-and-bound. Every combination first gets a cheap
+              lower bound on its NPV (capex + replacements + a lower bound on
+              the grid cost, see `financialmodel._bounds`). Combinations are
+              visited in bound order and the power-flow simulation is skipped
+              when the bound cannot beat the current k-th best. Returns the
+              same top-k as "exhaustive"; only useful with a finite `top_k`
+              and an `npv_cost` sink. Pruned combinations are not written to
+              `results_path`. Requires dispatch="greedy".
+            - "multifidelity": screen every combination on `representative_days`
+              typical days (see `representative_days()`), then re-simulate only
+              the best `shortlist_fraction` (at least `top_k`) on the full year.
+              Only the shortlisted, full-year results are ranked. Each of them
+              carries 'screening_npv_cost', and the approximation error of the
+              screening vs the full year is summarised in
+              `self.last_search_stats['approximation_error']`. Shortlisted
+              combinations whose full-year simulation fails are skipped and
+              counted in `self.last_search_stats['skipped']`.
+
+        Counts of simulated/pruned combinations are stored in
+        `self.last_search_stats`.
+
+        checkpoint_path / resume:
+            With `checkpoint_path`, every completed (components, contract)
+            evaluation is appended to that file (flushed every
+            `checkpoint_every` evaluations, see `financialmodel._checkpoint`).
+            A killed run restarted with `resume=True` and the same arguments
+            skips the completed work and merges the checkpointed results;
+            `results_path` is rewritten from scratch in that case.
+            Supported for search="exhaustive" and "prune".
+
+        shard:
+            (i, n) evaluates only the i-th of n contiguous blocks of the
+            (solar, battery, inverter) combinations, so n machines can split
+            a sweep. Combine the per-shard results with
+            `financialmodel._shards.merge_shards`. Supported for
+            search="exhaustive" and "prune".
+
+        progress:
+            Progress/telemetry per simulated component set (True, a callback,
+            a logger or a `powercalculations.progress.ProgressReporter`).
+            Silent by default.
+
+        profile:
+            True (or a directory) runs the sweep under cProfile/tracemalloc
+            and writes per-stage stats and the profiler reports next to
+            `results_path` (or into the directory), see
+            `powercalculations.profiling.profile_run`.
+
         Returns a list of dicts with keys:
             - 'solar', 'battery', 'inverter', 'contract'
             - 'annual_cost_year1'
@@ -207,75 +461,382 @@ class FinancialModel:
             discount_rate = self.discount_rate
         if belpex_filter_path is None:
             belpex_filter_path = self.belpex_filter_path
+        solar_options = list(solar_options)
+        battery_options = list(battery_options)
+        inverter_options = list(inverter_options)
+        contract_table = contract_options if isinstance(contract_options, ContractTable) else None
+        contract_options = list(contract_options)
 
-        results: List[Dict[str, Any]] = []
+        if search not in ("exhaustive", "prune", "multifidelity"):
+            raise ValueError("search must be 'exhaustive', 'prune' or 'multifidelity'")
+        if search == "prune" and self.dispatch != "greedy":
+            # the grid cost bound assumes the battery never charges from the grid
+            raise ValueError("search='prune' is only supported with dispatch='greedy'")
+        if (checkpoint_path or shard is not None) and search == "multifidelity":
+            raise ValueError("checkpointing and sharding are only supported for search='exhaustive' or 'prune'")
+        n_sets = len(solar_options) * len(battery_options) * len(inverter_options)
+        shard_range = range(*shard_bounds(n_sets, shard))
 
-        for solar in solar_options:
-            for battery in battery_options:
-                for inverter in inverter_options:
-                    # 1) grid time series for this component combo
-                    try:
-                        grid_series = self._compute_grid_series(solar, battery, inverter)
-                    except Exception as exc:  # noqa: BLE001
-                        # skip invalid / failing combinations
-                        continue
+        checkpoint = open_checkpoint(
+            checkpoint_path,
+            sweep_signature(
+                "optimise_components", solar_options, battery_options, inverter_options,
+                contract_options, discount_rate, self._pickled_path(), belpex_filter_path, shard,
+                # a non-greedy controller changes every GridFlow series
+                *(() if self.dispatch == "greedy" else
+                  (self.dispatch, self._dispatch_contract(), sorted(self.dispatch_options.items()))),
+            ),
+            resume=resume,
+            every=checkpoint_every,
+            results_path=results_path,
+        )
+        if sink is None:
+            sink = TopKResultSink(top_k, metric="npv_cost", columnar_path=results_path)
+
+        options = dict(
+            solar_options=solar_options,
+            battery_options=battery_options,
+            inverter_options=inverter_options,
+            contract_options=contract_options,
+            discount_rate=discount_rate,
+            belpex_filter_path=belpex_filter_path,
+            sink=sink,
+            progress=as_reporter(progress),
+        )
+        try:
+            with profile_option(profile, results_path):
+                if search == "exhaustive":
+                    return self._optimise_components_exhaustive(
+                        **options, checkpoint=checkpoint, shard_range=shard_range, contract_table=contract_table,
+                    )
+                if search == "prune":
+                    return self._optimise_components_pruned(**options, checkpoint=checkpoint, shard_range=shard_range)
+                return self._optimise_components_multifidelity(
+                    **options,
+                    representative_days=representative_days,
+                    shortlist_fraction=shortlist_fraction,
+                )
+        finally:
+            # flush completed work even when the sweep is interrupted
+            if checkpoint is not None:
+                checkpoint.close()
+
+    def _optimise_components_exhaustive(
+        self,
+        *,
+        solar_options: List[SolarSpec],
+        battery_options: List[BatterySpec],
+        inverter_options: List[InverterSpec],
+        contract_options: List[ElectricityContract],
+        discount_rate: float,
+        belpex_filter_path: str,
+        sink: TopKResultSink,
+        checkpoint: Optional[ResultCheckpoint] = None,
+        shard_range: Optional[range] = None,
+        contract_table: Optional[ContractTable] = None,
+        progress: ProgressReporter = SILENT,
+    ) -> List[Dict[str, Any]]:
+        """Evaluate every combination (search="exhaustive")."""
+        n_b, n_i, n_c = len(battery_options), len(inverter_options), len(contract_options)
+        n_simulated = 0
+        n_resumed = 0
+        n_sets = len(shard_range) if shard_range is not None else len(solar_options) * n_b * n_i
+        with progress.stage("optimise_components", total=n_sets) as stage:
+            for si, solar in enumerate(solar_options):
+                for bi, battery in enumerate(battery_options):
+                    for ii, inverter in enumerate(inverter_options):
+                        if shard_range is not None and (si * n_b + bi) * n_i + ii not in shard_range:
+                            continue
+                        stage.advance()
+                        orders = [((si * n_b + bi) * n_i + ii) * n_c + ci for ci in range(n_c)]
+
+                        # 0) already done in an earlier, interrupted run
+                        if checkpoint is not None and all(o in checkpoint for o in orders):
+                            for o in orders:
+                                if checkpoint.completed[o] is not None:
+                                    sink.add(checkpoint.completed[o])
+                            n_resumed += 1
+                            continue
+
+                        # 1) grid time series for this component combo
+                        try:
+                            grid_series = self._compute_grid_series(solar, battery, inverter)
+                        except Exception as exc:  # noqa: BLE001
+                            # skip invalid / failing combinations
+                            logger.debug("Skipping solar=%r battery=%r inverter=%r: %r", solar, battery, inverter, exc)
+                            if checkpoint is not None:
+                                for o in orders:
+                                    checkpoint.record(o, None)
+                            continue
+                        n_simulated += 1
+
+                        # 2) annual cost + NPV per contract
+                        if contract_table is not None:
+                            # all contracts in one pass over the grid series
+                            annual_costs = GridCost(
+                                consumption_data_df=grid_series,
+                                file_path_BelpexFilter=belpex_filter_path,
+                                electricity_contract=contract_table,
+                            ).calculate_total_cost()
+                        for ci, (order, contract_obj) in enumerate(zip(orders, contract_options)):
+                            if checkpoint is not None and order in checkpoint:
+                                result = checkpoint.completed[order]
+                            elif contract_table is not None:
+                                result = self._result_from_annual_cost(
+                                    solar, battery, inverter, contract_obj, annual_costs[ci],
+                                    discount_rate=discount_rate,
+                                )
+                                if checkpoint is not None:
+                                    checkpoint.record(order, result)
+                            else:
+                                result = self._evaluate_combination(
+                                    solar,
+                                    battery,
+                                    inverter,
+                                    contract_obj,
+                                    grid_series,
+                                    discount_rate=discount_rate,
+                                    belpex_filter_path=belpex_filter_path,
+                                )
+                                if checkpoint is not None:
+                                    checkpoint.record(order, result)
+                            sink.add(result)
+
+        self.last_search_stats = {
+            "search": "exhaustive",
+            "simulated": n_simulated,
+            "pruned": 0,
+            "resumed": n_resumed,
+        }
+
+        # best (lowest NPV of cost) first
+        sink.close()
+        return sink.results()
+
+    def _grid_cost_envelope(
+        self,
+        series: pd.Series,
+        contract_obj: ElectricityContract,
+        belpex_filter_path: str,
+    ) -> GridCost:
+        return GridCost(
+            consumption_data_df=series.rename("GridFlow"),
+            file_path_BelpexFilter=belpex_filter_path,
+            electricity_contract=contract_obj,
+        )
+
+    def _optimise_components_pruned(
+        self,
+        *,
+        solar_options: List[SolarSpec],
+        battery_options: List[BatterySpec],
+        inverter_options: List[InverterSpec],
+        contract_options: List[ElectricityContract],
+        discount_rate: float,
+        belpex_filter_path: str,
+        sink: TopKResultSink,
+        checkpoint: Optional[ResultCheckpoint] = None,
+        shard_range: Optional[range] = None,
+        progress: ProgressReporter = SILENT,
+    ) -> List[Dict[str, Any]]:
+        """Branch-and-bound variant of `optimise_components` (search="prune")."""
+        base = self._load_irradiance()
+        offtake = -base.pd["Load_kW"].astype(float)
+
+        # Envelope GridCosts: the offtake side only depends on the contract,
+        # the injection side on (solar, inverter, contract).
+        offtake_envelopes = [
+            self._grid_cost_envelope(offtake, c, belpex_filter_path) for c in contract_options
+        ]
+
+        n_b, n_i, n_c = len(battery_options), len(inverter_options), len(contract_options)
+        candidates: List[Tuple[float, int, int, int, int, int]] = []
 
+        for si, solar in enumerate(solar_options):
+            base.PV_generated_power(
+                cell_area=solar.panel_surface,
+                panel_count=solar.solar_panel_count,
+                T_STC=25,
+                efficiency_max=solar.panel_efficiency * (1 - solar.annual_degredation / 100.0),
+                Temp_coeff=solar.temperature_coefficient,
+            )
+            pv = base.pd["PV_generated_power"].astype(float).clip(lower=0)
+
+            for ii, inverter in enumerate(inverter_options):
+                injection = pv.clip(upper=inverter.DC_solar_panels).clip(upper=inverter.AC_output).clip(lower=0)
+                annual_lb = [
+                    grid_cost_lower_bound(
+                        offtake_envelopes[ci],
+                        self._grid_cost_envelope(injection, c, belpex_filter_path),
+                    )
+                    for ci, c in enumerate(contract_options)
+                ]
+
+                for bi, battery in enumerate(battery_options):
+                    if shard_range is not None and (si * n_b + bi) * n_i + ii not in shard_range:
+                        continue
                     capex = self._capex(solar, battery, inverter)
                     horizon = self._lifetime_horizon(solar, battery, inverter)
+                    for ci in range(n_c):
+                        bound = self._npv_cost(
+                            annual_lb[ci], capex, solar, battery, inverter, horizon, discount_rate
+                        )
+                        order = ((si * n_b + bi) * n_i + ii) * n_c + ci
+                        candidates.append((bound, order, si, bi, ii, ci))
 
-                    for c in contract_options:
-                        contract_obj = c
+        candidates.sort()
 
-                        # 2) annual cost using GridCost + ElectricityContract
-                        gc = GridCost(
-                            consumption_data_df=grid_series,
-                            file_path_BelpexFilter=belpex_filter_path,
-                            electricity_contract=contract_obj,
-                        )
-                        annual_cost_year1 = gc.calculate_total_cost(
-                            tariff=contract_obj.contract_type
-                            if contract_obj.contract_type
-                            else self.default_tariff
-                        )
+        failed: set = set()
+        simulated: set = set()
+        n_pruned = 0
+        n_resumed = 0
+        with progress.stage("optimise_components.prune", total=len(candidates)) as stage:
+            for bound, order, si, bi, ii, ci in candidates:
+                stage.advance()
+                if not sink.would_accept(bound, order):
+                    n_pruned += 1
+                    continue
+                if checkpoint is not None and order in checkpoint:
+                    if checkpoint.completed[order] is not None:
+                        sink.add(checkpoint.completed[order], order=order)
+                    n_resumed += 1
+                    continue
+                if (si, bi, ii) in failed:
+                    continue
 
-                        # 3) NPV of costs (capex + yearly OPEX + replacements)
-                        npv_cost = capex  # year 0 capex (undiscounted)
-                        deg = solar.annual_degredation / 100.0
-
-                        for year in range(1, horizon + 1):
-                            # scale OPEX with degradation approx.
-                            operating_cost = annual_cost_year1 * ((1 + deg) ** (year - 1))
-
-                            # replacement costs at end-of-life years
-                            replacement = 0.0
-                            if year % int(solar.solar_panel_lifetime) == 0:
-                                replacement += solar.total_solar_panel_cost
-                            if year % int(battery.battery_lifetime) == 0:
-                                replacement += battery.total_battery_cost
-                            if year % int(inverter.inverter_lifetime) == 0:
-                                replacement += inverter.inverter_cost
-
-                            yearly_cost = operating_cost + replacement
-                            npv_cost += yearly_cost / ((1 + discount_rate) ** year)
-
-                        results.append(
-                            {
-                                "solar": solar,
-                                "battery": battery,
-                                "inverter": inverter,
-                                "contract": contract_obj,
-                                "annual_cost_year1": float(annual_cost_year1),
-                                "capex": float(capex),
-                                "npv_cost": float(npv_cost),
-                                "horizon_years": int(horizon),
-                            }
-                        )
+                solar, battery, inverter = solar_options[si], battery_options[bi], inverter_options[ii]
+                try:
+                    grid_series = self._compute_grid_series(solar, battery, inverter)
+                except Exception:  # noqa: BLE001
+                    # skip invalid / failing combinations (as in the exhaustive search)
+                    failed.add((si, bi, ii))
+                    if checkpoint is not None:
+                        checkpoint.record(order, None)
+                    continue
+                simulated.add((si, bi, ii))
 
-        # sort by NPV of cost (lower is better)
-        results.sort(key=lambda r: r["npv_cost"])
-        if top_k is not None:
-            results = results[:top_k]
-        return results
+                result = self._evaluate_combination(
+                    solar,
+                    battery,
+                    inverter,
+                    contract_options[ci],
+                    grid_series,
+                    discount_rate=discount_rate,
+                    belpex_filter_path=belpex_filter_path,
+                )
+                if checkpoint is not None:
+                    checkpoint.record(order, result)
+                sink.add(result, order=order)
+
+        self.last_search_stats = {
+            "search": "prune",
+            "simulated": len(simulated),
+            "pruned": n_pruned,
+            "resumed": n_resumed,
+        }
+
+        sink.close()
+        return sink.results()
+
+    def _optimise_components_multifidelity(
+        self,
+        *,
+        solar_options: List[SolarSpec],
+        battery_options: List[BatterySpec],
+        inverter_options: List[InverterSpec],
+        contract_options: List[ElectricityContract],
+        discount_rate: float,
+        belpex_filter_path: str,
+        sink: TopKResultSink,
+        representative_days: int,
+        shortlist_fraction: float,
+        progress: ProgressReporter = SILENT,
+    ) -> List[Dict[str, Any]]:
+        """Screen on representative days, re-simulate the shortlist (search="multifidelity")."""
+        if not 0 < shortlist_fraction <= 1:
+            raise ValueError("shortlist_fraction must be in (0, 1]")
+        days = self.representative_days(representative_days, belpex_filter_path)
+
+        # 1) screening on the reduced year
+        screened: List[Tuple[float, int, int, int, int, int]] = []
+        n_b, n_i, n_c = len(battery_options), len(inverter_options), len(contract_options)
+        n_screened = 0
+        n_sets = len(solar_options) * n_b * n_i
+        with progress.stage("optimise_components.screening", total=n_sets) as stage:
+            for si, solar in enumerate(solar_options):
+                for bi, battery in enumerate(battery_options):
+                    for ii, inverter in enumerate(inverter_options):
+                        stage.advance()
+                        try:
+                            grid_series = self._compute_grid_series(solar, battery, inverter, days=days)
+                        except Exception as exc:  # noqa: BLE001
+                            logger.debug("Skipping solar=%r battery=%r inverter=%r: %r", solar, battery, inverter, exc)
+                            continue
+                        n_screened += 1
+                        for ci, contract_obj in enumerate(contract_options):
+                            approx = self._evaluate_combination(
+                                solar, battery, inverter, contract_obj, grid_series,
+                                discount_rate=discount_rate, belpex_filter_path=belpex_filter_path,
+                            )
+                            order = ((si * n_b + bi) * n_i + ii) * n_c + ci
+                            screened.append((approx["npv_cost"], order, si, bi, ii, ci))
+
+        # 2) full-year re-simulation of the shortlist
+        screened.sort()
+        n_short = int(np.ceil(shortlist_fraction * len(screened)))
+        if sink.top_k is not None:
+            n_short = max(n_short, sink.top_k)
+        shortlist = screened[:n_short]
+
+        simulated: set = set()
+        failed: set = set()
+        n_skipped = 0
+        errors = []
+        with progress.stage("optimise_components.shortlist", total=len(shortlist)) as stage:
+            for approx_npv, order, si, bi, ii, ci in shortlist:
+                stage.advance()
+                if (si, bi, ii) in failed:
+                    n_skipped += 1
+                    continue
+                solar, battery, inverter = solar_options[si], battery_options[bi], inverter_options[ii]
+                try:
+                    grid_series = self._compute_grid_series(solar, battery, inverter)
+                except Exception as exc:  # noqa: BLE001
+                    # feasible on the representative days, not over the full year
+                    logger.debug("Skipping solar=%r battery=%r inverter=%r: %r", solar, battery, inverter, exc)
+                    failed.add((si, bi, ii))
+                    n_skipped += 1
+                    continue
+                simulated.add((si, bi, ii))
+
+                result = self._evaluate_combination(
+                    solar, battery, inverter, contract_options[ci], grid_series,
+                    discount_rate=discount_rate, belpex_filter_path=belpex_filter_path,
+                )
+                result["screening_npv_cost"] = float(approx_npv)
+                errors.append((approx_npv - result["npv_cost"], result["npv_cost"]))
+                sink.add(result, order=order)
+
+        abs_err = np.array([abs(e) for e, _ in errors])
+        rel_err = np.array([abs(e) / abs(full) if full else np.nan for e, full in errors])
+        self.last_search_stats = {
+            "search": "multifidelity",
+            "representative_days": days.k,
+            "screened": n_screened,
+            "shortlisted": len(shortlist),
+            "simulated": len(simulated),
+            "skipped": n_skipped,
+            "pruned": len(screened) - len(shortlist),
+            "approximation_error": {
+                "mean_abs": float(abs_err.mean()) if len(errors) else 0.0,
+                "max_abs": float(abs_err.max()) if len(errors) else 0.0,
+                "mean_rel": float(np.nanmean(rel_err)) if len(errors) else 0.0,
+                "max_rel": float(np.nanmax(rel_err)) if len(errors) else 0.0,
+            },
+        }
+
+        sink.close()
+        return sink.results()
 
     # ------------------------------------------------------------------
     # 2) Contract-only optimisation (existing grid time series)
@@ -284,7 +845,7 @@ class FinancialModel:
     def optimise_contracts_from_consumption(
         self,
         *,
-        contracts: Iterable[Union[ElectricityContract, Dict[str, Any]]],
+        contracts: Union[ContractTable, Iterable[Union[ElectricityContract, Dict[str, Any]]]],
         consumption_data_df: Optional[pd.DataFrame | pd.Series] = None,
         consumption_data_csv: str = "",
         horizon_years: int = 20,
@@ -301,6 +862,8 @@ class FinancialModel:
         - `consumption_data_df` may be a DataFrame or Series with a DateTime
           index and a GridFlow column (or first numeric col used as GridFlow).
         - `consumption_data_csv` is a CSV in the format accepted by GridCost.
+        - `contracts` may be a `ContractTable`: all contracts are then priced
+          with a single GridCost.
 
         Returns a list of dicts sorted by NPV of cost (ascending) with keys:
             - 'contract'
@@ -318,7 +881,36 @@ class FinancialModel:
         if belpex_filter_path is None:
             belpex_filter_path = self.belpex_filter_path
 
-        results: List[Dict[str, Any]] = []
+        sink = TopKResultSink(top_k, metric="npv_cost")
+
+        if isinstance(contracts, ContractTable):
+            gc = GridCost(
+                consumption_data_df=consumption_data_df,
+                consumption_data_csv=consumption_data_csv,
+                file_path_BelpexFilter=belpex_filter_path,
+                electricity_contract=contracts,
+            )
+            breakdown = gc.calculate_total_cost(return_breakdown=True)
+            annual_costs = breakdown["total_cost"]
+
+            npv_costs = np.zeros(len(contracts))
+            for year in range(1, horizon_years + 1):
+                npv_costs += annual_costs / ((1 + discount_rate) ** year)
+
+            for i, contract_obj in enumerate(contracts):
+                entry = {
+                    "contract": contract_obj,
+                    "annual_cost_year1": float(annual_costs[i]),
+                    "npv_cost": float(npv_costs[i]),
+                    "horizon_years": int(horizon_years),
+                }
+                if return_breakdown:
+                    entry["breakdown"] = {
+                        k: float(v[i]) if isinstance(v, np.ndarray) else v
+                        for k, v in breakdown.items()
+                    }
+                sink.add(entry)
+            return sink.results()
 
         for c in contracts:
             contract_obj = c
@@ -352,13 +944,121 @@ class FinancialModel:
                     return_breakdown=True
                 )
 
+            sink.add(entry)
+
+        return sink.results()
+
+    def contract_cost_distributions(
+        self,
+        *,
+        contracts: Iterable[ElectricityContract],
+        consumption_data_df: Optional[pd.DataFrame | pd.Series] = None,
+        consumption_data_csv: str = "",
+        scenarios: Optional[Union[PriceScenarios, Callable[[pd.DatetimeIndex], PriceScenarios]]] = None,
+        n_scenarios: int = 1000,
+        block_days: int = 1,
+        seasonal_window: Optional[int] = 45,
+        seed: int = 0,
+        alpha: float = 0.95,
+        rank_by: str = "mean",
+        belpex_filter_path: Optional[str] = None,
+        return_costs: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Distribution of the yearly cost of each contract over Belpex price scenarios.
+
+        `scenarios` is a `PriceScenarios` built on the GridCost index (1h
+        resampled consumption) or a callable index -> PriceScenarios. By
+        default `n_scenarios` paths are bootstrapped from whole days of the
+        Belpex history in `belpex_filter_path` (see
+        `PriceScenarios.bootstrap_days` for `block_days`/`seasonal_window`).
+
+        Every contract is costed against all paths at once
+        (`GridCost.price_scenario_costs`), so the number of scenarios barely
+        affects the run time. Returns one dict per contract, sorted on
+        `rank_by` ('mean', 'p95', 'cvar', ...) ascending:
+            - 'contract'
+            - 'cost_distribution' (mean, std, p5, p50, p95, var, cvar; see `summarise_costs`)
+            - 'costs' (per-scenario yearly cost, if return_costs=True)
+        """
+        if consumption_data_df is None and not consumption_data_csv:
+            raise ValueError(
+                "You must provide either `consumption_data_df` or `consumption_data_csv`."
+            )
+        if belpex_filter_path is None:
+            belpex_filter_path = self.belpex_filter_path
+
+        built: Optional[PriceScenarios] = None
+        results = []
+        for contract_obj in contracts:
+            # prices come from the scenarios, so skip the Belpex merge
+            gc = GridCost(
+                consumption_data_df=consumption_data_df,
+                consumption_data_csv=consumption_data_csv,
+                file_path_BelpexFilter="",
+                electricity_contract=contract_obj,
+            )
+
+            if built is None or not built.index.equals(gc.pd.index):
+                if isinstance(scenarios, PriceScenarios):
+                    built = scenarios
+                elif scenarios is not None:
+                    built = scenarios(gc.pd.index)
+                else:
+                    if not belpex_filter_path or not os.path.isfile(belpex_filter_path):
+                        raise FileNotFoundError(f"BelpexFilter file not found: {belpex_filter_path}")
+                    history = pd.read_csv(belpex_filter_path, parse_dates=["DateTime"]).set_index("DateTime")["BelpexFilter"]
+                    built = PriceScenarios.bootstrap_days(
+                        history, gc.pd.index, n_scenarios,
+                        block_days=block_days, seasonal_window=seasonal_window, seed=seed,
+                    )
+
+            costs = gc.price_scenario_costs(built)
+            entry: Dict[str, Any] = {
+                "contract": contract_obj,
+                "cost_distribution": summarise_costs(costs, alpha=alpha),
+            }
+            if return_costs:
+                entry["costs"] = costs
             results.append(entry)
 
-        results.sort(key=lambda r: r["npv_cost"])
-        if top_k is not None:
-            results = results[:top_k]
+        results.sort(key=lambda r: r["cost_distribution"][rank_by])
         return results
 
+    def sensitivity_analysis(
+        self,
+        results: List[Dict[str, Any]],
+        *,
+        param_grid: Optional[Dict[str, List[float]]] = None,
+        ranges: Optional[Dict[str, Tuple[float, float]]] = None,
+        top_n: int = 3,
+        config: int = 0,
+        discount_rate: Optional[float] = None,
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        Re-rank finished `optimise_components` results under other financial
+        assumptions, without re-simulating (see `financialmodel._sensitivity`).
+
+        - `param_grid` (e.g. {'discount_rate': [0.03, 0.05, 0.07],
+          'escalation': [0, 0.02]}) gives the 'sweep' table (NPV and rank of
+          every result per scenario) and the 'rank_stability' table.
+        - `ranges` (name -> (low, high)) gives the 'tornado' table for
+          `results[config]` (by default the best result).
+
+        `discount_rate` is the rate the results were computed with
+        (default: the model's).
+        """
+        if discount_rate is None:
+            discount_rate = self.discount_rate
+
+        tables: Dict[str, pd.DataFrame] = {}
+        if param_grid:
+            tables["sweep"] = sensitivity_sweep(results, param_grid, discount_rate=discount_rate)
+            tables["rank_stability"] = rank_stability_table(tables["sweep"], top_n=top_n)
+        if ranges:
+            tables["tornado"] = tornado_table(results, ranges, discount_rate=discount_rate, config=config)
+        return tables
+
     from financialmodel._getters import (
         get_optimisation_cost_curve_data,
     )
@@ -3,7 +3,6 @@ from dataclasses import dataclass
 
 from dataclasses import dataclass, asdict
 from typing import Any, Dict, Optional
-import pdfplumber
 import re
 @dataclass
 class SolarSpec:
@@ -202,6 +201,8 @@ class ElectricityContract:
         if not os.path.isfile(pdf_path):
             raise FileNotFoundError(pdf_path)
 
+        import pdfplumber  # optional dependency, only needed for PDF parsing
+
         pages_text: list[str] = []
         with pdfplumber.open(str(pdf_path)) as pdf:
             for page in pdf.pages:
@@ -278,8 +279,6 @@ from datetime import datetime
 from pathlib import Path
 from typing import Optional, Tuple, Dict, List, Any
 
-import pdfplumber
-
 
 # -----------------------------
 # Helpers
@@ -298,6 +297,8 @@ def _read_pdf_text(pdf_path: str) -> str:
     Extract selectable text from a PDF.
     If your PDFs are scanned images, pass text_override to from_pdf (OCR output).
     """
+    import pdfplumber  # optional dependency, only needed for PDF parsing
+
     parts: List[str] = []
     with pdfplumber.open(pdf_path) as pdf:
         for page in pdf.pages:
@@ -561,6 +562,11 @@ def _build_notes(contract, formulas: Dict[str, Any], region: str) -> str:
     return " | ".join(parts)
 
 
+# Version of the parsing rules below. Bump it whenever they change, so cached
+# parsed contracts (see financialmodel.contract_library) are not reused.
+PARSER_VERSION = 1
+
+
 # Paste the following inside class ElectricityContract:
 #
 # @classmethod
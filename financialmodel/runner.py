@@ -1,21 +1,48 @@
 """Orchestration utilities for running searches and returning structured results."""
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple, Union
 from financialmodel.costs import make_cost_fn
 from financialmodel._optimizer import grid_search
+from financialmodel._search import STRATEGIES
+from powercalculations.profiling import profile_option
 
 
 class OptimizerRunner:
-    def __init__(self, *, orientation: str = "S", tilt_angle: int = 30, tariff: str = "DynamicTariff", discount_rate: float = 0.05, pkl_path: str = None, cache: dict = None):
+    def __init__(self, *, orientation: str = "S", tilt_angle: int = 30, tariff: str = "DynamicTariff", discount_rate: float = 0.05, pkl_path: str = None, cache: dict = None, belpex_filter_path: str = ""):
         self.orientation = orientation
         self.tilt_angle = tilt_angle
         self.tariff = tariff
         self.discount_rate = discount_rate
         self.pkl_path = pkl_path
         self.cache = cache
+        self.belpex_filter_path = belpex_filter_path
+        self.last_trajectory: List[Dict[str, Any]] = []
 
-    def grid_search(self, param_grid: Dict[str, list], top_k: int = 10, progress: bool = False) -> List[Dict[str, Any]]:
+    def grid_search(self, param_grid: Dict[str, list], top_k: int = 10, progress: Any = False, results_path: Optional[str] = None, strategy: str = "exhaustive", budget: Optional[int] = None, seed: int = 0, checkpoint_path: Optional[str] = None, resume: bool = False, shard: Optional[Tuple[int, int]] = None, profile: Union[bool, str] = False, **strategy_kwargs) -> List[Dict[str, Any]]:
         """Run grid search over param_grid using the cost function and return top_k detailed results.
 
+        If `results_path` is given, every evaluated combination is also appended
+        to that CSV file as a compact row (see `financialmodel._results.compact_row`).
+
+        `strategy` selects how the grid is explored:
+        - "exhaustive": every combination (default)
+        - "coordinate", "halving", "bayesian": budgeted searches from
+          `financialmodel._search`, evaluating at most `budget` combinations
+          (default 10% of the grid). Extra keyword arguments are passed to the
+          strategy. The best-found-vs-evaluations trajectory is stored in
+          `self.last_trajectory`.
+
+        With `checkpoint_path`, completed combinations of an exhaustive search
+        are checkpointed to that file; `resume=True` continues an interrupted
+        run from it (see `financialmodel._optimizer.grid_search`).
+
+        `shard=(i, n)` restricts an exhaustive search to its deterministic
+        slice of the grid; combine the per-shard outputs with
+        `financialmodel._shards.merge_shards(..., metric="cost")`.
+
+        `profile=True` writes a profiling report (stage timings, cProfile and
+        memory, see `powercalculations.profiling.profile_run`) next to
+        `results_path`; a string is used as the report directory.
+
         param_grid should contain keys matching the params expected by the cost function builder.
         Example params shape: {'solar': {...}, 'battery': {...}, 'inverter': {...}, 'contract': {...}}
         But grid_search expects flat parameter dicts; callers can construct a grid where each param is either a nested dict or a primitive.
@@ -27,19 +54,37 @@ class OptimizerRunner:
             discount_rate=self.discount_rate,
             pkl_path=self.pkl_path,
             cache=self.cache,
+            belpex_filter_path=self.belpex_filter_path,
         )
 
-        # Use existing grid_search utility to obtain top param combos
-        top_params = grid_search(param_grid, cost_fn, top_k=top_k, progress=progress)
-
-        # Enrich with metrics
-        detailed_results = []
-        for entry in top_params:
-            params = entry["params"]
-            try:
-                metrics = compute_metrics(params)
-            except Exception as e:
-                metrics = {"error": str(e)}
-            detailed_results.append({"params": params, "cost": entry["cost"], "metrics": metrics})
+        with profile_option(profile, results_path):
+            # Use existing grid_search utility to obtain top param combos
+            if strategy == "exhaustive":
+                top_params = grid_search(
+                    param_grid, cost_fn, top_k=top_k, progress=progress, results_path=results_path,
+                    checkpoint_path=checkpoint_path, resume=resume, shard=shard,
+                )
+                self.last_trajectory = []
+            elif checkpoint_path or resume or shard is not None:
+                raise ValueError("checkpoint/resume/shard are only supported for strategy='exhaustive'")
+            elif strategy in STRATEGIES:
+                search = STRATEGIES[strategy](
+                    param_grid, cost_fn, budget=budget, top_k=top_k, seed=seed,
+                    progress=progress, results_path=results_path, **strategy_kwargs,
+                )
+                top_params = search.results
+                self.last_trajectory = search.trajectory
+            else:
+                raise ValueError(f"Unknown search strategy: {strategy}")
+
+            # Enrich with metrics
+            detailed_results = []
+            for entry in top_params:
+                params = entry["params"]
+                try:
+                    metrics = compute_metrics(params)
+                except Exception as e:
+                    metrics = {"error": str(e)}
+                detailed_results.append({"params": params, "cost": entry["cost"], "metrics": metrics})
 
         return detailed_results
@@ -4,8 +4,6 @@ from pathlib import Path
 from typing import Union, Optional
 
 import pandas as pd
-import requests
-from requests.exceptions import SSLError, RequestException
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +20,10 @@ def _fetch_belpex_html(url: str) -> Optional[str]:
     - If that fails with an SSL error, retry once with verify=False (INSECURE).
       This is a pragmatic workaround for corporate / broken CA setups.
     """
+    # imported here: only the Belpex update needs network access
+    import requests
+    from requests.exceptions import SSLError, RequestException
+
     try:
         resp = requests.get(url, timeout=15)
         resp.raise_for_status()
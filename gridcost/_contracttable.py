@@ -0,0 +1,266 @@
+"""
+Many electricity contracts as columns, and the cost of all of them at once.
+
+`ContractTable` keeps N contracts as one NumPy array per `ElectricityContract`
+field instead of N dataclass instances. Iterating over a table (or indexing
+it) yields regular `ElectricityContract` objects, so code written for lists
+of contracts keeps working; FinancialModel accepts a table wherever it takes
+a list of contracts.
+
+With a table as `electricity_contract`, `GridCost.calculate_total_cost`
+prices every contract against one GridFlow series (`contract_table_costs`).
+For a fixed series both tariffs are linear in the contract fields:
+
+    DualTariff:    sum over rows of rate(sign, peak) * |GridFlow| / 100
+    DynamicTariff: sum over rows of 0.01 * (-GridFlow) * (var * p + fix)
+
+so the series is reduced once to a few aggregates per (consumption/injection,
+peak/off-peak) class, and every contract's energy cost is a dot product of
+its rate columns with those aggregates. The non-energy components only need
+the kWh totals, which are shared by all contracts.
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import fields
+from typing import Any, Dict, Iterable, Iterator, List, Union
+
+import numpy as np
+import pandas as pd
+
+from financialmodel.contract_library import load_contract_pdfs
+from financialmodel.models import ElectricityContract
+from gridcost._scenarios import peak_mask
+from powercalculations.profiling import profiled, rows_of_self_pd
+
+# numeric tariff fields vs. string fields (contract_type + metadata)
+_FIELDS = [f.name for f in fields(ElectricityContract)]
+NUMERIC_FIELDS = [f.name for f in fields(ElectricityContract) if f.type in ("float", float)]
+TEXT_FIELDS = [name for name in _FIELDS if name not in NUMERIC_FIELDS]
+
+
+class ContractTable:
+    """
+    N electricity contracts as columns.
+
+    `columns[name]` is a float64 array for every numeric tariff field and an
+    object array for `contract_type` and the metadata fields.
+    """
+
+    def __init__(self, columns: Dict[str, Any]) -> None:
+        lengths = {len(v) for v in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"All columns need the same length, got {sorted(lengths)}")
+        n = lengths.pop() if lengths else 0
+
+        defaults = ElectricityContract()
+        self.columns: Dict[str, np.ndarray] = {}
+        for name in _FIELDS:
+            if name in columns:
+                values = columns[name]
+            else:
+                values = [getattr(defaults, name)] * n
+            dtype = float if name in NUMERIC_FIELDS else object
+            self.columns[name] = np.asarray(values, dtype=dtype)
+
+        unknown = set(columns) - set(_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown contract fields: {sorted(unknown)}")
+
+    # ------------------------------------------------------------------
+    # constructors
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_contracts(cls, contracts: Iterable[ElectricityContract]) -> "ContractTable":
+        contracts = list(contracts)
+        return cls({name: [getattr(c, name) for c in contracts] for name in _FIELDS})
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> "ContractTable":
+        """One row per contract, one column per `ElectricityContract` field (missing columns use defaults)."""
+        frame = frame.copy()
+        for name in TEXT_FIELDS:
+            if name in frame.columns:
+                frame[name] = frame[name].fillna("").astype(str)
+        return cls({name: frame[name].to_numpy() for name in frame.columns})
+
+    @classmethod
+    def from_csv(cls, path: str, **read_csv_kwargs) -> "ContractTable":
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Contract CSV not found: {path}")
+        return cls.from_frame(pd.read_csv(path, **read_csv_kwargs))
+
+    @classmethod
+    def from_pdf_dir(cls, directory: str, *, pattern: str = "*.pdf", **load_kwargs) -> "ContractTable":
+        """
+        Parse every PDF in `directory` with `electricity_contract_from_pdf`,
+        through the on-disk cache and process pool of
+        `financialmodel.contract_library.load_contract_pdfs` (which takes the
+        keyword arguments).
+        """
+        return cls.from_contracts(load_contract_pdfs(directory, pattern=pattern, **load_kwargs))
+
+    # ------------------------------------------------------------------
+    # access
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.columns["contract_type"])
+
+    def __getitem__(self, i: int) -> ElectricityContract:
+        kwargs = {}
+        for name, col in self.columns.items():
+            v = col[i]
+            kwargs[name] = float(v) if name in NUMERIC_FIELDS else v
+        return ElectricityContract(**kwargs)
+
+    def __iter__(self) -> Iterator[ElectricityContract]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_contracts(self) -> List[ElectricityContract]:
+        return list(self)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.columns)
+
+    def to_csv(self, path: str) -> None:
+        self.to_frame().to_csv(path, index=False)
+
+    def select(self, mask_or_indices) -> "ContractTable":
+        """Subset of the rows (boolean mask or integer indices)."""
+        return ContractTable({name: col[mask_or_indices] for name, col in self.columns.items()})
+
+    def is_type(self, contract_type: str) -> np.ndarray:
+        return self.columns["contract_type"] == contract_type
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        # table.dual_cons_peak -> column array, mirroring ElectricityContract attributes
+        columns = self.__dict__.get("columns")
+        if columns is not None and name in columns:
+            return columns[name]
+        raise AttributeError(name)
+
+    def __repr__(self) -> str:
+        types = pd.Series(self.columns["contract_type"]).value_counts().to_dict()
+        return f"ContractTable(n={len(self)}, types={types})"
+
+
+def as_contract_table(contracts: Union[ContractTable, Iterable[ElectricityContract]]) -> ContractTable:
+    return contracts if isinstance(contracts, ContractTable) else ContractTable.from_contracts(contracts)
+
+
+# (flow side, peak?) classes in the order of the aggregates below
+_CLASSES = (("cons", True), ("cons", False), ("inj", True), ("inj", False))
+
+
+def _class_masks(peak: np.ndarray, consumption: np.ndarray, injection: np.ndarray) -> list:
+    side = {"cons": consumption, "inj": injection}
+    return [side[s] & (peak if is_peak else ~peak) for s, is_peak in _CLASSES]
+
+
+def _dual_energy_costs(self, table) -> np.ndarray:
+    """`dual_tariff` summed, for every row of the table."""
+    g = self.pd["GridFlow"].to_numpy(dtype=float)
+    peak = peak_mask(self.pd.index)
+    # as in dual_tariff: g < 0 is consumption, everything else injection (NaN rows are skipped by the sum)
+    valid = ~np.isnan(g)
+    masks = _class_masks(peak, g < 0, valid & (g >= 0))
+    flow = [float(np.abs(g[m]).sum()) for m in masks]
+
+    rates = (table.dual_cons_peak, table.dual_cons_offpeak, table.dual_inj_peak, table.dual_inj_offpeak)
+    energy = np.zeros(len(table))
+    for rate, kwh in zip(rates, flow):
+        energy += rate * kwh
+    return energy / 100
+
+
+def _dynamic_energy_costs(self, table) -> np.ndarray:
+    """`dynamic_tariff` summed, for every row of the table."""
+    if "BelpexFilter" not in self.pd.columns:
+        raise ValueError(
+            "BelpexFilter column missing. Provide file_path_BelpexFilter in GridCost init."
+        )
+    g = self.pd["GridFlow"].to_numpy(dtype=float)
+    price = pd.to_numeric(self.pd["BelpexFilter"], errors="coerce").to_numpy(dtype=float)
+    peak = peak_mask(self.pd.index)
+    # rows without a price (or flow) cost nothing, as in dynamic_tariff
+    priced = ~np.isnan(price)
+    masks = _class_masks(peak, priced & (g < 0), priced & (g > 0))
+
+    var_cols = (
+        table.dynamic_cons_var_peak, table.dynamic_cons_var_offpeak,
+        table.dynamic_inj_var_peak, table.dynamic_inj_var_offpeak,
+    )
+    fix_cols = (
+        table.dynamic_cons_fix_peak, table.dynamic_cons_fix_offpeak,
+        table.dynamic_inj_fix_peak, table.dynamic_inj_fix_offpeak,
+    )
+    energy = np.zeros(len(table))
+    for m, var, fix in zip(masks, var_cols, fix_cols):
+        flow_price = float((-g[m] * price[m]).sum())
+        flow = float((-g[m]).sum())
+        energy += var * flow_price + fix * flow
+    return energy * 0.01
+
+
+@profiled("GridCost.contract_table_costs", rows=rows_of_self_pd)
+def contract_table_costs(self, *, return_breakdown: bool = False) -> np.ndarray | Dict[str, object]:
+    """
+    `calculate_total_cost` for every contract of a ContractTable.
+
+    Returns an array of yearly totals (one per contract, in table order), or
+    with `return_breakdown=True` the usual breakdown dict with arrays as
+    values.
+    """
+    table = self.electricity_contract
+    n = len(table)
+    is_dual = table.is_type("DualTariff")
+    is_dynamic = table.is_type("DynamicTariff")
+    if not (is_dual | is_dynamic).all():
+        unknown = sorted(set(table.contract_type[~(is_dual | is_dynamic)]))
+        raise ValueError(f"Unknown tariff type: {unknown}")
+
+    energy_cost = np.zeros(n)
+    if is_dual.any():
+        energy_cost = np.where(is_dual, self._dual_energy_costs(table), energy_cost)
+    if is_dynamic.any():
+        energy_cost = np.where(is_dynamic, self._dynamic_energy_costs(table), energy_cost)
+
+    inj_peak, inj_offpeak, cons_peak, cons_offpeak = self.get_total_injection_and_consumption()
+
+    # Capacity cost: same fallback as the single-contract path
+    try:
+        capacity_cost = np.asarray(self.capacity_tariff(), dtype=float) * np.ones(n)
+    except Exception:
+        capacity_cost = np.zeros(n)
+
+    levy_base_kWh = cons_peak + cons_offpeak
+    # same components and order as _non_energy_costs
+    other = {
+        "data_management_cost": table.data_management_cost,
+        "purchase_cost_injection": table.purchase_rate_injection * (inj_peak + inj_offpeak) / 100,
+        "purchase_cost_consumption": table.purchase_rate_consumption * (cons_peak + cons_offpeak) / 100,
+        "capacity_cost": capacity_cost,
+        "levy_cost": (table.excise_duty + table.energy_contribution + table.green_power_fee) / 100 * levy_base_kWh,
+        "fixed_component": np.where(is_dual, table.dual_fix, table.dynamic_fix),
+    }
+
+    total_cost = energy_cost.copy()
+    for v in other.values():
+        total_cost = total_cost + v
+
+    if not return_breakdown:
+        return total_cost
+
+    return {
+        "total_cost": total_cost,
+        "energy_cost": energy_cost,
+        **other,
+        "injection_peak_kWh": float(inj_peak),
+        "injection_offpeak_kWh": float(inj_offpeak),
+        "consumption_peak_kWh": float(cons_peak),
+        "consumption_offpeak_kWh": float(cons_offpeak),
+        "GridCost_dataframe": self.pd,
+    }
@@ -1,5 +1,27 @@
-def dual_tariff(self) -> None:
-        """Calculates and fills the `DualTariff` column using `electricity_contract`."""
+import numpy as np
+
+from gridcost._scenarios import peak_mask
+from powercalculations.profiling import profiled, rows_of_self_pd
+
+
+def _dual_tariff_array(self) -> np.ndarray:
+        """`calculate_tariff_row` below on whole columns (same operations, same results)."""
+        c = self.electricity_contract
+        g = self.pd["GridFlow"].to_numpy(dtype=float)
+        peak = peak_mask(self.pd.index)
+        consumption = np.where(peak, c.dual_cons_peak, c.dual_cons_offpeak) * (-g)
+        injection = np.where(peak, c.dual_inj_peak, c.dual_inj_offpeak) * g
+        # NaN GridFlow is not < 0 and ends up in the injection branch, as in the row version
+        return np.where(g < 0, consumption, injection) / 100
+
+
+@profiled("GridCost.dual_tariff", rows=rows_of_self_pd)
+def dual_tariff(self, engine: str = "rows") -> None:
+        """
+        Calculates and fills the `DualTariff` column using `electricity_contract`.
+
+        engine="array" computes the column with numpy instead of row by row.
+        """
         if self.electricity_contract is None:
             raise ValueError("ElectricityContract is required for dual_tariff calculation.")
 
@@ -8,6 +30,12 @@ def dual_tariff(self) -> None:
         # Ensure GridFlow dtype
         self.pd["GridFlow"] = self.pd["GridFlow"].astype(float)
 
+        if engine == "array":
+            self.pd["DualTariff"] = _dual_tariff_array(self)
+            return
+        if engine != "rows":
+            raise ValueError(f"Unknown tariff engine: {engine}")
+
         def calculate_tariff_row(row):
             grid_flow = row["GridFlow"]
             dt = row.name
@@ -28,11 +56,3 @@ def dual_tariff(self) -> None:
             return cost/100
 
         self.pd["DualTariff"] = self.pd.apply(calculate_tariff_row, axis=1)
-
-
-
-        
-
-
-
-
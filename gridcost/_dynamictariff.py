@@ -1,16 +1,46 @@
 
+import numpy as np
 import pandas as pd
 
-def dynamic_tariff(self) -> None:
+from gridcost._scenarios import peak_mask
+from powercalculations.profiling import profiled, rows_of_self_pd
+
+
+def _dynamic_tariff_array(self) -> np.ndarray:
+        """`calculate_tariff_row` below on whole columns (same operations, same results)."""
+        c = self.electricity_contract
+        g = self.pd["GridFlow"].to_numpy(dtype=float)
+        price = pd.to_numeric(self.pd["BelpexFilter"], errors="coerce").to_numpy(dtype=float)
+        peak = peak_mask(self.pd.index)
+
+        cons_per = np.where(peak, c.dynamic_cons_var_peak * price + c.dynamic_cons_fix_peak,
+                            c.dynamic_cons_var_offpeak * price + c.dynamic_cons_fix_offpeak)
+        inj_per = np.where(peak, c.dynamic_inj_var_peak * price + c.dynamic_inj_fix_peak,
+                           c.dynamic_inj_var_offpeak * price + c.dynamic_inj_fix_offpeak)
+        priced = ~np.isnan(price)
+        cost = np.where(priced & (g < 0), (-g) * cons_per, np.where(priced & (g > 0), (-g) * inj_per, 0.0))
+        return cost * 0.01
+
+
+@profiled("GridCost.dynamic_tariff", rows=rows_of_self_pd)
+def dynamic_tariff(self, engine: str = "rows") -> None:
         """
         Calculates the dynamic tariff and fills the `DynamicTariff` column.
         Uses `BelpexFilter` prices.
+
+        engine="array" computes the column with numpy instead of row by row.
         """
         if "BelpexFilter" not in self.pd.columns:
             raise ValueError(
                 "BelpexFilter column missing. Provide file_path_BelpexFilter in GridCost init."
             )
 
+        if engine == "array":
+            self.pd["DynamicTariff"] = _dynamic_tariff_array(self)
+            return
+        if engine != "rows":
+            raise ValueError(f"Unknown tariff engine: {engine}")
+
         def calculate_tariff_row(row):
             grid_flow = row["GridFlow"]
             dynamic_cost = row["BelpexFilter"]  # €/MWh (assumption)
@@ -0,0 +1,248 @@
+"""
+Belpex price scenarios and vectorised DynamicTariff costing.
+
+`dynamic_tariff` prices one historical Belpex path. For a fixed GridFlow
+series the DynamicTariff energy cost is linear in the price of every
+interval:
+
+    cost_t(p_t) = 0.01 * (-GridFlow_t) * (var_t * p_t + fix_t)
+
+with var/fix picked by sign (consumption/injection) and peak/off-peak. So
+S price paths are costed at once as an (S x T) @ (T,) matrix product instead
+of S GridCost constructions. `PriceScenarios` builds the paths (bootstrapped
+historical days, seasonal block resampling, scaled/shifted curves, or an
+array you already have) and hands them out in batches, so 10 000 scenarios
+of a year never need to be in memory together.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+def peak_mask(index: pd.DatetimeIndex) -> np.ndarray:
+    """Weekdays 07:00-22:00 (same definition as the tariff functions)."""
+    return np.asarray((index.weekday < 5) & (index.hour >= 7) & (index.hour < 22))
+
+
+def _daily_profiles(history: pd.Series, freq: pd.Timedelta) -> tuple:
+    """(complete days, day x slot matrix) of a price history at `freq`."""
+    prices = history.astype(float).resample(freq).mean()
+    rows_per_day = int(pd.Timedelta(days=1) / freq)
+    days = prices.index.normalize()
+    counts = pd.Series(days).value_counts()
+    full_days = pd.DatetimeIndex(sorted(counts.index[counts == rows_per_day]))
+    matrix = prices.to_numpy()[days.isin(full_days)].reshape(len(full_days), rows_per_day)
+    # drop days with gaps in the history
+    keep = ~np.isnan(matrix).any(axis=1)
+    return full_days[keep], matrix[keep]
+
+
+class PriceScenarios:
+    """
+    S Belpex price paths (€/MWh) over a target DatetimeIndex.
+
+    Use one of the constructors; iterate over `batches()` to get
+    (batch, T) arrays.
+    """
+
+    def __init__(self, index: pd.DatetimeIndex, n_scenarios: int, make_batch) -> None:
+        self.index = index
+        self.n_scenarios = int(n_scenarios)
+        self._make_batch = make_batch
+
+    def __len__(self) -> int:
+        return self.n_scenarios
+
+    def batches(self, batch_size: int = 1000) -> Iterator[np.ndarray]:
+        for start in range(0, self.n_scenarios, batch_size):
+            yield self._make_batch(start, min(start + batch_size, self.n_scenarios))
+
+    def to_array(self) -> np.ndarray:
+        """All paths as one (S, T) array; only for small S."""
+        return np.vstack(list(self.batches()))
+
+    # ------------------------------------------------------------------
+    # constructors
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_array(cls, paths, index: pd.DatetimeIndex) -> "PriceScenarios":
+        """Ingest ready-made paths: an (S, T) array or a DataFrame with one column per scenario."""
+        if isinstance(paths, pd.DataFrame):
+            paths = paths.reindex(index).to_numpy().T
+        paths = np.atleast_2d(np.asarray(paths, dtype=float))
+        if paths.shape[1] != len(index):
+            raise ValueError(f"Expected {len(index)} prices per scenario, got {paths.shape[1]}")
+        return cls(index, len(paths), lambda a, b: paths[a:b])
+
+    @classmethod
+    def scaled(
+        cls,
+        base: pd.Series,
+        index: pd.DatetimeIndex,
+        *,
+        scales: Sequence[float] = (1.0,),
+        shifts: Sequence[float] = (0.0,),
+    ) -> "PriceScenarios":
+        """One path per (scale, shift): scale * base + shift (€/MWh)."""
+        prices = base.astype(float).reindex(index).to_numpy()
+        grid = np.array([(s, d) for s in scales for d in shifts], dtype=float)
+        return cls(index, len(grid), lambda a, b: grid[a:b, :1] * prices + grid[a:b, 1:])
+
+    @classmethod
+    def bootstrap_days(
+        cls,
+        history: pd.Series,
+        index: pd.DatetimeIndex,
+        n_scenarios: int,
+        *,
+        block_days: int = 1,
+        seasonal_window: Optional[int] = None,
+        seed: int = 0,
+    ) -> "PriceScenarios":
+        """
+        Build paths by resampling whole days of a historical price series.
+
+        - block_days=1: every target day gets an independently drawn
+          historical day (day bootstrap).
+        - block_days>1: consecutive blocks of that many historical days are
+          drawn, keeping multi-day price dynamics (block bootstrap).
+        - seasonal_window: only draw blocks whose day-of-year lies within
+          +/- that many days of the target block's day-of-year, so winter
+          days are not priced with summer profiles. Targets without any
+          historical block in their window fall back to all blocks.
+
+        Weekday/weekend structure is kept: single days are drawn from the
+        same kind of day (weekday or weekend) as the target day, multi-day
+        blocks start on the same weekday as the target block.
+        """
+        freq = pd.Timedelta(index.freq or pd.infer_freq(index[:10]))
+        hist_days, profiles = _daily_profiles(history, freq)
+        if len(hist_days) < block_days:
+            raise ValueError("Price history has fewer complete days than block_days")
+
+        # historical block starts: runs of block_days consecutive days
+        consecutive = np.ones(len(hist_days), dtype=bool)
+        if block_days > 1:
+            gaps = np.diff(hist_days.asi8) != pd.Timedelta(days=1).value
+            run_ok = np.convolve(~gaps, np.ones(block_days - 1, dtype=int), "valid") == block_days - 1
+            consecutive = np.zeros(len(hist_days), dtype=bool)
+            consecutive[: len(run_ok)] = run_ok
+        starts = np.flatnonzero(consecutive)
+        if not len(starts):
+            raise ValueError("Price history has no run of block_days consecutive days")
+
+        target_days = index.normalize().unique()
+        block_of_day = np.arange(len(target_days)) // block_days
+        block_first = target_days[:: block_days]
+
+        hist_doy = hist_days.dayofyear.to_numpy()[starts]
+        hist_weekday = hist_days.weekday.to_numpy()[starts]
+        candidates = []
+        for day in block_first:
+            if block_days == 1:
+                ok = (hist_weekday >= 5) == (day.weekday() >= 5)
+            else:
+                ok = hist_weekday == day.weekday()
+            if seasonal_window is not None:
+                dist = np.abs(hist_doy - day.dayofyear)
+                dist = np.minimum(dist, 365 - dist)
+                seasonal = ok & (dist <= seasonal_window)
+                ok = seasonal if seasonal.any() else ok
+            candidates.append(starts[ok] if ok.any() else starts)
+
+        rng = np.random.default_rng(seed)
+        # S x n_blocks block starts, drawn once so batches are reproducible
+        drawn = np.column_stack([rng.choice(c, size=n_scenarios) for c in candidates])
+
+        row_day = target_days.get_indexer(index.normalize())
+        row_slot = ((index - index.normalize()) // freq).to_numpy().astype(int)
+        row_hist_offset = row_day - block_of_day[row_day] * block_days
+
+        def make_batch(a: int, b: int) -> np.ndarray:
+            hist_day = drawn[a:b][:, block_of_day[row_day]] + row_hist_offset
+            return profiles[hist_day, row_slot]
+
+        return cls(index, n_scenarios, make_batch)
+
+
+def summarise_costs(costs: np.ndarray, *, alpha: float = 0.95) -> Dict[str, float]:
+    """Mean, spread, P5/P95 and CVaR_alpha (mean of the worst 1-alpha share) of scenario costs."""
+    costs = np.asarray(costs, dtype=float)
+    var = float(np.quantile(costs, alpha))
+    return {
+        "mean": float(costs.mean()),
+        "std": float(costs.std()),
+        "p5": float(np.quantile(costs, 0.05)),
+        "p50": float(np.quantile(costs, 0.50)),
+        "p95": float(np.quantile(costs, 0.95)),
+        "var": var,
+        "cvar": float(costs[costs >= var].mean()),
+        "n_scenarios": int(len(costs)),
+    }
+
+
+# ----------------------------------------------------------------------
+# GridCost methods
+# ----------------------------------------------------------------------
+
+def dynamic_tariff_weights(self) -> tuple:
+    """
+    Linear form of `dynamic_tariff` for the current GridFlow.
+
+    Returns (a, b) such that the DynamicTariff column for a price path p
+    equals a * p + b (rows with a NaN price cost nothing, as in
+    `dynamic_tariff`).
+    """
+    c = self.electricity_contract
+    g = self.pd["GridFlow"].to_numpy(dtype=float)
+    peak = peak_mask(self.pd.index)
+    consumption = g < 0
+
+    var = np.where(
+        consumption,
+        np.where(peak, c.dynamic_cons_var_peak, c.dynamic_cons_var_offpeak),
+        np.where(peak, c.dynamic_inj_var_peak, c.dynamic_inj_var_offpeak),
+    )
+    fix = np.where(
+        consumption,
+        np.where(peak, c.dynamic_cons_fix_peak, c.dynamic_cons_fix_offpeak),
+        np.where(peak, c.dynamic_inj_fix_peak, c.dynamic_inj_fix_offpeak),
+    )
+    g = np.nan_to_num(g)
+    return -0.01 * g * var, -0.01 * g * fix
+
+
+def price_scenario_costs(self, scenarios: PriceScenarios, *, batch_size: int = 1000) -> np.ndarray:
+    """
+    Yearly total cost (as `calculate_total_cost`) under every price path.
+
+    Only the DynamicTariff energy cost depends on the Belpex price; all
+    other cost components are computed once. For DualTariff contracts every
+    scenario therefore has the same cost.
+    """
+    if not scenarios.index.equals(self.pd.index):
+        raise ValueError("Price scenarios must be built on this GridCost's index (gc.pd.index)")
+
+    other = sum(v for k, v in self._non_energy_costs().items() if not k.endswith("_kWh"))
+    c = self.electricity_contract
+
+    if c.contract_type == "DualTariff":
+        self.dual_tariff()
+        energy = float(self.pd["DualTariff"].sum())
+        return np.full(len(scenarios), energy + other)
+    if c.contract_type != "DynamicTariff":
+        raise ValueError(f"Unknown tariff type: {c.contract_type}")
+
+    a, b = self.dynamic_tariff_weights()
+    costs = np.empty(len(scenarios))
+    pos = 0
+    for batch in scenarios.batches(batch_size):
+        valid = ~np.isnan(batch)
+        # (batch x T) @ (T,) for the price term, plus the price-independent fix term
+        costs[pos:pos + len(batch)] = np.where(valid, batch, 0.0) @ a + valid.astype(float) @ b
+        pos += len(batch)
+    return costs + other
@@ -1,8 +1,6 @@
 
-from pyparsing import Optional
-
 import pandas as pd
-from typing import Union
+from typing import Optional, Union
 
 
 def _prepare_tariff_columns(self, tariffs: list[str] = None) -> list[str]:
@@ -5,9 +5,11 @@ from typing import Optional, Union
 import pandas as pd
 
 from financialmodel.models import ElectricityContract
+from gridcost._contracttable import ContractTable
 import gridcost._dualtariff
 import gridcost._capacitytariff
 import gridcost._dynamictariff 
+from powercalculations.profiling import profiled, rows_of_result, rows_of_self_pd
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +22,7 @@ class GridCost:
     - Tariff application and total cost calculation
     """
 
+    @profiled("GridCost.__init__", rows=rows_of_self_pd)
     def __init__(
         self,
         *,
@@ -27,7 +30,7 @@ class GridCost:
         consumption_data_csv: str = "",
         file_path_BelpexFilter: str = r"C:\Users\67583\OneDrive - Bain\Documents\Personal projects\MA1SEM2_EnergyProject\data\belpex_quarter_hourly.csv",
         resample_freq: str = "1h",
-        electricity_contract: Optional[ElectricityContract] = None,
+        electricity_contract: Optional[Union[ElectricityContract, ContractTable]] = None,
     ) -> None:
         # Store simple attributes
         self.resample_freq = resample_freq
@@ -71,6 +74,7 @@ class GridCost:
     # Internal helpers
     # -------------------------------------------------------------------------
     
+    @profiled("GridCost.load_consumption_data", rows=rows_of_result)
     def _load_consumption_data(
         self,
         consumption_data_df: Optional[pd.DataFrame],
@@ -231,7 +235,6 @@ class GridCost:
         # -------------------- DataFrame input --------------------
         if consumption_data_df is not None and not consumption_data_df.empty:
             df_any = consumption_data_df.copy()
-            print(df_any.head())
             logger.debug("Using provided consumption_data_df with shape %s", getattr(df_any, "shape", None))
 
             # Accept Series directly
@@ -400,6 +403,7 @@ class GridCost:
             "You must provide either a non-empty `consumption_data_df` or a `consumption_data_csv` path."
         )
 
+    @profiled("GridCost.merge_belpex_filter", rows=rows_of_result)
     def _merge_belpex_filter(
         self,
         dataframe: pd.DataFrame,
@@ -442,6 +446,7 @@ class GridCost:
         if missing:
             raise ValueError(f"The following required columns are missing: {', '.join(missing)}")
 
+    @profiled("GridCost.resample_and_interpolate", rows=rows_of_result)
     def _resample_and_interpolate(self, df: pd.DataFrame) -> pd.DataFrame:
         """Resample the dataframe and interpolate missing values."""
         try:
@@ -510,6 +515,7 @@ class GridCost:
     # Total cost calculation
     # ---------------------------------------------------------------------
 
+    @profiled("GridCost.calculate_total_cost", rows=rows_of_self_pd)
     def calculate_total_cost(
         self,
         *,
@@ -523,8 +529,14 @@ class GridCost:
 
         By default returns a single float (total_cost).
         If `return_breakdown=True`, returns a dict with components.
+
+        With a ContractTable as `electricity_contract`, every contract is
+        priced at once and the totals (and breakdown values) are arrays, one
+        entry per contract.
         """
         c = self.electricity_contract
+        if isinstance(c, ContractTable):
+            return self.contract_table_costs(return_breakdown=return_breakdown)
 
         # Select tariff
 
@@ -539,6 +551,29 @@ class GridCost:
         # Energy cost as sum of chosen tariff column
         energy_cost = float(self.pd[c.contract_type].sum())
 
+        other = self._non_energy_costs()
+        total_cost = energy_cost
+        for k, v in other.items():
+            if not k.endswith("_kWh"):
+                total_cost += v
+
+        if not return_breakdown:
+            return float(total_cost)
+
+        return {
+            "total_cost": float(total_cost),
+            "energy_cost": float(energy_cost),
+            **{k: float(v) for k, v in other.items()},
+            "GridCost_dataframe": self.pd,
+        }
+
+    def _non_energy_costs(self) -> dict:
+        """
+        Cost components that do not depend on the tariff column (€/year),
+        plus the kWh totals they are based on (keys ending in '_kWh').
+        """
+        c = self.electricity_contract
+
         fixed_component = (
             c.dual_fix if c.contract_type == "DualTariff" else c.dynamic_fix
         )
@@ -562,38 +597,28 @@ class GridCost:
         levy_base_kWh = (cons_peak + cons_offpeak)
         levy_cost = (c.excise_duty + c.energy_contribution + c.green_power_fee)/100 * levy_base_kWh
 
-        total_cost = (
-            energy_cost
-            + c.data_management_cost
-            + purchase_cost_injection
-            + purchase_cost_consumption
-            + capacity_cost
-            + levy_cost
-            + fixed_component
-        )
-
-        if not return_breakdown:
-            return float(total_cost)
-
+        # same order as the original total_cost sum
         return {
-            "total_cost": float(total_cost),
-            "energy_cost": float(energy_cost),
-            "fixed_component": float(fixed_component),
-            "data_management_cost": float(c.data_management_cost),
-            "purchase_cost_injection": float(purchase_cost_injection),
-            "purchase_cost_consumption": float(purchase_cost_consumption),
-            "capacity_cost": float(capacity_cost),
-            "levy_cost": float(levy_cost),
-            "injection_peak_kWh": float(inj_peak),
-            "injection_offpeak_kWh": float(inj_offpeak),
-            "consumption_peak_kWh": float(cons_peak),
-            "consumption_offpeak_kWh": float(cons_offpeak),
-            "GridCost_dataframe": self.pd,
+            "data_management_cost": c.data_management_cost,
+            "purchase_cost_injection": purchase_cost_injection,
+            "purchase_cost_consumption": purchase_cost_consumption,
+            "capacity_cost": capacity_cost,
+            "levy_cost": levy_cost,
+            "fixed_component": fixed_component,
+            "injection_peak_kWh": inj_peak,
+            "injection_offpeak_kWh": inj_offpeak,
+            "consumption_peak_kWh": cons_peak,
+            "consumption_offpeak_kWh": cons_offpeak,
         }
 
     from gridcost._capacitytariff import capacity_tariff
     from gridcost._dualtariff import dual_tariff
     from gridcost._dynamictariff import dynamic_tariff
+    from gridcost._scenarios import dynamic_tariff_weights
+    from gridcost._scenarios import price_scenario_costs
+    from gridcost._contracttable import contract_table_costs
+    from gridcost._contracttable import _dual_energy_costs
+    from gridcost._contracttable import _dynamic_energy_costs
     from gridcost._belpex import update_belpex_quarter_hourly
     from gridcost._belpex import BELPEX_QUARTER_HOURLY_URL
     from gridcost._belpex import _scrape_belpex_page
@@ -1,19 +1,157 @@
-
-
+"""
+EV charging profiles from a one-week template.
+
+`data/EV-Calculation.xlsx` holds one week of EV load at 15 minutes
+(Load_EV_kW_with_SC, Load_EV_kW_no_SC) starting on a Monday, and a
+Correction_factor per week of the year. `add_EV_load_type` repeats the week
+over the dataset, scaled by the factor of each week, either
+
+- engine='rows': week by week with `DataFrame.update`, or
+- engine='tile': in one go, every row looks up its template sample (the first
+  one at or after its offset into the week, as `asfreq(method='bfill')`) and
+  its week's correction factor.
+
+The parsed template is kept in memory and pickled next to the workbook in
+`.ev_template_cache/`, both keyed by the size and mtime of the workbook, so
+only the first call ever opens it.
+"""
+import os
+import pickle
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
 import pandas as pd
 
-from visualisations.visualisations import plot_series
+DEFAULT_EV_TEMPLATE = 'data/EV-Calculation.xlsx'
+DEFAULT_CACHE_DIRNAME = '.ev_template_cache'
+# bump when the pickled template layout changes
+TEMPLATE_VERSION = 1
+
+_EV_COLUMNS = ('Load_EV_kW_with_SC', 'Load_EV_kW_no_SC')
+_WEEK_NS = 7 * 24 * 3600 * 10 ** 9
+_DAY_NS = 24 * 3600 * 10 ** 9
+# 1970-01-01 was a Thursday
+_EPOCH_WEEKDAY = 3
+
+_templates: Dict[Tuple[str, int, int], dict] = {}
+
+
+def _parse_EV_template(filepath: str) -> dict:
+    """Week offsets [ns], the EV load columns and the weekly correction factors of the template workbook."""
+    df1 = pd.read_excel(filepath, 'Sheet1')
+    for column in ('Datetime', 'Correction_factor') + _EV_COLUMNS:
+        if column not in df1.columns:
+            raise ValueError(f"The EV load file does not contain the column '{column}'.")
+    times = pd.to_datetime(df1['Datetime']).dt.round('min')
+    first = times.iloc[0]
+    monday = first.normalize() - pd.Timedelta(days=first.weekday())
+    offsets = (times - monday).to_numpy(dtype='timedelta64[ns]').astype(np.int64)
+    if (np.diff(offsets) <= 0).any() or offsets[-1] >= _WEEK_NS:
+        raise ValueError("The EV load template should be one week of increasing timestamps.")
+    factors = df1['Correction_factor'].head(53).dropna().to_numpy(dtype=float)
+    if not len(factors):
+        raise ValueError("The EV load file does not contain any correction factor.")
+    template = {'offsets': offsets, 'correction_factors': factors}
+    for column in _EV_COLUMNS:
+        template[column] = df1[column].to_numpy(dtype=float)
+    return template
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def load_EV_template(filepath: str = DEFAULT_EV_TEMPLATE, cache_dir: Optional[str] = None,
+                     use_cache: bool = True) -> dict:
+    """
+    Parsed EV load template of `filepath` (see `_parse_EV_template`).
+
+    Served from memory, else from the pickle in `cache_dir` (default `<workbook dir>/.ev_template_cache`), else
+    parsed and written to both. A cache entry is only used while the workbook keeps its size and mtime.
+    `use_cache=False` always parses and leaves the caches alone.
+    """
+    if not use_cache:
+        return _parse_EV_template(filepath)
+    path = Path(filepath).resolve()
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if key in _templates:
+        return _templates[key]
+
+    root = Path(cache_dir) if cache_dir is not None else path.parent / DEFAULT_CACHE_DIRNAME
+    pickled = root / f'{path.name}.pkl'
+    template = None
+    try:
+        with open(pickled, 'rb') as f:
+            cached = pickle.load(f)
+        if cached.get('key') == key[1:] and cached.get('version') == TEMPLATE_VERSION:
+            template = cached['template']
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError):
+        pass
+    if template is None:
+        template = _parse_EV_template(str(path))
+        try:
+            root.mkdir(parents=True, exist_ok=True)
+            _atomic_write(pickled, pickle.dumps({'key': key[1:], 'version': TEMPLATE_VERSION,
+                                                 'template': template}))
+        except OSError:
+            pass  # a read-only data directory only costs the parse next session
+    _templates[key] = template
+    return template
+
+
+def tile_EV_template(index: pd.DatetimeIndex, template: dict, type: str) -> np.ndarray:
+    """
+    EV load [kW] of column `type` of the template at every timestamp of `index`.
 
+    Week k counts the Mondays of the index (the rows before the first Monday belong to week 0) and is scaled by
+    correction factor k, cycling when the data is longer than the factors. Offsets past the last sample of the
+    week take the first sample of the next, as backfilling would. Missing template values are 0.
+    """
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    stamps = index.asi8
+    days = stamps // _DAY_NS
+    week_start = (days - (days + _EPOCH_WEEKDAY) % 7) * _DAY_NS
+    offset = stamps - week_start
+    first_monday = week_start[0] + (_WEEK_NS if offset[0] > 0 else 0)
+    week = np.clip((week_start - first_monday) // _WEEK_NS, 0, None)
+
+    offsets = template['offsets']
+    step = offsets[1] - offsets[0] if len(offsets) > 1 else 1
+    if offsets[0] == 0 and (offsets == np.arange(len(offsets)) * step).all():
+        sample = -(-offset // step)  # regular template: no search needed
+    else:
+        sample = np.searchsorted(offsets, offset, side='left')
+    sample[sample == len(offsets)] = 0
+    factors = template['correction_factors']
+    values = template[type][sample] * factors[week % len(factors)]
+    return np.nan_to_num(values, nan=0.0)
 
 
-def add_EV_load_type(self,type:str='Load_EV_kW_with_SC'):
+def add_EV_load_type(self,type:str='Load_EV_kW_with_SC', filepath:str=DEFAULT_EV_TEMPLATE, engine:str='rows', cache_dir:Optional[str]=None, use_cache:bool=True):
     """
     Add electric vehicle (EV) load data to the DataFrame.
     The EV load data is read from an Excel file and interpolated to match the time index of the DataFrame.
-    The EV load is added to the 'Load_kW' column of the DataFrame.
-    type: str
+    The EV load is written to the column `type` of the DataFrame.
+    type: str, 'Load_EV_kW_with_SC' or 'Load_EV_kW_no_SC'
+    filepath: str, the template workbook
+    engine: str, 'rows' updates the DataFrame week by week (hourly or 1 minute data only), 'tile' builds the
+        column in one go from the cached template (see `tile_EV_template`) at any frequency. Unlike 'rows' it
+        also fills the rows before the first Monday and the last minutes of Sunday at minute frequency.
+    cache_dir, use_cache: template cache of the 'tile' engine, see `load_EV_template`
     """
-    filepath='data/EV-Calculation.xlsx'
+    if type not in _EV_COLUMNS:
+        raise ValueError("The type must be either 'Load_EV_kW_with_SC' or 'Load_EV_kW_no_SC'.")
+    if engine == 'tile':
+        template = load_EV_template(filepath, cache_dir=cache_dir, use_cache=use_cache)
+        self.pd[type] = tile_EV_template(self.pd.index, template, type)
+        return None
+    if engine != 'rows':
+        raise ValueError(f"Unknown add_EV_load_type engine: {engine}")
 
     xls = pd.ExcelFile(filepath)
     df1 = pd.read_excel(xls, 'Sheet1')
@@ -68,6 +206,6 @@ def add_EV_load_type(self,type:str='Load_EV_kW_with_SC'):
     return None
 
 
-def add_EV_load(self):
-    add_EV_load_type(self,type='Load_EV_kW_with_SC')
-    add_EV_load_type(self,type='Load_EV_kW_no_SC')
\ No newline at end of file
+def add_EV_load(self, engine:str='rows', filepath:str=DEFAULT_EV_TEMPLATE):
+    add_EV_load_type(self,type='Load_EV_kW_with_SC', filepath=filepath, engine=engine)
+    add_EV_load_type(self,type='Load_EV_kW_no_SC', filepath=filepath, engine=engine)
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""
+Array engine of `power_flow` (engine="array").
+
+The battery and EV states depend on the previous row, so the simulation
+stays a loop, but it runs over plain Python floats taken from the columns
+once instead of over `DataFrame.iterrows()` rows, and calls the step
+functions below with the hour instead of a row. `battery_step` is a
+line-for-line port of `battery()` in `_powerflows`; the 'B2G' EV follows a
+schedule compiled into per-row arrays (`_evschedule`) whose default is
+`EV()`. Both engines produce the same floats (checked by
+`benchmarks.equivalence`).
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from powercalculations._evschedule import EV_schedule_step, compile_EV_schedule
+
+# rows between two progress updates
+_PROGRESS_BLOCK = 4096
+
+
+def battery_step(hour: int, load_to_battery: float, old_capacity: float, max_capacity: float,
+                 max_DC_batterypower: float, battery_roundtrip_efficiency: float):
+    """`_powerflows.battery` for one row; `max_DC_batterypower` already capped by the peak power."""
+    if load_to_battery > 0:  # Excess power from PV
+        max_input = min(max_capacity - old_capacity, load_to_battery, max_DC_batterypower)
+        return load_to_battery - max_input, old_capacity + max_input
+
+    # Insufficient PV power, draw from the battery but not between 23:00 and 4:00
+    if (load_to_battery < 0) and (hour >= 4 and hour < 23):
+        max_output = min(max_DC_batterypower, old_capacity - 0, -load_to_battery)
+        return (load_to_battery + max_output) * battery_roundtrip_efficiency / 100, old_capacity - max_output
+
+    return load_to_battery, old_capacity
+
+
+def EV_step(load_to_EV: float, EV_type: str, EV_power: float):
+    """`_powerflows.EV` for the EV types without a battery; `EV_power` is the row's Load_EV_kW_* value."""
+    if EV_type == 'no_EV':
+        return load_to_EV, 0
+    if EV_type in ('with_SC', 'no_SC', 'smart'):
+        return load_to_EV - EV_power, 0
+    raise ValueError('EV_type should be either B2G, with_SC, no_SC, smart or no_EV')
+
+
+def _EV_column(frame: pd.DataFrame, EV_type: str) -> List[float]:
+    if EV_type == 'with_SC':
+        return frame['Load_EV_kW_with_SC'].tolist()
+    if EV_type == 'no_SC':
+        return frame['Load_EV_kW_no_SC'].tolist()
+    if EV_type == 'smart':
+        return frame['Load_EV_kW_smart'].tolist()
+    return [0.0] * len(frame)
+
+
+def power_flow_arrays(frame: pd.DataFrame, *, interval: float, max_charge: float, max_AC_power_output: float,
+                      max_DC_batterypower: float, max_PV_input: float, max_EV_power: float, max_EV_charge: float,
+                      EV_type: str, battery_roundtrip_efficiency: float, battery_PeakPower: float,
+                      stage=None, EV_schedule: Optional[pd.DataFrame] = None,
+                      state: Optional[Dict[str, float]] = None) -> Dict[str, List[float]]:
+    """
+    The simulation loop of `power_flow` on column arrays. `max_charge` and
+    `max_EV_charge` are already converted to the data frequency. Returns the
+    output columns (BatteryCharge, GridFlow, BatteryFlow, EVCharge, EVFlow).
+
+    A 'B2G' EV follows `EV_schedule` (default: the behaviour of `EV()`),
+    compiled once into per-row arrays, see `_evschedule`.
+
+    `state` carries the battery and EV charge ('battery', 'EV', in the units
+    of `max_charge`) from one call to the next: missing entries start at 10%
+    and 50% of the capacity as in `power_flow`, and the charges after the
+    last row are written back, so consecutive blocks of a series give the
+    same result as one call on the whole series.
+    """
+    if EV_type not in ('B2G', 'with_SC', 'no_SC', 'smart', 'no_EV'):
+        raise ValueError('EV_type should be either B2G, with_SC, no_SC, smart or no_EV')
+
+    pv_column = frame['PV_generated_power'].tolist()
+    load_column = frame['Load_kW'].tolist()
+    EV_column = _EV_column(frame, EV_type)
+    hours = frame.index.hour.tolist()
+    if EV_type == 'B2G':
+        schedule = compile_EV_schedule(frame.index, max_EV_charge, EV_schedule)
+        EV_modes = schedule.mode.tolist()
+        EV_min_capacity = schedule.min_capacity.tolist()
+        EV_drain = schedule.drain.tolist()
+
+    max_DC_batterypower = min(max_DC_batterypower, battery_PeakPower)
+    state = {} if state is None else state
+    previous_charge_battery = state.get('battery', 0.1 * max_charge)
+    previous_charge_EV = state.get('EV', 0.5 * max_EV_charge)
+
+    n = len(pv_column)
+    battery_charge_list = [0.0] * n
+    grid_flow_list = [0.0] * n
+    battery_flow_list = [0.0] * n
+    EV_charge_list = [0.0] * n
+    EV_flow_list = [0.0] * n
+
+    for i in range(n):
+        if stage is not None and not i % _PROGRESS_BLOCK:
+            stage.update(i)
+        hour = hours[i]
+        PV_power = min(pv_column[i], max_PV_input)
+        load = -load_column[i]
+
+        excess_load = -max(0, -load - max_AC_power_output)
+        load = load - excess_load
+        load_to_EV = PV_power + load
+        if EV_type == 'B2G':
+            load_to_battery, new_charge_EV = EV_schedule_step(EV_modes[i], EV_min_capacity[i], EV_drain[i], load_to_EV,
+                                                              previous_charge_EV, max_EV_power, schedule.max_capacity)
+        else:
+            load_to_battery, new_charge_EV = EV_step(load_to_EV, EV_type, EV_column[i])
+        load_from_battery, new_charge_battery = battery_step(hour, load_to_battery, previous_charge_battery,
+                                                             max_charge, max_DC_batterypower,
+                                                             battery_roundtrip_efficiency)
+        grid_flow = min(load_from_battery, max_AC_power_output)
+        grid_flow = grid_flow + excess_load
+        previous_charge_battery = new_charge_battery
+        previous_charge_EV = new_charge_EV
+
+        battery_charge_list[i] = new_charge_battery / interval
+        grid_flow_list[i] = grid_flow
+        battery_flow_list[i] = load_to_battery - load_from_battery
+        EV_charge_list[i] = new_charge_EV / interval
+        EV_flow_list[i] = load_to_EV - load_to_battery
+    if stage is not None:
+        stage.update(n)
+    state['battery'] = previous_charge_battery
+    state['EV'] = previous_charge_EV
+
+    return {
+        'BatteryCharge': battery_charge_list,
+        'GridFlow': grid_flow_list,
+        'BatteryFlow': battery_flow_list,
+        'EVCharge': EV_charge_list,
+        'EVFlow': EV_flow_list,
+    }
@@ -0,0 +1,160 @@
+"""
+Chunked power flow (`power_flow(block=...)`, `stream_power_flow`).
+
+The array engine runs over blocks of the series (a month by default) one
+after another: the battery and EV charge after the last row of a block are
+the starting charges of the next (see the `state` argument of
+`power_flow_arrays`), so the blocks give exactly the floats of a single
+pass. The output columns of every block go to a sink as soon as the block
+is done, so a run over input blocks that are read one at a time (e.g. a
+file per month) keeps at most one block in memory, whatever the length of
+the series.
+
+A sink is any object with a `write(frame)` method; `ColumnarSink` appends
+every column to its own binary file and reads them back memory-mapped:
+
+    <directory>/index.i8      timestamps, int64 nanoseconds (UTC for a tz-aware index)
+    <directory>/<column>.f8   float64 values
+    <directory>/meta.json     columns, rows, time zone
+"""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from powercalculations._arrayengine import power_flow_arrays
+from powercalculations.progress import as_reporter
+
+
+class ColumnarSink:
+    """
+    Output columns appended block by block, one binary file per column in `directory`.
+
+    An existing sink in `directory` is replaced, unless `append=True`.
+    """
+
+    def __init__(self, directory: str, append: bool = False) -> None:
+        self.root = Path(directory)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._meta_path = self.root / 'meta.json'
+        self.columns: Optional[List[str]] = None
+        self.rows = 0
+        self.tz: Optional[str] = None
+        if append and self._meta_path.is_file():
+            meta = json.loads(self._meta_path.read_text())
+            self.columns, self.rows, self.tz = meta['columns'], meta['rows'], meta['tz']
+        else:
+            for path in self.root.glob('*.[fi]8'):
+                path.unlink()
+            self._meta_path.unlink(missing_ok=True)
+
+    def _path(self, column: str) -> Path:
+        return self.root / f'{column}.f8'
+
+    def write(self, frame: pd.DataFrame) -> None:
+        """Append the rows of `frame`; every block must have the columns of the first."""
+        if self.columns is None:
+            self.columns = [str(column) for column in frame.columns]
+            self.tz = None if frame.index.tz is None else str(frame.index.tz)
+        elif [str(column) for column in frame.columns] != self.columns:
+            raise ValueError(f"Block columns {list(frame.columns)} differ from the sink columns {self.columns}")
+        with open(self.root / 'index.i8', 'ab') as f:
+            f.write(frame.index.asi8.astype('<i8').tobytes())
+        for column in self.columns:
+            with open(self._path(column), 'ab') as f:
+                f.write(frame[column].to_numpy(dtype='<f8').tobytes())
+        self.rows += len(frame)
+        tmp = self._meta_path.with_name('meta.json.tmp')
+        tmp.write_text(json.dumps({'columns': self.columns, 'rows': self.rows, 'tz': self.tz}))
+        os.replace(tmp, self._meta_path)
+
+    def read(self, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """The written rows as a DataFrame; the columns are memory-mapped, not loaded."""
+        if self.columns is None:
+            return pd.DataFrame()
+        index = pd.DatetimeIndex(np.fromfile(self.root / 'index.i8', dtype='<i8').view('datetime64[ns]'))
+        if self.tz is not None:
+            index = index.tz_localize('UTC').tz_convert(self.tz)
+        columns = self.columns if columns is None else list(columns)
+        data = {column: np.memmap(self._path(column), dtype='<f8', mode='r', shape=(self.rows,))
+                for column in columns}
+        return pd.DataFrame(data, index=index, copy=False)
+
+
+class _FrameSink:
+    """Collects the blocks in memory; `power_flow(block=...)` without a sink."""
+
+    def __init__(self) -> None:
+        self.blocks: List[pd.DataFrame] = []
+
+    def write(self, frame: pd.DataFrame) -> None:
+        self.blocks.append(frame)
+
+
+def iter_blocks(frame: pd.DataFrame, block: Union[str, int] = 'MS') -> Iterator[pd.DataFrame]:
+    """Consecutive row blocks of `frame`: `block` rows each, or one per period of a pandas frequency ('MS', 'W')."""
+    n = len(frame)
+    if isinstance(block, (int, np.integer)):
+        if block < 1:
+            raise ValueError("block should be a positive number of rows or a pandas frequency")
+        edges = list(range(0, n, int(block)))
+    else:
+        starts = pd.date_range(frame.index[0], frame.index[-1], freq=block)
+        edges = sorted(set([0] + frame.index.searchsorted(starts).tolist()) - {n})
+    for start, stop in zip(edges, edges[1:] + [n]):
+        yield frame.iloc[start:stop]
+
+
+def stream_power_flow(blocks: Iterable[pd.DataFrame], sink, *, freq=None, max_charge: float = 8,
+                      max_AC_power_output: float = 5, max_DC_batterypower: float = 5, max_PV_input: float = 10,
+                      max_EV_power: float = 3.7, max_EV_charge: float = 82.3, EV_type: str = 'no_EV',
+                      battery_roundtrip_efficiency: float = 97.5, battery_PeakPower: float = 11,
+                      EV_schedule: Optional[pd.DataFrame] = None, state: Optional[Dict[str, float]] = None,
+                      progress=None, total: Optional[int] = None) -> Dict[str, float]:
+    """
+    Greedy power flow (as `power_flow(engine='array')`) over consecutive `blocks` of input rows, writing the
+    output columns of every block to `sink`.
+
+    Args:
+        blocks: DataFrames with the input columns of `power_flow`, in time order and without gaps between them.
+        sink: object with a `write(frame)` method, e.g. a `ColumnarSink`.
+        freq: data frequency; defaults to the frequency of the block index.
+        state (dict): starting 'battery' and 'EV' charge in kWh; defaults to 10% and 50% of the capacity.
+        total (int): number of rows, for progress reporting only.
+        The other arguments are those of `power_flow`.
+    Returns:
+        dict: rows and blocks processed, and the 'battery' and 'EV' charge in kWh after the last row.
+    """
+    carried: Dict[str, float] = {}
+    interval = None
+    rows = n_blocks = 0
+    with as_reporter(progress).stage("power_flow", total=total) as stage:
+        for frame in blocks:
+            if not len(frame):
+                continue
+            block_freq = freq if freq is not None else frame.index.freq
+            if block_freq is None:
+                raise ValueError("stream_power_flow needs `freq` for blocks whose index has no frequency")
+            if interval is None:
+                interval = 3600 / pd.Timedelta(block_freq).total_seconds()
+                for key, value in (state or {}).items():
+                    carried[key] = value * interval
+            columns = power_flow_arrays(
+                frame, interval=interval, max_charge=max_charge * interval, max_AC_power_output=max_AC_power_output,
+                max_DC_batterypower=max_DC_batterypower, max_PV_input=max_PV_input, max_EV_power=max_EV_power,
+                max_EV_charge=max_EV_charge * interval, EV_type=EV_type,
+                battery_roundtrip_efficiency=battery_roundtrip_efficiency, battery_PeakPower=battery_PeakPower,
+                EV_schedule=EV_schedule, state=carried,
+            )
+            sink.write(pd.DataFrame(columns, index=frame.index))
+            rows += len(frame)
+            n_blocks += 1
+            stage.update(rows)
+    interval = interval or 1.0
+    return {'rows': rows, 'blocks': n_blocks, 'battery': carried.get('battery', 0.0) / interval,
+            'EV': carried.get('EV', 0.0) / interval}
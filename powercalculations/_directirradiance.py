@@ -1,9 +1,38 @@
 import math
+import numpy as np
 import pandas as pd
-import pvlib
-counter = 0
-length=0
-def calculate_direct_irradiance(self, tilt_angle:int=0, orientation:str='S'): 
+
+from powercalculations.profiling import profiled, rows_of_self_pd
+from powercalculations.progress import as_reporter
+
+def _direct_irradiance_array(frame: pd.DataFrame, tilt_angle: float, surface_azimuth_angle: float):
+    """
+    `calculate_irradiance_row` on whole columns. Returns (DirectIrradiance, DNI) arrays.
+
+    The cosine of the angle of incidence is clipped to [-1, 1] before the arccos, where
+    the row version raises a math domain error on rounding noise.
+    """
+    GHI = frame['GlobRad'].to_numpy(dtype=float)
+    GDI = frame['DiffRad'].to_numpy(dtype=float)
+    zenith = frame['SolarZenithAngle'].to_numpy(dtype=float)
+    azimuth = frame['SolarAzimuthAngle'].to_numpy(dtype=float)
+
+    tilt = math.radians(tilt_angle)
+    zenith_rad = np.radians(zenith)
+    cos_AOI = (math.cos(tilt) * np.cos(zenith_rad)
+               + math.sin(tilt) * np.sin(zenith_rad) * np.cos(np.radians(azimuth - surface_azimuth_angle)))
+    AOI = np.arccos(np.clip(cos_AOI, -1.0, 1.0))
+
+    DNI = (GHI - GDI) / np.cos(zenith_rad / 1.2)
+    direct_irradiance = np.maximum(DNI * np.cos(AOI), 0) + GDI
+    DNI = np.where(DNI < 0, 0.0, DNI)
+    DNI = np.where(zenith > 89, np.maximum(GHI - GDI, 0), DNI)
+    direct_irradiance = np.where(zenith > 87, np.minimum(GHI, direct_irradiance), direct_irradiance)
+    return direct_irradiance, DNI
+
+
+@profiled("calculate_direct_irradiance", rows=rows_of_self_pd)
+def calculate_direct_irradiance(self, tilt_angle:int=0, orientation:str='S', progress=None, engine:str='rows'): 
     """
     Calculate the direct irradiance on a tilted surface for each row in the DataFrame.
 
@@ -13,10 +42,27 @@ def calculate_direct_irradiance(self, tilt_angle:int=0, orientation:str='S'):
     - longitude: Longitude of the location [degrees].
     - temperature: Temperature of the location [degrees Celsius].
     - orientation: Orientation of the surface [N, E, W, S].
+    - progress: progress reporting, see `powercalculations.progress`. Silent by default.
+    - engine: 'rows' (row by row) or 'array' (numpy on whole columns, same results up to rounding).
 
     Returns:
     - None.
     """
+    stage = as_reporter(progress).stage("calculate_direct_irradiance", total=self.pd.shape[0])
+
+    if engine == 'array':
+        azimuths = {"N": [0], "E": [90], "W": [270], "S": [180], "EW": [90, 270]}
+        if orientation not in azimuths:
+            raise ValueError("Given orientation is unvalid or not implemented")
+        with stage:
+            results = [_direct_irradiance_array(self.pd, tilt_angle, a) for a in azimuths[orientation]]
+            stage.update(self.pd.shape[0])
+        # EW: mean of the east and west facing halves
+        self.pd['DirectIrradiance'] = sum(r[0] for r in results) / len(results)
+        self.pd['DNI'] = sum(r[1] for r in results) / len(results)
+        return None
+    if engine != 'rows':
+        raise ValueError(f"Unknown irradiance engine: {engine}")
 
     # Define a function to calculate the direct irradiance for a single row
     def calculate_irradiance_row(row, tilt_angle,surface_azimuth_angle):
@@ -31,10 +77,6 @@ def calculate_direct_irradiance(self, tilt_angle:int=0, orientation:str='S'):
         - temperature: Temperature of the location [degrees Celsius].
         - surface_azimuth_angle: Azimuth angle of the surface [degrees].
         """
-        global counter 
-        global length
-        counter += 1
-        print(f"Calculating direct irradiance for row {counter}/{length}", end="\r")
         GHI = row['GlobRad']
         GDI = row['DiffRad']
          
@@ -81,29 +123,29 @@ def calculate_direct_irradiance(self, tilt_angle:int=0, orientation:str='S'):
         surface_azimuth_angle=180
     elif orientation=="EW":
         # Calculate the direct irradiance for both "E" and "W" orientations
-        # Apply the calculation function to each row with vectorized operations
-        self.pd[['DirectIrradiance', 'DNI']] = self.pd.apply(
-            lambda row: pd.Series({
+        def calculate_east_west_row(row):
+            stage.advance()
+            return pd.Series({
                 'DirectIrradiance': (calculate_irradiance_row(row, tilt_angle, surface_azimuth_angle=90)[0] + calculate_irradiance_row(row, tilt_angle, surface_azimuth_angle=270)[0]) / 2,
                 'DNI': (calculate_irradiance_row(row, tilt_angle, surface_azimuth_angle=90)[1] + calculate_irradiance_row(row, tilt_angle, surface_azimuth_angle=270)[1]) / 2
-            }),
-            axis=1
-        )
+            })
+
+        # Apply the calculation function to each row
+        with stage:
+            self.pd[['DirectIrradiance', 'DNI']] = self.pd.apply(calculate_east_west_row, axis=1)
 
         return None
     else:
         raise ValueError("Given orientation is unvalid or not implemented")
     
 
-    global length
-    length=self.pd.shape[0]
-    global counter
-    counter=0
+    def calculate_row(row):
+        stage.advance()
+        return calculate_irradiance_row(row=row, tilt_angle=tilt_angle, surface_azimuth_angle=surface_azimuth_angle)
+
     # Calculate irradiance for each row
-    irradiance_values = self.pd.apply(
-        lambda row: calculate_irradiance_row(row=row, tilt_angle=tilt_angle, surface_azimuth_angle=surface_azimuth_angle),
-        axis=1
-    )
+    with stage:
+        irradiance_values = self.pd.apply(calculate_row, axis=1)
     self.pd['DNI']=0
     # Assign irradiance values to new columns
     self.pd[['DirectIrradiance', 'DNI']] = irradiance_values.apply(lambda x: pd.Series({'DirectIrradiance': x[0], 'DNI': x[1]}))
@@ -113,29 +155,32 @@ def calculate_direct_irradiance(self, tilt_angle:int=0, orientation:str='S'):
 
 
 
-def calculate_solar_angles(self, latitude:int=0, longitude:int=0):
+@profiled("calculate_solar_angles", rows=rows_of_self_pd)
+def calculate_solar_angles(self, latitude:int=0, longitude:int=0, progress=None):
     """
     Calculate the solar angles for each row in the DataFrame.
 
     Parameters:
     - latitude: Latitude of the location [degrees].
     - longitude: Longitude of the location [degrees].
+    - progress: progress reporting, see `powercalculations.progress`. Silent by default.
 
     Returns:
     - None.
     """
+    import pvlib  # imported on first use: pvlib (and scipy) take a while to load
+
     solar_zenith_angles = []  # List to store calculated solar zenith angles
     solar_azimuth_angles = []  # List to store calculated solar azimuth angles
 
-    print("Calculating solar angles...", end="\r")
-    for _, row in self.pd.iterrows():
-
-        print(f"Calculating solar angles for row {row.name}", end="\r")
-        # Solar angles calculation
-        A = pvlib.solarposition.get_solarposition(time=row.name, latitude=latitude, longitude=longitude, temperature=row['T_RV_degC'])
+    with as_reporter(progress).stage("calculate_solar_angles", total=self.pd.shape[0]) as stage:
+        for _, row in self.pd.iterrows():
+            stage.advance()
+            # Solar angles calculation
+            A = pvlib.solarposition.get_solarposition(time=row.name, latitude=latitude, longitude=longitude, temperature=row['T_RV_degC'])
 
-        solar_zenith_angles.append(A['zenith'].iloc[0])     # [degrees] starting from the vertical
-        solar_azimuth_angles.append(A['azimuth'].iloc[0])   # [degrees] starting from the north
+            solar_zenith_angles.append(A['zenith'].iloc[0])     # [degrees] starting from the vertical
+            solar_azimuth_angles.append(A['azimuth'].iloc[0])   # [degrees] starting from the north
 
 
     # Update DataFrame with calculated solar angles
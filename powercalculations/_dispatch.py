@@ -0,0 +1,297 @@
+"""
+Cost-optimal battery dispatch as a sparse linear program.
+
+`power_flow` charges the battery greedily from PV surplus. `optimal_power_flow`
+instead chooses, for the whole horizon at once, the charge/discharge power of
+every step that minimises the electricity bill of the contract:
+
+    min   sum_t dt * (import_rate_t * imp_t - export_rate_t * exp_t)
+          + capacity_tariff_rate * billed_peak
+    s.t.  c_t - eta * d_t + exp_t - imp_t + cur_t = pv_t - load_t     (power balance)
+          soc_t = soc_{t-1} + dt * (c_t - d_t)                          (battery state)
+          peak_m >= mean over each 15 min block in month m of (imp - exp)
+          billed_peak >= mean_m peak_m,  billed_peak >= 2.5 kW
+          0 <= soc_t <= max_charge,  0 <= c_t, d_t <= min(max_DC_batterypower, battery_PeakPower)
+          0 <= exp_t <= max_AC_power_output,  0 <= cur_t <= pv_t,  imp_t >= 0
+
+with the rates of DualTariff (peak/off-peak) or DynamicTariff (Belpex based)
+as in `gridcost`, the discharge efficiency `eta` as in `battery()` and the
+capacity tariff billed on the average monthly 15-minute offtake peak (at
+least 2.5 kW). PV may be curtailed (cur_t), which only pays off at negative
+injection prices.
+
+The meter only sees the net flow, so importing and exporting in the same
+step must not pay off. It does not as long as export_rate_t <= import_rate_t;
+at the (few) steps where injection earns more than offtake costs, e.g. at
+negative Belpex prices, a binary z_t allows either imp_t or exp_t:
+
+          exp_t <= max_AC_power_output * z_t,  imp_t <= (load_t + c_max) * (1 - z_t)
+
+Steps without a Belpex price (DST hours, days that were not scraped) take
+the last known price, the first known one before the first price: pricing
+them at 0 would let the dispatch buy free energy in every data gap, and an
+optimum found there would only be an artefact of the gap. `energy_rates`
+raises when no step has a price.
+
+The matrices are built with scipy.sparse and solved with HiGHS
+(`scipy.optimize.milp`, a plain LP when no binaries are needed); a year of
+hourly data solves in a few seconds, up to half a minute with hundreds of
+negative-price hours.
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from powercalculations.profiling import profiled, rows_of_self_pd
+
+# billed capacity is at least this many kW (as in gridcost's capacity_tariff)
+MIN_BILLED_PEAK_KW = 2.5
+
+
+def _peak_mask(index: pd.DatetimeIndex) -> np.ndarray:
+    """Weekdays 07:00-22:00, the peak window of the tariff functions."""
+    return np.asarray((index.weekday < 5) & (index.hour >= 7) & (index.hour < 22))
+
+
+def _fill_prices(prices: np.ndarray) -> np.ndarray:
+    """Missing prices forward-filled, a leading gap back-filled (see the module docstring)."""
+    missing = np.isnan(prices)
+    if not missing.any():
+        return prices
+    if missing.all():
+        raise ValueError("DynamicTariff dispatch needs at least one Belpex price.")
+    return pd.Series(prices).ffill().bfill().to_numpy()
+
+
+def energy_rates(index: pd.DatetimeIndex, electricity_contract, prices: Optional[np.ndarray] = None,
+                 missing: str = 'ffill'):
+    """
+    (import cost, export revenue) per kWh in € for every step, following
+    `dual_tariff` and `dynamic_tariff`. Steps without a Belpex price take the last known price, or with
+    missing='unavailable' an infinite import cost and no export revenue (no energy is traded there).
+    """
+    if missing not in ('ffill', 'unavailable'):
+        raise ValueError(f"Unknown missing price policy: {missing}")
+    c = electricity_contract
+    peak = _peak_mask(index)
+    if c.contract_type == "DualTariff":
+        import_rate = np.where(peak, c.dual_cons_peak, c.dual_cons_offpeak) / 100
+        export_rate = -np.where(peak, c.dual_inj_peak, c.dual_inj_offpeak) / 100
+    elif c.contract_type == "DynamicTariff":
+        if prices is None:
+            raise ValueError("DynamicTariff dispatch needs Belpex prices (a BelpexFilter column or `prices`).")
+        p = np.asarray(prices, dtype=float)
+        gaps = np.isnan(p)
+        if missing == 'ffill':
+            p = _fill_prices(p)
+        import_rate = np.where(peak, c.dynamic_cons_var_peak * p + c.dynamic_cons_fix_peak,
+                               c.dynamic_cons_var_offpeak * p + c.dynamic_cons_fix_offpeak) * 0.01
+        # dynamic_tariff charges (-GridFlow) * rate on injection, so the revenue per kWh is the rate itself
+        export_rate = np.where(peak, c.dynamic_inj_var_peak * p + c.dynamic_inj_fix_peak,
+                               c.dynamic_inj_var_offpeak * p + c.dynamic_inj_fix_offpeak) * 0.01
+        if missing == 'unavailable':
+            import_rate = np.where(gaps, np.inf, import_rate)
+            export_rate = np.where(gaps, 0.0, export_rate)
+    else:
+        raise ValueError(f"Unknown tariff type: {c.contract_type}")
+    return import_rate, export_rate
+
+
+def _EV_load(frame: pd.DataFrame, EV_type: str, caller: str) -> np.ndarray:
+    """EV load [kW] added to the household load; B2G has no linear model."""
+    if EV_type == 'no_EV':
+        return np.zeros(len(frame))
+    if EV_type == 'with_SC':
+        return frame['Load_EV_kW_with_SC'].to_numpy(dtype=float)
+    if EV_type == 'no_SC':
+        return frame['Load_EV_kW_no_SC'].to_numpy(dtype=float)
+    if EV_type == 'smart':
+        return frame['Load_EV_kW_smart'].to_numpy(dtype=float)
+    if EV_type == 'B2G':
+        raise ValueError(f"{caller} does not support EV_type='B2G'; use power_flow.")
+    raise ValueError('EV_type should be either B2G, with_SC, no_SC, smart or no_EV')
+
+
+def _prices(frame: pd.DataFrame, prices=None) -> Optional[np.ndarray]:
+    """Belpex prices [€/MWh] per row: `prices` if given, else the BelpexFilter column (if any)."""
+    if prices is None and 'BelpexFilter' in frame.columns:
+        return pd.to_numeric(frame['BelpexFilter'], errors='coerce').to_numpy(dtype=float)
+    return prices
+
+
+def _quarter_hour_blocks(index: pd.DatetimeIndex):
+    """(block id per step, month id per block, number of months); blocks are 15 min or one step if longer."""
+    blocks = index.floor("15min") if pd.Timedelta(index.freq) < pd.Timedelta("15min") else index
+    block_codes, block_starts = pd.factorize(blocks)
+    month_codes, months = pd.factorize(pd.DatetimeIndex(block_starts).month)
+    return block_codes, month_codes, len(months)
+
+
+def dispatch_cost(index: pd.DatetimeIndex, grid_flow, electricity_contract, prices=None,
+                  capacity_tariff: bool = True) -> Dict[str, float]:
+    """The LP objective for a given GridFlow series (kW, >0 injection), e.g. the one of `power_flow`."""
+    g = np.asarray(grid_flow, dtype=float)
+    dt = pd.Timedelta(index.freq).total_seconds() / 3600
+    import_rate, export_rate = energy_rates(index, electricity_contract, prices)
+    energy = float(np.sum(dt * (import_rate * np.clip(-g, 0, None) - export_rate * np.clip(g, 0, None))))
+    capacity = 0.0
+    if capacity_tariff:
+        block_codes, month_codes, n_months = _quarter_hour_blocks(index)
+        block_offtake = np.bincount(block_codes, weights=-g) / np.bincount(block_codes)
+        peaks = np.zeros(n_months)
+        np.maximum.at(peaks, month_codes, block_offtake)
+        billed = max(float(peaks.mean()), MIN_BILLED_PEAK_KW)
+        capacity = billed * electricity_contract.capacity_tariff_rate
+    return {"energy_cost": energy, "capacity_cost": capacity, "total_cost": energy + capacity}
+
+
+@profiled("optimal_power_flow", rows=rows_of_self_pd)
+def optimal_power_flow(self, electricity_contract, max_charge: float = 8, max_AC_power_output: float = 5,
+                       max_DC_batterypower: float = 5, max_PV_input: float = 10, EV_type: str = 'no_EV',
+                       battery_roundtrip_efficiency: float = 97.5, battery_PeakPower: float = 11,
+                       prices=None, capacity_tariff: bool = True, initial_charge: Optional[float] = None,
+                       time_limit: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Cost-optimal battery dispatch over the whole DataFrame (see the module docstring).
+
+    Writes the same columns as `power_flow` (BatteryCharge [kWh], GridFlow [kW], BatteryFlow [kW, >0 charging],
+    EVCharge, EVFlow) plus Curtailment [kW], and returns the solve summary: status, objective, energy and
+    capacity cost, solve time.
+
+    Args:
+        electricity_contract: ElectricityContract whose DualTariff/DynamicTariff rates are minimised.
+        max_charge (float): battery capacity in kWh.
+        prices: Belpex prices in €/MWh per row for a DynamicTariff; defaults to the BelpexFilter column.
+        capacity_tariff (bool): include the capacity tariff on the monthly offtake peaks.
+        initial_charge (float): battery charge at the start in kWh; defaults to 10% of max_charge, as power_flow.
+        EV_type (str): 'no_EV', 'with_SC', 'no_SC' or 'smart' (the EV load is added to the household load). 'B2G' is
+            not supported: its driving schedule is not a linear model.
+        time_limit (float): HiGHS time limit in seconds.
+    """
+    from scipy import sparse
+    from scipy.optimize import Bounds, LinearConstraint, milp
+
+    index = self.pd.index
+    T = len(index)
+    dt = pd.Timedelta(index.freq).total_seconds() / 3600
+    eta = battery_roundtrip_efficiency / 100
+    power_limit = min(max_DC_batterypower, battery_PeakPower)
+
+    EV_load = _EV_load(self.pd, EV_type, 'optimal_power_flow')
+    prices = _prices(self.pd, prices)
+    import_rate, export_rate = energy_rates(index, electricity_contract, prices)
+
+    pv = np.minimum(self.pd['PV_generated_power'].to_numpy(dtype=float), max_PV_input)
+    load = self.pd['Load_kW'].to_numpy(dtype=float) + EV_load
+    soc0 = 0.1 * max_charge if initial_charge is None else float(initial_charge)
+
+    # steps where simultaneous import and export would be profitable get a binary z
+    conflict = np.flatnonzero(export_rate > import_rate)
+    K = len(conflict)
+
+    # variable layout: c, d, imp, exp, cur, soc (T each), monthly peaks, the billed peak, then z (K)
+    C, D, IMP, EXP, CUR, SOC = (k * T for k in range(6))
+    block_codes, month_codes, n_months = _quarter_hour_blocks(index)
+    n_blocks = len(month_codes)
+    PEAK = 6 * T
+    BILL = PEAK + n_months
+    Z = BILL + 1 if capacity_tariff else PEAK
+    n_vars = Z + K
+
+    cost = np.zeros(n_vars)
+    cost[IMP:IMP + T] = dt * import_rate
+    cost[EXP:EXP + T] = -dt * export_rate
+    if capacity_tariff:
+        cost[BILL] = electricity_contract.capacity_tariff_rate
+
+    eye = sparse.identity(T, format='csr')
+    zero = sparse.csr_matrix((T, T))
+    # SOC: soc_t - soc_{t-1} - dt*c_t + dt*d_t = 0 (soc_{-1} = soc0 moves to the right hand side)
+    shift = sparse.eye(T, k=-1, format='csr')
+    A_eq = sparse.bmat([
+        [eye, -eta * eye, -eye, eye, eye, zero],
+        [-dt * eye, dt * eye, zero, zero, zero, eye - shift],
+    ], format='csr')
+    A_eq = sparse.hstack([A_eq, sparse.csr_matrix((2 * T, n_vars - 6 * T))], format='csr')
+    b_eq = np.concatenate([pv - load, np.zeros(T)])
+    b_eq[T] = soc0
+    constraints = [LinearConstraint(A_eq, b_eq, b_eq)]
+
+    if capacity_tariff:
+        # block mean of (imp - exp) - peak_month <= 0
+        sizes = np.bincount(block_codes, minlength=n_blocks).astype(float)
+        weights = 1.0 / sizes[block_codes]
+        steps = np.arange(T)
+        block_rows = sparse.csr_matrix(
+            (np.concatenate([weights, -weights, -np.ones(n_blocks)]),
+             (np.concatenate([block_codes, block_codes, np.arange(n_blocks)]),
+              np.concatenate([IMP + steps, EXP + steps, PEAK + month_codes]))),
+            shape=(n_blocks, n_vars),
+        )
+        # mean of the monthly peaks - billed peak <= 0
+        bill_row = sparse.csr_matrix(
+            (np.concatenate([np.full(n_months, 1.0 / n_months), [-1.0]]),
+             (np.zeros(n_months + 1, dtype=int), np.concatenate([PEAK + np.arange(n_months), [BILL]]))),
+            shape=(1, n_vars),
+        )
+        constraints.append(LinearConstraint(sparse.vstack([block_rows, bill_row], format='csr'),
+                                            -np.inf, np.zeros(n_blocks + 1)))
+
+    if K:
+        # exp_t - max_AC * z_k <= 0 and imp_t + M_t * z_k <= M_t
+        big_m = load[conflict] + power_limit
+        rows = np.arange(K)
+        exclusive = sparse.csr_matrix(
+            (np.concatenate([np.ones(K), np.full(K, -float(max_AC_power_output)), np.ones(K), big_m]),
+             (np.concatenate([rows, rows, K + rows, K + rows]),
+              np.concatenate([EXP + conflict, Z + rows, IMP + conflict, Z + rows]))),
+            shape=(2 * K, n_vars),
+        )
+        constraints.append(LinearConstraint(exclusive, -np.inf, np.concatenate([np.zeros(K), big_m])))
+
+    lower = np.zeros(n_vars)
+    upper = np.full(n_vars, np.inf)
+    upper[C:C + T] = power_limit
+    upper[D:D + T] = power_limit
+    upper[EXP:EXP + T] = max_AC_power_output
+    upper[CUR:CUR + T] = np.clip(pv, 0, None)
+    upper[SOC:SOC + T] = max_charge
+    upper[Z:] = 1
+    if capacity_tariff:
+        lower[BILL] = MIN_BILLED_PEAK_KW
+    integrality = np.zeros(n_vars)
+    integrality[Z:] = 1
+
+    options = {} if time_limit is None else {'time_limit': float(time_limit)}
+    start = time.perf_counter()
+    result = milp(cost, constraints=constraints, integrality=integrality, bounds=Bounds(lower, upper),
+                  options=options)
+    solve_s = time.perf_counter() - start
+    if result.x is None:
+        raise RuntimeError(f"Battery dispatch LP failed: {result.message}")
+
+    x = result.x
+    charge, discharge = x[C:C + T], x[D:D + T]
+    grid_flow = x[EXP:EXP + T] - x[IMP:IMP + T]
+    self.pd['BatteryCharge'] = x[SOC:SOC + T]
+    self.pd['GridFlow'] = grid_flow
+    self.pd['BatteryFlow'] = charge - discharge
+    self.pd['EVCharge'] = 0.0
+    self.pd['EVFlow'] = EV_load
+    self.pd['Curtailment'] = x[CUR:CUR + T]
+
+    costs = dispatch_cost(index, grid_flow, electricity_contract, prices, capacity_tariff)
+    return {
+        'status': result.status,
+        'message': result.message,
+        'objective': float(result.fun),
+        **costs,
+        'solve_s': solve_s,
+        'variables': n_vars,
+        'binaries': K,
+        'constraints': sum(constraint.A.shape[0] for constraint in constraints),
+    }
@@ -0,0 +1,140 @@
+"""
+Battery arbitrage by dynamic programming over a discretised state of charge.
+
+`dp_power_flow` needs no solver and, unlike the LP of `_dispatch`, accepts
+non-convex rules: discharging is only allowed inside `discharge_hours`
+(04:00-23:00 as in `battery()`) and the cost of every step is evaluated on
+the net grid flow, so injection and offtake never happen at once.
+
+The battery charge takes `soc_levels` values 0, Δ, ..., max_charge. A step
+moves it by a whole number of levels o (at most the battery power), which
+fixes the charge/discharge power and thereby the grid flow and its cost
+for that step. The cost of a move only depends on o, not on the charge it
+starts from, so backward induction is a min-plus convolution of the value
+function with the (T x moves) cost table:
+
+    V_t(j) = min_o cost_t(o) + V_{t+1}(j + o),   V_T = 0
+
+done for all levels at once with NumPy; the forward pass then follows the
+stored best moves from the initial charge. Only the energy part of the bill
+is optimised (the capacity tariff couples all steps of a month).
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from powercalculations._dispatch import _EV_load, _prices, dispatch_cost, energy_rates
+from powercalculations.profiling import profiled, rows_of_self_pd
+
+
+def _step_costs(moves: np.ndarray, pv: np.ndarray, load: np.ndarray, import_rate: np.ndarray,
+                export_rate: np.ndarray, dt: float, eta: float, max_AC_power_output: float):
+    """(cost, grid flow, curtailment) of every (step, move), moves in kWh of battery charge."""
+    charge = np.clip(moves, 0, None) / dt
+    discharge = np.clip(-moves, 0, None) / dt
+    flow = (pv - load)[:, None] - charge[None, :] + eta * discharge[None, :]
+
+    # curtail what the inverter cannot inject, and all PV surplus when injecting costs money
+    injected = np.clip(flow, 0, None)
+    curtail = np.clip(injected - max_AC_power_output, 0, None)
+    paid = (export_rate < 0)[:, None]
+    curtail = np.where(paid, np.minimum(injected, pv[:, None]), curtail)
+    flow = flow - curtail
+
+    cost = dt * (import_rate[:, None] * np.clip(-flow, 0, None) - export_rate[:, None] * np.clip(flow, 0, None))
+    return cost, flow, curtail
+
+
+@profiled("dp_power_flow", rows=rows_of_self_pd)
+def dp_power_flow(self, electricity_contract, max_charge: float = 8, max_AC_power_output: float = 5,
+                  max_DC_batterypower: float = 5, max_PV_input: float = 10, EV_type: str = 'no_EV',
+                  battery_roundtrip_efficiency: float = 97.5, battery_PeakPower: float = 11, prices=None,
+                  soc_levels: int = 201, discharge_hours: Optional[Tuple[int, int]] = (4, 23),
+                  initial_charge: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Energy-cost-optimal battery dispatch by dynamic programming (see the module docstring).
+
+    Writes the same columns as `power_flow` (BatteryCharge [kWh], GridFlow [kW], BatteryFlow [kW, >0 charging],
+    EVCharge, EVFlow) plus Curtailment [kW], and returns the DP objective (energy cost in €) with the cost of the
+    resulting GridFlow as in `_dispatch.dispatch_cost`.
+
+    Args:
+        electricity_contract: ElectricityContract whose DualTariff/DynamicTariff energy rates are minimised.
+        prices: Belpex prices in €/MWh per row for a DynamicTariff; defaults to the BelpexFilter column.
+        soc_levels (int): number of battery charge levels between 0 and max_charge.
+        discharge_hours (tuple): (first, last) hour, discharging is allowed from `first`:00 until `last`:00;
+            None allows it at any time.
+        initial_charge (float): battery charge at the start in kWh, rounded to the nearest level; defaults to
+            10% of max_charge, as power_flow.
+        The other arguments are those of `power_flow`; 'B2G' is not supported.
+    """
+    if soc_levels < 2:
+        raise ValueError("soc_levels should be at least 2")
+
+    index = self.pd.index
+    T = len(index)
+    dt = pd.Timedelta(index.freq).total_seconds() / 3600
+    eta = battery_roundtrip_efficiency / 100
+    power_limit = min(max_DC_batterypower, battery_PeakPower)
+
+    EV_load = _EV_load(self.pd, EV_type, 'dp_power_flow')
+    prices = _prices(self.pd, prices)
+    import_rate, export_rate = energy_rates(index, electricity_contract, prices)
+    pv = np.minimum(self.pd['PV_generated_power'].to_numpy(dtype=float), max_PV_input)
+    load = self.pd['Load_kW'].to_numpy(dtype=float) + EV_load
+
+    levels = soc_levels - 1
+    delta = max_charge / levels if max_charge > 0 else 0.0
+    reach = int(np.floor(power_limit * dt / delta + 1e-9)) if delta > 0 else 0
+    reach = min(reach, levels)
+    offsets = np.arange(-reach, reach + 1)
+    cost, flow, curtail = _step_costs(offsets * delta, pv, load, import_rate, export_rate, dt, eta,
+                                      max_AC_power_output)
+    if discharge_hours is not None:
+        first, last = discharge_hours
+        closed = ~((index.hour >= first) & (index.hour < last))
+        cost[np.asarray(closed)[:, None] & (offsets < 0)[None, :]] = np.inf
+
+    # backward induction; best[t, j] is the index into `offsets` of the best move from level j at step t
+    width = len(offsets)
+    value = np.zeros(soc_levels)
+    padded = np.full(soc_levels + 2 * reach, np.inf)
+    best = np.empty((T, soc_levels), dtype=np.int16 if width < 2 ** 15 else np.int32)
+    for t in range(T - 1, -1, -1):
+        padded[reach:reach + soc_levels] = value
+        totals = np.lib.stride_tricks.sliding_window_view(padded, width) + cost[t]
+        best[t] = np.argmin(totals, axis=1)
+        value = totals[np.arange(soc_levels), best[t]]
+
+    soc0 = 0.1 * max_charge if initial_charge is None else float(initial_charge)
+    level = int(round(soc0 / delta)) if delta > 0 else 0
+    objective = float(value[level])
+
+    moves = np.empty(T, dtype=int)
+    charge_levels = np.empty(T, dtype=int)
+    for t in range(T):
+        moves[t] = best[t, level]
+        level += offsets[moves[t]]
+        charge_levels[t] = level
+
+    steps = np.arange(T)
+    battery_flow = offsets[moves] * delta / dt
+    grid_flow = flow[steps, moves]
+
+    self.pd['BatteryCharge'] = charge_levels * delta
+    self.pd['GridFlow'] = grid_flow
+    self.pd['BatteryFlow'] = battery_flow
+    self.pd['EVCharge'] = 0.0
+    self.pd['EVFlow'] = EV_load
+    self.pd['Curtailment'] = curtail[steps, moves]
+
+    costs = dispatch_cost(index, grid_flow, electricity_contract, prices, capacity_tariff=False)
+    return {
+        'objective': objective,
+        **costs,
+        'soc_levels': soc_levels,
+        'moves': width,
+    }
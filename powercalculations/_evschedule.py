@@ -0,0 +1,124 @@
+"""
+EV behaviour as a schedule table instead of weekday/hour branches.
+
+A schedule is a DataFrame with one row per window:
+
+    weekdays   tuple of weekdays (0 = Monday) the window applies to
+    start/end  hours, the window covers start <= hour < end
+    mode       'away'      the car is not home: no power, the charge drops by `drain`
+               'follow'    at home and bidirectional: covers household deficits down to
+                           `min_soc`, takes PV surplus up to the maximum charge
+               'charge'    at home and charging at full power up to the maximum charge
+               'discharge' at home and discharging towards `min_soc` to cover deficits
+    min_soc    lowest state of charge while discharging, as a share of the battery
+    drain      energy used while away, in kWh per hour
+
+`compile_EV_schedule` resolves the table once into per-timestep arrays
+(mode code, minimum charge, drain per step), and `EV_schedule_step` is the
+stepper the array engine calls with them, so the simulation loop has no
+calendar logic left. `DEFAULT_EV_SCHEDULE` is the 'B2G' behaviour of
+`_powerflows.EV`, and the array engine reproduces that function with it.
+
+Charges are in the units of `power_flow` (kWh times steps per hour), in
+which a drain of x kWh per hour is x per step at every data frequency.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+EV_MODES = ('away', 'follow', 'charge', 'discharge')
+AWAY, FOLLOW, CHARGE, DISCHARGE = range(len(EV_MODES))
+
+# at most 80% charged, as in `_powerflows.EV`
+EV_MAX_SOC = 0.8
+
+_WORKDAYS = (0, 1, 2, 3, 4)
+_WEEKEND = (5, 6)
+
+DEFAULT_EV_SCHEDULE = pd.DataFrame(
+    [
+        # weekdays: away at work (Wednesday afternoon at home), home in the morning and evening
+        ((0, 1, 3, 4), 9, 17, 'away', 0.0, 1.3),
+        ((2,), 9, 13, 'away', 0.0, 1.3),
+        (_WORKDAYS, 6, 9, 'follow', 0.4, 0.0),
+        (_WORKDAYS, 17, 22, 'follow', 0.2, 0.0),
+        ((2,), 13, 17, 'follow', 0.2, 0.0),
+        (_WORKDAYS, 0, 6, 'charge', 0.0, 0.0),
+        (_WORKDAYS, 22, 24, 'charge', 0.0, 0.0),
+        # weekend: charging around noon, two trips
+        (_WEEKEND, 11, 17, 'charge', 0.0, 0.0),
+        (_WEEKEND, 0, 9, 'discharge', 0.2, 0.0),
+        (_WEEKEND, 17, 19, 'discharge', 0.4, 0.0),
+        (_WEEKEND, 22, 24, 'discharge', 0.4, 0.0),
+        (_WEEKEND, 9, 11, 'away', 0.0, 1.5),
+        (_WEEKEND, 19, 22, 'away', 0.0, 1.5),
+    ],
+    columns=['weekdays', 'start', 'end', 'mode', 'min_soc', 'drain'],
+)
+
+
+@dataclass(frozen=True)
+class CompiledEVSchedule:
+    """Per-timestep EV arrays of a schedule (charges in `power_flow` units)."""
+    mode: np.ndarray
+    min_capacity: np.ndarray
+    drain: np.ndarray
+    max_capacity: float
+
+
+def _week_table(schedule: pd.DataFrame):
+    """(mode, min_soc, drain) lookup tables of shape (7, 24); every hour of the week must be covered once."""
+    mode = np.full((7, 24), -1, dtype=np.int8)
+    min_soc = np.zeros((7, 24))
+    drain = np.zeros((7, 24))
+    for window in schedule.itertuples(index=False):
+        if window.mode not in EV_MODES:
+            raise ValueError(f"Unknown EV schedule mode {window.mode!r}; expected one of {EV_MODES}")
+        if not 0 <= window.start < window.end <= 24:
+            raise ValueError(f"EV schedule window {window.start}-{window.end} is not within 0-24 h")
+        days = np.asarray(window.weekdays, dtype=int)
+        hours = np.arange(window.start, window.end)
+        if (mode[np.ix_(days, hours)] >= 0).any():
+            raise ValueError(f"EV schedule windows overlap on weekdays {tuple(days)}, {window.start}-{window.end} h")
+        mode[np.ix_(days, hours)] = EV_MODES.index(window.mode)
+        min_soc[np.ix_(days, hours)] = window.min_soc
+        drain[np.ix_(days, hours)] = window.drain
+    if (mode < 0).any():
+        day, hour = np.argwhere(mode < 0)[0]
+        raise ValueError(f"EV schedule does not cover weekday {day} at {hour}:00")
+    return mode, min_soc, drain
+
+
+def compile_EV_schedule(index: pd.DatetimeIndex, max_EV_charge: float,
+                        schedule: Optional[pd.DataFrame] = None) -> CompiledEVSchedule:
+    """
+    Resolve `schedule` (default: `DEFAULT_EV_SCHEDULE`) for every timestamp of `index`; `max_EV_charge` is the
+    battery size already converted to the data frequency, as in `power_flow`.
+    """
+    mode, min_soc, drain = _week_table(DEFAULT_EV_SCHEDULE if schedule is None else schedule)
+    weekday = index.weekday.to_numpy()
+    hour = index.hour.to_numpy()
+    return CompiledEVSchedule(
+        mode=mode[weekday, hour],
+        min_capacity=max_EV_charge * min_soc[weekday, hour],
+        drain=drain[weekday, hour],
+        max_capacity=EV_MAX_SOC * max_EV_charge,
+    )
+
+
+def EV_schedule_step(mode: int, min_capacity: float, drain: float, load_to_EV: float, old_capacity: float,
+                     max_EV_power: float, max_capacity: float):
+    """One step of the EV in schedule `mode`; returns (load after the EV, new EV charge) as `_powerflows.EV`."""
+    if mode == AWAY:
+        return load_to_EV, old_capacity - drain
+    if mode == CHARGE or (mode == FOLLOW and load_to_EV >= 0):
+        max_input = min(max_EV_power, max_capacity - old_capacity)
+        if mode == FOLLOW:
+            max_input = min(max_input, load_to_EV)
+        return load_to_EV - max_input, old_capacity + max_input
+    max_output = min(max_EV_power, old_capacity - min_capacity, -load_to_EV)
+    return load_to_EV + max_output, old_capacity - max_output
@@ -0,0 +1,225 @@
+"""
+Several EVs on one site (`fleet_power_flow`).
+
+`power_flow` simulates one EV through a single `EV_type`. A fleet is a list
+of `EVSpec`s (battery, charger power, schedule table of `_evschedule`,
+whether it may feed the house, priority), and the whole fleet is stepped
+together: the charge of every vehicle is one entry of a state vector, and
+the schedules are compiled up front into (rows x vehicles) arrays, so a
+step is a handful of NumPy operations whatever the fleet size.
+
+Every step, in this order:
+
+1. vehicles that are 'away' use their drain
+2. vehicles in 'charge' mode charge at full power, from the grid if needed
+3. what is left of the PV surplus goes to the 'follow' and 'discharge'
+   vehicles, or, on a deficit, V2G vehicles in 'follow' or 'discharge'
+   mode cover it down to their minimum charge
+4. the stationary battery and the grid take the rest, as in `power_flow`
+
+Steps 2 and 3 share the site's charger power (`site_EV_power`) and the
+surplus or deficit between the vehicles by `sharing`:
+
+    'priority'      by decreasing `EVSpec.priority`, ties in fleet order
+    'proportional'  in proportion to what each vehicle asks
+    'equal'         the same power for all, vehicles asking less get what they ask
+
+A one-vehicle fleet with a schedule without 'discharge' windows gives the
+same result as `power_flow(EV_type='B2G', engine='array')`; on a surplus a
+'discharge' vehicle charges at most its charger power, where `EV()` takes
+the whole surplus.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from powercalculations._arrayengine import battery_step
+from powercalculations._evschedule import (AWAY, CHARGE, DEFAULT_EV_SCHEDULE, DISCHARGE, EV_MAX_SOC, FOLLOW,
+                                           _week_table)
+from powercalculations.profiling import profiled, rows_of_self_pd
+from powercalculations.progress import as_reporter
+
+SHARING_RULES = ('priority', 'proportional', 'equal')
+
+# rows between two progress updates
+_PROGRESS_BLOCK = 4096
+
+
+@dataclass(frozen=True)
+class EVSpec:
+    """One vehicle of a fleet; capacity in kWh, charger_power in kW, schedule as in `_evschedule`."""
+    name: Optional[str] = None
+    capacity: float = 82.3
+    charger_power: float = 3.7
+    schedule: Optional[pd.DataFrame] = None
+    V2G: bool = True
+    priority: int = 0
+    initial_soc: float = 0.5
+
+
+def share_power(requests: np.ndarray, budget: float, sharing: str, order: np.ndarray) -> np.ndarray:
+    """
+    Split `budget` over `requests` (both >= 0) by `sharing`; nobody gets more than asked. `order` is the
+    serving order of the 'priority' rule.
+    """
+    total = requests.sum()
+    if total <= budget:
+        return requests
+    if budget <= 0:
+        return np.zeros_like(requests)
+    if sharing == 'proportional':
+        return requests * (budget / total)
+    if sharing == 'priority':
+        ranked = requests[order]
+        before = np.cumsum(ranked) - ranked
+        shares = np.empty_like(requests)
+        shares[order] = np.clip(budget - before, 0, ranked)
+        return shares
+    # equal: water filling, the level at which the capped requests add up to the budget
+    ranked = np.sort(requests)
+    before = np.cumsum(ranked) - ranked
+    left = len(ranked) - np.arange(len(ranked))
+    k = int(np.argmax(before + ranked * left >= budget))
+    return np.minimum(requests, (budget - before[k]) / left[k])
+
+
+def _compile_fleet(index: pd.DatetimeIndex, fleet: List[EVSpec], interval: float):
+    """(mode, minimum charge, drain) arrays of shape (rows, vehicles) and the maximum charge per vehicle."""
+    weekday = index.weekday.to_numpy()
+    hour = index.hour.to_numpy()
+    tables = {}
+    n, m = len(index), len(fleet)
+    mode = np.empty((n, m), dtype=np.int8)
+    min_capacity = np.empty((n, m))
+    drain = np.empty((n, m))
+    for j, spec in enumerate(fleet):
+        schedule = DEFAULT_EV_SCHEDULE if spec.schedule is None else spec.schedule
+        if id(schedule) not in tables:
+            tables[id(schedule)] = _week_table(schedule)
+        modes, min_soc, drains = tables[id(schedule)]
+        mode[:, j] = modes[weekday, hour]
+        min_capacity[:, j] = spec.capacity * interval * min_soc[weekday, hour]
+        drain[:, j] = drains[weekday, hour]
+    max_capacity = np.array([EV_MAX_SOC * spec.capacity * interval for spec in fleet])
+    return mode, min_capacity, drain, max_capacity
+
+
+def fleet_power_flow_arrays(frame: pd.DataFrame, fleet: List[EVSpec], *, interval: float, max_charge: float,
+                            max_AC_power_output: float, max_DC_batterypower: float, max_PV_input: float,
+                            battery_roundtrip_efficiency: float, battery_PeakPower: float,
+                            site_EV_power: Optional[float] = None, sharing: str = 'priority',
+                            stage=None) -> Dict[str, np.ndarray]:
+    """
+    The fleet simulation on column arrays; `max_charge` is already converted to the data frequency, as in
+    `power_flow_arrays`. Returns the site columns (BatteryCharge, GridFlow, BatteryFlow) and the (rows x vehicles)
+    arrays EVCharge [kWh] and EVFlow [kW, > 0 charging].
+    """
+    if sharing not in SHARING_RULES:
+        raise ValueError(f"sharing should be one of {SHARING_RULES}")
+    if not fleet:
+        raise ValueError("The fleet should contain at least one EV")
+
+    mode, min_capacity, drain, max_capacity = _compile_fleet(frame.index, fleet, interval)
+    away = mode == AWAY
+    forced = mode == CHARGE
+    takes_surplus = (mode == FOLLOW) | (mode == DISCHARGE)
+    V2G = np.array([spec.V2G for spec in fleet])
+    gives = takes_surplus & V2G[None, :]
+    power = np.array([spec.charger_power for spec in fleet], dtype=float)
+    order = np.argsort([-spec.priority for spec in fleet], kind='stable')
+    site_power = np.inf if site_EV_power is None else float(site_EV_power)
+
+    pv_column = np.minimum(frame['PV_generated_power'].to_numpy(dtype=float), max_PV_input).tolist()
+    load_column = frame['Load_kW'].tolist()
+    hours = frame.index.hour.tolist()
+    max_DC_batterypower = min(max_DC_batterypower, battery_PeakPower)
+
+    capacity = np.array([spec.initial_soc * spec.capacity * interval for spec in fleet])
+    previous_charge_battery = 0.1 * max_charge
+    n = len(pv_column)
+    EV_charge = np.empty((n, len(fleet)))
+    EV_flow = np.empty((n, len(fleet)))
+    battery_charge = np.empty(n)
+    grid_flow = np.empty(n)
+    battery_flow = np.empty(n)
+
+    for i in range(n):
+        if stage is not None and not i % _PROGRESS_BLOCK:
+            stage.update(i)
+        load = -load_column[i]
+        excess_load = -max(0, -load - max_AC_power_output)
+        load = load - excess_load
+        load_to_EV = pv_column[i] + load
+
+        headroom = np.minimum(power, np.clip(max_capacity - capacity, 0, None))
+        charging = share_power(np.where(forced[i], headroom, 0.0), site_power, sharing, order)
+        used = charging.sum()
+        net = load_to_EV - used
+        if net > 0:
+            extra = share_power(np.where(takes_surplus[i], headroom, 0.0), min(net, site_power - used), sharing,
+                                order)
+            charging = charging + extra
+            flow = charging
+        elif net < 0 and gives[i].any():
+            available = np.where(gives[i], np.minimum(power, np.clip(capacity - min_capacity[i], 0, None)), 0.0)
+            flow = charging - share_power(available, min(-net, site_power - used), sharing, order)
+        else:
+            flow = charging
+        capacity = capacity + flow - np.where(away[i], drain[i], 0.0)
+
+        load_to_battery = load_to_EV - flow.sum()
+        load_from_battery, previous_charge_battery = battery_step(hours[i], load_to_battery, previous_charge_battery,
+                                                                  max_charge, max_DC_batterypower,
+                                                                  battery_roundtrip_efficiency)
+        grid_flow[i] = min(load_from_battery, max_AC_power_output) + excess_load
+        battery_charge[i] = previous_charge_battery / interval
+        battery_flow[i] = load_to_battery - load_from_battery
+        EV_charge[i] = capacity / interval
+        EV_flow[i] = flow
+    if stage is not None:
+        stage.update(n)
+
+    return {'BatteryCharge': battery_charge, 'GridFlow': grid_flow, 'BatteryFlow': battery_flow,
+            'EVCharge': EV_charge, 'EVFlow': EV_flow}
+
+
+@profiled("fleet_power_flow", rows=rows_of_self_pd)
+def fleet_power_flow(self, fleet: Iterable[EVSpec], max_charge: float = 8, max_AC_power_output: float = 5,
+                     max_DC_batterypower: float = 5, max_PV_input: float = 10,
+                     battery_roundtrip_efficiency: float = 97.5, battery_PeakPower: float = 11,
+                     site_EV_power: Optional[float] = None, sharing: str = 'priority',
+                     progress=None) -> Dict[str, pd.DataFrame]:
+    """
+    Power flow of the site with a fleet of EVs (see the module docstring).
+
+    Writes the same columns as `power_flow`, with EVCharge [kWh] and EVFlow [kW] summed over the fleet, and
+    returns the per-vehicle EVCharge and EVFlow as DataFrames with one column per vehicle.
+
+    Args:
+        fleet: the EVSpec of every vehicle; vehicles without a name are called EV0, EV1, ...
+        site_EV_power (float): power of all chargers together in kW, shared by `sharing`; unlimited by default.
+        sharing (str): 'priority', 'proportional' or 'equal'.
+        The other arguments are those of `power_flow`.
+    """
+    fleet = list(fleet)
+    names = [spec.name or f'EV{j}' for j, spec in enumerate(fleet)]
+    if len(set(names)) != len(names):
+        raise ValueError("The EVs of a fleet should have distinct names")
+    interval = 3600 / pd.Timedelta(self.pd.index.freq).total_seconds()
+    with as_reporter(progress).stage("fleet_power_flow", total=self.pd.shape[0]) as stage:
+        columns = fleet_power_flow_arrays(
+            self.pd, fleet, interval=interval, max_charge=max_charge * interval,
+            max_AC_power_output=max_AC_power_output, max_DC_batterypower=max_DC_batterypower,
+            max_PV_input=max_PV_input, battery_roundtrip_efficiency=battery_roundtrip_efficiency,
+            battery_PeakPower=battery_PeakPower, site_EV_power=site_EV_power, sharing=sharing, stage=stage,
+        )
+    for column in ('BatteryCharge', 'GridFlow', 'BatteryFlow'):
+        self.pd[column] = columns[column]
+    self.pd['EVCharge'] = columns['EVCharge'].sum(axis=1)
+    self.pd['EVFlow'] = columns['EVFlow'].sum(axis=1)
+    return {column: pd.DataFrame(columns[column], index=self.pd.index, columns=names)
+            for column in ('EVCharge', 'EVFlow')}
@@ -0,0 +1,245 @@
+"""
+Rolling-horizon (model-predictive) battery dispatch.
+
+`optimal_power_flow` plans the whole DataFrame at once with perfect
+foresight. `mpc_power_flow` decides like a home energy management system:
+every `step_hours` it plans the next `horizon_hours` on the day-ahead Belpex
+prices and a forecast of load and PV, executes the first `step_hours` of that
+plan on the measured load and PV, and continues from the resulting battery
+charge. Executing means following the planned grid flow: the battery takes
+up the forecast error as far as its power and charge allow.
+
+Each window is the LP of `_dispatch` with a single capacity peak: the peak
+may not drop below the month-to-date realised peak and every kW above it
+costs capacity_tariff_rate / (number of months). All windows have the same
+number of steps, so the sparse matrices are built once and only the cost
+vector, the right hand sides (forecast balance, initial charge) and the
+bounds (curtailable PV, month-to-date peak) change per window. Injection
+is never paid more than offtake within a window (the export rate is capped
+at the import rate), which keeps every window a plain LP.
+
+scipy's HiGHS interface has no warm-start hook, so the previous plan is
+reused differently: if a window does not solve (e.g. `time_limit` hit), the
+remaining part of the previous plan is executed instead.
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from powercalculations._dispatch import _EV_load, _prices, dispatch_cost, energy_rates
+from powercalculations.profiling import profiled, rows_of_self_pd
+
+
+class _WindowLP:
+    """Sparse dispatch LP of one window with `n_steps` steps; build once, solve per window."""
+
+    def __init__(self, n_steps: int, dt: float, steps_per_block: int, eta: float, power_limit: float,
+                 max_AC_power_output: float, max_charge: float, capacity_tariff: bool) -> None:
+        from scipy import sparse
+
+        H = n_steps
+        self.n_steps = H
+        self.dt = dt
+        self.capacity_tariff = capacity_tariff
+        self.n_vars = 6 * H + (1 if capacity_tariff else 0)
+
+        eye = sparse.identity(H, format='csr')
+        zero = sparse.csr_matrix((H, H))
+        shift = sparse.eye(H, k=-1, format='csr')
+        A_eq = sparse.bmat([
+            [eye, -eta * eye, -eye, eye, eye, zero],
+            [-dt * eye, dt * eye, zero, zero, zero, eye - shift],
+        ], format='csr')
+        self.A_eq = sparse.hstack([A_eq, sparse.csr_matrix((2 * H, self.n_vars - 6 * H))], format='csr')
+
+        self.A_ub = None
+        if capacity_tariff:
+            # block mean of (imp - exp) - peak <= 0
+            blocks = np.arange(H) // steps_per_block
+            n_blocks = int(blocks[-1]) + 1
+            weights = 1.0 / np.bincount(blocks)[blocks]
+            steps = np.arange(H)
+            self.A_ub = sparse.csr_matrix(
+                (np.concatenate([weights, -weights, -np.ones(n_blocks)]),
+                 (np.concatenate([blocks, blocks, np.arange(n_blocks)]),
+                  np.concatenate([2 * H + steps, 3 * H + steps, np.full(n_blocks, 6 * H)]))),
+                shape=(n_blocks, self.n_vars),
+            )
+            self.b_ub = np.zeros(n_blocks)
+
+        self.bounds = np.zeros((self.n_vars, 2))
+        self.bounds[:, 1] = np.inf
+        self.bounds[0:2 * H, 1] = power_limit
+        self.bounds[3 * H:4 * H, 1] = max_AC_power_output
+        self.bounds[5 * H:6 * H, 1] = max_charge
+
+    def solve(self, import_rate, export_rate, pv, load, soc0: float, peak_floor: float, peak_cost: float,
+              time_limit: Optional[float] = None):
+        from scipy.optimize import linprog
+
+        H = self.n_steps
+        cost = np.zeros(self.n_vars)
+        cost[2 * H:3 * H] = self.dt * import_rate
+        cost[3 * H:4 * H] = -self.dt * np.minimum(export_rate, import_rate)
+        b_eq = np.concatenate([pv - load, np.zeros(H)])
+        b_eq[H] = soc0
+        bounds = self.bounds.copy()
+        bounds[4 * H:5 * H, 1] = np.clip(pv, 0, None)
+        if self.capacity_tariff:
+            cost[6 * H] = peak_cost
+            bounds[6 * H, 0] = peak_floor
+
+        options = {} if time_limit is None else {'time_limit': float(time_limit)}
+        return linprog(cost, A_ub=self.A_ub, b_ub=self.b_ub if self.capacity_tariff else None, A_eq=self.A_eq,
+                       b_eq=b_eq, bounds=bounds, method='highs', options=options)
+
+
+def _forecast(actual: np.ndarray, start: int, stop: int, steps_per_day: int, forecast: str) -> np.ndarray:
+    """Forecast of `actual[start:stop]` made at `start`: the actual values, or the last observed day repeated."""
+    if forecast == 'perfect' or start < steps_per_day:
+        return actual[start:stop]
+    last_day = actual[start - steps_per_day:start]
+    return np.resize(last_day, stop - start)
+
+
+def _track_step(t: int, grid_target: float, planned_curtailment: float, soc: float, pv, load, charge, discharge,
+                curtailment, grid_flow, dt: float, eta: float, power_limit: float, max_charge: float,
+                max_AC_power_output: float) -> float:
+    """
+    Execute step `t` of a plan on the measured PV and load: the battery takes up the forecast error so the grid
+    flow follows the planned one as far as its power and charge allow. Fills the output arrays, returns the charge.
+    """
+    cur = min(planned_curtailment, pv[t])
+    net = pv[t] - cur - load[t] - grid_target
+    c = d = 0.0
+    if net > 0:
+        c = min(net, power_limit, (max_charge - soc) / dt)
+    else:
+        d = min(-net / eta, power_limit, soc / dt)
+    flow = pv[t] - cur - load[t] - c + eta * d
+    # the inverter clips what it cannot inject
+    clipped = max(flow - max_AC_power_output, 0.0)
+    charge[t], discharge[t], curtailment[t], grid_flow[t] = c, d, cur + clipped, flow - clipped
+    return soc + dt * (c - d)
+
+
+@profiled("mpc_power_flow", rows=rows_of_self_pd)
+def mpc_power_flow(self, electricity_contract, max_charge: float = 8, max_AC_power_output: float = 5,
+                   max_DC_batterypower: float = 5, max_PV_input: float = 10, EV_type: str = 'no_EV',
+                   battery_roundtrip_efficiency: float = 97.5, battery_PeakPower: float = 11, prices=None,
+                   capacity_tariff: bool = True, initial_charge: Optional[float] = None,
+                   horizon_hours: float = 36, step_hours: float = 24, forecast: str = 'persistence',
+                   time_limit: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Rolling-horizon battery dispatch (see the module docstring).
+
+    Writes the same columns as `optimal_power_flow` and returns the cost of the realised GridFlow (same terms
+    as `_dispatch.dispatch_cost`) with the number of windows, failed windows and the total solve time.
+
+    Args:
+        electricity_contract: ElectricityContract whose DualTariff/DynamicTariff rates are minimised.
+        prices: Belpex prices in €/MWh per row, known a day ahead; defaults to the BelpexFilter column.
+        horizon_hours (float): length of every planning window.
+        step_hours (float): part of each plan that is executed before re-planning; at most horizon_hours.
+        forecast (str): load/PV forecast used for planning. 'persistence' repeats the last observed day
+            (the first day is planned on the actual values), 'perfect' uses the actual values.
+        initial_charge (float): battery charge at the start in kWh; defaults to 10% of max_charge.
+        time_limit (float): HiGHS time limit per window in seconds.
+        The other arguments are those of `optimal_power_flow`.
+    """
+    if forecast not in ('persistence', 'perfect'):
+        raise ValueError("forecast should be either 'persistence' or 'perfect'")
+    if not 0 < step_hours <= horizon_hours:
+        raise ValueError("step_hours should be positive and at most horizon_hours")
+
+    index = self.pd.index
+    T = len(index)
+    dt = pd.Timedelta(index.freq).total_seconds() / 3600
+    eta = battery_roundtrip_efficiency / 100
+    power_limit = min(max_DC_batterypower, battery_PeakPower)
+    steps_per_block = max(1, int(round(0.25 / dt)))
+    steps_per_day = int(round(24 / dt))
+    step = int(round(step_hours / dt))
+    horizon = int(round(horizon_hours / dt))
+    if step % steps_per_block:
+        raise ValueError("step_hours should be a whole number of 15 minute blocks")
+
+    EV_load = _EV_load(self.pd, EV_type, 'mpc_power_flow')
+    prices = _prices(self.pd, prices)
+    import_rate, export_rate = energy_rates(index, electricity_contract, prices)
+    pv = np.minimum(self.pd['PV_generated_power'].to_numpy(dtype=float), max_PV_input)
+    load = self.pd['Load_kW'].to_numpy(dtype=float) + EV_load
+    months = (index.year * 12 + index.month).to_numpy()
+    peak_cost = electricity_contract.capacity_tariff_rate / len(np.unique(months))
+
+    soc0 = 0.1 * max_charge if initial_charge is None else float(initial_charge)
+    soc = soc0
+    month_peaks: Dict[int, float] = {}
+    problems: Dict[int, _WindowLP] = {}
+    plan = None  # (grid flow, curtailment) of the rest of the previous plan
+    charge = np.zeros(T)
+    discharge = np.zeros(T)
+    curtailment = np.zeros(T)
+    grid_flow = np.zeros(T)
+    battery_charge = np.zeros(T)
+    windows = failed = 0
+    solve_s = 0.0
+
+    for start in range(0, T, step):
+        stop = min(start + horizon, T)
+        H = stop - start
+        if H not in problems:
+            problems[H] = _WindowLP(H, dt, steps_per_block, eta, power_limit, max_AC_power_output, max_charge,
+                                    capacity_tariff)
+        began = time.perf_counter()
+        result = problems[H].solve(
+            import_rate[start:stop], export_rate[start:stop],
+            _forecast(pv, start, stop, steps_per_day, forecast),
+            _forecast(load, start, stop, steps_per_day, forecast),
+            soc, month_peaks.get(months[start], 0.0), peak_cost, time_limit,
+        )
+        solve_s += time.perf_counter() - began
+        windows += 1
+
+        if result.x is not None:
+            x = result.x
+            plan = (x[3 * H:4 * H] - x[2 * H:3 * H], x[4 * H:5 * H])
+        else:
+            failed += 1
+            if plan is None or len(plan[0]) < H:
+                # nothing (long enough) to fall back on: self-consumption, i.e. aim for zero grid flow
+                plan = (np.zeros(H), np.zeros(H))
+
+        n = min(step, T - start)
+        for i in range(n):
+            t = start + i
+            soc = _track_step(t, plan[0][i], plan[1][i], soc, pv, load, charge, discharge, curtailment, grid_flow,
+                              dt, eta, power_limit, max_charge, max_AC_power_output)
+            battery_charge[t] = soc
+        plan = tuple(part[step:] for part in plan)
+
+        executed = grid_flow[start:start + n]
+        blocks = np.arange(n) // steps_per_block
+        block_offtake = np.bincount(blocks, weights=-executed) / np.bincount(blocks)
+        for month, offtake in zip(months[start:start + n:steps_per_block], block_offtake):
+            month_peaks[month] = max(month_peaks.get(month, 0.0), float(offtake))
+
+    self.pd['BatteryCharge'] = battery_charge
+    self.pd['GridFlow'] = grid_flow
+    self.pd['BatteryFlow'] = charge - discharge
+    self.pd['EVCharge'] = 0.0
+    self.pd['EVFlow'] = EV_load
+    self.pd['Curtailment'] = curtailment
+
+    costs = dispatch_cost(index, grid_flow, electricity_contract, prices, capacity_tariff)
+    return {
+        **costs,
+        'windows': windows,
+        'failed_windows': failed,
+        'structures': len(problems),
+        'solve_s': solve_s,
+    }
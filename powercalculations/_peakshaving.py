@@ -0,0 +1,195 @@
+"""
+Capacity-tariff-aware peak shaving (`power_flow(control="peak_shaving")`).
+
+The capacity tariff bills the average of the monthly peaks of the 15-minute
+mean offtake, while `battery()` empties the battery on the first deficit of
+the day. Peak shaving keeps two numbers of state per battery besides its
+charge: the month-to-date peak and the running sum of the offtake in the
+current 15-minute block. Every step the offtake allowed before a new peak
+is set follows from them,
+
+    allowed = max(peak_target, month_peak) * (steps in block so far + 1) - block_sum
+
+and the battery
+
+- charges from PV surplus, as `battery()`
+- covers deficits from 04:00 to 23:00 as `battery()`, but only down to
+  `peak_reserve` * max_charge
+- discharges below that reserve (at any hour) when the offtake would exceed
+  `allowed`
+- tops the reserve up from the grid when there is headroom under `allowed`
+
+Losses are applied as in `battery()`. The battery state is a vector, so one
+pass over the data simulates many battery sizes at once
+(`peak_shaving_sweep`).
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from powercalculations._dispatch import MIN_BILLED_PEAK_KW, _quarter_hour_blocks
+from powercalculations.profiling import profiled, rows_of_result
+from powercalculations.progress import as_reporter
+
+# rows between two progress updates
+_PROGRESS_BLOCK = 4096
+
+
+def _EV_power(frame: pd.DataFrame, EV_type: str) -> np.ndarray:
+    if EV_type == 'with_SC':
+        return frame['Load_EV_kW_with_SC'].to_numpy(dtype=float)
+    if EV_type == 'no_SC':
+        return frame['Load_EV_kW_no_SC'].to_numpy(dtype=float)
+    if EV_type == 'smart':
+        return frame['Load_EV_kW_smart'].to_numpy(dtype=float)
+    if EV_type == 'no_EV':
+        return np.zeros(len(frame))
+    if EV_type == 'B2G':
+        raise ValueError("peak shaving does not support EV_type='B2G'")
+    raise ValueError('EV_type should be either B2G, with_SC, no_SC, smart or no_EV')
+
+
+def peak_shaving_arrays(frame: pd.DataFrame, *, interval: float, max_charges, max_AC_power_output: float,
+                        max_DC_batterypower: float, max_PV_input: float, EV_type: str,
+                        battery_roundtrip_efficiency: float, battery_PeakPower: float,
+                        peak_target: Optional[float] = None, peak_reserve: float = 0.5,
+                        discharge_hours: Tuple[int, int] = (4, 23), stage=None) -> Dict[str, np.ndarray]:
+    """
+    Peak-shaving simulation for every battery size in `max_charges` (already converted to the data frequency,
+    as in `power_flow_arrays`). Returns (rows x sizes) arrays BatteryCharge, GridFlow, BatteryFlow and the
+    EVFlow column.
+    """
+    if not 0 <= peak_reserve <= 1:
+        raise ValueError("peak_reserve should be between 0 and 1")
+    target = MIN_BILLED_PEAK_KW if peak_target is None else float(peak_target)
+
+    max_charges = np.atleast_1d(np.asarray(max_charges, dtype=float))
+    pv_column = np.minimum(frame['PV_generated_power'].to_numpy(dtype=float), max_PV_input)
+    load_column = frame['Load_kW'].to_numpy(dtype=float)
+    EV_column = _EV_power(frame, EV_type)
+    index = frame.index
+    hours = index.hour.to_numpy()
+    block_codes = _quarter_hour_blocks(index)[0]
+    block_start = np.r_[True, block_codes[1:] != block_codes[:-1]]
+    month_codes = (index.year * 12 + index.month).to_numpy()
+    month_start = np.r_[True, month_codes[1:] != month_codes[:-1]]
+    first, last = discharge_hours
+
+    power = min(max_DC_batterypower, battery_PeakPower)
+    efficiency = battery_roundtrip_efficiency / 100
+    reserve = peak_reserve * max_charges
+    capacity = 0.1 * max_charges
+    month_peak = np.zeros_like(max_charges)
+    block_sum = np.zeros_like(max_charges)
+    block_steps = 0
+
+    n = len(index)
+    battery_charge = np.empty((n, len(max_charges)))
+    grid_flow = np.empty((n, len(max_charges)))
+    battery_flow = np.empty((n, len(max_charges)))
+    EV_flow = np.empty(n)
+
+    for i in range(n):
+        if stage is not None and not i % _PROGRESS_BLOCK:
+            stage.update(i)
+        if block_start[i]:
+            if block_steps:
+                np.maximum(month_peak, block_sum / block_steps, out=month_peak)
+            block_sum[:] = 0.0
+            block_steps = 0
+        if month_start[i]:
+            month_peak[:] = 0.0
+
+        load = -load_column[i]
+        excess_load = -max(0, -load - max_AC_power_output)
+        load = load - excess_load
+        load_to_EV = pv_column[i] + load
+        load_to_battery = load_to_EV - EV_column[i]
+        EV_flow[i] = load_to_EV - load_to_battery
+        # offtake the battery may leave this step; load beyond the inverter output is offtake anyway
+        allowed = np.maximum(target, month_peak) * (block_steps + 1) - block_sum + excess_load
+
+        if load_to_battery > 0:  # Excess power from PV
+            max_input = np.minimum(np.minimum(max_charges - capacity, load_to_battery), power)
+            from_battery = load_to_battery - max_input
+            capacity = capacity + max_input
+        else:
+            deficit = -load_to_battery
+            if first <= hours[i] < last:
+                own_use = np.minimum(np.minimum(np.clip(capacity - reserve, 0, None), deficit), power)
+            else:
+                own_use = np.zeros_like(capacity)
+            # clip a new peak with whatever is left in the battery
+            shave = np.minimum(np.minimum(power - own_use, capacity - own_use), deficit - own_use - allowed)
+            max_output = own_use + np.clip(shave, 0, None)
+            from_battery = (load_to_battery + max_output) * efficiency
+            # refill the reserve from the grid under the allowed offtake
+            refill = np.minimum(np.minimum(power - max_output, reserve - (capacity - max_output)),
+                                allowed + from_battery)
+            refill = np.clip(refill, 0, None)
+            from_battery = from_battery - refill
+            capacity = capacity - max_output + refill
+
+        flow = np.minimum(from_battery, max_AC_power_output) + excess_load
+        block_sum -= flow
+        block_steps += 1
+
+        battery_charge[i] = capacity / interval
+        grid_flow[i] = flow
+        battery_flow[i] = load_to_battery - from_battery
+    if stage is not None:
+        stage.update(n)
+
+    return {'BatteryCharge': battery_charge, 'GridFlow': grid_flow, 'BatteryFlow': battery_flow, 'EVFlow': EV_flow}
+
+
+def billed_peaks(index: pd.DatetimeIndex, grid_flow: np.ndarray) -> np.ndarray:
+    """Billed capacity [kW] per column of `grid_flow`: mean monthly peak of the 15-minute offtake, at least 2.5 kW."""
+    block_codes, month_codes, n_months = _quarter_hour_blocks(index)
+    flows = np.asarray(grid_flow, dtype=float).reshape(len(index), -1)
+    counts = np.bincount(block_codes)[:, None]
+    block_offtake = np.zeros((len(counts), flows.shape[1]))
+    np.add.at(block_offtake, block_codes, -flows)
+    block_offtake /= counts
+    peaks = np.full((n_months, flows.shape[1]), -np.inf)
+    np.maximum.at(peaks, month_codes, block_offtake)
+    return np.maximum(peaks.mean(axis=0), MIN_BILLED_PEAK_KW)
+
+
+@profiled("peak_shaving_sweep", rows=rows_of_result)
+def peak_shaving_sweep(self, max_charges: Iterable[float], max_AC_power_output: float = 5,
+                       max_DC_batterypower: float = 5, max_PV_input: float = 10, EV_type: str = 'no_EV',
+                       battery_roundtrip_efficiency: float = 97.5, battery_PeakPower: float = 11,
+                       peak_target: Optional[float] = None, peak_reserve: float = 0.5,
+                       capacity_tariff_rate: float = 40.0, progress=None) -> pd.DataFrame:
+    """
+    Peak-shaving power flow for many battery sizes in one pass over the data.
+
+    Returns one row per battery size (max_charge in kWh) with the billed capacity (billed_peak_kW), its cost at
+    `capacity_tariff_rate` (€/kW/year) and the offtake/injection energy in kWh. The DataFrame itself is left
+    unchanged; use `power_flow(control='peak_shaving')` for the time series of one size.
+    """
+    sizes = np.asarray(list(max_charges), dtype=float)
+    interval = 3600 / pd.Timedelta(self.pd.index.freq).total_seconds()
+    with as_reporter(progress).stage("peak_shaving_sweep", total=self.pd.shape[0]) as stage:
+        columns = peak_shaving_arrays(
+            self.pd, interval=interval, max_charges=sizes * interval, max_AC_power_output=max_AC_power_output,
+            max_DC_batterypower=max_DC_batterypower, max_PV_input=max_PV_input, EV_type=EV_type,
+            battery_roundtrip_efficiency=battery_roundtrip_efficiency, battery_PeakPower=battery_PeakPower,
+            peak_target=peak_target, peak_reserve=peak_reserve, stage=stage,
+        )
+    grid = columns['GridFlow']
+    billed = billed_peaks(self.pd.index, grid)
+    hours = 1 / interval
+    return pd.DataFrame(
+        {
+            'billed_peak_kW': billed,
+            'capacity_cost': billed * capacity_tariff_rate,
+            'offtake_kWh': np.clip(-grid, 0, None).sum(axis=0) * hours,
+            'injection_kWh': np.clip(grid, 0, None).sum(axis=0) * hours,
+        },
+        index=pd.Index(sizes, name='max_charge'),
+    )
@@ -1,8 +1,46 @@
 import pandas as pd
 
-
-
-def power_flow(self, max_charge: int = 8, max_AC_power_output: int = 5, max_DC_batterypower: int = 5, max_PV_input: int = 10, max_EV_power: int = 3.7, max_EV_charge=82.3,EV_type:str='no_EV',battery_roundtrip_efficiency:float=97.5, battery_PeakPower:int=11):
+from powercalculations._arrayengine import power_flow_arrays
+from powercalculations._chunked import _FrameSink, iter_blocks, stream_power_flow
+from powercalculations._peakshaving import peak_shaving_arrays
+from powercalculations.profiling import profiled, rows_of_self_pd
+from powercalculations.progress import as_reporter
+
+
+
+def _check_power_flow_arguments(engine: str, control: str, EV_type: str, peak_target, peak_reserve: float,
+                                EV_schedule, block, sink, initial_charge, initial_EV_charge) -> None:
+    """Reject the `power_flow` keyword combinations it cannot honour, before any simulation runs."""
+    if control not in ('greedy', 'peak_shaving'):
+        raise ValueError(f"Unknown power_flow control: {control}")
+    if engine not in ('rows', 'array'):
+        raise ValueError(f"Unknown power_flow engine: {engine}")
+    if isinstance(initial_charge, str) and initial_charge != 'steady':
+        raise ValueError(f"Unknown power_flow initial_charge: {initial_charge}")
+    greedy_array = engine == 'array' and control == 'greedy'
+    if EV_schedule is not None and not greedy_array:
+        raise ValueError("EV_schedule needs engine='array' and control='greedy'")
+    if (block is not None or sink is not None) and not greedy_array:
+        raise ValueError("block and sink need engine='array' and control='greedy'")
+    if initial_charge == 'steady' and not greedy_array:
+        raise ValueError("initial_charge='steady' needs engine='array' and control='greedy'")
+    if control == 'peak_shaving':
+        if EV_type == 'B2G':
+            raise ValueError("peak shaving does not support EV_type='B2G'")
+        if not 0 <= peak_reserve <= 1:
+            raise ValueError("peak_reserve should be between 0 and 1")
+        if initial_charge is not None or initial_EV_charge is not None:
+            raise ValueError("peak shaving always starts the battery at 10% of max_charge")
+    elif peak_target is not None:
+        raise ValueError("peak_target needs control='peak_shaving'")
+
+
+@profiled("power_flow", rows=rows_of_self_pd)
+def power_flow(self, max_charge: int = 8, max_AC_power_output: int = 5, max_DC_batterypower: int = 5,
+               max_PV_input: int = 10, max_EV_power: int = 3.7, max_EV_charge=82.3, EV_type: str = 'no_EV',
+               battery_roundtrip_efficiency: float = 97.5, battery_PeakPower: int = 11, progress=None,
+               engine: str = 'rows', control: str = 'greedy', peak_target: float = None, peak_reserve: float = 0.5,
+               EV_schedule=None, block=None, sink=None, initial_charge=None, initial_EV_charge=None):
     """
     Calculates power flows, how much is going to and from the battery and how much is being tapped from the grid
     #TODO: add units, PV_generated_power and Load_kW are both in kW. Depending on the frequency of this data, a different amount is subtracted from the battery charge (in kWh?) (e.g. if 1h freq, the load of each line can be subtracted directly since 1kW*1h=1kWh. If in minutes, then 1kW*1min=1/60kWh) 
@@ -15,21 +53,106 @@ def power_flow(self, max_charge: int = 8, max_AC_power_output: int = 5, max_DC_b
         max_PV_input (int, optional): Maximum power that can be sent to the battery in kW. Defaults to 10.
         max_EV_power (int, optional): Maximum power that can be sent to the EV in kW. Defaults to 3.7.
         max_EV_charge (int, optional): Maximum charge capacity of the EV in kWh. Defaults to 82.3.
+        progress (optional): progress reporting, see `powercalculations.progress`. Silent by default.
+        engine (str, optional): 'rows' iterates over the DataFrame rows, 'array' runs the same simulation on the
+            column arrays (see `_arrayengine`), which gives the same result many times faster. Defaults to 'rows'.
+        control (str, optional): 'greedy' discharges on every deficit as `battery()`; 'peak_shaving' keeps a
+            reserve to clip new monthly 15-minute offtake peaks (see `_peakshaving`). Peak shaving always runs
+            on arrays and takes no EV_schedule; it does not simulate the EV charge, so EVCharge is 0 for every
+            EV_type and only EVFlow is written. Defaults to 'greedy'.
+        peak_target (float, optional): offtake in kW that peak shaving defends; defaults to the 2.5 kW minimum
+            billed capacity. Needs control='peak_shaving'.
+        peak_reserve (float, optional): share of max_charge that peak shaving keeps for clipping peaks. Defaults to 0.5.
+        EV_schedule (pd.DataFrame, optional): schedule table of the 'B2G' EV (see `_evschedule`); needs
+            engine='array' and control='greedy'. Defaults to the behaviour of `EV()`.
+        block (str or int, optional): run the array engine block by block, carrying the battery and EV charge
+            across blocks (see `_chunked`): a pandas frequency such as 'MS' (a block per month) or a number of
+            rows. Needs engine='array' and control='greedy'; the result equals the single-pass one.
+        sink (optional): object with a `write(frame)` method, e.g. `_chunked.ColumnarSink`, that receives the
+            output columns of every block instead of the DataFrame. Implies block='MS' if no block is given.
+        initial_charge (float or str, optional): battery charge at the start in kWh, defaults to 10% of
+            max_charge. 'steady' starts the battery and the EV at the charge the data ends with again (see
+            `_steadystate`); needs engine='array' and control='greedy'.
+        initial_EV_charge (float, optional): EV charge at the start in kWh, defaults to 50% of max_EV_charge.
+    Unsupported combinations of these arguments raise a ValueError before anything is simulated.
+
     Returns:
-        None
+        None, or with initial_charge='steady' the result of `steady_state_charge` with the 'residual' [kWh]:
+        the largest difference between the start and end charge of the battery and the EV of this run.
     """ 
+    _check_power_flow_arguments(engine, control, EV_type, peak_target, peak_reserve, EV_schedule, block, sink,
+                                initial_charge, initial_EV_charge)
+    steady = None
+    if initial_charge == 'steady':
+        steady = self.steady_state_charge(
+            max_charge=max_charge, max_AC_power_output=max_AC_power_output, max_DC_batterypower=max_DC_batterypower,
+            max_PV_input=max_PV_input, max_EV_power=max_EV_power, max_EV_charge=max_EV_charge, EV_type=EV_type,
+            battery_roundtrip_efficiency=battery_roundtrip_efficiency, battery_PeakPower=battery_PeakPower,
+            EV_schedule=EV_schedule,
+        )
+        initial_charge, initial_EV_charge = steady['battery'], steady['EV']
+    initial_state = {}
+    if initial_charge is not None:
+        initial_state['battery'] = initial_charge
+    if initial_EV_charge is not None:
+        initial_state['EV'] = initial_EV_charge
+
+    if block is not None or sink is not None:
+        frames = _FrameSink() if sink is None else sink
+        end = stream_power_flow(
+            iter_blocks(self.pd, 'MS' if block is None else block), frames, freq=self.pd.index.freq,
+            max_charge=max_charge, max_AC_power_output=max_AC_power_output,
+            max_DC_batterypower=max_DC_batterypower, max_PV_input=max_PV_input, max_EV_power=max_EV_power,
+            max_EV_charge=max_EV_charge, EV_type=EV_type,
+            battery_roundtrip_efficiency=battery_roundtrip_efficiency, battery_PeakPower=battery_PeakPower,
+            EV_schedule=EV_schedule, state=initial_state, progress=progress, total=self.pd.shape[0],
+        )
+        if sink is None:
+            for column, values in pd.concat(frames.blocks).items():
+                self.pd[column] = values.to_numpy()
+        if steady is not None:
+            return {**steady, 'residual': max(abs(end['battery'] - steady['battery']),
+                                              abs(end['EV'] - steady['EV']))}
+        return None
+
     # convert charges to unit of frequency of the data
     interval = 3600/pd.Timedelta(self.pd.index.freq).total_seconds() # hours to seconds
     max_charge = max_charge*interval
     max_EV_charge = max_EV_charge*interval
+    initial_state = {key: value*interval for key, value in initial_state.items()}
+
+    if control == 'peak_shaving':
+        with as_reporter(progress).stage("power_flow", total=self.pd.shape[0]) as stage:
+            columns = peak_shaving_arrays(
+                self.pd, interval=interval, max_charges=max_charge, max_AC_power_output=max_AC_power_output,
+                max_DC_batterypower=max_DC_batterypower, max_PV_input=max_PV_input, EV_type=EV_type,
+                battery_roundtrip_efficiency=battery_roundtrip_efficiency, battery_PeakPower=battery_PeakPower,
+                peak_target=peak_target, peak_reserve=peak_reserve, stage=stage,
+            )
+        for column in ('BatteryCharge', 'GridFlow', 'BatteryFlow'):
+            self.pd[column] = columns[column][:, 0]
+        self.pd['EVCharge'] = 0.0
+        self.pd['EVFlow'] = columns['EVFlow']
+        return None
+
+    if engine == 'array':
+        with as_reporter(progress).stage("power_flow", total=self.pd.shape[0]) as stage:
+            columns = power_flow_arrays(
+                self.pd, interval=interval, max_charge=max_charge, max_AC_power_output=max_AC_power_output,
+                max_DC_batterypower=max_DC_batterypower, max_PV_input=max_PV_input, max_EV_power=max_EV_power,
+                max_EV_charge=max_EV_charge, EV_type=EV_type, battery_roundtrip_efficiency=battery_roundtrip_efficiency,
+                battery_PeakPower=battery_PeakPower, stage=stage, EV_schedule=EV_schedule, state=initial_state,
+            )
+        for column, values in columns.items():
+            self.pd[column] = values
+        if steady is not None:
+            return {**steady, 'residual': max(abs(columns['BatteryCharge'][-1] - steady['battery']),
+                                              abs(columns['EVCharge'][-1] - steady['EV']))}
+        return None
 
     # Initialize variables
-    previous_charge_battery = 0.1*max_charge  # Initialize as integer
-    previous_charge_EV = 0.5*max_EV_charge  # Initialize as integer
-
-    # Initialize counters
-    length=self.pd.shape[0]
-    counter=0
+    previous_charge_battery = initial_state.get('battery', 0.1*max_charge)  # Initialize as integer
+    previous_charge_EV = initial_state.get('EV', 0.5*max_EV_charge)  # Initialize as integer
 
     # Set lists to store calculated values
     battery_charge_list = []  # List to store calculated battery charges
@@ -41,40 +164,41 @@ def power_flow(self, max_charge: int = 8, max_AC_power_output: int = 5, max_DC_b
     PV_power=[]
     loss=[]
     # Iterate over DataFrame rows
-    for _, row in self.pd.iterrows():
-        print(f"Calculating power flows for row {counter}/{length}", end="\r")
-        counter+=1
-        PV_power = min(row['PV_generated_power'], max_PV_input) #power_loss = row['PV_generated_power'] - PV_power
-        loss+=row['PV_generated_power'] - PV_power
-        load = -row['Load_kW']
-        """
-        # Calculate battery charge and grid flow
-        if load > max_AC_power_output:  # Load too high for inverter, switch to grid-tie to avoid overloading of inverter #TODO: everything until max_AC_power is still gotten from the PV
-            load_to_EV = PV_power
-            load_to_battery, new_charge_EV= EV(row=row,load_to_EV=load_to_EV,old_capacity=previous_charge_EV,EV_type=EV_type)
-            load_from_battery, new_charge_battery = battery(load_to_battery, previous_charge_battery)
-            grid_flow = load + load_from_battery
-        """
+    stage = as_reporter(progress).stage("power_flow", total=self.pd.shape[0])
+    with stage:
+        for _, row in self.pd.iterrows():
+            stage.advance()
+            PV_power = min(row['PV_generated_power'], max_PV_input) #power_loss = row['PV_generated_power'] - PV_power
+            loss+=row['PV_generated_power'] - PV_power
+            load = -row['Load_kW']
+            """
+            # Calculate battery charge and grid flow
+            if load > max_AC_power_output:  # Load too high for inverter, switch to grid-tie to avoid overloading of inverter #TODO: everything until max_AC_power is still gotten from the PV
+                load_to_EV = PV_power
+                load_to_battery, new_charge_EV= EV(row=row,load_to_EV=load_to_EV,old_capacity=previous_charge_EV,EV_type=EV_type)
+                load_from_battery, new_charge_battery = battery(load_to_battery, previous_charge_battery)
+                grid_flow = load + load_from_battery
+            """
  
-        excess_load=-max(0,-load-max_AC_power_output) #load that is immediately sent to the grid
-        load=load-excess_load #load that is left after the excess load is sent to the grid 
-        load_to_EV =PV_power+load
-        load_to_battery, new_charge_EV= EV(row=row,load_to_EV=load_to_EV,old_capacity=previous_charge_EV,EV_type=EV_type,max_EV_charge=max_EV_charge,max_EV_power=max_EV_power,freq=interval)
-        load_from_battery, new_charge_battery = battery(row,load_to_battery, previous_charge_battery,max_charge=max_charge,max_DC_batterypower=max_DC_batterypower,battery_PeakPower=battery_PeakPower,battery_roundtrip_efficiency=battery_roundtrip_efficiency)
-        grid_flow = load_from_battery
+            excess_load=-max(0,-load-max_AC_power_output) #load that is immediately sent to the grid
+            load=load-excess_load #load that is left after the excess load is sent to the grid 
+            load_to_EV =PV_power+load
+            load_to_battery, new_charge_EV= EV(row=row,load_to_EV=load_to_EV,old_capacity=previous_charge_EV,EV_type=EV_type,max_EV_charge=max_EV_charge,max_EV_power=max_EV_power,freq=interval)
+            load_from_battery, new_charge_battery = battery(row,load_to_battery, previous_charge_battery,max_charge=max_charge,max_DC_batterypower=max_DC_batterypower,battery_PeakPower=battery_PeakPower,battery_roundtrip_efficiency=battery_roundtrip_efficiency)
+            grid_flow = load_from_battery
         
-        grid_flow = min(grid_flow, max_AC_power_output) # Limit positive grid flow to max AC power output
-        grid_flow = grid_flow + excess_load # Add the excess load to the grid flow
-        previous_charge_battery=new_charge_battery
-        previous_charge_EV=new_charge_EV
+            grid_flow = min(grid_flow, max_AC_power_output) # Limit positive grid flow to max AC power output
+            grid_flow = grid_flow + excess_load # Add the excess load to the grid flow
+            previous_charge_battery=new_charge_battery
+            previous_charge_EV=new_charge_EV
 
-        # Append calculated values to lists
-        battery_charge_list.append(new_charge_battery/interval) 
-        grid_flow_list.append(grid_flow)
-        power_loss_list.append(0)
-        battery_flow_list.append(load_to_battery-load_from_battery) # Battery flow is positive when charging, negative when discharging
-        EV_charge_list.append(new_charge_EV/interval)
-        EV_flow_list.append(load_to_EV-load_to_battery)     # EV flow is positive when charging, negative when discharging
+            # Append calculated values to lists
+            battery_charge_list.append(new_charge_battery/interval) 
+            grid_flow_list.append(grid_flow)
+            power_loss_list.append(0)
+            battery_flow_list.append(load_to_battery-load_from_battery) # Battery flow is positive when charging, negative when discharging
+            EV_charge_list.append(new_charge_EV/interval)
+            EV_flow_list.append(load_to_EV-load_to_battery)     # EV flow is positive when charging, negative when discharging
 
 
     self.pd['BatteryCharge'] = battery_charge_list
@@ -120,7 +244,7 @@ def EV(row,load_to_EV:float,old_capacity:float,EV_type:str='B2G',max_EV_power: i
         row (pd.Series): The row of the DataFrame
         load_to_EV (float): The load that is sent to the EV
         old_capacity (float): The old capacity of the EV
-        EV_type (str): The type of EV, either 'B2G', 'with_SC', 'no_SC' or 'no_EV'
+        EV_type (str): The type of EV, either 'B2G', 'with_SC', 'no_SC', 'smart' or 'no_EV'
         max_EV_power (int, optional): The maximum power that can be sent to the EV in kW. Defaults to 3.7.
         max_EV_charge (int, optional): The maximum charge capacity of the EV in kWh. Defaults to 82.3.
         
@@ -190,11 +314,15 @@ def EV(row,load_to_EV:float,old_capacity:float,EV_type:str='B2G',max_EV_power: i
         power_to_EV=row['Load_EV_kW_no_SC']
         load_from_EV=load_to_EV-power_to_EV
         new_capacity=0
+    elif EV_type=='smart':
+        power_to_EV=row['Load_EV_kW_smart']
+        load_from_EV=load_to_EV-power_to_EV
+        new_capacity=0
     elif EV_type=='no_EV':
         load_from_EV=load_to_EV
         new_capacity=0
     else:
-        raise ValueError('EV_type should be either B2G, with_SC, no_SC or no_EV')
+        raise ValueError('EV_type should be either B2G, with_SC, no_SC, smart or no_EV')
     return load_from_EV,new_capacity    
 
 def nettoProduction(self):
@@ -208,52 +336,6 @@ def nettoProduction(self):
     self.pd['NettoProduction'] = self.pd['PV_generated_power'] - self.pd['Load_kW']
     return None
 
-def optimized_charging(time:pd.DatetimeIndex, max_charge: int = 8, max_AC_power_output: int = 2, max_DC_batterypower: int = 2, max_PV_input: int = 10):
-    """
-    Calculates power flows, how much is going to and from the battery and how much is being tapped from the grid
-    """
-    return None
-
-"""
-import numpy as np
-from scipy.optimize import minimize
-
-def objective_function(X, B):
-    return -np.dot(X, B)  # Maximizing X * B is equivalent to minimizing -X * B
-
-def constraint(X, total_sum):
-    return np.sum(X) - total_sum  # Constraint on the total sum of X
-
-# Initial guess for vector X
-initial_guess_X = np.zeros_like(B)
-
-# Total sum constraint for vector X
-total_sum_constraint = 10  # Change this value to your desired total sum
-
-# Bounds for each element of vector X
-bounds = [(0, None) for _ in range(len(B))]  # Each element of X should be non-negative
-
-# Define the optimization problem
-problem = {
-    'fun': objective_function,
-    'x0': initial_guess_X,
-    'args': (B,),
-    'constraints': {'type': 'eq', 'fun': constraint, 'args': (total_sum_constraint,)},
-    'bounds': bounds
-}
-
-# Solve the optimization problem
-result = minimize(**problem)
-
-# Extract the optimized vector X
-optimized_X = result.x
-
-print("Optimized vector X:", optimized_X)
-print("Maximum value of X * B:", -result.fun)  # Since we were minimizing -X * B
-
-
-"""
-
 def power_flow_old(self, max_charge: int = 8, max_AC_power_output: int = 5, max_DC_batterypower: int = 5, max_PV_input: int = 10, max_EV_power: int = 3.7, max_EV_charge=82.3):
     """
     Calculates power flows, how much is going to and from the battery and how much is being tapped from the grid
@@ -1,4 +1,6 @@
+from powercalculations.profiling import profiled, rows_of_self_pd
 
+@profiled("PV_generated_power", rows=rows_of_self_pd)
 def PV_generated_power(self,cell_area:int=2, panel_count:int=1, T_STC:int=25, efficiency_max = 0.223, Temp_coeff = -0.0026 ):
     """
     Calculates the PV generated power in [kW] based on the DirectIrradiance column in the DataFrame.
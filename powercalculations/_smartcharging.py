@@ -0,0 +1,134 @@
+"""
+Price-responsive EV charging (`smart_EV_load`).
+
+The 'with_SC'/'no_SC' EV loads replay the profiles of the EV workbook and
+the 'B2G' EV follows fixed clock windows. Smart charging starts from
+charging sessions instead, one row per plug-in:
+
+    plug_in, plug_out   timestamps; a step is available when it lies completely inside the session
+    energy              kWh the vehicle needs before plug_out
+    power               charger power in kW (optional, default `max_EV_power`)
+    vehicle             any label (optional), carried over to the result
+
+and charges every session in its cheapest steps under the contract's
+offtake rate (`_dispatch.energy_rates`, so the Belpex price for a
+DynamicTariff): full power in the cheapest steps, the remainder in the next
+cheapest, earliest first at equal prices. Steps without a Belpex price are
+left out of the sessions (`energy_rates(missing='unavailable')`): charging
+there would look free, and the energy a session then cannot get is reported
+as its shortfall. Sessions are sorted in batches:
+sessions with windows of similar length are stacked into one (sessions x
+steps) matrix of rates, padded with inf, and ranked with a single argsort
+along the rows. The EV load of all sessions is summed into one column,
+'Load_EV_kW_smart', which `power_flow` and the dispatch methods use with
+EV_type='smart'.
+"""
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from powercalculations._dispatch import _prices, energy_rates
+from powercalculations.profiling import profiled, rows_of_self_pd
+
+SMART_EV_COLUMN = 'Load_EV_kW_smart'
+
+# largest (sessions x steps) rate matrix sorted at once
+_BATCH_CELLS = 2 ** 22
+
+
+def _session_steps(index: pd.DatetimeIndex, sessions: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """(first step, number of steps) of every session: the steps that start and end within the session."""
+    stamps = index.asi8
+    step_ns = pd.Timedelta(index.freq).value
+    plug_in = pd.DatetimeIndex(sessions['plug_in']).asi8
+    plug_out = pd.DatetimeIndex(sessions['plug_out']).asi8
+    first = np.searchsorted(stamps, plug_in, side='left')
+    stop = np.searchsorted(stamps, plug_out - step_ns, side='right')
+    return first, np.clip(stop - first, 0, None)
+
+
+def schedule_EV_sessions(index: pd.DatetimeIndex, sessions: pd.DataFrame, import_rate: np.ndarray,
+                         max_EV_power: float = 3.7) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    EV load [kW] per step of `index` charging every session of `sessions` in its cheapest steps under
+    `import_rate` (€/kWh per step, inf where no energy can be bought), and one row per session with the delivered
+    energy, the shortfall (kWh the session was too short for), the cost of the charged energy and the number of
+    steps it could charge in.
+    """
+    for column in ('plug_in', 'plug_out', 'energy'):
+        if column not in sessions.columns:
+            raise ValueError(f"The EV sessions do not contain the column '{column}'.")
+    energy = sessions['energy'].to_numpy(dtype=float)
+    power = (sessions['power'].to_numpy(dtype=float) if 'power' in sessions.columns
+             else np.full(len(sessions), float(max_EV_power)))
+    if (energy < 0).any() or (power <= 0).any():
+        raise ValueError("EV sessions need a non-negative energy and a positive power")
+    if (pd.DatetimeIndex(sessions['plug_out']) <= pd.DatetimeIndex(sessions['plug_in'])).any():
+        raise ValueError("Every EV session should be plugged out after it is plugged in")
+
+    dt = pd.Timedelta(index.freq).total_seconds() / 3600
+    first, length = _session_steps(index, sessions)
+    # steps at full power each session needs; the last one is partial
+    needed = energy / (power * dt)
+    rate = np.asarray(import_rate, dtype=float)
+
+    load = np.zeros(len(index))
+    delivered = np.zeros(len(sessions))
+    cost = np.zeros(len(sessions))
+    available = np.zeros(len(sessions), dtype=int)
+    # batch sessions whose windows round up to the same power of two
+    width = np.where(length > 0, 2 ** np.ceil(np.log2(np.maximum(length, 1))).astype(int), 0)
+    for W in np.unique(width[width > 0]):
+        members = np.flatnonzero(width == W)
+        for batch in np.array_split(members, -(-len(members) * W // _BATCH_CELLS)):
+            offsets = np.arange(W)
+            steps = first[batch, None] + offsets
+            rates = rate[np.minimum(steps, len(index) - 1)]
+            # steps without a rate (no price) are not available for charging
+            inside = (offsets < length[batch, None]) & np.isfinite(rates)
+            rates = np.where(inside, rates, np.inf)
+            available[batch] = inside.sum(axis=1)
+            order = np.argsort(rates, axis=1, kind='stable')
+            # full power in the floor(needed) cheapest steps, the remainder in the next one
+            share = np.clip(needed[batch, None] - offsets, 0, 1) * np.take_along_axis(inside, order, axis=1)
+            kW = share * power[batch, None]
+            chosen = np.take_along_axis(steps, order, axis=1)
+            charging = kW > 0
+            np.add.at(load, chosen[charging], kW[charging])
+            delivered[batch] = kW.sum(axis=1) * dt
+            cost[batch] = (np.where(charging, np.take_along_axis(rates, order, axis=1), 0.0) * kW).sum(axis=1) * dt
+
+    result = pd.DataFrame({
+        'delivered_kWh': delivered,
+        'shortfall_kWh': energy - delivered,
+        'cost': cost,
+        'steps': available,
+    }, index=sessions.index)
+    if 'vehicle' in sessions.columns:
+        result.insert(0, 'vehicle', sessions['vehicle'])
+    return load, result
+
+
+@profiled("smart_EV_load", rows=rows_of_self_pd)
+def smart_EV_load(self, sessions: pd.DataFrame, electricity_contract, prices=None, max_EV_power: float = 3.7,
+                  column: str = SMART_EV_COLUMN) -> pd.DataFrame:
+    """
+    Charge the EV `sessions` in their cheapest steps (see the module docstring) and write their summed load
+    [kW] to `column`; run `power_flow(EV_type='smart')` afterwards to simulate the site with it.
+
+    Args:
+        sessions (pd.DataFrame): plug_in, plug_out, energy [kWh] and optionally power [kW] and vehicle.
+        electricity_contract: ElectricityContract whose offtake rate is minimised.
+        prices: Belpex prices in €/MWh per row for a DynamicTariff; defaults to the BelpexFilter column.
+        max_EV_power (float): charger power of the sessions without a power.
+    Returns:
+        pd.DataFrame: per session the delivered energy, the shortfall and the energy cost in €.
+    """
+    import_rate, _ = energy_rates(self.pd.index, electricity_contract, _prices(self.pd, prices),
+                                  missing='unavailable')
+    load, result = schedule_EV_sessions(self.pd.index, sessions, import_rate, max_EV_power)
+    self.pd[column] = load
+    return result
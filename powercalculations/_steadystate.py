@@ -0,0 +1,119 @@
+"""
+Periodic steady-state starting charge (`power_flow(initial_charge='steady')`).
+
+`power_flow` starts the battery at 10% and the EV at 50% of their capacity,
+which biases the result of one simulated year when the battery is large. The
+steady state is the starting charge that the year ends with again.
+
+Both the battery and the EV steps are monotone and never widen a difference
+in charge: a higher starting charge never gives a lower charge later on,
+and two runs only move apart when one is clipped at empty or full, which
+brings them together. So `steady_state_charge` runs the array engine block
+by block (a week by default) from the lowest and the highest possible
+charge at once. Every other start stays between these two runs, and once
+they have met, every start ends the year at the same charge. From there one
+run finishes the year, and its end charge is the steady state. That costs
+a year plus the warm-up until the runs meet, usually a few days.
+
+When the two runs do not meet within the data (a battery that is never
+emptied or filled), the end charge is bisected. Each step is a full-year
+run, on the EV first (it does not depend on the battery), then on the
+battery.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from powercalculations._arrayengine import power_flow_arrays
+from powercalculations._chunked import iter_blocks
+from powercalculations._evschedule import EV_MAX_SOC
+
+
+def steady_state_charge(self, max_charge: float = 8, max_AC_power_output: float = 5, max_DC_batterypower: float = 5,
+                        max_PV_input: float = 10, max_EV_power: float = 3.7, max_EV_charge: float = 82.3,
+                        EV_type: str = 'no_EV', battery_roundtrip_efficiency: float = 97.5,
+                        battery_PeakPower: float = 11, EV_schedule: Optional[pd.DataFrame] = None,
+                        tol: float = 1e-6, block='W', max_iter: int = 60) -> Dict[str, Any]:
+    """
+    Starting charges of the battery and the EV that `power_flow` ends the data with again (see the module
+    docstring). The DataFrame is left unchanged.
+
+    Args:
+        tol (float): tolerance in kWh on the starting charges.
+        block: warm-up step, a pandas frequency or a number of rows (see `_chunked.iter_blocks`).
+        max_iter (int): bisection steps per charge when the runs do not meet.
+        The other arguments are those of `power_flow`.
+    Returns:
+        dict: 'battery' and 'EV' charge [kWh], 'tolerance' [kWh] reached (for 'coalesced' the spread of the end
+        charges over all starting charges, for 'bisection' the largest |end - start| of the returned charges),
+        'method' ('coalesced' or 'bisection') and 'simulated_rows'.
+    """
+    interval = 3600 / pd.Timedelta(self.pd.index.freq).total_seconds()
+    kwargs = dict(
+        interval=interval, max_charge=max_charge * interval, max_AC_power_output=max_AC_power_output,
+        max_DC_batterypower=max_DC_batterypower, max_PV_input=max_PV_input, max_EV_power=max_EV_power,
+        max_EV_charge=max_EV_charge * interval, EV_type=EV_type,
+        battery_roundtrip_efficiency=battery_roundtrip_efficiency, battery_PeakPower=battery_PeakPower,
+        EV_schedule=EV_schedule,
+    )
+    EV_high = EV_MAX_SOC * max_EV_charge * interval if EV_type == 'B2G' else 0.0
+    simulated = 0
+
+    def run(frame: pd.DataFrame, state: Dict[str, float]) -> Dict[str, float]:
+        nonlocal simulated
+        power_flow_arrays(frame, state=state, **kwargs)
+        simulated += len(frame)
+        return state
+
+    def gap(low: Dict[str, float], high: Dict[str, float]) -> float:
+        return max(abs(high['battery'] - low['battery']), abs(high['EV'] - low['EV'])) / interval
+
+    low = {'battery': 0.0, 'EV': 0.0}
+    high = {'battery': max_charge * interval, 'EV': EV_high}
+    blocks = list(iter_blocks(self.pd, block))
+    for k, frame in enumerate(blocks):
+        run(frame, low)
+        run(frame, high)
+        spread = gap(low, high)
+        if spread <= tol:
+            state = {key: (low[key] + high[key]) / 2 for key in low}
+            for rest in blocks[k + 1:]:
+                run(rest, state)
+            return {'battery': state['battery'] / interval, 'EV': state['EV'] / interval, 'tolerance': spread,
+                    'method': 'coalesced', 'simulated_rows': simulated}
+
+    # the runs did not meet: bisect start - end on the EV, then on the battery
+    def end_of(start: Dict[str, float]) -> Dict[str, float]:
+        return run(self.pd, dict(start))
+
+    start = {'battery': 0.1 * max_charge * interval, 'EV': 0.5 * EV_high}
+    bounds = {'battery': (0.0, max_charge * interval), 'EV': (0.0, EV_high)}
+    # the ends of the warm-up runs are the first evaluations at the bounds
+    ends = {'battery': (low['battery'], high['battery']), 'EV': (low['EV'], high['EV'])}
+    residual = 0.0
+    for key in ('EV', 'battery'):
+        lo, hi = bounds[key]
+        end_lo, end_hi = ends[key]
+        best = min(((abs(end_lo - lo), lo), (abs(end_hi - hi), hi)))
+        for _ in range(max_iter):
+            if hi - lo <= tol * interval:
+                break
+            mid = (lo + hi) / 2
+            start[key] = mid
+            end = end_of(start)[key]
+            best = min(best, (abs(end - mid), mid))
+            if end > mid:
+                lo = mid
+            else:
+                hi = mid
+        start[key] = best[1]
+        residual = max(residual, best[0] / interval)
+        if key == 'EV' and EV_type == 'B2G':
+            # the battery bounds were evaluated with other EV charges; use the bracket of the battery instead
+            end_low = end_of({'battery': 0.0, 'EV': start['EV']})['battery']
+            end_high = end_of({'battery': max_charge * interval, 'EV': start['EV']})['battery']
+            ends['battery'] = (end_low, end_high)
+    return {'battery': start['battery'] / interval, 'EV': start['EV'] / interval, 'tolerance': residual,
+            'method': 'bisection', 'simulated_rows': simulated}
@@ -1,7 +1,6 @@
 # Function to plot a given dataset
 from typing import List
 
-from matplotlib import pyplot as plt
 import pandas as pd
 
 
@@ -12,6 +11,7 @@ def plot_columns(self, column_names: List[str]):
     Args:
         column_names (list): A list of column names to plot.
     """
+    from matplotlib import pyplot as plt
 
     # Assert column names are valid
     assert all(col in self.pd.columns for col in column_names), f"Invalid column names: {', '.join(set(column_names) - set(self.pd.columns))}"
@@ -41,6 +41,7 @@ def plot_dataframe(self, df:pd.DataFrame=pd.DataFrame):
     Args:
         df (DataFrame): The DataFrame to plot.
     """
+    from matplotlib import pyplot as plt
 
     # Create the plot
     fig, ax = plt.subplots()
@@ -67,6 +68,7 @@ def plot_series(self, series:pd.Series=pd.Series):
     Args:
         series (Series): The Series to plot.
     """
+    from matplotlib import pyplot as plt
 
     # Create the plot
     fig, ax = plt.subplots()
@@ -1,12 +1,11 @@
-
+import logging
 from math import acos, asin, cos, pi, sin, tan
 import math
 from typing import List
 import pandas as pd
-import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
 
-from torch import sgn
+logger = logging.getLogger(__name__)
 
 class PowerCalculations():
     def __init__(self, file_path_irradiance: str="",file_path_load: str="", file_path_combined:str=""):
@@ -20,7 +19,7 @@ class PowerCalculations():
         if file_path_combined != "":
             # Use the dataset directly if provided
             merged_df = pd.read_excel(file_path_combined)
-            print(merged_df)
+            logger.debug("Read combined dataset with shape %s", merged_df.shape)
         else:
             assert file_path_irradiance.endswith('.xlsx'), 'The file must be an Excel file'
             assert file_path_load.endswith('.xlsx'), 'The file must be an Excel file'
@@ -80,6 +79,14 @@ class PowerCalculations():
     from ._powerflows import power_flow
     from ._powerflows import nettoProduction
     from ._powerflows import power_flow_old
+    from ._steadystate import steady_state_charge
+
+    from ._dispatch import optimal_power_flow
+    from ._mpc import mpc_power_flow
+    from ._dpdispatch import dp_power_flow
+    from ._peakshaving import peak_shaving_sweep
+    from ._fleet import fleet_power_flow
+    from ._smartcharging import smart_EV_load
     
     from ._getters import get_dataset
     from ._getters import get_irradiance
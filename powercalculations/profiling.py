@@ -0,0 +1,244 @@
+"""Per-stage timing and memory instrumentation of the hot paths.
+
+The expensive steps of PowerCalculations, GridCost and FinancialModel
+(unpickling, solar angles, power_flow, GridCost construction, the Belpex
+merge, tariff apply, NPV loops, ...) are wrapped with `@profiled(...)`.
+While profiling is enabled, every call records, per stage name:
+
+- calls, rows processed
+- wall time and CPU time (inclusive: nested stages are counted in their
+  parent as well)
+- peak traced memory above the memory in use at the start of the call
+  (only while tracemalloc is tracing, e.g. `enable_profiling(memory=True)`)
+
+Profiling is off by default; a disabled stage costs one flag check.
+
+    enable_profiling(memory=True)
+    model.optimise_components(...)
+    print(profiling_stats()["power_flow"])
+    dump_profiling("stats.json")
+
+`profile_run(report_dir)` additionally runs cProfile and writes the stage
+stats, the cProfile report and the largest tracemalloc allocations to
+`report_dir`. `FinancialModel.optimise_components(profile=True)` and
+`OptimizerRunner.grid_search(profile=True)` use it to write the report next
+to their results.
+"""
+from __future__ import annotations
+
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, ContextManager, Dict, Iterator, Optional, Union
+
+_enabled = False
+_stats: Dict[str, Dict[str, Any]] = {}
+_local = threading.local()
+
+
+def _new_entry() -> Dict[str, Any]:
+    return {"calls": 0, "rows": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_mem_bytes": None}
+
+
+def enable_profiling(*, memory: bool = False) -> None:
+    """Start recording stage stats; with `memory=True` also start tracemalloc."""
+    global _enabled
+    _enabled = True
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable_profiling() -> None:
+    global _enabled
+    _enabled = False
+
+
+def profiling_enabled() -> bool:
+    return _enabled
+
+
+def reset_profiling() -> None:
+    _stats.clear()
+
+
+def profiling_stats() -> Dict[str, Dict[str, Any]]:
+    """Copy of the stats per stage, sorted by wall time (largest first)."""
+    ordered = sorted(_stats.items(), key=lambda item: item[1]["wall_s"], reverse=True)
+    return {name: dict(entry) for name, entry in ordered}
+
+
+def dump_profiling(path: str) -> Dict[str, Dict[str, Any]]:
+    stats = profiling_stats()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+    return stats
+
+
+class _Frame:
+    __slots__ = ("mem_start", "peak_seen")
+
+    def __init__(self, mem_start: int) -> None:
+        self.mem_start = mem_start
+        self.peak_seen = mem_start
+
+
+def _stack() -> list:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+@contextmanager
+def stage(name: str, rows: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Record one call of stage `name`. The yielded dict accepts a 'rows'
+    entry when the row count is only known at the end.
+    """
+    info: Dict[str, Any] = {"rows": rows}
+    if not _enabled:
+        yield info
+        return
+
+    tracing = tracemalloc.is_tracing()
+    stack = _stack()
+    frame = None
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            # keep the parent's peak before resetting it for this stage
+            stack[-1].peak_seen = max(stack[-1].peak_seen, peak)
+        tracemalloc.reset_peak()
+        frame = _Frame(current)
+        stack.append(frame)
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield info
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        entry = _stats.setdefault(name, _new_entry())
+        entry["calls"] += 1
+        entry["rows"] += int(info.get("rows") or 0)
+        entry["wall_s"] += wall
+        entry["cpu_s"] += cpu
+        if frame is not None:
+            stack.pop()
+            peak = max(frame.peak_seen, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak_seen = max(stack[-1].peak_seen, peak)
+            used = peak - frame.mem_start
+            entry["peak_mem_bytes"] = max(entry["peak_mem_bytes"] or 0, used)
+
+
+def rows_of_self_pd(result: Any, self: Any, *args: Any, **kwargs: Any) -> Optional[int]:
+    """Row counter for methods working on `self.pd`."""
+    frame = getattr(self, "pd", None)
+    return len(frame) if frame is not None else None
+
+
+def rows_of_result(result: Any, *args: Any, **kwargs: Any) -> Optional[int]:
+    """Row counter for functions returning a DataFrame/Series."""
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+def profiled(name: str, rows: Optional[Callable[..., Optional[int]]] = None):
+    """
+    Decorator recording every call as stage `name`. `rows(result, *args,
+    **kwargs)` returns the number of rows processed (see `rows_of_self_pd`
+    and `rows_of_result`).
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with stage(name) as info:
+                result = fn(*args, **kwargs)
+                if rows is not None:
+                    info["rows"] = rows(result, *args, **kwargs)
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def profile_run(
+    report_dir: str,
+    *,
+    use_cprofile: bool = True,
+    memory: bool = True,
+    top: int = 40,
+) -> Iterator[None]:
+    """
+    Profile everything inside the block and write to `report_dir`:
+
+    - profile_stages.json   stage stats (see `profiling_stats`)
+    - profile_cprofile.txt  cProfile, `top` functions by cumulative time
+    - profile_cprofile.pstats  raw cProfile data (for snakeviz etc.)
+    - profile_memory.txt    `top` allocation sites by size (with `memory`)
+
+    Stage stats recorded before the block are discarded; profiling is
+    switched back off afterwards unless it was already enabled.
+    """
+    os.makedirs(report_dir, exist_ok=True)
+    was_enabled = _enabled
+    started_tracing = memory and not tracemalloc.is_tracing()
+    reset_profiling()
+    enable_profiling(memory=memory)
+    profiler = cProfile.Profile() if use_cprofile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        dump_profiling(os.path.join(report_dir, "profile_stages.json"))
+
+        if profiler is not None:
+            profiler.dump_stats(os.path.join(report_dir, "profile_cprofile.pstats"))
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(top)
+            with open(os.path.join(report_dir, "profile_cprofile.txt"), "w", encoding="utf-8") as f:
+                f.write(text.getvalue())
+
+        if memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            lines = [str(s) for s in snapshot.statistics("lineno")[:top]]
+            with open(os.path.join(report_dir, "profile_memory.txt"), "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        if started_tracing:
+            tracemalloc.stop()
+        if not was_enabled:
+            disable_profiling()
+
+
+def profile_option(profile: Union[bool, str, None], results_path: Optional[str] = None) -> ContextManager:
+    """
+    Context for a `profile=` argument: False/None does nothing, a string is
+    the report directory, True writes the report next to `results_path`
+    (or into the working directory).
+    """
+    if not profile:
+        return nullcontext()
+    if isinstance(profile, str):
+        report_dir = profile
+    elif results_path:
+        report_dir = os.path.dirname(os.path.abspath(results_path))
+    else:
+        report_dir = os.getcwd()
+    return profile_run(report_dir)
@@ -0,0 +1,194 @@
+"""Rate-limited progress reporting and structured telemetry for long loops.
+
+Long-running methods (power_flow, the irradiance calculations, grid_search,
+FinancialModel.optimise_components, ...) take a `progress` argument instead
+of printing every row:
+
+- None / False         silent (default); per-row cost is one integer add
+- True                 one status line on stderr at most every second
+- a callable           called with every emitted `ProgressEvent`
+- a logging.Logger     INFO messages with throughput and ETA
+- a ProgressReporter   full control, e.g. to also write an event log
+
+Every stage emits a 'start' event, rate-limited 'progress' events and a
+'stop' event (also when the loop raises). With `event_log` (a path to a
+JSON-lines file, or a list) all events are recorded as plain dicts, so batch
+jobs can scrape stage timings and row counts:
+
+    reporter = ProgressReporter(event_log="events.jsonl")
+    model.power_flow(progress=reporter)
+"""
+from __future__ import annotations
+
+import json
+import logging
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Union
+
+
+@dataclass
+class ProgressEvent:
+    """One telemetry record. `rate` is rows/s, `eta` seconds (None if unknown)."""
+
+    kind: str                 # 'start', 'progress' or 'stop'
+    stage: str
+    done: int
+    total: Optional[int]
+    elapsed: float
+    rate: float
+    eta: Optional[float]
+    timestamp: float
+    status: str = "ok"        # 'error' on a 'stop' event when the stage raised
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def message(self) -> str:
+        total = f"/{self.total}" if self.total else ""
+        text = f"{self.stage}: {self.done}{total} rows, {self.rate:,.0f} rows/s"
+        if self.kind == "stop":
+            return f"{text}, done in {self.elapsed:.1f}s" + (" (failed)" if self.status != "ok" else "")
+        if self.eta is not None:
+            text += f", ETA {self.eta:.0f}s"
+        return text
+
+
+class _NullStage:
+    """Stage of a silent reporter: every call is a no-op."""
+
+    done = 0
+
+    def advance(self, n: int = 1) -> None:
+        pass
+
+    def update(self, done: int) -> None:
+        pass
+
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class ProgressStage:
+    """A running stage; use as a context manager and call `advance()` per row."""
+
+    def __init__(self, reporter: "ProgressReporter", name: str, total: Optional[int]) -> None:
+        self.reporter = reporter
+        self.name = name
+        self.total = total
+        self.done = 0
+        self._start = time.perf_counter()
+        # only look at the clock every `_stride` rows
+        self._stride = 1
+        self._next_check = 1
+        self._last_emit = self._start
+
+    def _event(self, kind: str, now: float, status: str = "ok") -> ProgressEvent:
+        elapsed = now - self._start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.total and rate > 0:
+            eta = max(self.total - self.done, 0) / rate
+        return ProgressEvent(kind, self.name, self.done, self.total, elapsed, rate, eta, time.time(), status)
+
+    def advance(self, n: int = 1) -> None:
+        self.done += n
+        if self.done >= self._next_check:
+            self._check()
+
+    def update(self, done: int) -> None:
+        """Set the absolute number of processed rows."""
+        self.done = int(done)
+        if self.done >= self._next_check:
+            self._check()
+
+    def _check(self) -> None:
+        now = time.perf_counter()
+        since = now - self._last_emit
+        interval = self.reporter.min_interval
+        if since >= interval:
+            self.reporter._emit(self._event("progress", now))
+            self._last_emit = now
+        # aim for ~10 clock reads per interval
+        rate = self.done / max(now - self._start, 1e-9)
+        self._stride = max(1, int(rate * interval / 10))
+        self._next_check = self.done + self._stride
+
+    def __enter__(self) -> "ProgressStage":
+        self.reporter._emit(self._event("start", self._start))
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        status = "ok" if exc_type is None else "error"
+        self.reporter._emit(self._event("stop", time.perf_counter(), status))
+
+
+class ProgressReporter:
+    """
+    Sends rate-limited progress events to a callback, a logger and/or an
+    event log (JSON-lines path or list). Without any of these it is silent
+    and its stages cost next to nothing.
+    """
+
+    def __init__(
+        self,
+        callback: Optional[Callable[[ProgressEvent], None]] = None,
+        *,
+        logger: Optional[logging.Logger] = None,
+        min_interval: float = 1.0,
+        event_log: Union[str, List[Dict[str, Any]], None] = None,
+    ) -> None:
+        self.callback = callback
+        self.logger = logger
+        self.min_interval = float(min_interval)
+        self.event_log = event_log
+
+    @property
+    def enabled(self) -> bool:
+        return self.callback is not None or self.logger is not None or self.event_log is not None
+
+    def stage(self, name: str, total: Optional[int] = None) -> Union[ProgressStage, _NullStage]:
+        if not self.enabled:
+            return _NULL_STAGE
+        return ProgressStage(self, name, total)
+
+    def _emit(self, event: ProgressEvent) -> None:
+        if self.callback is not None:
+            self.callback(event)
+        if self.logger is not None:
+            self.logger.info(event.message())
+        if isinstance(self.event_log, list):
+            self.event_log.append(event.as_dict())
+        elif self.event_log:
+            with open(self.event_log, "a", encoding="utf-8") as f:
+                f.write(json.dumps(event.as_dict()) + "\n")
+
+
+def _print_status(event: ProgressEvent) -> None:
+    end = "\n" if event.kind == "stop" else "\r"
+    print(event.message(), end=end, file=sys.stderr, flush=True)
+
+
+SILENT = ProgressReporter()
+
+
+def as_reporter(progress: Any) -> ProgressReporter:
+    """Normalise a `progress` argument (see the module docstring)."""
+    if progress is None or progress is False:
+        return SILENT
+    if progress is True:
+        return ProgressReporter(_print_status)
+    if isinstance(progress, ProgressReporter):
+        return progress
+    if isinstance(progress, logging.Logger):
+        return ProgressReporter(logger=progress)
+    if callable(progress):
+        return ProgressReporter(progress)
+    raise TypeError(f"Unsupported progress argument: {progress!r}")
@@ -3,9 +3,26 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import powercalculations.powercalculations as pc
+import powercalculations.progress as pc_progress
+import powercalculations.profiling as pc_profiling
 import gridcost.gridcost as fa
+import gridcost._scenarios as fa_scenarios
 import financialmodel.financialmodel as fm
 import financialmodel.models as fm_models
+import gridcost._contracttable as fa_contract_table
+import financialmodel.contract_library as fm_contract_library
+import financialmodel._results as fm_results
+import financialmodel._optimizer as fm_optimizer
+import financialmodel._search as fm_search
+import financialmodel.runner as fm_runner
+import financialmodel.costs as fm_costs
+import financialmodel._representative as fm_representative
+import financialmodel._checkpoint as fm_checkpoint
+import financialmodel._shards as fm_shards
+import financialmodel._sensitivity as fm_sensitivity
 
 
 
+import benchmarks.suite as bench_suite
+import benchmarks.synthetic as bench_synthetic
+import benchmarks.equivalence as bench_equivalence
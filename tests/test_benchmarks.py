@@ -0,0 +1,99 @@
+import json
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from context import fa, bench_suite, bench_synthetic, bench_equivalence
+
+
+class TestSyntheticData(unittest.TestCase):
+    def test_supplier_export_parses_back_to_gridflow(self):
+        frame = bench_synthetic.weather_and_load(years=7 / 365, freq="15min")
+        flow = bench_synthetic.grid_flow(frame)
+        export = bench_synthetic.supplier_export(flow)
+        self.assertEqual(len(export), 2 * len(flow))
+
+        gc = fa.GridCost(consumption_data_df=export, file_path_BelpexFilter="", resample_freq="15min")
+        pd.testing.assert_series_equal(gc.pd["GridFlow"], flow, check_names=False, check_freq=False, atol=1e-3)
+
+    def test_belpex_covers_the_dataset(self):
+        frame = bench_synthetic.weather_and_load(years=7 / 365, freq="1h")
+        belpex = bench_synthetic.belpex_prices(years=7 / 365)
+        self.assertEqual(belpex["DateTime"].iloc[0], frame.index[0])
+        self.assertEqual(len(belpex), 4 * len(frame))
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test_run_writes_json_and_compares(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "run.json")
+            doc = bench_suite.run_benchmarks(
+                freqs=["1h"], years=[3 / 365], repeat=2, max_rows=48, output=path,
+                only=["power_flow", "dual_tariff", "gridcost_init"],
+            )
+            with open(path) as f:
+                self.assertEqual(json.load(f), doc)
+
+        self.assertIn("commit", doc["environment"])
+        results = {r["benchmark"]: r for r in doc["results"]}
+        self.assertEqual(set(results), {"power_flow", "dual_tariff", "gridcost_init"})
+        for r in results.values():
+            self.assertIsNone(r["error"])
+            self.assertEqual((r["dataset"], r["rows"], r["truncated"]), (bench_suite.Dataset("1h", 3 / 365).name, 48, True))
+            self.assertEqual(len(r["times_s"]), 2)
+
+        slower = json.loads(json.dumps(doc))
+        slower["results"][0]["min_s"] *= 2
+        statuses = [c["status"] for c in bench_suite.compare(doc, slower)]
+        self.assertEqual(statuses, ["regression", "ok", "ok"])
+
+    def test_failures_are_recorded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            inputs = bench_suite.Inputs(bench_suite.Dataset("1h", 2 / 365), tmp)
+            failing = bench_suite.Benchmark("failing", lambda inputs, rows: None, lambda state: 1 / 0)
+            result = bench_suite.time_benchmark(failing, inputs, repeat=3)
+        self.assertTrue(result["error"].startswith("ZeroDivisionError"))
+        self.assertEqual(len(result["times_s"]), 1)
+
+    def test_unknown_benchmark(self):
+        with self.assertRaises(ValueError):
+            bench_suite.run_benchmarks(only=["nope"])
+
+
+class TestEquivalence(unittest.TestCase):
+    def test_accelerated_engines_match_legacy(self):
+        document = bench_equivalence.run_equivalence(bench_equivalence.default_cases(days=3))
+        bench_equivalence.assert_equivalent(document)
+        self.assertEqual(
+            {r["target"] for r in document["results"]},
+            {"power_flow", "dual_tariff", "dynamic_tariff", "direct_irradiance"},
+        )
+        for r in document["results"]:
+            self.assertGreater(r["speedup"], 0)
+
+    def test_breaches_are_reported(self):
+        legacy = pd.DataFrame({"a": [1.0, 2.0, float("nan")], "b": [0.0, 1.0, 2.0]})
+        accelerated = pd.DataFrame({"a": [1.0, 2.0, 3.0], "b": [0.0, 1.0 + 1e-12, 2.5]})
+        columns = bench_equivalence.compare_columns(legacy, accelerated, atol=1e-9, rtol=0.0)
+        self.assertEqual(columns["a"]["nan_mismatch"], 1)
+        self.assertFalse(columns["a"]["ok"])
+        self.assertAlmostEqual(columns["b"]["max_abs"], 0.5)
+        self.assertAlmostEqual(columns["b"]["max_rel"], 0.25)
+        self.assertFalse(columns["b"]["ok"])
+
+        document = {"atol": 1e-9, "rtol": 0.0, "results": [{"case": "x", "columns": columns}]}
+        with self.assertRaises(bench_equivalence.EquivalenceError):
+            bench_equivalence.assert_equivalent(document)
+
+    def test_unknown_engine(self):
+        gc = fa.GridCost.__new__(fa.GridCost)
+        gc.electricity_contract = bench_equivalence.DUAL
+        gc.pd = pd.DataFrame({"GridFlow": [1.0]}, index=pd.DatetimeIndex(["2018-06-04"]))
+        with self.assertRaises(ValueError):
+            gc.dual_tariff(engine="gpu")
+
+
+if __name__ == "__main__":
+    unittest.main()
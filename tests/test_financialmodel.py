@@ -1,7 +1,9 @@
 import os
+import pickle
 import tempfile
 import unittest
 
+import numpy as np
 import pandas as pd
 
 # Adjust these imports to match your project layout.
@@ -10,6 +12,7 @@ import pandas as pd
 
 from context import fm  # fm should expose FinancialModel, e.g. `import financialmodel.financialmodel as fm` in context.py
 from context import fm_models  # fm_models should expose ElectricityContract, e.g. `import financialmodel.models as fm_models` in context.py
+from context import pc, fm_results, fm_optimizer, fm_search, fm_runner, fm_costs, fm_representative, fm_checkpoint, fm_shards, fm_sensitivity, fa_contract_table, fm_contract_library, fa
 
 
 class TestFinancialModelOptimiseContractsFromConsumption(unittest.TestCase):
@@ -140,6 +143,732 @@ class TestFinancialModelOptimiseContractsFromConsumption(unittest.TestCase):
         self.assertIn("npv_cost", results[0])
 
 
+# ----------------------------------------------------------------------
+# Helpers for optimisation tests (synthetic data, no Excel/pickle fixtures)
+# ----------------------------------------------------------------------
+
+def _synthetic_powercalculations(days: int = 7, freq: str = "1h", seed: int = 0):
+    """Build a small PowerCalculations object with irradiance and load columns."""
+    idx = pd.date_range("2018-06-04", periods=int(pd.Timedelta(days=days) / pd.Timedelta(freq)), freq=freq)
+    idx.name = "DateTime"
+    rng = np.random.default_rng(seed)
+    hour = idx.hour + idx.minute / 60.0
+    sun = np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None)
+
+    obj = pc.PowerCalculations.__new__(pc.PowerCalculations)
+    obj.pd = pd.DataFrame(
+        {
+            "Load_kW": 0.3 + 0.7 * rng.random(len(idx)),
+            "GlobRad": 800 * sun,
+            "DiffRad": 150 * sun,
+            "T_RV_degC": 20.0,
+            "T_CommRoof_degC": 25.0,
+            "DirectIrradiance": 700 * sun,
+            "PV_generated_power": 0.0,
+            "GridFlow": 0.0,
+            "BatteryCharge": 0.0,
+        },
+        index=idx,
+    )
+    return obj
+
+
+def _write_synthetic_pickle(directory: str, **kwargs) -> str:
+    path = os.path.join(directory, "pd_synthetic")
+    with open(path, "wb") as f:
+        pickle.dump(_synthetic_powercalculations(**kwargs), f)
+    return path
+
+
+def _component_options():
+    solar = [
+        fm_models.SolarSpec(
+            solar_panel_cost=150 + 10 * n,
+            solar_panel_count=n,
+            solar_panel_lifetime=25,
+            panel_surface=1.7,
+            annual_degredation=0.5,
+            panel_efficiency=0.21,
+            temperature_coefficient=-0.003,
+        )
+        for n in (2, 6, 10)
+    ]
+    battery = [
+        fm_models.BatterySpec(battery_cost=2500, battery_count=n, battery_lifetime=10, battery_capacity=5.0)
+        for n in (0, 1)
+    ]
+    inverter = [
+        fm_models.InverterSpec(
+            inverter_cost=1200, inverter_lifetime=10, inverter_efficiency=0.97,
+            DC_battery=5, DC_solar_panels=6, AC_output=5,
+        )
+    ]
+    contracts = [
+        fm_models.ElectricityContract(contract_type="DualTariff", dual_cons_peak=35.0, dual_cons_offpeak=25.0,
+                                      dual_inj_peak=-4.0, dual_inj_offpeak=-4.0),
+        fm_models.ElectricityContract(contract_type="DualTariff", dual_cons_peak=30.0, dual_cons_offpeak=30.0,
+                                      dual_inj_peak=-2.0, dual_inj_offpeak=-2.0),
+    ]
+    return solar, battery, inverter, contracts
+
+
+class TestTopKResultSink(unittest.TestCase):
+    def test_matches_sorted_slice_with_stable_ties(self):
+        rng = np.random.default_rng(1)
+        results = [{"id": i, "npv_cost": float(v)} for i, v in enumerate(rng.integers(0, 20, 200))]
+
+        sink = fm_results.TopKResultSink(15)
+        sink.extend(results)
+
+        expected = sorted(results, key=lambda r: r["npv_cost"])[:15]
+        self.assertEqual([r["id"] for r in sink.results()], [r["id"] for r in expected])
+        self.assertEqual(sink.n_seen, 200)
+        self.assertEqual(len(sink), 15)
+
+    def test_unbounded_and_maximise(self):
+        results = [{"cost": c} for c in (3.0, 1.0, 2.0)]
+        sink = fm_results.TopKResultSink(None, metric="cost", minimise=False)
+        sink.extend(results)
+        self.assertEqual([r["cost"] for r in sink.results()], [3.0, 2.0, 1.0])
+
+    def test_columnar_file_gets_every_result(self):
+        solar, battery, inverter, contracts = _component_options()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.csv")
+            with fm_results.TopKResultSink(2, columnar_path=path, flush_every=3) as sink:
+                for i in range(10):
+                    sink.add({"solar": solar[0], "contract": contracts[0], "npv_cost": float(i),
+                              "grid": pd.Series([1.0, 2.0])})
+            rows = pd.read_csv(path)
+
+        self.assertEqual(len(rows), 10)
+        self.assertIn("solar.solar_panel_count", rows.columns)
+        self.assertIn("contract.dual_cons_peak", rows.columns)
+        self.assertNotIn("grid", rows.columns)
+        self.assertEqual([r["npv_cost"] for r in sink.results()], [0.0, 1.0])
+
+    def test_columnar_file_keeps_columns_of_later_batches(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.csv")
+            with fm_results.TopKResultSink(None, columnar_path=path, flush_every=2) as sink:
+                for i in range(5):
+                    result = {"id": i, "npv_cost": float(i)}
+                    if i == 3:
+                        result["note"] = "extra"
+                    sink.add(result)
+            rows = pd.read_csv(path)
+
+        self.assertEqual(list(rows.columns), ["id", "npv_cost", "note"])
+        self.assertEqual(rows["id"].tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(rows["note"].isna().tolist(), [True, True, True, False, True])
+        self.assertEqual(rows.loc[3, "note"], "extra")
+
+    def test_grid_search_top_k(self):
+        grid = {"a": range(10), "b": range(10)}
+
+        def cost_fn(p):
+            if p["a"] == 3:
+                raise ValueError("invalid")
+            return (p["a"] - 5) ** 2 + (p["b"] - 2) ** 2
+
+        best = fm_optimizer.grid_search(grid, cost_fn, top_k=3)
+        self.assertEqual(best[0]["params"], {"a": 5, "b": 2})
+        self.assertEqual([r["cost"] for r in best], [0.0, 1.0, 1.0])
+
+
+class TestOptimiseComponentsSynthetic(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pkl = _write_synthetic_pickle(self.tmp.name)
+        self.fm = fm.FinancialModel(pkl_path=self.pkl, belpex_filter_path="")
+        self.solar, self.battery, self.inverter, self.contracts = _component_options()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _run(self, **kwargs):
+        return self.fm.optimise_components(
+            solar_options=self.solar,
+            battery_options=self.battery,
+            inverter_options=self.inverter,
+            contract_options=self.contracts,
+            **kwargs,
+        )
+
+    def test_top_k_is_prefix_of_full_ranking(self):
+        full = self._run()
+        self.assertEqual(len(full), 12)
+        npvs = [r["npv_cost"] for r in full]
+        self.assertEqual(npvs, sorted(npvs))
+
+        results_path = os.path.join(self.tmp.name, "rows.csv")
+        top = self._run(top_k=4, results_path=results_path)
+        self.assertEqual([r["npv_cost"] for r in top], npvs[:4])
+        self.assertEqual(len(pd.read_csv(results_path)), 12)
+
+    def test_prune_search_matches_exhaustive(self):
+        for k in (1, 4):
+            exhaustive = self._run(top_k=k)
+            pruned = self._run(top_k=k, search="prune")
+            self.assertEqual(
+                [(r["solar"], r["battery"], r["contract"], r["npv_cost"]) for r in pruned],
+                [(r["solar"], r["battery"], r["contract"], r["npv_cost"]) for r in exhaustive],
+            )
+        self.assertGreater(self.fm.last_search_stats["pruned"], 0)
+
+    def test_progress_events(self):
+        events = []
+        self._run(top_k=2, progress=events.append)
+        stops = [e for e in events if e.kind == "stop"]
+        self.assertEqual([(e.stage, e.done, e.total) for e in stops], [("optimise_components", 6, 6)])
+
+    def test_profile_report(self):
+        import json
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            self._run(top_k=2, profile=tmp)
+            with open(os.path.join(tmp, "profile_stages.json")) as f:
+                stages = json.load(f)
+        self.assertEqual(stages["FinancialModel.evaluate_combination"]["calls"], 12)
+        self.assertIn("GridCost.__init__", stages)
+
+
+class TestDispatchModes(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pkl = _write_synthetic_pickle(self.tmp.name)
+        self.solar, self.battery, self.inverter, self.contracts = _component_options()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _model(self, dispatch):
+        return fm.FinancialModel(pkl_path=self.pkl, belpex_filter_path="", dispatch=dispatch,
+                                 dispatch_contract=self.contracts[0])
+
+    def _run(self, model, **kwargs):
+        return model.optimise_components(
+            solar_options=self.solar,
+            battery_options=self.battery,
+            inverter_options=self.inverter,
+            contract_options=self.contracts,
+            **kwargs,
+        )
+
+    def test_controllers_plug_into_the_sweep(self):
+        def key(r):
+            return r["solar"].solar_panel_count, r["battery"].battery_count, r["contract"].dual_cons_peak
+
+        costs = {}
+        for dispatch in ("optimal", "mpc"):
+            results = self._run(self._model(dispatch))
+            self.assertEqual(len(results), 12)
+            npvs = [r["npv_cost"] for r in results]
+            self.assertEqual(npvs, sorted(npvs))
+            costs[dispatch] = {key(r): r["annual_cost_year1"] for r in results}
+
+        # without a battery there is nothing to dispatch, so both controllers give the same grid flow
+        for k, cost in costs["optimal"].items():
+            if k[1] == 0:
+                self.assertAlmostEqual(cost, costs["mpc"][k], places=6)
+
+    def test_invalid_dispatch(self):
+        with self.assertRaises(ValueError):
+            fm.FinancialModel(pkl_path=self.pkl, dispatch="random")
+        with self.assertRaises(ValueError):
+            self._run(self._model("mpc"), top_k=2, search="prune")
+
+
+class TestBudgetedSearch(unittest.TestCase):
+    grid = {"a": list(range(15)), "b": list(range(15)), "mode": ["x", "y", "z"]}
+
+    @staticmethod
+    def cost_fn(p):
+        offset = {"x": 3.0, "y": 0.0, "z": 5.0}[p["mode"]]
+        cost = (p["a"] - 11) ** 2 + 0.5 * (p["b"] - 4) ** 2 + offset
+        # low-fidelity evaluations are a noisy version of the true cost
+        return cost + (1.0 - p.get("fidelity", 1.0)) * ((p["a"] * 7 + p["b"]) % 5)
+
+    def test_strategies_respect_budget_and_find_optimum(self):
+        optimum = {"a": 11, "b": 4, "mode": "y"}
+        cases = [
+            ("coordinate", {"categorical_axes": ["mode"]}),
+            ("halving", {}),
+            ("bayesian", {"categorical_axes": ["mode"]}),
+        ]
+        for name, kwargs in cases:
+            with self.subTest(strategy=name):
+                budget = 150 if name == "halving" else 80
+                res = fm_search.STRATEGIES[name](self.grid, self.cost_fn, budget=budget, top_k=3, **kwargs)
+                self.assertLessEqual(res.evaluations, budget)
+                self.assertEqual(len(res.trajectory), res.evaluations)
+                if name == "halving":
+                    # random screening: only guaranteed to land near the optimum
+                    all_costs = [r["cost"] for r in fm_optimizer.grid_search(self.grid, self.cost_fn, top_k=None)]
+                    self.assertLessEqual(res.results[0]["cost"], all_costs[len(all_costs) // 50])
+                else:
+                    self.assertEqual(res.results[0]["params"], optimum)
+
+                best = [t["best_cost"] for t in res.trajectory if t["best_cost"] is not None]
+                self.assertEqual(best, sorted(best, reverse=True))
+
+    def test_invalid_params_count_against_budget(self):
+        def cost_fn(p):
+            if p["a"] % 2:
+                raise ValueError("invalid")
+            return self.cost_fn(p)
+
+        res = fm_search.coordinate_descent(self.grid, cost_fn, budget=30, top_k=2)
+        self.assertEqual(res.evaluations, 30)
+        self.assertTrue(all(r["params"]["a"] % 2 == 0 for r in res.results))
+
+
+class TestOptimizerRunnerStrategies(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        solar, battery, inverter, contracts = _component_options()
+        self.grid = {"solar": solar, "battery": battery, "inverter": inverter, "contract": contracts}
+        pkl = _write_synthetic_pickle(self.tmp.name, days=28)
+        self.runner = fm_runner.OptimizerRunner(tariff="DualTariff", pkl_path=pkl, cache={})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_budgeted_strategies_return_priced_results(self):
+        exhaustive = self.runner.grid_search(self.grid, top_k=None)
+        self.assertEqual(len(exhaustive), 12)
+        self.assertTrue(all("error" not in r["metrics"] for r in exhaustive))
+        costs = [r["cost"] for r in exhaustive]
+        self.assertEqual(costs, sorted(costs))
+        self.assertAlmostEqual(costs[0], -exhaustive[0]["metrics"]["npv"])
+
+        for strategy in ("coordinate", "halving", "bayesian"):
+            with self.subTest(strategy=strategy):
+                results = self.runner.grid_search(self.grid, top_k=3, strategy=strategy, budget=6)
+                self.assertGreater(len(results), 0)
+                self.assertLessEqual(len(results), 3)
+                self.assertLessEqual(len(self.runner.last_trajectory), 6)
+                self.assertTrue(all("error" not in r["metrics"] for r in results))
+                self.assertGreaterEqual(results[0]["cost"], costs[0] - 1e-6)
+
+    def test_dynamic_tariff_needs_belpex(self):
+        cost_fn, _ = fm_costs.make_cost_fn(tariff="DynamicTariff", pkl_path=self.runner.pkl_path)
+        with self.assertRaises(ValueError):
+            cost_fn({"solar": self.grid["solar"][0], "battery": self.grid["battery"][0],
+                     "inverter": self.grid["inverter"][0]})
+
+
+class TestSubsampleWeeks(unittest.TestCase):
+    def test_keeps_every_kth_week_on_continuous_index(self):
+        obj = _synthetic_powercalculations(days=28)
+        fraction = fm_costs._subsample_weeks(obj, 0.5)
+
+        self.assertAlmostEqual(fraction, 0.5)
+        self.assertEqual(len(obj.pd), 14 * 24)
+        self.assertEqual(obj.pd.index[0], pd.Timestamp("2018-06-04"))
+        self.assertEqual(pd.infer_freq(obj.pd.index), "h")
+
+
+class TestRepresentativeDays(unittest.TestCase):
+    def setUp(self):
+        self.frame = _synthetic_powercalculations(days=21).pd[["Load_kW", "DirectIrradiance"]]
+
+    def test_weights_cover_every_day(self):
+        days = fm_representative.select_representative_days(self.frame, 4)
+        self.assertEqual(days.k, 4)
+        self.assertEqual(int(days.weights.sum()), 21)
+        self.assertTrue(days.medoids.isin(days.assignment.index).all())
+
+    def test_expand_reduce_round_trip(self):
+        days = fm_representative.select_representative_days(self.frame, 21)
+        reduced = days.reduce(self.frame)
+        self.assertEqual(reduced.index.freq, self.frame.index.freq)
+
+        expanded = days.expand(reduced["Load_kW"], self.frame.index)
+        pd.testing.assert_series_equal(expanded, self.frame["Load_kW"], check_freq=False)
+
+        days = fm_representative.select_representative_days(self.frame, 3)
+        expanded = days.expand(days.reduce(self.frame)["Load_kW"], self.frame.index)
+        for day, medoid in days.assignment.items():
+            np.testing.assert_array_equal(
+                expanded[day:day + pd.Timedelta(hours=23)].to_numpy(),
+                self.frame.loc[medoid:medoid + pd.Timedelta(hours=23), "Load_kW"].to_numpy(),
+            )
+
+    def test_reduce_keeps_hour_of_day_for_midday_start(self):
+        frame = self.frame.iloc[13:]
+        days = fm_representative.select_representative_days(frame, 3)
+        reduced = days.reduce(frame)
+
+        self.assertEqual(reduced.index[0], frame.index[0].normalize())
+        self.assertEqual(reduced.index.freq, frame.index.freq)
+        self.assertTrue((reduced.index.hour == np.tile(np.arange(24), days.k)).all())
+
+
+class TestOptimiseComponentsMultiFidelity(unittest.TestCase):
+    setUp = TestOptimiseComponentsSynthetic.setUp
+    tearDown = TestOptimiseComponentsSynthetic.tearDown
+    _run = TestOptimiseComponentsSynthetic._run
+
+    def test_all_days_and_full_shortlist_match_exhaustive(self):
+        exhaustive = self._run(top_k=5)
+        multi = self._run(top_k=5, search="multifidelity", representative_days=7, shortlist_fraction=1.0)
+
+        self.assertEqual([r["npv_cost"] for r in multi], [r["npv_cost"] for r in exhaustive])
+        self.assertAlmostEqual(self.fm.last_search_stats["approximation_error"]["max_abs"], 0.0, places=6)
+
+    def test_shortlist_and_error_report(self):
+        multi = self._run(top_k=2, search="multifidelity", representative_days=2, shortlist_fraction=0.25)
+        stats = self.fm.last_search_stats
+
+        self.assertEqual(stats["representative_days"], 2)
+        self.assertEqual(stats["shortlisted"], 3)
+        self.assertEqual(len(multi), 2)
+        for r in multi:
+            self.assertIn("screening_npv_cost", r)
+        self.assertGreaterEqual(stats["approximation_error"]["max_abs"], stats["approximation_error"]["mean_abs"])
+
+    def test_failing_full_year_simulation_is_skipped(self):
+        compute = self.fm._compute_grid_series
+        infeasible = self.solar[0]
+
+        def full_year_fails(solar, battery, inverter, days=None):
+            if days is None and solar is infeasible:
+                raise ValueError("infeasible over the full year")
+            return compute(solar, battery, inverter, days=days)
+
+        self.fm._compute_grid_series = full_year_fails
+        multi = self._run(top_k=None, search="multifidelity", representative_days=7, shortlist_fraction=1.0)
+        stats = self.fm.last_search_stats
+
+        self.assertEqual(stats["skipped"], 4)
+        self.assertEqual(stats["simulated"], 4)
+        self.assertEqual(len(multi), 8)
+        self.assertTrue(all(r["solar"] is not infeasible for r in multi))
+
+
+class TestCheckpointResume(unittest.TestCase):
+    grid = {"a": list(range(6)), "b": list(range(5))}
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.ckpt = os.path.join(self.tmp.name, "sweep.ckpt")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @staticmethod
+    def _cost_fn(calls, stop_after=None):
+        def cost_fn(p):
+            calls.append(p)
+            if stop_after is not None and len(calls) > stop_after:
+                raise KeyboardInterrupt
+            if p["a"] == 1:
+                raise ValueError("invalid")
+            return (p["a"] - 3) ** 2 + p["b"]
+        return cost_fn
+
+    def test_grid_search_resumes_after_interrupt(self):
+        expected = fm_optimizer.grid_search(self.grid, self._cost_fn([]), top_k=5)
+
+        calls = []
+        with self.assertRaises(KeyboardInterrupt):
+            fm_optimizer.grid_search(self.grid, self._cost_fn(calls, stop_after=17), top_k=5,
+                                     checkpoint_path=self.ckpt, checkpoint_every=4)
+
+        calls = []
+        resumed = fm_optimizer.grid_search(self.grid, self._cost_fn(calls), top_k=5,
+                                           checkpoint_path=self.ckpt, resume=True)
+        self.assertEqual(resumed, expected)
+        self.assertEqual(len(calls), 30 - 17)
+
+    def test_truncated_record_and_signature_mismatch(self):
+        fm_optimizer.grid_search(self.grid, self._cost_fn([]), checkpoint_path=self.ckpt)
+        with open(self.ckpt, "r+b") as f:
+            f.truncate(os.path.getsize(self.ckpt) - 3)
+
+        calls = []
+        fm_optimizer.grid_search(self.grid, self._cost_fn(calls), checkpoint_path=self.ckpt, resume=True)
+        self.assertEqual(len(calls), 1)
+
+        with self.assertRaises(ValueError):
+            fm_optimizer.grid_search({"a": [0, 1]}, self._cost_fn([]), checkpoint_path=self.ckpt, resume=True)
+
+    def test_optimise_components_resume_rewrites_results_file(self):
+        case = TestOptimiseComponentsSynthetic()
+        case.setUp()
+        self.addCleanup(case.tearDown)
+        expected = case._run(top_k=4)
+
+        results_path = os.path.join(self.tmp.name, "rows.csv")
+        model = fm.FinancialModel(pkl_path=case.pkl, belpex_filter_path="")
+        original = model._compute_grid_series
+        calls = []
+
+        def interrupted(*args, **kwargs):
+            calls.append(args)
+            if len(calls) > 3:
+                raise KeyboardInterrupt
+            return original(*args, **kwargs)
+
+        model._compute_grid_series = interrupted
+        with self.assertRaises(KeyboardInterrupt):
+            model.optimise_components(solar_options=case.solar, battery_options=case.battery,
+                                      inverter_options=case.inverter, contract_options=case.contracts,
+                                      top_k=4, results_path=results_path, checkpoint_path=self.ckpt,
+                                      checkpoint_every=1)
+
+        model._compute_grid_series = original
+        resumed = model.optimise_components(solar_options=case.solar, battery_options=case.battery,
+                                            inverter_options=case.inverter, contract_options=case.contracts,
+                                            top_k=4, results_path=results_path, checkpoint_path=self.ckpt,
+                                            resume=True)
+
+        self.assertEqual([r["npv_cost"] for r in resumed], [r["npv_cost"] for r in expected])
+        self.assertEqual(model.last_search_stats["resumed"], 3)
+        self.assertEqual(len(pd.read_csv(results_path)), 12)
+
+
+class TestShardedSweeps(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_grid_search_shards_merge_to_single_node(self):
+        grid = {"a": list(range(7)), "b": list(range(5))}
+
+        def cost_fn(p):
+            return abs(p["a"] - 3) + (p["b"] % 2)  # many ties
+
+        single = fm_optimizer.grid_search(grid, cost_fn, top_k=6)
+        for n in (1, 3, 4):
+            shards = [fm_optimizer.grid_search(grid, cost_fn, top_k=6, shard=(i, n)) for i in range(n)]
+            self.assertEqual(fm_shards.merge_shards(shards, top_k=6, metric="cost"), single)
+
+    def test_optimise_components_shard_files(self):
+        case = TestOptimiseComponentsSynthetic()
+        case.setUp()
+        self.addCleanup(case.tearDown)
+
+        single_rows = os.path.join(self.tmp.name, "single.csv")
+        single = case._run(top_k=4, results_path=single_rows)
+
+        n = 4
+        paths, row_paths = [], []
+        for i in reversed(range(n)):
+            row_paths.insert(0, os.path.join(self.tmp.name, f"rows_{i}.csv"))
+            results = case._run(top_k=4, results_path=row_paths[0], shard=(i, n))
+            paths.append(os.path.join(self.tmp.name, f"shard_{i}.pkl"))
+            fm_shards.save_shard(paths[-1], results, shard=(i, n))
+
+        merged = fm_shards.merge_shards(paths, top_k=4)
+        self.assertEqual([r["npv_cost"] for r in merged], [r["npv_cost"] for r in single])
+        self.assertEqual([r["solar"] for r in merged], [r["solar"] for r in single])
+
+        rows = fm_shards.merge_results_files(row_paths, os.path.join(self.tmp.name, "merged.csv"))
+        pd.testing.assert_frame_equal(rows, pd.read_csv(single_rows))
+
+        with self.assertRaises(ValueError):
+            fm_shards.merge_shards(paths[:-1])
+
+
+class TestContractCostDistributions(unittest.TestCase):
+    def test_dynamic_spread_and_dual_constant(self):
+        idx = pd.date_range("2025-03-03", periods=28 * 24, freq="1h", name="DateTime")
+        rng = np.random.default_rng(3)
+        consumption = pd.DataFrame({"GridFlow": -0.5 - rng.random(len(idx))}, index=idx)
+        belpex = pd.DataFrame({"DateTime": idx, "BelpexFilter": 80 + 30 * rng.standard_normal(len(idx))})
+        solar, battery, inverter, contracts = _component_options()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "belpex.csv")
+            belpex.to_csv(path, index=False)
+            model = fm.FinancialModel(belpex_filter_path=path)
+            results = model.contract_cost_distributions(
+                contracts=[contracts[0], fm_models.ElectricityContract(contract_type="DynamicTariff")],
+                consumption_data_df=consumption,
+                n_scenarios=500,
+                rank_by="p95",
+                return_costs=True,
+            )
+
+        by_type = {r["contract"].contract_type: r for r in results}
+        self.assertEqual(by_type["DualTariff"]["cost_distribution"]["std"], 0.0)
+        self.assertGreater(by_type["DynamicTariff"]["cost_distribution"]["std"], 0.0)
+        self.assertEqual(len(by_type["DynamicTariff"]["costs"]), 500)
+        p95 = [r["cost_distribution"]["p95"] for r in results]
+        self.assertEqual(p95, sorted(p95))
+
+
+class TestSensitivityAnalysis(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        case = TestOptimiseComponentsSynthetic()
+        case.setUp()
+        try:
+            cls.results = case._run()
+            cls.model = case.fm
+            cls.case = case
+        except Exception:
+            case.tearDown()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.case.tearDown()
+
+    def test_baseline_reproduces_npv(self):
+        sweep = fm_sensitivity.sensitivity_sweep(self.results, {"discount_rate": [0.05]}, discount_rate=0.05)
+        np.testing.assert_allclose(sweep["npv_cost"], [r["npv_cost"] for r in self.results])
+        self.assertEqual(list(sweep["rank"]), list(range(1, len(self.results) + 1)))
+
+    def test_matches_re_run(self):
+        tables = self.model.sensitivity_analysis(self.results, param_grid={"discount_rate": [0.02, 0.08]})
+        rerun = self.case._run(discount_rate=0.08)
+
+        at_8 = tables["sweep"][tables["sweep"]["discount_rate"] == 0.08].sort_values("rank")
+        np.testing.assert_allclose(at_8["npv_cost"], [r["npv_cost"] for r in rerun])
+        self.assertEqual(len(tables["rank_stability"]), len(self.results))
+
+    def test_tornado(self):
+        tables = self.model.sensitivity_analysis(
+            self.results,
+            ranges={"discount_rate": (0.02, 0.08), "escalation": (0.0, 0.04), "battery_lifetime": (8, 12)},
+        )
+        tornado = tables["tornado"]
+        self.assertEqual(list(tornado["swing"]), sorted(tornado["swing"], reverse=True))
+        row = tornado.set_index("parameter").loc["escalation"]
+        self.assertGreater(row["npv_cost_high"], row["npv_cost_low"])
+        self.assertAlmostEqual(tornado.attrs["base_npv_cost"], self.results[0]["npv_cost"])
+
+
+class TestContractTable(unittest.TestCase):
+    def setUp(self):
+        _, _, _, dual = _component_options()
+        dynamic = [
+            fm_models.ElectricityContract(
+                contract_type="DynamicTariff", dynamic_cons_var_peak=0.12, dynamic_cons_var_offpeak=0.1,
+                dynamic_cons_fix_peak=3.0, dynamic_cons_fix_offpeak=2.0, dynamic_inj_var_peak=0.09,
+                dynamic_inj_var_offpeak=0.08, dynamic_inj_fix_peak=-1.0, dynamic_inj_fix_offpeak=-1.0,
+                dynamic_fix=50.0, excise_duty=5.0, purchase_rate_consumption=1.5, product_name="dyn",
+            ),
+            fm_models.ElectricityContract(contract_type="DynamicTariff", dynamic_cons_var_peak=0.2),
+        ]
+        self.contracts = dual + dynamic
+        self.table = fa_contract_table.ContractTable.from_contracts(self.contracts)
+
+        idx = pd.date_range("2025-03-03", periods=14 * 24, freq="1h", name="DateTime")
+        rng = np.random.default_rng(5)
+        self.consumption = pd.DataFrame({"GridFlow": 1.5 - 3 * rng.random(len(idx))}, index=idx)
+        prices = 80 + 30 * rng.standard_normal(len(idx))
+        prices[::17] = np.nan
+        self.tmp = tempfile.TemporaryDirectory()
+        self.belpex = os.path.join(self.tmp.name, "belpex.csv")
+        pd.DataFrame({"DateTime": idx, "BelpexFilter": prices}).to_csv(self.belpex, index=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        self.assertEqual(len(self.table), 4)
+        self.assertEqual(self.table.to_contracts(), self.contracts)
+        np.testing.assert_array_equal(self.table.is_type("DynamicTariff"), [False, False, True, True])
+
+        path = os.path.join(self.tmp.name, "contracts.csv")
+        self.table.to_csv(path)
+        self.assertEqual(fa_contract_table.ContractTable.from_csv(path).to_contracts(), self.contracts)
+        with self.assertRaises(ValueError):
+            fa_contract_table.ContractTable({"not_a_field": [1.0]})
+
+    def test_vectorised_totals_match_per_contract(self):
+        gc = fa.GridCost(consumption_data_df=self.consumption, file_path_BelpexFilter=self.belpex,
+                         electricity_contract=self.table)
+        totals = gc.calculate_total_cost()
+
+        expected = [
+            fa.GridCost(consumption_data_df=self.consumption, file_path_BelpexFilter=self.belpex,
+                        electricity_contract=c).calculate_total_cost()
+            for c in self.contracts
+        ]
+        np.testing.assert_allclose(totals, expected, rtol=1e-10)
+
+    def test_optimise_contracts_accepts_table(self):
+        model = fm.FinancialModel(belpex_filter_path=self.belpex)
+        kwargs = dict(consumption_data_df=self.consumption, return_breakdown=True)
+        from_table = model.optimise_contracts_from_consumption(contracts=self.table, **kwargs)
+        from_list = model.optimise_contracts_from_consumption(contracts=self.contracts, **kwargs)
+
+        self.assertEqual([r["contract"] for r in from_table], [r["contract"] for r in from_list])
+        np.testing.assert_allclose([r["npv_cost"] for r in from_table], [r["npv_cost"] for r in from_list])
+        self.assertAlmostEqual(from_table[0]["breakdown"]["levy_cost"], from_list[0]["breakdown"]["levy_cost"])
+
+    def test_optimise_components_accepts_table(self):
+        case = TestOptimiseComponentsSynthetic()
+        case.setUp()
+        try:
+            from_list = case._run()
+            case.contracts = fa_contract_table.ContractTable.from_contracts(case.contracts)
+            from_table = case._run()
+        finally:
+            case.tearDown()
+        self.assertEqual([(r["solar"], r["contract"]) for r in from_table],
+                         [(r["solar"], r["contract"]) for r in from_list])
+        np.testing.assert_allclose([r["npv_cost"] for r in from_table], [r["npv_cost"] for r in from_list])
+
+
+class TestContractLibrary(unittest.TestCase):
+    PDFS = ("Mega-FR-EL-B2C-BX-102025-TA0525-Var_(1).pdf", "Mega-NL-EL-B2C-VL-122025-Online0112-Green.pdf")
+
+    def setUp(self):
+        import shutil
+
+        self.tmp = tempfile.TemporaryDirectory()
+        source = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "contracts")
+        for name in self.PDFS:
+            shutil.copy(os.path.join(source, name), self.tmp.name)
+        self.cache_dir = os.path.join(self.tmp.name, "cache")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _load(self, **kwargs):
+        cache = fm_contract_library.ContractPdfCache(self.cache_dir)
+        return fm_contract_library.load_contract_pdfs(self.tmp.name, cache=cache, **kwargs), cache.stats
+
+    def test_rescan_is_served_from_cache(self):
+        first, stats = self._load(workers=2)
+        self.assertEqual(stats["parsed"], 2)
+        direct = fm_models.electricity_contract_from_pdf(
+            fm_models.ElectricityContract, os.path.join(self.tmp.name, self.PDFS[0])
+        )
+        direct.parsed_at = first[0].parsed_at
+        self.assertEqual(first[0], direct)
+
+        second, stats = self._load(workers=2)
+        self.assertEqual(stats, {"cached": 2, "text_cached": 0, "parsed": 0})
+        self.assertEqual(second, first)
+
+        table = fa_contract_table.ContractTable.from_pdf_dir(self.tmp.name, cache_dir=self.cache_dir)
+        self.assertEqual(table.to_contracts(), first)
+
+    def test_parser_version_bump_reuses_text(self):
+        self._load(workers=1)
+        version = fm_models.PARSER_VERSION
+        fm_models.PARSER_VERSION = version + 1
+        try:
+            _, stats = self._load(workers=1)
+        finally:
+            fm_models.PARSER_VERSION = version
+        self.assertEqual(stats, {"cached": 0, "text_cached": 2, "parsed": 0})
+
+        # parse options are part of the key
+        _, stats = self._load(workers=1, region="BX")
+        self.assertEqual(stats["text_cached"], 2)
+
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -149,4 +878,3 @@ if __name__ == "__main__":
 # contract_type: DynamicTariff
 # dynamic_fixed_tariff_injection: -2.75
 # dynamic_variable_tariff_injection: 0.9
-
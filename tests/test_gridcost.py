@@ -1,10 +1,14 @@
 import os
+import tempfile
+import time
 import unittest
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
 from context import fa  # fa should expose GridCost & update_belpex_quarter_hourly
+from context import fa_scenarios
 
 # Full historical Belpex Excel file (user-specific path)
 BELPEX_INITIAL_XLSX = Path(
@@ -274,5 +278,70 @@ class TestGridCostWithBelpex(unittest.TestCase):
             )
 
 
+def _synthetic_year(days: int = 364, seed: int = 0):
+    """Hourly GridFlow and a quarter-hourly Belpex history over the same dates."""
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range("2025-01-06", periods=days * 24, freq="1h", name="DateTime")
+    hour = idx.hour.to_numpy()
+    gridflow = -0.8 - 0.4 * rng.random(len(idx)) + 2.5 * np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None)
+
+    qidx = pd.date_range(idx[0], periods=days * 96, freq="15min")
+    price = 90 + 40 * np.sin((qidx.hour.to_numpy() - 8) / 24 * 2 * np.pi) + 10 * rng.standard_normal(len(qidx))
+    belpex = pd.DataFrame({"DateTime": qidx, "BelpexFilter": price})
+    return pd.DataFrame({"GridFlow": gridflow}, index=idx), belpex
+
+
+class TestPriceScenarios(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.consumption, belpex = _synthetic_year()
+        self.belpex_path = os.path.join(self.tmp.name, "belpex.csv")
+        belpex.to_csv(self.belpex_path, index=False)
+        self.history = belpex.set_index("DateTime")["BelpexFilter"]
+        self.contract = fa.ElectricityContract(contract_type="DynamicTariff")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_scaled_paths_match_dynamic_tariff(self):
+        gc = fa.GridCost(consumption_data_df=self.consumption, file_path_BelpexFilter=self.belpex_path,
+                         electricity_contract=self.contract)
+        scenarios = fa_scenarios.PriceScenarios.scaled(
+            gc.pd["BelpexFilter"], gc.pd.index, scales=[1.0, 1.5], shifts=[0.0, 20.0]
+        )
+        costs = gc.price_scenario_costs(scenarios, batch_size=3)
+
+        self.assertAlmostEqual(costs[0], gc.calculate_total_cost(), places=6)
+        for (scale, shift), cost in zip([(1.5, 20.0)], costs[3:]):
+            gc.pd["BelpexFilter"] = gc.pd["BelpexFilter"] * scale + shift
+            self.assertAlmostEqual(cost, gc.calculate_total_cost(), places=6)
+
+    def test_bootstrap_ten_thousand_scenarios(self):
+        gc = fa.GridCost(consumption_data_df=self.consumption, file_path_BelpexFilter="",
+                         electricity_contract=self.contract)
+        scenarios = fa_scenarios.PriceScenarios.bootstrap_days(
+            self.history, gc.pd.index, 10_000, block_days=7, seasonal_window=30, seed=1
+        )
+        start = time.perf_counter()
+        costs = gc.price_scenario_costs(scenarios)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(costs.shape, (10_000,))
+        self.assertLess(elapsed, 30.0)
+        summary = fa_scenarios.summarise_costs(costs)
+        self.assertLessEqual(summary["p5"], summary["mean"])
+        self.assertLessEqual(summary["mean"], summary["p95"])
+        self.assertGreaterEqual(summary["cvar"], summary["var"])
+
+        # every scenario day is a whole historical day of the same weekday/weekend kind
+        first = next(scenarios.batches(2))[0].reshape(-1, 24)
+        hourly = self.history.resample("1h").mean().to_numpy().reshape(-1, 24)
+        hist_days = self.history.resample("1h").mean().index[::24]
+        for d, day in enumerate(gc.pd.index[::24][:14]):
+            match = np.flatnonzero(np.isclose(hourly, first[d]).all(axis=1))
+            self.assertEqual(len(match), 1)
+            self.assertEqual(hist_days[match[0]].weekday() >= 5, day.weekday() >= 5)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,56 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Libraries that must only be imported on first use (plotting, PDF parsing,
+# pvlib, ML, network access, scipy).
+HEAVY_MODULES = ("torch", "matplotlib", "pdfplumber", "pvlib", "scipy", "requests", "scienceplots")
+
+# Import time of the project modules on top of numpy + pandas (ms). numpy and
+# pandas themselves are excluded: they are needed by everything and their
+# import time depends mostly on the machine.
+IMPORT_BUDGET_MS = 300
+
+
+def _import_in_subprocess(module: str) -> dict:
+    code = (
+        "import json, sys, time\n"
+        "import numpy, pandas\n"
+        "t = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = (time.perf_counter() - t) * 1000\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'ms': elapsed, 'heavy': heavy}))\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+class TestImportTime(unittest.TestCase):
+    MODULES = (
+        "gridcost.gridcost",
+        "financialmodel.financialmodel",
+        "powercalculations.powercalculations",
+    )
+
+    def test_heavy_dependencies_are_lazy(self):
+        for module in self.MODULES:
+            with self.subTest(module=module):
+                self.assertEqual(_import_in_subprocess(module)["heavy"], [])
+
+    def test_import_time_budget(self):
+        for module in self.MODULES:
+            with self.subTest(module=module):
+                # best of three, to ignore a cold file cache
+                ms = min(_import_in_subprocess(module)["ms"] for _ in range(3))
+                self.assertLess(ms, IMPORT_BUDGET_MS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,9 @@
 import os
+import tempfile
 import unittest
 import pandas as pd
 import pytest
-from context import pc
+from context import pc, pc_progress, pc_profiling
 
 class test_DirectIrradiance(unittest.TestCase):
     def setUp(self):
@@ -142,6 +143,659 @@ class test_Export(unittest.TestCase):
             os.remove(output_file_path)
 
 
+def _synthetic_powerflow_input(days: int = 3):
+    """Small PowerCalculations object that power_flow can run on."""
+    import numpy as np
+
+    idx = pd.date_range("2018-06-04", periods=days * 24, freq="1h", name="DateTime")
+    hour = idx.hour.to_numpy()
+    obj = pc.PowerCalculations.__new__(pc.PowerCalculations)
+    obj.pd = pd.DataFrame(
+        {
+            "Load_kW": 0.5 + 0.1 * (hour % 5),
+            "PV_generated_power": 3.0 * np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None),
+            "GridFlow": 0.0,
+            "BatteryCharge": 0.0,
+        },
+        index=idx,
+    )
+    return obj
+
+
+class test_Progress(unittest.TestCase):
+    def test_stage_events(self):
+        events = []
+        reporter = pc_progress.ProgressReporter(min_interval=0.0, event_log=events)
+        with reporter.stage("loop", total=100) as stage:
+            for _ in range(100):
+                stage.advance()
+
+        self.assertEqual(events[0]["kind"], "start")
+        self.assertEqual(events[-1]["kind"], "stop")
+        self.assertEqual(events[-1]["done"], 100)
+        self.assertEqual(events[-1]["status"], "ok")
+        self.assertTrue(any(e["kind"] == "progress" and e["eta"] is not None for e in events))
+
+    def test_failed_stage_is_reported(self):
+        events = []
+        reporter = pc_progress.ProgressReporter(event_log=events)
+        with self.assertRaises(RuntimeError):
+            with reporter.stage("loop"):
+                raise RuntimeError("boom")
+        self.assertEqual((events[-1]["kind"], events[-1]["status"]), ("stop", "error"))
+
+    def test_event_log_file_and_silent_default(self):
+        import json
+        import tempfile
+
+        self.assertFalse(pc_progress.as_reporter(None).enabled)
+        with self.assertRaises(TypeError):
+            pc_progress.as_reporter("verbose")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "events.jsonl")
+            with pc_progress.ProgressReporter(event_log=path).stage("loop", total=3) as stage:
+                stage.advance(3)
+            with open(path) as f:
+                kinds = [json.loads(line)["kind"] for line in f]
+        self.assertEqual(kinds[0], "start")
+        self.assertEqual(kinds[-1], "stop")
+
+    def test_power_flow_reports_instead_of_printing(self):
+        import contextlib
+        import io
+
+        silent = _synthetic_powerflow_input()
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            silent.power_flow()
+        self.assertEqual(out.getvalue(), "")
+
+        events = []
+        reported = _synthetic_powerflow_input()
+        reported.power_flow(progress=events.append)
+        self.assertEqual([e.kind for e in events[:1] + events[-1:]], ["start", "stop"])
+        self.assertEqual(events[-1].done, len(reported.pd))
+        pd.testing.assert_series_equal(reported.pd["GridFlow"], silent.pd["GridFlow"])
+
+class test_Profiling(unittest.TestCase):
+    def tearDown(self):
+        pc_profiling.disable_profiling()
+        pc_profiling.reset_profiling()
+
+    def test_disabled_records_nothing(self):
+        pc_profiling.reset_profiling()
+        _synthetic_powerflow_input().power_flow()
+        self.assertEqual(pc_profiling.profiling_stats(), {})
+
+    def test_power_flow_stage(self):
+        model = _synthetic_powerflow_input()
+        pc_profiling.reset_profiling()
+        pc_profiling.enable_profiling(memory=True)
+        model.power_flow()
+        model.power_flow()
+        stats = pc_profiling.profiling_stats()["power_flow"]
+        self.assertEqual(stats["calls"], 2)
+        self.assertEqual(stats["rows"], 2 * len(model.pd))
+        self.assertGreater(stats["wall_s"], 0)
+        self.assertGreater(stats["peak_mem_bytes"], 0)
+
+    def test_profile_run_writes_report(self):
+        import json
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with pc_profiling.profile_run(tmp, top=5):
+                _synthetic_powerflow_input().power_flow()
+            self.assertFalse(pc_profiling.profiling_enabled())
+            for name in ("profile_stages.json", "profile_cprofile.txt", "profile_cprofile.pstats", "profile_memory.txt"):
+                self.assertTrue(os.path.isfile(os.path.join(tmp, name)), name)
+            with open(os.path.join(tmp, "profile_stages.json")) as f:
+                self.assertEqual(json.load(f)["power_flow"]["calls"], 1)
+
+class test_OptimalDispatch(unittest.TestCase):
+    def _model(self):
+        import numpy as np
+
+        obj = _synthetic_powerflow_input(days=14)
+        rng = np.random.default_rng(0)
+        obj.pd["BelpexFilter"] = 90 + 60 * rng.standard_normal(len(obj.pd))
+        return obj
+
+    def _contract(self, contract_type):
+        from context import fm_models
+
+        return fm_models.ElectricityContract(contract_type=contract_type, dual_cons_peak=35.0, dual_cons_offpeak=25.0,
+                                             dual_inj_peak=-4.0, dual_inj_offpeak=-2.0, dynamic_cons_var_peak=0.1,
+                                             dynamic_cons_var_offpeak=0.1, dynamic_cons_fix_peak=2.0,
+                                             dynamic_inj_var_peak=0.08, dynamic_inj_var_offpeak=0.08)
+
+    def test_not_worse_than_greedy_power_flow(self):
+        from powercalculations._dispatch import dispatch_cost
+
+        for contract_type in ("DualTariff", "DynamicTariff"):
+            with self.subTest(contract_type=contract_type):
+                contract = self._contract(contract_type)
+                greedy = self._model()
+                # at 100% efficiency the greedy schedule is a feasible point of the LP
+                greedy.power_flow(max_charge=5, battery_roundtrip_efficiency=100)
+                greedy_cost = dispatch_cost(greedy.pd.index, greedy.pd["GridFlow"], contract,
+                                            greedy.pd["BelpexFilter"].to_numpy())
+
+                optimal = self._model()
+                summary = optimal.optimal_power_flow(contract, max_charge=5, battery_roundtrip_efficiency=100)
+                self.assertEqual(summary["status"], 0)
+                self.assertAlmostEqual(summary["objective"], summary["total_cost"], places=4)
+                self.assertLessEqual(summary["total_cost"], greedy_cost["total_cost"] + 1e-6)
+
+                pd_ = optimal.pd
+                self.assertTrue(((pd_["BatteryCharge"] >= -1e-9) & (pd_["BatteryCharge"] <= 5 + 1e-9)).all())
+                self.assertTrue((pd_["GridFlow"] <= 5 + 1e-9).all())
+                # energy balance: PV - curtailment - load = battery flow + grid flow
+                balance = (pd_["PV_generated_power"] - pd_["Curtailment"] - pd_["Load_kW"]
+                           - pd_["BatteryFlow"] - pd_["GridFlow"])
+                self.assertLess(balance.abs().max(), 1e-6)
+
+    def test_unsupported_ev_type(self):
+        with self.assertRaises(ValueError):
+            self._model().optimal_power_flow(self._contract("DualTariff"), EV_type="B2G")
+
+    def test_missing_prices_take_the_last_known_price(self):
+        import numpy as np
+        from powercalculations._dispatch import energy_rates
+
+        contract = self._contract("DynamicTariff")
+        gap = self._model()
+        gap.pd.iloc[:3, gap.pd.columns.get_loc("BelpexFilter")] = np.nan
+        gap.pd.iloc[30:40, gap.pd.columns.get_loc("BelpexFilter")] = np.nan
+        filled = self._model()
+        filled.pd["BelpexFilter"] = gap.pd["BelpexFilter"].ffill().bfill()
+
+        rates = energy_rates(gap.pd.index, contract, gap.pd["BelpexFilter"].to_numpy())
+        expected = energy_rates(filled.pd.index, contract, filled.pd["BelpexFilter"].to_numpy())
+        np.testing.assert_array_equal(rates[0], expected[0])
+
+        summary = gap.optimal_power_flow(contract, max_charge=5)
+        self.assertAlmostEqual(summary["total_cost"], filled.optimal_power_flow(contract, max_charge=5)["total_cost"])
+        with self.assertRaises(ValueError):
+            energy_rates(gap.pd.index, contract, np.full(len(gap.pd), np.nan))
+
+class test_MPCDispatch(unittest.TestCase):
+    def _model(self):
+        import numpy as np
+
+        obj = _synthetic_powerflow_input(days=14)
+        rng = np.random.default_rng(0)
+        obj.pd["BelpexFilter"] = 90 + 60 * rng.standard_normal(len(obj.pd))
+        return obj
+
+    def test_not_better_than_perfect_foresight(self):
+        contract = test_OptimalDispatch()._contract("DynamicTariff")
+        optimal = self._model().optimal_power_flow(contract, max_charge=5)
+
+        for forecast in ("perfect", "persistence"):
+            with self.subTest(forecast=forecast):
+                model = self._model()
+                summary = model.mpc_power_flow(contract, max_charge=5, forecast=forecast)
+                self.assertEqual(summary["windows"], 14)
+                self.assertEqual(summary["failed_windows"], 0)
+                self.assertEqual(summary["structures"], 2)
+                self.assertLessEqual(optimal["total_cost"], summary["total_cost"] + 1e-6)
+
+                pd_ = model.pd
+                self.assertTrue(((pd_["BatteryCharge"] >= -1e-9) & (pd_["BatteryCharge"] <= 5 + 1e-9)).all())
+                discharge = (-pd_["BatteryFlow"]).clip(lower=0)
+                balance = (pd_["PV_generated_power"] - pd_["Curtailment"] - pd_["Load_kW"]
+                           - pd_["BatteryFlow"] - 0.025 * discharge - pd_["GridFlow"])
+                self.assertLess(balance.abs().max(), 1e-6)
+
+    def test_invalid_arguments(self):
+        contract = test_OptimalDispatch()._contract("DualTariff")
+        with self.assertRaises(ValueError):
+            self._model().mpc_power_flow(contract, forecast="oracle")
+        with self.assertRaises(ValueError):
+            self._model().mpc_power_flow(contract, horizon_hours=12, step_hours=24)
+
+class test_DPDispatch(unittest.TestCase):
+    def _model(self):
+        import numpy as np
+
+        obj = _synthetic_powerflow_input(days=14)
+        rng = np.random.default_rng(0)
+        obj.pd["BelpexFilter"] = 90 + 30 * np.abs(rng.standard_normal(len(obj.pd)))
+        return obj
+
+    def test_close_to_lp_and_window_costs_money(self):
+        contract = test_OptimalDispatch()._contract("DynamicTariff")
+        lp = self._model().optimal_power_flow(contract, max_charge=5, capacity_tariff=False)
+
+        free = self._model()
+        summary = free.dp_power_flow(contract, max_charge=5, discharge_hours=None)
+        self.assertAlmostEqual(summary["objective"], summary["energy_cost"], places=6)
+        # the LP is the continuous relaxation of the discretised problem
+        self.assertGreaterEqual(summary["energy_cost"], lp["energy_cost"] - 1e-6)
+        self.assertLess(summary["energy_cost"] - lp["energy_cost"], 0.05 * abs(lp["energy_cost"]))
+
+        model = self._model()
+        windowed = model.dp_power_flow(contract, max_charge=5)
+        self.assertGreaterEqual(windowed["energy_cost"], summary["energy_cost"] - 1e-9)
+        pd_ = model.pd
+        night = (pd_.index.hour < 4) | (pd_.index.hour >= 23)
+        self.assertTrue((pd_.loc[night, "BatteryFlow"] >= 0).all())
+        self.assertTrue(((pd_["BatteryCharge"] >= 0) & (pd_["BatteryCharge"] <= 5 + 1e-9)).all())
+        for column in ("BatteryCharge", "GridFlow", "BatteryFlow", "EVCharge", "EVFlow"):
+            self.assertIn(column, pd_.columns)
+
+    def test_invalid_levels(self):
+        with self.assertRaises(ValueError):
+            self._model().dp_power_flow(test_OptimalDispatch()._contract("DualTariff"), soc_levels=1)
+
+class test_PeakShaving(unittest.TestCase):
+    def _model(self):
+        obj = _synthetic_powerflow_input(days=14)
+        hour = obj.pd.index.hour
+        obj.pd.loc[(hour >= 17) & (hour < 21), "Load_kW"] += 1.0
+        obj.pd.loc[hour == 21, "Load_kW"] += 4.0
+        return obj
+
+    def test_lower_billed_peak_than_greedy(self):
+        from powercalculations._peakshaving import billed_peaks
+
+        greedy = self._model()
+        greedy.power_flow(max_charge=5, engine="array")
+        shaved = self._model()
+        shaved.power_flow(max_charge=5, control="peak_shaving")
+
+        greedy_peak = billed_peaks(greedy.pd.index, greedy.pd["GridFlow"].to_numpy())[0]
+        shaved_peak = billed_peaks(shaved.pd.index, shaved.pd["GridFlow"].to_numpy())[0]
+        self.assertGreater(greedy_peak, 4.0)
+        self.assertAlmostEqual(shaved_peak, 2.5)
+        self.assertTrue(((shaved.pd["BatteryCharge"] >= -1e-9) & (shaved.pd["BatteryCharge"] <= 5 + 1e-9)).all())
+
+    def test_sweep_matches_single_runs(self):
+        from powercalculations._peakshaving import billed_peaks
+
+        sweep = self._model().peak_shaving_sweep([0, 2, 5], peak_target=3.0)
+        for size in (0, 2, 5):
+            single = self._model()
+            single.power_flow(max_charge=size, control="peak_shaving", peak_target=3.0)
+            billed = billed_peaks(single.pd.index, single.pd["GridFlow"].to_numpy())[0]
+            self.assertAlmostEqual(sweep.loc[size, "billed_peak_kW"], billed, places=9)
+        self.assertGreater(sweep.loc[0, "billed_peak_kW"], sweep.loc[5, "billed_peak_kW"])
+
+    def test_invalid_arguments(self):
+        from powercalculations._evschedule import DEFAULT_EV_SCHEDULE
+
+        with self.assertRaises(ValueError):
+            self._model().power_flow(control="shave_everything")
+        with self.assertRaises(ValueError):
+            self._model().power_flow(control="peak_shaving", peak_reserve=1.5)
+        with self.assertRaises(ValueError):
+            self._model().power_flow(control="peak_shaving", engine="numba")
+        with self.assertRaises(ValueError):
+            self._model().power_flow(control="peak_shaving", engine="array", EV_schedule=DEFAULT_EV_SCHEDULE)
+
+class test_EVSchedule(unittest.TestCase):
+    def test_default_schedule_compiles_every_hour(self):
+        from powercalculations import _evschedule
+
+        index = pd.date_range("2018-06-04", periods=7 * 24, freq="1h")  # Monday
+        compiled = _evschedule.compile_EV_schedule(index, 80.0)
+        modes = pd.Series(compiled.mode, index=index)
+        self.assertEqual(modes["2018-06-04 10:00"], _evschedule.AWAY)
+        self.assertEqual(modes["2018-06-06 14:00"], _evschedule.FOLLOW)   # Wednesday afternoon at home
+        self.assertEqual(modes["2018-06-09 12:00"], _evschedule.CHARGE)   # Saturday
+        self.assertEqual(modes["2018-06-09 07:00"], _evschedule.DISCHARGE)
+        self.assertAlmostEqual(compiled.min_capacity[7], 0.4 * 80.0)
+        self.assertAlmostEqual(compiled.max_capacity, 0.8 * 80.0)
+
+    def test_gaps_and_overlaps_are_rejected(self):
+        from powercalculations import _evschedule
+
+        index = pd.date_range("2018-06-04", periods=24, freq="1h")
+        gap = _evschedule.DEFAULT_EV_SCHEDULE.iloc[1:]
+        overlap = pd.concat([_evschedule.DEFAULT_EV_SCHEDULE, _evschedule.DEFAULT_EV_SCHEDULE.iloc[:1]])
+        for schedule in (gap, overlap):
+            with self.assertRaises(ValueError):
+                _evschedule.compile_EV_schedule(index, 80.0, schedule)
+
+    def test_drain_is_per_hour_at_any_frequency(self):
+        always_away = pd.DataFrame([((0, 1, 2, 3, 4, 5, 6), 0, 24, "away", 0.0, 1.0)],
+                                   columns=["weekdays", "start", "end", "mode", "min_soc", "drain"])
+        for freq in ("1h", "15min"):
+            with self.subTest(freq=freq):
+                obj = _synthetic_powerflow_input(days=2)
+                obj.pd = obj.pd.resample(freq).ffill()
+                obj.power_flow(EV_type="B2G", max_EV_charge=80, engine="array", EV_schedule=always_away)
+                used = 0.5 * 80 - obj.pd["EVCharge"].iloc[-1]
+                self.assertAlmostEqual(used, len(obj.pd) * pd.Timedelta(freq) / pd.Timedelta("1h"))
+                self.assertTrue((obj.pd["EVFlow"] == 0).all())
+
+        with self.assertRaises(ValueError):
+            _synthetic_powerflow_input().power_flow(EV_type="B2G", EV_schedule=always_away)
+
+class test_EVTemplateTiling(unittest.TestCase):
+    TEMPLATE = os.path.join(os.path.dirname(__file__), '..', 'deprecated', 'EV-Calculation.xlsx')
+
+    def _model(self, freq, start="2018-01-01", weeks=3):
+        obj = pc.PowerCalculations.__new__(pc.PowerCalculations)
+        index = pd.date_range(start, periods=int(pd.Timedelta(weeks=weeks) / pd.Timedelta(freq)), freq=freq)
+        obj.pd = pd.DataFrame({"Load_kW": 0.0}, index=index)
+        return obj
+
+    def test_tile_matches_rows(self):
+        from powercalculations import _EVload
+
+        rows, tile = self._model("1h"), self._model("1h")
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for kind in ("Load_EV_kW_with_SC", "Load_EV_kW_no_SC"):
+                _EVload.add_EV_load_type(rows, kind, filepath=self.TEMPLATE)
+                _EVload.add_EV_load_type(tile, kind, filepath=self.TEMPLATE, engine="tile", cache_dir=cache_dir)
+                pd.testing.assert_series_equal(tile.pd[kind], rows.pd[kind])
+
+    def test_any_frequency_and_partial_weeks(self):
+        from powercalculations import _EVload
+
+        template = _EVload.load_EV_template(self.TEMPLATE, use_cache=False)
+        hourly = self._model("1h")
+        _EVload.add_EV_load_type(hourly, filepath=self.TEMPLATE, engine="tile", use_cache=False)
+        for freq, start in (("15min", "2018-01-01"), ("1min", "2018-01-01"), ("1h", "2018-01-03 05:00")):
+            with self.subTest(freq=freq, start=start):
+                obj = self._model(freq, start=start)
+                values = _EVload.tile_EV_template(obj.pd.index, template, "Load_EV_kW_with_SC")
+                self.assertEqual(len(values), len(obj.pd))
+                on_the_hour = pd.Series(values, index=obj.pd.index)
+                on_the_hour = on_the_hour[on_the_hour.index.minute == 0]
+                common = on_the_hour.index.intersection(hourly.pd.index)
+                pd.testing.assert_series_equal(on_the_hour[common], hourly.pd.loc[common, "Load_EV_kW_with_SC"],
+                                               check_names=False, check_freq=False)
+
+    def test_template_cache(self):
+        import numpy as np
+        from powercalculations import _EVload
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            _EVload._templates.clear()
+            first = _EVload.load_EV_template(self.TEMPLATE, cache_dir=cache_dir)
+            self.assertIs(_EVload.load_EV_template(self.TEMPLATE, cache_dir=cache_dir), first)
+            self.assertTrue(os.listdir(cache_dir))
+
+            _EVload._templates.clear()
+            original = _EVload._parse_EV_template
+            _EVload._parse_EV_template = None  # served from disk, never parsed
+            try:
+                from_disk = _EVload.load_EV_template(self.TEMPLATE, cache_dir=cache_dir)
+            finally:
+                _EVload._parse_EV_template = original
+            np.testing.assert_array_equal(from_disk["Load_EV_kW_with_SC"], first["Load_EV_kW_with_SC"])
+
+    def test_invalid_arguments(self):
+        from powercalculations import _EVload
+
+        with self.assertRaises(ValueError):
+            _EVload.add_EV_load_type(self._model("1h"), "Load_EV_kW_B2G", filepath=self.TEMPLATE, engine="tile")
+        with self.assertRaises(ValueError):
+            _EVload.add_EV_load_type(self._model("1h"), filepath=self.TEMPLATE, engine="vectorised")
+        with self.assertRaises(FileNotFoundError):
+            _EVload.add_EV_load_type(self._model("1h"), filepath="no_such_template.xlsx", engine="tile")
+
+class test_EVFleet(unittest.TestCase):
+    def test_single_vehicle_matches_power_flow(self):
+        from powercalculations import _evschedule
+        from powercalculations._fleet import EVSpec
+
+        schedule = _evschedule.DEFAULT_EV_SCHEDULE.copy()
+        schedule.loc[schedule["mode"] == "discharge", "mode"] = "follow"
+        single, fleet = _synthetic_powerflow_input(days=7), _synthetic_powerflow_input(days=7)
+        single.power_flow(EV_type="B2G", max_EV_power=3.7, max_EV_charge=60, engine="array", EV_schedule=schedule)
+        per_vehicle = fleet.fleet_power_flow([EVSpec(name="car", capacity=60, charger_power=3.7, schedule=schedule)])
+        for column in ("BatteryCharge", "GridFlow", "BatteryFlow", "EVCharge"):
+            pd.testing.assert_series_equal(fleet.pd[column], single.pd[column])
+        pd.testing.assert_series_equal(per_vehicle["EVFlow"]["car"], single.pd["EVFlow"], check_names=False,
+                                       atol=1e-12)
+
+    def test_site_power_is_shared(self):
+        from powercalculations._fleet import EVSpec
+
+        always_charging = pd.DataFrame([((0, 1, 2, 3, 4, 5, 6), 0, 24, "charge", 0.0, 0.0)],
+                                       columns=["weekdays", "start", "end", "mode", "min_soc", "drain"])
+        fleet = [EVSpec(name="low", charger_power=11, schedule=always_charging, priority=0),
+                 EVSpec(name="high", charger_power=11, schedule=always_charging, priority=1),
+                 EVSpec(name="slow", charger_power=3, schedule=always_charging, priority=0)]
+        expected = {"priority": (5.0, 11.0, 0.0), "proportional": (7.04, 7.04, 1.92), "equal": (6.5, 6.5, 3.0)}
+        for sharing, shares in expected.items():
+            with self.subTest(sharing=sharing):
+                obj = _synthetic_powerflow_input(days=1)
+                flows = obj.fleet_power_flow(fleet, site_EV_power=16, sharing=sharing)["EVFlow"]
+                for name, share in zip(("low", "high", "slow"), shares):
+                    self.assertAlmostEqual(flows[name].iloc[0], share)
+                self.assertLessEqual(obj.pd["EVFlow"].max(), 16 + 1e-9)
+
+    def test_only_V2G_vehicles_discharge(self):
+        from powercalculations._fleet import EVSpec
+
+        covering = pd.DataFrame([((0, 1, 2, 3, 4, 5, 6), 0, 24, "discharge", 0.2, 0.0)],
+                                columns=["weekdays", "start", "end", "mode", "min_soc", "drain"])
+        obj = _synthetic_powerflow_input(days=1)
+        obj.pd["PV_generated_power"] = 0.0
+        per_vehicle = obj.fleet_power_flow([EVSpec(name="V2G", charger_power=20, schedule=covering),
+                                            EVSpec(name="plain", charger_power=20, schedule=covering, V2G=False)],
+                                           max_charge=0, max_AC_power_output=20)
+        self.assertTrue((per_vehicle["EVFlow"]["V2G"] < 0).all())
+        self.assertTrue((per_vehicle["EVFlow"]["plain"] == 0).all())
+        self.assertAlmostEqual(obj.pd["GridFlow"].abs().max(), 0.0)
+
+    def test_invalid_arguments(self):
+        from powercalculations._fleet import EVSpec
+
+        with self.assertRaises(ValueError):
+            _synthetic_powerflow_input().fleet_power_flow([EVSpec()], sharing="first_come")
+        with self.assertRaises(ValueError):
+            _synthetic_powerflow_input().fleet_power_flow([])
+        with self.assertRaises(ValueError):
+            _synthetic_powerflow_input().fleet_power_flow([EVSpec(name="car"), EVSpec(name="car")])
+
+class test_SmartCharging(unittest.TestCase):
+    def _sessions(self):
+        return pd.DataFrame({
+            "vehicle": ["a", "b", "a"],
+            "plug_in": pd.to_datetime(["2018-06-04 17:30", "2018-06-04 18:00", "2018-06-05 17:00"]),
+            "plug_out": pd.to_datetime(["2018-06-05 07:00", "2018-06-05 08:00", "2018-06-06 07:00"]),
+            "energy": [9.0, 30.0, 1.5],
+            "power": [3.7, 11.0, 3.7],
+        })
+
+    def test_cheapest_steps_are_charged(self):
+        import numpy as np
+        from powercalculations._smartcharging import schedule_EV_sessions
+
+        obj = test_OptimalDispatch()._model()
+        index = obj.pd.index
+        rate = np.random.default_rng(3).uniform(0.1, 0.4, len(index))
+        sessions = self._sessions()
+        load, result = schedule_EV_sessions(index, sessions, rate)
+        np.testing.assert_allclose(result["delivered_kWh"], sessions["energy"])
+        self.assertAlmostEqual(load.sum(), sessions["energy"].sum())
+        for i, session in sessions.iterrows():
+            window = (index >= session.plug_in) & (index + pd.Timedelta("1h") <= session.plug_out)
+            ranked = np.sort(rate[window])
+            full, partial = divmod(session.energy, session.power)
+            best = session.power * (ranked[:int(full)].sum() + ranked[int(full)] * partial / session.power)
+            self.assertAlmostEqual(result["cost"].iloc[i], best)
+        self.assertTrue((load <= 3.7 + 11.0 + 1e-9).all())
+
+    def test_too_short_session(self):
+        from powercalculations._smartcharging import schedule_EV_sessions
+
+        index = pd.date_range("2018-06-04", periods=48, freq="1h")
+        sessions = pd.DataFrame({"plug_in": [pd.Timestamp("2018-06-04 20:15")],
+                                 "plug_out": [pd.Timestamp("2018-06-04 23:00")], "energy": [20.0]})
+        load, result = schedule_EV_sessions(index, sessions, [0.2] * 48, max_EV_power=3.7)
+        self.assertEqual(result["steps"].iloc[0], 2)  # 21:00 and 22:00
+        self.assertAlmostEqual(result["shortfall_kWh"].iloc[0], 20.0 - 2 * 3.7)
+        self.assertEqual(list(load[21:23]), [3.7, 3.7])
+
+    def test_steps_without_price_are_not_charged(self):
+        import numpy as np
+
+        contract = test_OptimalDispatch()._contract("DynamicTariff")
+        obj = _synthetic_powerflow_input(days=2)
+        obj.pd["BelpexFilter"] = 100.0
+        obj.pd.loc["2018-06-04 22:00":"2018-06-05 01:00", "BelpexFilter"] = np.nan  # 4 steps without a price
+        obj.pd.loc["2018-06-05 03:00", "BelpexFilter"] = 50.0
+        sessions = pd.DataFrame({"plug_in": [pd.Timestamp("2018-06-04 20:00")],
+                                 "plug_out": [pd.Timestamp("2018-06-05 06:00")], "energy": [7.4]})
+
+        result = obj.smart_EV_load(sessions, contract)
+        load = obj.pd["Load_EV_kW_smart"]
+        self.assertEqual(load["2018-06-04 22:00":"2018-06-05 01:00"].sum(), 0.0)
+        self.assertAlmostEqual(load["2018-06-05 03:00"], 3.7)
+        self.assertEqual(result["steps"].iloc[0], 6)
+        self.assertAlmostEqual(result["delivered_kWh"].iloc[0], 7.4)
+        self.assertTrue(np.isfinite(result["cost"].iloc[0]))
+
+        # a session that lies in the gap only gets nothing
+        gap_only = sessions.assign(plug_in=pd.Timestamp("2018-06-04 22:00"), plug_out=pd.Timestamp("2018-06-05 02:00"))
+        result = obj.smart_EV_load(gap_only, contract)
+        self.assertEqual(result["shortfall_kWh"].iloc[0], 7.4)
+        self.assertEqual(result["cost"].iloc[0], 0.0)
+
+    def test_power_flow_uses_smart_load(self):
+        contract = test_OptimalDispatch()._contract("DynamicTariff")
+        for engine in ("rows", "array"):
+            with self.subTest(engine=engine):
+                obj = test_OptimalDispatch()._model()
+                obj.smart_EV_load(self._sessions(), contract)
+                obj.power_flow(EV_type="smart", engine=engine)
+                pd.testing.assert_series_equal(obj.pd["EVFlow"], obj.pd["Load_EV_kW_smart"], check_names=False)
+
+    def test_invalid_sessions(self):
+        from powercalculations._smartcharging import schedule_EV_sessions
+
+        index = pd.date_range("2018-06-04", periods=48, freq="1h")
+        backwards = self._sessions().assign(plug_out=lambda df: df["plug_in"] - pd.Timedelta("1h"))
+        for sessions in (self._sessions().drop(columns="energy"), self._sessions().assign(energy=-1.0), backwards):
+            with self.assertRaises(ValueError):
+                schedule_EV_sessions(index, sessions, [0.2] * 48)
+
+class test_ChunkedPowerFlow(unittest.TestCase):
+    COLUMNS = ["BatteryCharge", "GridFlow", "BatteryFlow", "EVCharge", "EVFlow"]
+
+    def test_blocks_equal_single_pass(self):
+        for EV_type in ("no_EV", "B2G", "with_SC"):
+            for block in ("D", 7, 1):
+                with self.subTest(EV_type=EV_type, block=block):
+                    single, chunked = _synthetic_powerflow_input(days=5), _synthetic_powerflow_input(days=5)
+                    for obj in (single, chunked):
+                        obj.pd["Load_EV_kW_with_SC"] = 3.7 * (obj.pd.index.hour >= 20)
+                    single.power_flow(EV_type=EV_type, max_charge=20, engine="array")
+                    chunked.power_flow(EV_type=EV_type, max_charge=20, engine="array", block=block)
+                    pd.testing.assert_frame_equal(chunked.pd[self.COLUMNS], single.pd[self.COLUMNS])
+
+    def test_columnar_sink(self):
+        from powercalculations._chunked import ColumnarSink, iter_blocks, stream_power_flow
+
+        single = _synthetic_powerflow_input(days=5)
+        single.power_flow(EV_type="B2G", engine="array")
+        source = _synthetic_powerflow_input(days=5)
+        with tempfile.TemporaryDirectory() as directory:
+            sink = ColumnarSink(directory)
+            # a generator, as when every block is read from its own file
+            blocks = (block.copy() for block in iter_blocks(source.pd, "D"))
+            summary = stream_power_flow(blocks, sink, EV_type="B2G")
+            self.assertEqual((summary["rows"], summary["blocks"]), (len(source.pd), 5))
+            self.assertAlmostEqual(summary["EV"], single.pd["EVCharge"].iloc[-1])
+
+            written = ColumnarSink(directory, append=True).read()
+            pd.testing.assert_frame_equal(written[self.COLUMNS], single.pd[self.COLUMNS], check_freq=False,
+                                          check_names=False)
+            del written
+
+    def test_state_is_carried_in(self):
+        from powercalculations._chunked import _FrameSink, stream_power_flow
+
+        obj = _synthetic_powerflow_input(days=2)
+        frames = _FrameSink()
+        stream_power_flow([obj.pd.iloc[:24], obj.pd.iloc[24:]], frames, max_charge=10, state={"battery": 10.0})
+        self.assertGreater(frames.blocks[0]["BatteryCharge"].iloc[0], 8)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            _synthetic_powerflow_input().power_flow(block="D")
+        with self.assertRaises(ValueError):
+            _synthetic_powerflow_input().power_flow(engine="array", control="peak_shaving", block="D")
+        with self.assertRaises(ValueError):
+            _synthetic_powerflow_input().power_flow(engine="array", block=0)
+        with self.assertRaises(ValueError):
+            _synthetic_powerflow_input().power_flow(engine="array", peak_target=3.0)
+
+    def test_arguments_are_checked_before_simulating(self):
+        obj = _synthetic_powerflow_input()
+
+        def fail(**kwargs):
+            raise AssertionError("simulated before the arguments were checked")
+
+        obj.steady_state_charge = fail
+        with self.assertRaises(ValueError):
+            obj.power_flow(initial_charge="steady", block="D")
+        with self.assertRaises(ValueError):
+            obj.power_flow(engine="array", initial_charge="steady", control="peak_shaving")
+
+class test_SteadyState(unittest.TestCase):
+    def test_coalesced_start_is_periodic(self):
+        for EV_type in ("no_EV", "B2G"):
+            with self.subTest(EV_type=EV_type):
+                obj = _synthetic_powerflow_input(days=21)
+                report = obj.power_flow(engine="array", max_charge=8, EV_type=EV_type, initial_charge="steady")
+                self.assertEqual(report["method"], "coalesced")
+                self.assertLessEqual(report["tolerance"], 1e-6)
+                self.assertLess(report["residual"], 1e-6)
+                self.assertLess(report["simulated_rows"], 2 * len(obj.pd))
+                self.assertAlmostEqual(obj.pd["BatteryCharge"].iloc[-1], report["battery"], places=6)
+
+    def test_bisection_when_runs_do_not_meet(self):
+        obj = _synthetic_powerflow_input(days=3)
+        report = obj.power_flow(engine="array", max_charge=100, initial_charge="steady")
+        self.assertEqual(report["method"], "bisection")
+        self.assertLess(report["residual"], 1e-5)
+
+        again = _synthetic_powerflow_input(days=3)
+        again.power_flow(engine="array", max_charge=100, initial_charge=report["battery"])
+        self.assertAlmostEqual(again.pd["BatteryCharge"].iloc[-1], report["battery"], places=5)
+
+    def test_steady_with_blocks_and_sink(self):
+        from powercalculations._chunked import ColumnarSink
+
+        single = _synthetic_powerflow_input(days=21)
+        expected = single.power_flow(engine="array", max_charge=8, EV_type="B2G", initial_charge="steady")
+        chunked = _synthetic_powerflow_input(days=21)
+        report = chunked.power_flow(engine="array", max_charge=8, EV_type="B2G", initial_charge="steady", block="W")
+        self.assertEqual(report, expected)
+        with tempfile.TemporaryDirectory() as directory:
+            sink = ColumnarSink(directory)
+            report = _synthetic_powerflow_input(days=21).power_flow(engine="array", max_charge=8, EV_type="B2G",
+                                                                    initial_charge="steady", sink=sink)
+            self.assertEqual(report, expected)
+            self.assertLess(report["residual"], 1e-6)
+            written = sink.read(["BatteryCharge"])
+            self.assertAlmostEqual(written["BatteryCharge"].iloc[-1], report["battery"], places=6)
+            del written
+
+    def test_initial_charge_in_both_engines(self):
+        rows, array = _synthetic_powerflow_input(), _synthetic_powerflow_input()
+        rows.power_flow(max_charge=10, initial_charge=6, EV_type="B2G", initial_EV_charge=30)
+        array.power_flow(max_charge=10, initial_charge=6, EV_type="B2G", initial_EV_charge=30, engine="array")
+        columns = ["BatteryCharge", "GridFlow", "EVCharge"]
+        pd.testing.assert_frame_equal(array.pd[columns], rows.pd[columns])
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            _synthetic_powerflow_input().power_flow(initial_charge="steady")
+        with self.assertRaises(ValueError):
+            _synthetic_powerflow_input().power_flow(engine="array", initial_charge="periodic")
+        with self.assertRaises(ValueError):
+            _synthetic_powerflow_input().power_flow(control="peak_shaving", initial_charge=4)
+
 ############################################################################################################
 
 if __name__ == '__main__':